@@ -0,0 +1,139 @@
+"""
+Fixed challenge corpus and query mix for the execution engine benchmarks.
+
+Every size builds the same three-table challenge (departments, employees,
+projects) with deterministic rows, so runs on different machines or commits
+measure the same work. The query mix covers what students submit: plain
+reads, filters, joins with aggregation, window functions, CTEs, subqueries,
+and the writes and schema changes that need a private database.
+"""
+
+import datetime
+
+
+# Employees per dataset; departments and projects scale with them
+SIZES = {
+    'small': 20,
+    'medium': 500,
+    'large': 5000,
+}
+
+DEPARTMENT_NAMES = ['Engineering', 'Sales', 'Marketing', 'Finance', 'Support', 'Legal', 'Research', 'Operations']
+
+SCHEMAS = {
+    'departments': (
+        "CREATE TABLE departments (id INT PRIMARY KEY, name VARCHAR(50) NOT NULL, "
+        "location VARCHAR(50), budget DECIMAL(12,2))"
+    ),
+    'employees': (
+        "CREATE TABLE employees (id INT PRIMARY KEY, name VARCHAR(100) NOT NULL, department_id INT, "
+        "manager_id INT, salary DECIMAL(10,2), hire_date DATE)"
+    ),
+    'projects': (
+        "CREATE TABLE projects (id INT PRIMARY KEY, title VARCHAR(100) NOT NULL, department_id INT, "
+        "lead_id INT, budget DECIMAL(12,2))"
+    ),
+}
+
+# (name, weight, query); weights set how often each query runs in the mix
+QUERY_MIX = [
+    ('select_all', 4, "SELECT * FROM employees"),
+    ('filter_order', 4, "SELECT name, salary FROM employees WHERE salary > 60000 ORDER BY salary DESC, id"),
+    ('join_group', 3, (
+        "SELECT d.name, COUNT(*) AS headcount, AVG(e.salary) AS avg_salary "
+        "FROM employees e JOIN departments d ON d.id = e.department_id "
+        "GROUP BY d.name ORDER BY d.name"
+    )),
+    ('window', 2, (
+        "SELECT name, department_id, salary, "
+        "RANK() OVER (PARTITION BY department_id ORDER BY salary DESC) AS salary_rank "
+        "FROM employees ORDER BY department_id, salary_rank, id"
+    )),
+    ('cte', 2, (
+        "WITH dept_totals AS (SELECT department_id, SUM(salary) AS total FROM employees GROUP BY department_id) "
+        "SELECT d.name, t.total FROM dept_totals t JOIN departments d ON d.id = t.department_id "
+        "ORDER BY t.total DESC"
+    )),
+    ('subquery', 2, (
+        "SELECT name FROM employees WHERE salary > (SELECT AVG(salary) FROM employees) "
+        "AND department_id IN (SELECT department_id FROM projects WHERE budget > 50000) ORDER BY id"
+    )),
+    ('insert', 1, (
+        "INSERT INTO employees (id, name, department_id, manager_id, salary, hire_date) "
+        "VALUES (999999, 'New Hire', 1, NULL, 50000.00, '2024-01-15'); "
+        "SELECT COUNT(*) AS total FROM employees"
+    )),
+    ('update', 1, "UPDATE employees SET salary = salary * 1.05 WHERE department_id = 2"),
+    ('alter', 1, "ALTER TABLE employees ADD COLUMN bonus DECIMAL(10,2); SELECT id, bonus FROM employees ORDER BY id"),
+]
+
+
+def build_dataset_sql(table, employees, flag_id):
+    """INSERT statements for one table; flag_id varies the values between datasets"""
+    departments = max(2, employees // 25)
+    projects = max(2, employees // 10)
+    start = datetime.date(2015, 1, 1)
+    statements = []
+
+    if table == 'departments':
+        for i in range(1, departments + 1):
+            name = f"{DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)]} {i}"
+            budget = 100000 + (i * 7919 * flag_id) % 400000
+            statements.append(
+                f"INSERT INTO departments (id, name, location, budget) "
+                f"VALUES ({i}, '{name}', 'City {i % 5}', {budget}.00);"
+            )
+    elif table == 'employees':
+        for i in range(1, employees + 1):
+            manager = 'NULL' if i % 10 == 1 else str(i - i % 10 + 1)
+            salary = 35000 + (i * 37 * flag_id) % 70000
+            hire_date = start + datetime.timedelta(days=(i * 13 + flag_id) % 3000)
+            statements.append(
+                f"INSERT INTO employees (id, name, department_id, manager_id, salary, hire_date) "
+                f"VALUES ({i}, 'Employee {i}', {i % departments + 1}, {manager}, {salary}.50, '{hire_date}');"
+            )
+    elif table == 'projects':
+        for i in range(1, projects + 1):
+            budget = 10000 + (i * 104729 * flag_id) % 90000
+            statements.append(
+                f"INSERT INTO projects (id, title, department_id, lead_id, budget) "
+                f"VALUES ({i}, 'Project {i}', {i % departments + 1}, {i % employees + 1}, {budget}.00);"
+            )
+    return '\n'.join(statements)
+
+
+def create_challenge(size):
+    """Create (or replace) the benchmark challenge for a size and return it"""
+    from challenges.models import Challenge, ChallengeTable
+
+    title = f'Benchmark corpus ({size})'
+    Challenge.objects.filter(title=title).delete()
+    employees = SIZES[size]
+
+    challenge = Challenge.objects.create(
+        title=title,
+        description='Fixed challenge used by the execution engine benchmarks',
+        difficulty='easy',
+    )
+    for order, (table, schema_sql) in enumerate(SCHEMAS.items()):
+        ChallengeTable.objects.create(
+            challenge=challenge,
+            table_name=table,
+            schema_sql=schema_sql,
+            run_dataset_sql=build_dataset_sql(table, employees, 1),
+            submit_dataset_sql=build_dataset_sql(table, employees, 2),
+            order=order,
+        )
+    challenge.refresh_from_db()
+    return challenge
+
+
+def iter_query_mix(rounds=1):
+    """Yield (name, query) following the mix weights, interleaved the same way every time"""
+    for _ in range(rounds):
+        remaining = {name: weight for name, weight, _ in QUERY_MIX}
+        while any(remaining.values()):
+            for name, _, query in QUERY_MIX:
+                if remaining[name]:
+                    remaining[name] -= 1
+                    yield name, query
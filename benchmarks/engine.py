@@ -0,0 +1,268 @@
+"""
+Latency and allocation benchmarks for the challenge execution engine.
+
+Runs the fixed corpus from benchmarks.corpus (small, medium and large
+datasets, a weighted query mix) through:
+
+- execute_dual_dataset_query, end to end on the chosen engine
+- _process_user_query, the table renaming and flag_id rewrite
+- normalize_json_result, on the rows each query returns
+- _split_sql_statements, on the submit dataset SQL
+- the editor's execute_sql_query_enhanced, on a SQLite file with the corpus
+
+Each case reports p50/p95/p99 and mean milliseconds and the peak memory
+allocated per call (a separate tracemalloc pass, so tracing does not inflate
+the timings). The challenges are created in a throwaway test database and the
+result cache is disabled, so every query really executes. Results can be saved
+as a JSON baseline and later runs compared against it; a case whose p50 or
+p95 grew by more than the threshold is reported and the exit status is 1.
+
+Usage:
+    python -m benchmarks.engine [--engine sqlite|postgresql|mysql]
+        [--sizes small medium large] [--iterations 20]
+        [--save-baseline PATH] [--compare PATH] [--threshold 0.25] [--min-delta-ms 0.5]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.corpus import SCHEMAS, SIZES, build_dataset_sql, create_challenge, iter_query_mix
+
+
+PERCENTILES = (50, 95, 99)
+
+# Smallest slowdown in milliseconds that counts as a regression
+MIN_DELTA_MS = 0.5
+
+
+def percentile(timings, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(timings)
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+def summarize(timings, alloc_peak):
+    summary = {f'p{pct}': round(percentile(timings, pct), 3) for pct in PERCENTILES}
+    summary['mean'] = round(sum(timings) / len(timings), 3)
+    summary['alloc_peak_kib'] = round(alloc_peak / 1024, 1)
+    summary['calls'] = len(timings)
+    return summary
+
+
+def measure(func, calls, iterations):
+    """
+    Time every call over the given iterations, then run each call once more
+    under tracemalloc for the largest per-call peak. calls is a list of
+    argument tuples; returns (timings in ms, peak bytes, errors).
+    """
+    timings = []
+    errors = 0
+    for _ in range(iterations):
+        for args in calls:
+            start = time.perf_counter()
+            result = func(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+            if isinstance(result, dict) and not result.get('success', True):
+                errors += 1
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for args in calls:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            func(*args)
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return timings, peak, errors
+
+
+def build_editor_database(size):
+    """SQLite file holding the run dataset under the original table names"""
+    from challenges.utils import DatabaseEngineManager
+
+    manager = DatabaseEngineManager('sqlite')
+    employees = SIZES[size]
+    handle, path = tempfile.mkstemp(suffix='.sqlite3', prefix=f'kodesql_bench_{size}_')
+    os.close(handle)
+
+    import sqlite3
+    conn = sqlite3.connect(path)
+    try:
+        for table, schema_sql in SCHEMAS.items():
+            conn.execute(manager._adapt_sql_for_engine(schema_sql, 'sqlite'))
+            conn.executescript(build_dataset_sql(table, employees, 1))
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def run_size(size, engine, iterations):
+    """Benchmark every case for one corpus size; returns {case: summary}"""
+    from challenges.utils import (
+        _process_user_query, _split_sql_statements, execute_dual_dataset_query, normalize_json_result
+    )
+    from editor.views import execute_sql_query_enhanced
+
+    challenge = create_challenge(size)
+    compiled = challenge.get_compiled_sql()
+    mix = list(iter_query_mix())
+    results = {}
+
+    def execute(query, flag_id):
+        return execute_dual_dataset_query(challenge, query, flag_id, engine)
+
+    # Warm the engine (templates, pools, compiled artifact) before timing
+    for _, query in mix:
+        warm = execute(query, 1)
+        if warm.get('fallback_used') or warm.get('engine_unavailable'):
+            ran_on = warm.get('fallback_engine', 'postgresql') if warm.get('fallback_used') else 'no engine'
+            print(f"  warning: {engine} is unavailable, queries ran on {ran_on}")
+            break
+
+    case_calls = {
+        'execute.run': (execute, [(query, 1) for _, query in mix]),
+        'execute.submit': (execute, [(query, 2) for _, query in mix]),
+        'process_user_query': (
+            lambda query: _process_user_query(query, challenge, 1, compiled),
+            [(query,) for _, query in mix],
+        ),
+        'split_statements': (
+            _split_sql_statements,
+            [(table.submit_dataset_sql,) for table in challenge.tables.all()],
+        ),
+    }
+
+    rows = [
+        result['results'] for result in (execute(query, 1) for _, query in mix)
+        if result.get('success') and result.get('results')
+    ]
+    case_calls['normalize_json_result'] = (normalize_json_result, [(result,) for result in rows])
+
+    db_path = build_editor_database(size)
+    try:
+        case_calls['editor_execute'] = (
+            execute_sql_query_enhanced,
+            [(db_path, query) for name, query in mix if name not in ('insert', 'update', 'alter')],
+        )
+        for case, (func, calls) in case_calls.items():
+            if not calls:
+                continue
+            timings, peak, errors = measure(func, calls, iterations)
+            results[f'{size}.{case}'] = summarize(timings, peak)
+            results[f'{size}.{case}']['errors'] = errors
+    finally:
+        os.remove(db_path)
+        challenge.delete()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms=MIN_DELTA_MS):
+    """
+    Cases whose p50 or p95 grew by more than threshold (and by at least
+    min_delta_ms, so jitter in microsecond cases is ignored); returns
+    [(case, metric, old, new)]
+    """
+    regressions = []
+    for case, summary in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if not previous:
+            continue
+        for metric in ('p50', 'p95'):
+            old, new = previous.get(metric), summary[metric]
+            if old and new > old * (1 + threshold) and new - old >= min_delta_ms:
+                regressions.append((case, metric, old, new))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'case':<34} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9} {'KiB':>9} {'err':>4}  vs baseline")
+    for case, summary in results.items():
+        delta = ''
+        previous = (baseline or {}).get('results', {}).get(case)
+        if previous and previous.get('p50'):
+            delta = f"{summary['p50'] / previous['p50'] - 1:+.0%} p50"
+        print(f"{case:<34} {summary['p50']:>9.3f} {summary['p95']:>9.3f} {summary['p99']:>9.3f} "
+              f"{summary['mean']:>9.3f} {summary['alloc_peak_kib']:>9.1f} {summary['errors']:>4}  {delta}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--engine', choices=['sqlite', 'postgresql', 'mysql'], default='sqlite')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--iterations', type=int, default=20, help='Passes over the query mix per case')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed p50/p95 growth over the baseline (default 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS,
+                        help='Ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sqlplayground.settings')
+    import django
+    django.setup()
+
+    from django.test.utils import override_settings
+    from django.test.runner import DiscoverRunner
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    results = {}
+    try:
+        with override_settings(
+            CHALLENGE_RESULT_CACHE_ENABLED=False,
+            CHALLENGE_SQLITE_ENGINE_ENABLED=True,
+            CHALLENGE_WARMUP_ENABLED=False,
+        ):
+            for size in args.sizes:
+                print(f"Running {size} corpus ({SIZES[size]} employees) on {args.engine}...")
+                results.update(run_size(size, args.engine, args.iterations))
+    finally:
+        runner.teardown_databases(old_config)
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'meta': {
+                    'engine': args.engine,
+                    'iterations': args.iterations,
+                    'python': platform.python_version(),
+                    'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if baseline is not None:
+        if baseline.get('meta', {}).get('engine') != args.engine:
+            print(f"Note: baseline was recorded on {baseline.get('meta', {}).get('engine')}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for case, metric, old, new in regressions:
+            print(f"REGRESSION {case} {metric}: {old:.3f} ms -> {new:.3f} ms")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
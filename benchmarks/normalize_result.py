@@ -0,0 +1,119 @@
+"""
+Time of normalize_json_result against the implementation it replaced.
+
+Builds result sets with the value types the engines return (integers, text
+with surrounding spaces, Decimal, float, dates, NULLs, and the flag_id column
+that is dropped) and normalizes each one ordered (preserve_order=True) and
+unordered (sorted into canonical order), with the previous per-value
+isinstance chain and json.dumps sort key and with the current
+challenges.result_normalization.
+
+Usage:
+    python -m benchmarks.normalize_result [--rows 10000 100000] [--repeat 5]
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import statistics
+import time
+
+from challenges.result_normalization import normalize_json_result
+
+
+def build_rows(count):
+    """Deterministic employee-like rows, shuffled so the unordered sort has work to do"""
+    departments = ['Engineering', 'Sales', 'Marketing', 'Finance', 'Support']
+    start = datetime.date(2015, 1, 1)
+    rows = [
+        {
+            'id': i,
+            'name': f' Employee {i} ',
+            'department': departments[i % len(departments)],
+            'salary': decimal.Decimal(f'{40000 + (i * 37) % 60000}.50'),
+            'bonus_ratio': (i % 97) / 7,
+            'hire_date': start + datetime.timedelta(days=i % 3000),
+            'manager_id': None if i % 7 == 0 else i // 7,
+            'flag_id': 2,
+        }
+        for i in range(1, count + 1)
+    ]
+    return [rows[(i * 7919) % count] for i in range(count)]
+
+
+def legacy_normalize_json_result(result, preserve_order=False):
+    """The per-value isinstance chain and json.dumps sort key used before"""
+
+    def normalize_value(value):
+        if value is None:
+            return None
+        elif isinstance(value, bool):
+            return bool(value)
+        elif isinstance(value, int):
+            return int(value)
+        elif isinstance(value, float):
+            return round(float(value), 10)
+        elif isinstance(value, decimal.Decimal):
+            return round(float(value), 10)
+        elif isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        elif isinstance(value, str):
+            return value.strip()
+        elif isinstance(value, bytes):
+            return value.decode('utf-8', errors='ignore')
+        else:
+            return str(value)
+
+    if isinstance(result, list):
+        normalized = []
+        for row in result:
+            if isinstance(row, dict):
+                normalized_row = {}
+                for key in row.keys():
+                    if key.lower() != 'flag_id':
+                        normalized_row[key] = normalize_value(row[key])
+                normalized.append(normalized_row)
+            else:
+                normalized.append(normalize_value(row))
+
+        if not preserve_order:
+            try:
+                normalized.sort(key=lambda x: json.dumps(x, sort_keys=True) if isinstance(x, dict) else str(x))
+            except (TypeError, ValueError):
+                pass
+
+        return normalized
+    else:
+        return normalize_value(result)
+
+
+def measure(function, rows, preserve_order, repeat):
+    """Median milliseconds of repeat calls"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(rows, preserve_order)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>7} {'mode':<10} {'legacy ms':>10} {'current ms':>11} {'speedup':>8}")
+    for count in args.rows:
+        rows = build_rows(count)
+        # Same rows in the same order in both modes, so the change is a pure speedup
+        assert legacy_normalize_json_result(rows, True) == normalize_json_result(rows, True)
+        for mode, preserve_order in (('ordered', True), ('unordered', False)):
+            legacy_ms = measure(legacy_normalize_json_result, rows, preserve_order, args.repeat)
+            current_ms = measure(normalize_json_result, rows, preserve_order, args.repeat)
+            print(f"{count:>7} {mode:<10} {legacy_ms:>10.1f} {current_ms:>11.1f} {legacy_ms / current_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Size and encode time of the objects and columnar result formats.
+
+Builds result sets with the value types the engines return (integers, text,
+Decimal, dates, NULLs) and encodes each one the way the Run endpoint does:
+serialized {column: value} dicts versus editor.result_format.encode_columnar,
+followed by the JSON encoding done by JsonResponse.
+
+Usage:
+    python -m benchmarks.result_payload [--rows 100 1000 5000] [--repeat 20]
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import statistics
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from challenges.execution import _serialize_value
+from editor.result_format import encode_columnar
+
+
+COLUMNS = ['id', 'name', 'department', 'salary', 'hire_date', 'manager_id']
+
+
+def build_rows(count):
+    """Deterministic employee-like rows"""
+    departments = ['Engineering', 'Sales', 'Marketing', 'Finance', 'Support']
+    start = datetime.date(2015, 1, 1)
+    return [
+        {
+            'id': i,
+            'name': f'Employee {i}',
+            'department': departments[i % len(departments)],
+            'salary': decimal.Decimal(f'{40000 + (i * 37) % 60000}.50'),
+            'hire_date': start + datetime.timedelta(days=i % 3000),
+            'manager_id': None if i % 7 == 0 else i // 7,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def encode_objects(rows):
+    results = [{key: _serialize_value(value) for key, value in row.items()} for row in rows]
+    return json.dumps({'results': results, 'columns': COLUMNS}, cls=DjangoJSONEncoder)
+
+
+def encode_columns(rows):
+    return json.dumps(encode_columnar(rows, COLUMNS), cls=DjangoJSONEncoder)
+
+
+def measure(encoder, rows, repeat):
+    """Return (payload bytes, median milliseconds)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = encoder(rows)
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(payload.encode('utf-8')), statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>6} {'format':<9} {'bytes':>10} {'ms':>8}")
+    for count in args.rows:
+        rows = build_rows(count)
+        objects_size, objects_ms = measure(encode_objects, rows, args.repeat)
+        columnar_size, columnar_ms = measure(encode_columns, rows, args.repeat)
+        print(f"{count:>6} {'objects':<9} {objects_size:>10} {objects_ms:>8.2f}")
+        print(f"{count:>6} {'columnar':<9} {columnar_size:>10} {columnar_ms:>8.2f}"
+              f"  ({columnar_size / objects_size:.0%} size, {columnar_ms / objects_ms:.0%} time)")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ from django.shortcuts import get_object_or_404
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 import json
-from .models import Challenge, ChallengeTable, UserChallengeProgress, ChallengeSubscriptionPlan, UserChallengeSubscription, XPTransaction
+from .models import Challenge, ChallengeTable, ChallengeDatabaseVersion, ChallengeQueryJob, UserChallengeProgress, ChallengeSubscriptionPlan, UserChallengeSubscription, XPTransaction
 
 
 # Import/Export Resources
@@ -420,3 +420,37 @@ class XPTransactionAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'challenge')
+
+
+@admin.register(ChallengeDatabaseVersion)
+class ChallengeDatabaseVersionAdmin(admin.ModelAdmin):
+    """Admin interface for persistent challenge query databases"""
+    list_display = ['database_name', 'challenge', 'engine', 'flag_id', 'status', 'last_used_at', 'updated_at']
+    list_filter = ['engine', 'status', 'flag_id']
+    search_fields = ['database_name', 'challenge__title', 'content_hash']
+    readonly_fields = ['challenge', 'engine', 'flag_id', 'content_hash', 'database_name', 'status',
+                       'error_message', 'last_used_at', 'created_at', 'updated_at']
+    ordering = ['-updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('challenge')
+
+
+@admin.register(ChallengeQueryJob)
+class ChallengeQueryJobAdmin(admin.ModelAdmin):
+    """Admin interface for queued challenge Run and Submit jobs"""
+    list_display = ['id', 'kind', 'user', 'challenge', 'engine', 'status', 'created_at', 'started_at', 'finished_at']
+    list_filter = ['kind', 'engine', 'status']
+    search_fields = ['user__email', 'challenge__title']
+    readonly_fields = ['id', 'user', 'challenge', 'kind', 'engine', 'query', 'status', 'result',
+                       'created_at', 'started_at', 'finished_at']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'challenge')
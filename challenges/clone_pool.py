@@ -0,0 +1,333 @@
+"""
+PostgreSQL sandbox databases cloned from a loaded template.
+
+Queries that cannot run on the shared template database (schema changes,
+transaction control) need a private database. Instead of replaying the
+converted schema and INSERT statements for every run, each template version
+keeps an untouched clone source, and private databases are created with
+CREATE DATABASE ... TEMPLATE, which copies files instead of executing SQL.
+
+A per-process ClonePool keeps a few clones ready for every source that has
+been used. A background thread tops the pool up after a clone is taken and
+drops used clones, so neither happens on the request path. Each source's
+clones are leased for CHALLENGE_CLONE_LEASE_SECONDS; taking a clone or warming
+the source (warmup.py) renews the lease, and the clones of a source whose
+lease ran out are dropped.
+
+Before a source is dropped it is retired (discard_source): no new clones of it
+are started, and the drop waits for the ones being created, since PostgreSQL
+cannot drop a database that is being copied.
+"""
+
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+# Matches databases created by this module (see get_clone_name)
+CLONE_NAME_PATTERN = re.compile(r'^challenge_\d+_v[0-9a-f]{12}_d\d+_c[0-9a-f]{10}$')
+
+# How often the pool worker looks for expired leases when it has nothing to do
+LEASE_CHECK_INTERVAL_SECONDS = 30
+
+# How long discard_source waits for clones of the source that are being created
+DISCARD_WAIT_SECONDS = 60
+
+_clone_pool = None
+_clone_pool_lock = threading.Lock()
+
+
+def is_cloning_enabled():
+    """Check whether PostgreSQL sandboxes should be cloned from template databases"""
+    return getattr(settings, 'CHALLENGE_DATABASE_CLONING_ENABLED', True)
+
+
+def get_clone_source_name(database_name):
+    """Name of the idle database that clones of a template database are copied from"""
+    return f"{database_name}_t"
+
+
+def get_clone_name(source_name):
+    """Unique name for a new clone of a clone source"""
+    return f"{source_name[:-2]}_c{uuid.uuid4().hex[:10]}"
+
+
+def create_clone(source_name):
+    """Create a new database as a copy of the clone source and return its name"""
+    from .connection_pool import get_connection
+    from .job_resources import track_resource
+
+    clone_name = get_clone_name(source_name)
+    track_resource('database', 'postgresql', clone_name)
+    conn = get_connection('postgresql')
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE {clone_name} TEMPLATE {source_name}")
+        cursor.close()
+    finally:
+        conn.close()
+    return clone_name
+
+
+def drop_clone(clone_name):
+    """Drop a cloned database"""
+    from .connection_pool import get_connection
+    from .job_resources import untrack_resource
+
+    conn = get_connection('postgresql')
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS {clone_name}")
+        cursor.close()
+    finally:
+        conn.close()
+    untrack_resource('database', 'postgresql', clone_name)
+
+
+class ClonePool:
+    """
+    Pre-created clones per clone source, refilled and dropped by a background thread.
+    """
+
+    def __init__(self, size, lease_seconds=600):
+        self.size = size
+        self.lease_seconds = lease_seconds
+        self._clones = {}  # source name -> list of ready clone names
+        self._leases = {}  # source name -> time the ready clones expire
+        self._creating = {}  # source name -> number of clones being created
+        self._retired = set()  # sources being dropped
+        self._lock = threading.Lock()
+        self._created = threading.Condition(self._lock)
+        self._tasks = queue.Queue()
+        self._worker = None
+        self._pid = os.getpid()
+
+    def take(self, source_name):
+        """
+        Return a ready clone of source_name, creating one now if none is pooled.
+        Raises RuntimeError if the source is being dropped.
+        """
+        with self._lock:
+            if source_name in self._retired:
+                raise RuntimeError(f"Clone source {source_name} is being dropped")
+            self._leases[source_name] = time.monotonic() + self.lease_seconds
+            ready = self._clones.setdefault(source_name, [])
+            clone_name = ready.pop() if ready else None
+            if clone_name is None:
+                self._start_creating_locked(source_name)
+
+        if self.size > 0:
+            self._schedule(('fill', source_name))
+
+        if clone_name is None:
+            try:
+                clone_name = create_clone(source_name)
+            finally:
+                self._finish_creating(source_name)
+        return clone_name
+
+    def warm(self, source_name):
+        """Lease source_name and fill its ready clones in the background"""
+        if self.size <= 0:
+            return
+        with self._lock:
+            if source_name in self._retired:
+                return
+            self._leases[source_name] = time.monotonic() + self.lease_seconds
+        self._schedule(('fill', source_name))
+
+    def ready_count(self, source_name):
+        """Number of clones of source_name that are ready to be taken"""
+        with self._lock:
+            return len(self._clones.get(source_name, []))
+
+    def release(self, clone_name):
+        """Drop a used clone in the background"""
+        self._schedule(('drop', clone_name))
+
+    def discard_source(self, source_name):
+        """
+        Retire a source that is about to be dropped: wait for clones of it that
+        are being created and drop all of its pooled clones. The source stays
+        retired until restore_source is called after the drop.
+        """
+        with self._lock:
+            self._retired.add(source_name)
+            self._leases.pop(source_name, None)
+            deadline = time.monotonic() + DISCARD_WAIT_SECONDS
+            while self._creating.get(source_name):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Clones of {source_name} are still being created, dropping it anyway")
+                    break
+                self._created.wait(remaining)
+            ready = self._clones.pop(source_name, [])
+
+        for clone_name in ready:
+            try:
+                drop_clone(clone_name)
+            except Exception as e:
+                print(f"Could not drop clone {clone_name}: {e}")
+
+    def restore_source(self, source_name):
+        """Allow clones of a source again once its drop has finished"""
+        with self._lock:
+            self._retired.discard(source_name)
+
+    def close(self):
+        """Drop every pooled clone (called at process exit)"""
+        with self._lock:
+            sources = list(self._clones)
+        for source_name in sources:
+            self.discard_source(source_name)
+
+    def _schedule(self, task):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name='challenge-clone-pool', daemon=True)
+                    self._worker.start()
+        self._tasks.put(task)
+
+    def expire_leases(self):
+        """Drop the ready clones of sources that were not used during their lease"""
+        now = time.monotonic()
+        expired_clones = []
+        with self._lock:
+            for source_name, expires_at in list(self._leases.items()):
+                if expires_at <= now:
+                    del self._leases[source_name]
+                    expired_clones.extend(self._clones.pop(source_name, []))
+
+        for clone_name in expired_clones:
+            try:
+                drop_clone(clone_name)
+            except Exception as e:
+                print(f"Could not drop clone {clone_name}: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                action, name = self._tasks.get(timeout=LEASE_CHECK_INTERVAL_SECONDS)
+            except queue.Empty:
+                self.expire_leases()
+                continue
+            try:
+                if action == 'drop':
+                    drop_clone(name)
+                elif action == 'fill':
+                    self._fill(name)
+            except Exception as e:
+                print(f"Clone pool task {action} {name} failed: {e}")
+
+    def _start_creating_locked(self, source_name):
+        self._creating[source_name] = self._creating.get(source_name, 0) + 1
+
+    def _finish_creating(self, source_name):
+        with self._lock:
+            self._creating[source_name] -= 1
+            if not self._creating[source_name]:
+                del self._creating[source_name]
+            self._created.notify_all()
+
+    def _fill(self, source_name):
+        while True:
+            with self._lock:
+                if source_name in self._retired:
+                    return
+                if len(self._clones.get(source_name, [])) >= self.size:
+                    return
+                self._start_creating_locked(source_name)
+
+            try:
+                clone_name = create_clone(source_name)
+            finally:
+                self._finish_creating(source_name)
+
+            with self._lock:
+                if source_name not in self._retired:
+                    self._clones.setdefault(source_name, []).append(clone_name)
+                    # Clones made after the lease ran out still get one
+                    self._leases.setdefault(source_name, time.monotonic() + self.lease_seconds)
+                    continue
+
+            # The source was retired while we were cloning it
+            drop_clone(clone_name)
+            return
+
+
+def get_clone_pool():
+    """Return this process's clone pool, creating it on first use"""
+    global _clone_pool
+
+    with _clone_pool_lock:
+        if _clone_pool is None or _clone_pool._pid != os.getpid():
+            _clone_pool = ClonePool(
+                getattr(settings, 'CHALLENGE_CLONE_POOL_SIZE', 2),
+                getattr(settings, 'CHALLENGE_CLONE_LEASE_SECONDS', 600)
+            )
+            atexit.register(_clone_pool.close)
+        return _clone_pool
+
+
+def execute_on_cloned_database(challenge, flag_id, schema_sql, dataset_sql, query, load_plan=None):
+    """
+    Execute a processed user query on a private PostgreSQL database cloned from
+    the challenge's template. Returns None when no template is available, so the
+    caller can fall back to building a temporary database from SQL.
+    """
+    import psycopg2
+    import psycopg2.extras
+    from .connection_pool import connect_direct
+    from editor.query_governor import describe_error
+    from .provisioning import get_template_database, is_template_execution_enabled
+    from .utils import _collect_statement_results, _split_sql_statements
+
+    if not is_cloning_enabled() or not is_template_execution_enabled():
+        return None
+
+    if challenge.pk is None or challenge._state.adding:
+        return None
+
+    database_name = get_template_database(challenge, flag_id, 'postgresql', schema_sql, dataset_sql, load_plan)
+    if not database_name:
+        return None
+
+    source_name = get_clone_source_name(database_name)
+    pool = get_clone_pool()
+
+    try:
+        clone_name = pool.take(source_name)
+        try:
+            conn = connect_direct('postgresql', clone_name)
+        except psycopg2.OperationalError:
+            # A pooled clone was dropped underneath us (e.g. by the cleanup command)
+            clone_name = create_clone(source_name)
+            conn = connect_direct('postgresql', clone_name)
+    except Exception as e:
+        print(f"Could not clone {source_name}, building a temporary database instead: {e}")
+        return None
+
+    try:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        return _collect_statement_results(conn, cursor, _split_sql_statements(query), 'postgresql')
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'PostgreSQL Error: {describe_error("postgresql", e)}'
+        }
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+        pool.release(clone_name)
@@ -0,0 +1,153 @@
+"""
+Precompiled SQL artifacts for challenge execution.
+
+Everything the executors derive from a challenge's raw SQL (processed schema
+and datasets, the unique table-name mapping, per-engine statement lists and
+parsed dataset rows, and the views that expose each dataset under the original
+table names) is computed once when the challenge or one of its tables
+is saved and stored in Challenge.compiled_sql. The execution hot path reads it
+from the already loaded challenge row: no regex passes and no queries on
+challenge.tables.
+
+Bump COMPILER_VERSION whenever the processing functions change; artifacts
+compiled by an older version are rebuilt on first use.
+"""
+
+import hashlib
+
+from .dataset_loader import Number, parse_dataset
+
+
+COMPILER_VERSION = 3
+
+ENGINES = ('mysql', 'postgresql')
+FLAG_IDS = (1, 2)
+
+# Challenge fields whose changes require recompiling
+SOURCE_FIELDS = frozenset(['schema_sql', 'run_dataset_sql', 'submit_dataset_sql'])
+
+MAX_CACHED_LOAD_PLANS = 64
+
+_load_plans = {}
+
+
+def compile_challenge_sql(challenge):
+    """Build the compiled artifact for a challenge from its current SQL and tables"""
+    from .utils import _split_sql_statements, convert_mysql_to_postgresql
+
+    content_hash = challenge.get_content_hash()
+    schema_sql = challenge.get_all_schema_sql()
+    datasets = {str(flag_id): challenge.get_all_dataset_sql(flag_id) for flag_id in FLAG_IDS}
+
+    engines = {}
+    for engine in ENGINES:
+        engine_schema = convert_mysql_to_postgresql(schema_sql) if engine == 'postgresql' else schema_sql
+        engines[engine] = {
+            'schema_statements': [s for s in _split_sql_statements(engine_schema) if s.strip()],
+            'datasets': {
+                flag: encode_operations(parse_dataset(engine, dataset_sql))
+                for flag, dataset_sql in datasets.items()
+            },
+        }
+
+    table_mapping = challenge.get_unique_table_names()
+    has_flag_id = 'flag_id' in (schema_sql or '').lower()
+
+    return {
+        'compiler_version': COMPILER_VERSION,
+        'version': hashlib.sha256(f'{COMPILER_VERSION}:{content_hash}'.encode('utf-8')).hexdigest(),
+        'content_hash': content_hash,
+        'table_mapping': table_mapping,
+        'has_flag_id': has_flag_id,
+        'schema_sql': schema_sql,
+        'datasets': datasets,
+        'dataset_views': {
+            str(flag_id): build_dataset_view_statements(table_mapping, flag_id, has_flag_id)
+            for flag_id in FLAG_IDS
+        },
+        'engines': engines,
+    }
+
+
+def build_dataset_view_statements(table_mapping, flag_id, has_flag_id=True):
+    """
+    Statements that expose one dataset under the original table names, for
+    databases that hold a single dataset (template databases and their clones).
+    Both MySQL and PostgreSQL treat these views as updatable and merge them into
+    the outer query, so the flag_id predicate still reaches the table's indexes.
+    """
+    statements = []
+    for name, unique_name in table_mapping.items():
+        if name.lower() == unique_name.lower():
+            continue
+        if has_flag_id:
+            # Rows inserted through the view must stay visible through it
+            statements.append(f"ALTER TABLE {unique_name} ALTER COLUMN flag_id SET DEFAULT {int(flag_id)}")
+            statements.append(f"CREATE VIEW {name} AS SELECT * FROM {unique_name} WHERE flag_id = {int(flag_id)}")
+        else:
+            statements.append(f"CREATE VIEW {name} AS SELECT * FROM {unique_name}")
+    return statements
+
+
+def is_current(compiled):
+    """Check that a stored artifact was produced by this compiler version"""
+    return bool(compiled) and compiled.get('compiler_version') == COMPILER_VERSION
+
+
+def get_load_plan(compiled, engine, flag_id):
+    """
+    Return (schema statements, dataset load operations) for one engine and dataset,
+    or None if the artifact has nothing for that engine.
+    """
+    engine_artifacts = (compiled or {}).get('engines', {}).get(engine)
+    if not engine_artifacts:
+        return None
+    operations = engine_artifacts['datasets'].get(str(flag_id))
+    if operations is None:
+        return None
+
+    # Decoded rows are reused across executions of the same version
+    key = (compiled.get('version'), engine, flag_id)
+    plan = _load_plans.get(key)
+    if plan is None:
+        if len(_load_plans) >= MAX_CACHED_LOAD_PLANS:
+            _load_plans.clear()
+        plan = (tuple(engine_artifacts['schema_statements']), decode_operations(operations))
+        _load_plans[key] = plan
+    return plan
+
+
+def encode_operations(operations):
+    """JSON-friendly form of dataset_loader.parse_dataset output"""
+    encoded = []
+    for operation in operations:
+        if operation[0] == 'sql':
+            encoded.append(['sql', operation[1]])
+        else:
+            _, table, columns, rows, statements = operation
+            encoded.append([
+                'rows', table, list(columns),
+                # Numbers are wrapped in a list so they are not mistaken for strings
+                [[[value] if isinstance(value, Number) else value for value in row] for row in rows],
+                list(statements),
+            ])
+    return encoded
+
+
+def decode_operations(encoded):
+    """Inverse of encode_operations"""
+    operations = []
+    for operation in encoded:
+        if operation[0] == 'sql':
+            operations.append(('sql', operation[1]))
+        else:
+            _, table, columns, rows, statements = operation
+            operations.append((
+                'rows', table, tuple(columns),
+                tuple(
+                    tuple(Number(value[0]) if isinstance(value, list) else value for value in row)
+                    for row in rows
+                ),
+                tuple(statements),
+            ))
+    return tuple(operations)
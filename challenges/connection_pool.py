@@ -0,0 +1,398 @@
+"""
+Process-wide connection pools for the challenge query engines (MySQL and PostgreSQL).
+
+There is one pool per engine and target database. Connections are handed out
+wrapped in a PooledConnection whose close() returns them to the pool, so the
+executors keep their usual connect/try/finally/close structure. Idle connections
+are evicted after a timeout, checked before reuse and have their session state
+reset when returned.
+
+Pool sizes are per process; with several worker processes the database sees
+up to (workers x pools in use x max_size) connections. A forked child starts
+without pools. The parent's connections it inherited are detached rather than
+closed: closing them would say goodbye to the server on sockets the parent is
+still using.
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+
+# Connections idle for less than this are handed out without a server round trip
+HEALTH_CHECK_INTERVAL_SECONDS = 5
+
+# How often get_pool() sweeps all pools for idle connections and unused pools
+SWEEP_INTERVAL_SECONDS = 60
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+_last_sweep = time.monotonic()
+
+# Every connection the pools have opened in this process and not yet freed
+_opened = weakref.WeakSet()
+
+# Connections inherited from the parent process, kept so they are never finalized
+_inherited = []
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+    pass
+
+
+class PooledConnection:
+    """
+    Thin proxy around a driver connection. Attribute access and assignment go to
+    the wrapped connection; close() hands it back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_released', False)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+    def close(self):
+        """Return the connection to the pool"""
+        if not self._released:
+            object.__setattr__(self, '_released', True)
+            self._pool.release(self._raw)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it to the pool"""
+        if not self._released:
+            object.__setattr__(self, '_released', True)
+            self._pool.release(self._raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of connections to one database on one engine.
+    """
+
+    def __init__(self, engine, params, max_size=10, idle_timeout=300,
+                 checkout_timeout=10, health_check_interval=HEALTH_CHECK_INTERVAL_SECONDS,
+                 enabled=True):
+        self.engine = engine
+        self.params = params
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.enabled = enabled
+
+        self._idle = deque()  # (connection, returned_at), most recently returned last
+        self._size = 0  # idle + checked out
+        self._closed = False
+        self._last_used = time.monotonic()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Check out a healthy connection, opening a new one if the pool is not full"""
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            raw = None
+            idle_since = None
+            expired = []
+
+            with self._condition:
+                while True:
+                    expired.extend(self._evict_idle_locked())
+                    if self._idle:
+                        # Reuse the most recently returned connection; it is the least likely to be stale
+                        raw, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size or not self.enabled:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f'No {self.engine} connection available within {self.checkout_timeout}s '
+                            f'(pool size {self.max_size})'
+                        )
+                    self._condition.wait(remaining)
+                self._last_used = time.monotonic()
+
+            for connection in expired:
+                _close_quietly(connection)
+
+            if raw is None:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+                _opened.add(raw)
+                return PooledConnection(self, raw)
+
+            if time.monotonic() - idle_since < self.health_check_interval or self._is_healthy(raw):
+                return PooledConnection(self, raw)
+
+            # Broken connection (server restart, network timeout); drop it and try again
+            _close_quietly(raw)
+            self._forget()
+
+    def release(self, raw, discard=False):
+        """Return a connection to the pool, resetting its session state first"""
+        if not discard and self.enabled and not self._closed:
+            try:
+                self._reset_session(raw)
+            except Exception as e:
+                print(f"Discarding {self.engine} connection that could not be reset: {e}")
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            _close_quietly(raw)
+            self._forget()
+            return
+
+        with self._condition:
+            self._idle.append((raw, time.monotonic()))
+            self._last_used = time.monotonic()
+            self._condition.notify()
+
+    def evict_idle(self):
+        """Close connections that have been idle for longer than the idle timeout"""
+        with self._condition:
+            expired = self._evict_idle_locked()
+        for connection in expired:
+            _close_quietly(connection)
+
+    def close(self):
+        """Close all idle connections; checked-out ones are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            _close_quietly(connection)
+
+    def is_unused(self):
+        """True when the pool holds no connections and has not been used for a while"""
+        with self._condition:
+            return self._size == 0 and time.monotonic() - self._last_used > self.idle_timeout
+
+    def _evict_idle_locked(self):
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        # Oldest connections are at the left
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+        return expired
+
+    def _forget(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _connect(self):
+        if self.engine == 'mysql':
+            import mysql.connector
+            return mysql.connector.connect(**self.params)
+        elif self.engine == 'postgresql':
+            import psycopg2
+            return psycopg2.connect(**self.params)
+        raise ValueError(f"Unsupported engine: {self.engine}")
+
+    def _is_healthy(self, raw):
+        try:
+            if self.engine == 'mysql':
+                return raw.is_connected()
+            if raw.closed:
+                return False
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reset_session(self, raw):
+        if self.engine == 'mysql':
+            if raw.unread_result:
+                raw.consume_results()
+            raw.rollback()
+            # Drops session variables, user variables and temporary tables
+            raw.cmd_reset_connection()
+            raw.autocommit = False
+        elif self.engine == 'postgresql':
+            import psycopg2.extensions
+            if raw.closed:
+                raise ValueError('connection is closed')
+            raw.rollback()
+            raw.autocommit = True
+            cursor = raw.cursor()
+            cursor.execute("DISCARD ALL")
+            cursor.close()
+            raw.autocommit = False
+            raw.set_session(isolation_level='DEFAULT', readonly='DEFAULT', deferrable='DEFAULT')
+            raw.cursor_factory = psycopg2.extensions.cursor
+
+
+def get_pool(engine, database=None):
+    """
+    Return the shared pool for an engine and database, creating it on first use.
+
+    database=None uses the configured query database; for MySQL an empty string
+    connects to the server without selecting a database.
+    """
+    global _pools_pid, _last_sweep
+    from sqlplayground.routers import QueryExecutionRouter
+
+    engine = engine.lower()
+    params = QueryExecutionRouter.get_connection_params(engine, database)
+    pool_options = params.pop('pool', {})
+    key = (engine, params.get('database', ''))
+
+    with _pools_lock:
+        # Connections must not be shared with a forked child process
+        if os.getpid() != _pools_pid:
+            _detach_inherited_connections()
+
+        if time.monotonic() - _last_sweep > SWEEP_INTERVAL_SECONDS:
+            _last_sweep = time.monotonic()
+            _sweep_locked()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(engine, params, **pool_options)
+            _pools[key] = pool
+        return pool
+
+
+def get_connection(engine, database=None):
+    """Check out a pooled connection; close() returns it to the pool"""
+    return get_pool(engine, database).acquire()
+
+
+def connect_direct(engine, database=None):
+    """
+    Open an unpooled connection with the same parameters as the pool. Used for
+    short-lived databases that are dropped right after use.
+    """
+    from sqlplayground.routers import QueryExecutionRouter
+
+    params = QueryExecutionRouter.get_connection_params(engine, database)
+    params.pop('pool', None)
+    if engine.lower() == 'mysql':
+        import mysql.connector
+        return mysql.connector.connect(**params)
+    import psycopg2
+    return psycopg2.connect(**params)
+
+
+def close_pool(engine, database):
+    """Close and forget the pool for a database, e.g. before dropping that database"""
+    with _pools_lock:
+        pool = _pools.pop((engine.lower(), database or ''), None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    """Close every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def get_pool_stats():
+    """Snapshot of pool sizes for monitoring"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return [
+        {
+            'engine': engine,
+            'database': database,
+            'size': pool._size,
+            'idle': len(pool._idle),
+            'max_size': pool.max_size,
+        }
+        for (engine, database), pool in pools
+    ]
+
+
+def _detach_inherited_connections():
+    """
+    In a forked child, forget the parent's pools and detach the connections
+    they held: each socket descriptor is pointed at /dev/null, so that closing
+    the connection can neither send anything on the parent's socket nor hit a
+    file that later reuses the descriptor number.
+    """
+    global _pools_pid
+
+    _pools.clear()
+    _pools_pid = os.getpid()
+    for raw in list(_opened):
+        fd = _socket_fd(raw)
+        if fd is not None:
+            devnull = os.open(os.devnull, os.O_RDWR)
+            try:
+                os.dup2(devnull, fd)
+            finally:
+                os.close(devnull)
+        # Without a descriptor (MySQL C extension) it must simply never be closed
+        _inherited.append(raw)
+    _opened.clear()
+
+
+def _after_fork_in_child():
+    global _pools_lock
+    # Another thread of the parent may have held the lock while forking
+    _pools_lock = threading.Lock()
+    _detach_inherited_connections()
+
+
+def _socket_fd(raw):
+    """The socket descriptor of a driver connection, or None"""
+    try:
+        if hasattr(raw, 'get_backend_pid'):
+            # psycopg2
+            return None if raw.closed else raw.fileno()
+        # mysql.connector's pure Python connection
+        return raw._socket.sock.fileno()
+    except Exception:
+        return None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _sweep_locked():
+    for key, pool in list(_pools.items()):
+        pool.evict_idle()
+        if pool.is_unused():
+            del _pools[key]
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
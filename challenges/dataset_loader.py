@@ -0,0 +1,316 @@
+"""
+Bulk loading of challenge datasets.
+
+Dataset SQL is mostly INSERT ... VALUES statements. Replaying them one by one
+costs a round trip per statement, so the loader parses them into row tuples
+once (cached per engine and SQL text) and loads consecutive INSERTs into the
+same table in bulk: COPY FROM STDIN on PostgreSQL, batched multi-row
+INSERTs via executemany on MySQL and a single executemany on SQLite.
+
+Only literal values are parsed (strings, numbers, NULL, TRUE/FALSE). Any
+statement the parser is not sure about, such as one calling functions, is
+executed as written, and a batch that the database rejects is replayed
+statement by statement so errors look the same as before.
+"""
+
+import io
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+
+# Rows per multi-row INSERT on MySQL (keeps packets well below max_allowed_packet)
+MYSQL_BATCH_SIZE = 1000
+
+_IDENTIFIER = r'(?:`[^`]+`|"[^"]+"|[A-Za-z_][A-Za-z0-9_$]*)'
+
+_INSERT_HEAD = re.compile(
+    rf'^\s*INSERT\s+INTO\s+(?P<table>{_IDENTIFIER})\s*\((?P<columns>[^()]*)\)\s*VALUES\s*',
+    re.IGNORECASE
+)
+
+_NUMBER = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+_WORD = re.compile(r'[A-Za-z_]+')
+
+_KEYWORD_VALUES = {'NULL': None, 'TRUE': True, 'FALSE': False}
+
+_MYSQL_ESCAPES = {
+    '0': '\0', "'": "'", '"': '"', 'b': '\b', 'n': '\n', 'r': '\r',
+    't': '\t', 'Z': '\x1a', '\\': '\\', '%': '\\%', '_': '\\_',
+}
+
+
+class _Unparseable(Exception):
+    pass
+
+
+def load_dataset(cursor, engine, dataset_sql):
+    """
+    Load (MySQL-dialect) dataset SQL through cursor, bulk-loading plain
+    INSERT ... VALUES statements
+    """
+    load_operations(cursor, engine, parse_dataset(engine, dataset_sql))
+
+
+def load_operations(cursor, engine, operations):
+    """Execute load operations as produced by parse_dataset"""
+    for operation in operations:
+        if operation[0] == 'sql':
+            _execute_statement(cursor, engine, operation[1])
+        else:
+            _, table, columns, rows, statements = operation
+            _load_rows(cursor, engine, table, columns, rows, statements)
+
+
+@lru_cache(maxsize=64)
+def parse_dataset(engine, dataset_sql):
+    """
+    Split dataset SQL into load operations, merging consecutive INSERTs into the
+    same table and columns. Returns a tuple of ('sql', statement) and
+    ('rows', table, columns, rows, original statements) entries.
+
+    dataset_sql is the MySQL dataset; it is converted here for PostgreSQL so the
+    conversion is cached along with the parse.
+    """
+    from .utils import _split_sql_statements, convert_mysql_to_postgresql
+
+    if engine == 'postgresql':
+        dataset_sql = convert_mysql_to_postgresql(dataset_sql)
+
+    operations = []
+    for statement in _split_sql_statements(dataset_sql):
+        if not statement.strip():
+            continue
+
+        parsed = parse_insert(statement, engine)
+        if parsed is None:
+            operations.append(('sql', statement))
+            continue
+
+        table, columns, rows = parsed
+        previous = operations[-1] if operations else None
+        if previous and previous[0] == 'rows' and previous[1] == table and previous[2] == columns:
+            previous[3].extend(rows)
+            previous[4].append(statement)
+        else:
+            operations.append(['rows', table, columns, rows, [statement]])
+
+    return tuple(
+        ('rows', op[1], op[2], tuple(op[3]), tuple(op[4])) if op[0] == 'rows' else op
+        for op in operations
+    )
+
+
+def parse_insert(statement, engine):
+    """
+    Parse INSERT INTO table (columns) VALUES (...), (...) with literal values only.
+    Returns (table, columns, rows) or None if the statement must be executed as is.
+    """
+    match = _INSERT_HEAD.match(statement)
+    if not match:
+        return None
+
+    columns = tuple(column.strip() for column in match.group('columns').split(','))
+    if not all(re.fullmatch(_IDENTIFIER, column) for column in columns):
+        return None
+
+    try:
+        rows, end = _parse_rows(statement, match.end(), engine, len(columns))
+    except _Unparseable:
+        return None
+
+    # Trailing clauses (ON DUPLICATE KEY UPDATE, RETURNING, ...) change the meaning
+    if statement[end:].strip():
+        return None
+
+    return match.group('table'), columns, rows
+
+
+def _parse_rows(text, position, engine, column_count):
+    rows = []
+    length = len(text)
+    while True:
+        position = _skip_space(text, position)
+        if position >= length or text[position] != '(':
+            raise _Unparseable()
+        position += 1
+
+        row = []
+        while True:
+            position = _skip_space(text, position)
+            value, position = _parse_value(text, position, engine)
+            row.append(value)
+            position = _skip_space(text, position)
+            if position < length and text[position] == ',':
+                position += 1
+                continue
+            if position < length and text[position] == ')':
+                position += 1
+                break
+            raise _Unparseable()
+
+        if len(row) != column_count:
+            raise _Unparseable()
+        rows.append(tuple(row))
+
+        position = _skip_space(text, position)
+        if position < length and text[position] == ',':
+            position += 1
+            continue
+        return rows, position
+
+
+def _parse_value(text, position, engine):
+    if position >= len(text):
+        raise _Unparseable()
+
+    if text[position] == "'":
+        return _parse_string(text, position + 1, engine)
+
+    match = _NUMBER.match(text, position)
+    if match:
+        token = match.group()
+        end = match.end()
+        # Reject things like 1abc or 12.5.3 that only start like a number
+        if end < len(text) and (text[end].isalnum() or text[end] in '._'):
+            raise _Unparseable()
+        return Number(token), end
+
+    match = _WORD.match(text, position)
+    if match and match.group().upper() in _KEYWORD_VALUES:
+        end = match.end()
+        if end < len(text) and (text[end].isalnum() or text[end] in '_('):
+            raise _Unparseable()
+        return _KEYWORD_VALUES[match.group().upper()], end
+
+    raise _Unparseable()
+
+
+def _parse_string(text, position, engine):
+    chars = []
+    length = len(text)
+    while position < length:
+        char = text[position]
+        if char == "'":
+            if position + 1 < length and text[position + 1] == "'":
+                chars.append("'")
+                position += 2
+                continue
+            return ''.join(chars), position + 1
+        if char == '\\' and engine == 'mysql':
+            if position + 1 >= length:
+                raise _Unparseable()
+            following = text[position + 1]
+            chars.append(_MYSQL_ESCAPES.get(following, following))
+            position += 2
+            continue
+        chars.append(char)
+        position += 1
+    raise _Unparseable()
+
+
+def _skip_space(text, position):
+    length = len(text)
+    while position < length and text[position].isspace():
+        position += 1
+    return position
+
+
+class Number(str):
+    """Numeric literal kept as written so no precision is lost"""
+
+    def to_python(self):
+        if re.fullmatch(r'[+-]?\d+', self):
+            return int(self)
+        return Decimal(self)
+
+
+def _load_rows(cursor, engine, table, columns, rows, statements):
+    if engine == 'postgresql':
+        # COPY aborts the whole transaction on error; a savepoint lets us replay instead
+        cursor.execute("SAVEPOINT dataset_bulk_load")
+        try:
+            _copy_rows(cursor, table, columns, rows)
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT dataset_bulk_load")
+            for statement in statements:
+                _execute_statement(cursor, engine, statement)
+        cursor.execute("RELEASE SAVEPOINT dataset_bulk_load")
+    elif engine == 'sqlite':
+        _insert_rows_sqlite(cursor, table, columns, rows)
+    else:
+        # Rows are inserted in batches; undo the batches that succeeded before replaying
+        cursor.execute("SAVEPOINT dataset_bulk_load")
+        try:
+            _insert_rows_mysql(cursor, table, columns, rows)
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT dataset_bulk_load")
+            for statement in statements:
+                _execute_statement(cursor, engine, statement)
+        cursor.execute("RELEASE SAVEPOINT dataset_bulk_load")
+
+
+def _copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_text(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _insert_rows_mysql(cursor, table, columns, rows):
+    placeholders = ', '.join(['%s'] * len(columns))
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    values = [
+        tuple(value.to_python() if isinstance(value, Number) else value for value in row)
+        for row in rows
+    ]
+    for start in range(0, len(values), MYSQL_BATCH_SIZE):
+        cursor.executemany(statement, values[start:start + MYSQL_BATCH_SIZE])
+
+
+def _insert_rows_sqlite(cursor, table, columns, rows):
+    # In-memory databases have no round trips to save; one executemany is enough
+    placeholders = ', '.join(['?'] * len(columns))
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    cursor.executemany(statement, [
+        tuple(_sqlite_value(value) for value in row)
+        for row in rows
+    ])
+
+
+def _sqlite_value(value):
+    if isinstance(value, Number):
+        value = value.to_python()
+        # sqlite3 has no Decimal adapter
+        return float(value) if isinstance(value, Decimal) else value
+    return value
+
+
+def _execute_statement(cursor, engine, statement):
+    cursor.execute(statement)
+    if engine == 'mysql':
+        # Consume any results to avoid "Unread result found" error
+        try:
+            while cursor.nextset():
+                pass
+        except:
+            pass
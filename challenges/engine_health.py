@@ -0,0 +1,217 @@
+"""
+Circuit breakers for the challenge database servers.
+
+Without them every request during a MySQL outage tried to connect first and
+only fell back to PostgreSQL after the connect timeout. Each server engine now
+has a breaker whose state lives in the 'engine_health' Django cache (Redis
+when REDIS_URL is set, a database cache table otherwise), so all workers
+share it:
+
+- closed: queries go to the engine; ENGINE_HEALTH_FAILURE_THRESHOLD connection
+  failures in a row open the breaker
+- open: queries are routed straight to the fallback engine. A background
+  thread in each process that saw the outage probes the server every
+  ENGINE_HEALTH_PROBE_INTERVAL_SECONDS and closes the breaker once it answers
+- half_open: ENGINE_HEALTH_COOLDOWN_SECONDS after opening, a single request
+  is let through as a trial; its outcome closes or reopens the breaker
+
+Only connection failures count. A query that fails because of its SQL still
+proves that the server is up.
+
+While an engine is healthy each process keeps its closed state for
+CLOSED_STATE_CACHE_SECONDS, so queries do not read the shared cache (a
+database table without Redis). The shared state is read and written on a
+failure and while the breaker is open or half-open; another process's outage
+is noticed within those few seconds.
+"""
+
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+CACHE_ALIAS = 'engine_health'
+
+# Engines that run on a database server; the in-memory SQLite engine is always available
+SERVER_ENGINES = ('mysql', 'postgresql')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Breaker state is kept long after the last change, it is small
+STATE_TIMEOUT_SECONDS = 24 * 60 * 60
+
+# How long a process trusts a healthy (closed, no failures) state it has read
+CLOSED_STATE_CACHE_SECONDS = 5
+
+_healthy_until = {}  # engine -> monotonic time until which it is known to be healthy
+
+_probe_thread = None
+_probe_pid = None
+_probe_lock = threading.Lock()
+
+
+def get_failure_threshold():
+    return getattr(settings, 'ENGINE_HEALTH_FAILURE_THRESHOLD', 3)
+
+
+def get_cooldown_seconds():
+    return getattr(settings, 'ENGINE_HEALTH_COOLDOWN_SECONDS', 30)
+
+
+def get_probe_interval():
+    return getattr(settings, 'ENGINE_HEALTH_PROBE_INTERVAL_SECONDS', 10)
+
+
+def _get_cache():
+    from django.core.cache import caches
+
+    return caches[CACHE_ALIAS]
+
+
+def _state_key(engine):
+    return f'engine_health:{engine}'
+
+
+def get_engine_state(engine, shared=False):
+    """
+    Return the breaker state dict of an engine. A healthy state read in the
+    last CLOSED_STATE_CACHE_SECONDS is returned without reading the shared
+    cache, unless shared is set.
+    """
+    if engine not in SERVER_ENGINES:
+        return {'state': CLOSED, 'failures': 0}
+    if not shared and _healthy_until.get(engine, 0) > time.monotonic():
+        return {'state': CLOSED, 'failures': 0}
+    state = _get_cache().get(_state_key(engine)) or {'state': CLOSED, 'failures': 0}
+    _remember_state(engine, state)
+    return state
+
+
+def _remember_state(engine, state):
+    if state['state'] == CLOSED and not state['failures']:
+        _healthy_until[engine] = time.monotonic() + CLOSED_STATE_CACHE_SECONDS
+    else:
+        _healthy_until.pop(engine, None)
+
+
+def _set_engine_state(engine, state):
+    _get_cache().set(_state_key(engine), state, STATE_TIMEOUT_SECONDS)
+    _remember_state(engine, state)
+
+
+def is_engine_available(engine):
+    """
+    Decide whether a query should be sent to an engine. While the breaker is
+    open this is False, except for the one trial request of the half-open state.
+    """
+    state = get_engine_state(engine)
+    if state['state'] == CLOSED:
+        return True
+
+    ensure_probes_running()
+    if time.time() - state.get('opened_at', 0) < get_cooldown_seconds():
+        return False
+
+    # Only one request across all workers gets the trial
+    if _get_cache().add(f'{_state_key(engine)}:trial', True, get_cooldown_seconds()):
+        _set_engine_state(engine, dict(state, state=HALF_OPEN))
+        return True
+    return False
+
+
+def record_engine_success(engine):
+    """The engine answered; close its breaker"""
+    if engine not in SERVER_ENGINES:
+        return
+    state = get_engine_state(engine)
+    # Avoid a cache write on every query while everything is healthy
+    if state['state'] == CLOSED and not state['failures']:
+        return
+    if state['state'] != CLOSED:
+        print(f"{engine} is available again, closing its circuit breaker")
+    _set_engine_state(engine, {'state': CLOSED, 'failures': 0})
+    _get_cache().delete(f'{_state_key(engine)}:trial')
+
+
+def record_engine_failure(engine, error=''):
+    """The engine could not be reached; open its breaker once failures pile up"""
+    if engine not in SERVER_ENGINES:
+        return
+    # Failures of every process count towards the threshold
+    state = get_engine_state(engine, shared=True)
+    failures = state['failures'] + 1
+
+    if state['state'] != CLOSED or failures >= get_failure_threshold():
+        if state['state'] == CLOSED:
+            print(f"{engine} is unavailable, opening its circuit breaker: {error}")
+        new_state = {'state': OPEN, 'failures': failures, 'opened_at': time.time(), 'last_error': str(error)}
+        _set_engine_state(engine, new_state)
+        _get_cache().delete(f'{_state_key(engine)}:trial')
+        ensure_probes_running()
+    else:
+        _set_engine_state(engine, {'state': CLOSED, 'failures': failures, 'last_error': str(error)})
+
+
+def get_available_engines(engines):
+    """
+    Filter a list of engines down to those whose breaker is not open. If none
+    is left the list is returned as is: the query fallbacks still serve it.
+    """
+    available = [engine for engine in engines if get_engine_state(engine)['state'] == CLOSED]
+    return available or list(engines)
+
+
+def get_engine_health():
+    """Breaker state of every server engine, for monitoring"""
+    return {engine: get_engine_state(engine, shared=True) for engine in SERVER_ENGINES}
+
+
+def probe_engine(engine):
+    """Try to connect to an engine and record the outcome. Returns True if it answered."""
+    from .connection_pool import connect_direct
+
+    try:
+        conn = connect_direct(engine)
+        conn.close()
+    except Exception as e:
+        record_engine_failure(engine, e)
+        return False
+    record_engine_success(engine)
+    return True
+
+
+def ensure_probes_running():
+    """Start this process's probe thread if it is not running"""
+    global _probe_thread, _probe_pid
+
+    with _probe_lock:
+        # Threads do not survive a fork, so a forked worker starts its own
+        if _probe_thread is not None and _probe_thread.is_alive() and _probe_pid == os.getpid():
+            return
+        _probe_thread = threading.Thread(target=_probe_loop, name='engine-health-probe', daemon=True)
+        _probe_pid = os.getpid()
+        _probe_thread.start()
+
+
+def _probe_loop():
+    """Probe engines with an open breaker until none is left"""
+    from django.db import connections
+
+    try:
+        while True:
+            time.sleep(get_probe_interval())
+            open_engines = [engine for engine in SERVER_ENGINES if get_engine_state(engine)['state'] != CLOSED]
+            if not open_engines:
+                return
+            for engine in open_engines:
+                try:
+                    probe_engine(engine)
+                except Exception as e:
+                    print(f"Engine health probe for {engine} failed: {e}")
+    finally:
+        # The database cache opened a connection for this thread
+        connections.close_all()
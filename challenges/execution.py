@@ -0,0 +1,245 @@
+"""
+Run and Submit handling for challenge queries.
+
+The views call these directly, or enqueue a job (job_queue.py) that a query
+worker process runs later; either way the returned dict is the JSON response
+the challenge page expects.
+"""
+
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+
+def _serialize_value(value):
+    """Convert Python objects to JSON-serializable format"""
+    from decimal import Decimal
+    import datetime
+
+    if isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    elif value is None:
+        return None
+    else:
+        return str(value)
+
+
+def run_challenge_query(challenge, user, user_query, engine, result_format='objects'):
+    """
+    Execute a user query against the run dataset (flag_id=1) of a challenge.
+    result_format is 'objects' or 'columnar' (see editor/result_format.py).
+    """
+    from editor.parsed_query import parse_query
+    from editor.result_format import COLUMNAR, encode_columnar
+    from sqlplayground.query_timing import span
+    from .utils import execute_dual_dataset_query, execute_sql_query_multi_engine
+
+    # Parse once; the parsed query is passed along instead of the raw text
+    parsed_query = parse_query(user_query)
+
+    # Execute user query with selected engine
+    start_time = time.time()
+
+    # Use new dual-dataset system if available
+    if challenge.has_multi_table_setup() or (challenge.schema_sql and challenge.run_dataset_sql):
+        # New dual-dataset system (test mode - flag_id=1)
+        result = execute_dual_dataset_query(
+            challenge=challenge,
+            query=parsed_query,
+            flag_id=1,  # Test dataset
+            engine=engine
+        )
+
+        # Add fallback message if MySQL fallback was used
+        if result.get('fallback_used') and result.get('fallback_engine') == 'sqlite':
+            original_message = result.get('message', f'Query executed successfully. {result.get("row_count", 0)} row(s) returned.')
+            result['message'] = original_message + ' (Note: Executed on SQLite - no database server available)'
+        elif result.get('fallback_used') and result.get('original_engine') == 'mysql':
+            original_message = result.get('message', f'Query executed successfully. {result.get("row_count", 0)} row(s) returned.')
+            result['message'] = original_message + ' (Note: Executed on PostgreSQL - MySQL server not available)'
+    else:
+        # Use multi-engine logic for PostgreSQL/MySQL (hosting service engines)
+        db_config = {
+            'database': f"challenge_{challenge.id}_user_{user.id}"
+        }
+        result = execute_sql_query_multi_engine(engine, db_config, parsed_query)
+
+    execution_time = int((time.time() - start_time) * 1000)
+
+    if not result['success']:
+        return {
+            'success': False,
+            'error': f'Query execution failed: {result["error"]}',
+            'execution_time': execution_time
+        }
+
+    columns = result.get('columns', [])
+    row_count = result.get('row_count', 0)
+
+    response = {
+        'success': True,
+        'columns': columns,
+        'row_count': row_count,
+        'execution_time': execution_time,
+        'message': f'Query executed successfully. {row_count} row(s) returned.'
+    }
+
+    with span('result.serialize', engine):
+        if result_format == COLUMNAR:
+            # Encoded column by column straight from the driver values
+            response.update(encode_columnar(result.get('results', []), columns))
+            response['format'] = COLUMNAR
+        else:
+            # Serialize all results
+            response['results'] = [
+                {key: _serialize_value(value) for key, value in row.items()}
+                for row in result.get('results', [])
+            ]
+    if result.get('truncated'):
+        # The governor stopped fetching at its row or byte cap
+        response['truncated'] = True
+        response['message'] = f'Query executed successfully. Showing the first {row_count} row(s); the result was truncated.'
+    return response
+
+
+def submit_challenge_query(challenge, user, user_query, engine):
+    """
+    Execute a user query against the submit dataset (flag_id=2), grade it and
+    record the attempt, completion and XP.
+    """
+    from editor.parsed_query import parse_query
+    from editor.views import execute_sql_query
+    from users.models import UserProfile
+    from .models import UserChallengeProgress, XPTransaction
+    from sqlplayground.query_timing import span
+    from .utils import execute_dual_dataset_query, execute_sql_query_multi_engine
+    from .views import compare_query_results
+
+    # Parse once; the parsed query is passed along instead of the raw text
+    parsed_query = parse_query(user_query)
+
+    # Get or create user progress
+    user_progress, created = UserChallengeProgress.objects.get_or_create(
+        user=user,
+        challenge=challenge
+    )
+
+    # Increment attempts
+    user_progress.attempts += 1
+
+    # Execute user query using dual-dataset system (submit dataset for validation)
+    if challenge.has_multi_table_setup() or (challenge.schema_sql and challenge.submit_dataset_sql):
+        # Use new dual-dataset system
+        result = execute_dual_dataset_query(
+            challenge=challenge,
+            query=parsed_query,
+            flag_id=2,  # Submit dataset for validation
+            engine=engine
+        )
+    else:
+        # Fallback to legacy system for old challenges
+        try:
+            challenge.initialize_challenge_database(user, engine)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Failed to initialize {engine} database: {str(e)}'
+            }
+
+        if engine == 'sqlite':
+            # Use existing SQLite logic
+            db_path = challenge.get_challenge_database_path(user, engine)
+            result = execute_sql_query(db_path, user_query)
+        else:
+            # Use multi-engine logic for PostgreSQL/MySQL
+            db_config = {
+                'database': f"challenge_{challenge.id}_user_{user.id}"
+            }
+            result = execute_sql_query_multi_engine(engine, db_config, parsed_query)
+
+    if not result['success']:
+        user_progress.save()
+        return {
+            'success': False,
+            'error': f'Query execution failed: {result["error"]}',
+            'attempts': user_progress.attempts
+        }
+
+    # Get user result and expected result for response
+    user_result = result.get('results', [])
+    expected_result = challenge.expected_result
+
+    # Use dual-dataset validation for both legacy and multi-table systems
+    if (challenge.schema_sql and challenge.submit_dataset_sql) or challenge.has_multi_table_setup():
+        # Dual-dataset validation (submit mode), grading the result executed above
+        with span('result.grade', engine):
+            is_correct, validation_message = challenge.grade_query_result(result, is_test_mode=False)
+        if not is_correct:
+            # Query executed successfully but result doesn't match
+            user_progress.save()
+            return {
+                'success': False,
+                'error': validation_message,
+                'attempts': user_progress.attempts,
+                'validation_type': 'dual_dataset'
+            }
+    else:
+        # Fallback validation for challenges not yet migrated
+        # Normalize results for comparison; a truncated result cannot be graded
+        is_correct = not result.get('truncated') and compare_query_results(user_result, expected_result)
+
+    if is_correct:
+        # The XP transaction, profile total and progress are written together, so a
+        # query worker stopped in the middle leaves none of them behind
+        with transaction.atomic():
+            # Check if this is the first completion to award XP
+            if not user_progress.is_completed:
+                user_progress.xp_earned = challenge.xp
+                xp_message = f" You earned {challenge.xp} XP!"
+
+                # Create XP transaction for audit trail
+                XPTransaction.objects.create(
+                    user=user,
+                    challenge=challenge,
+                    transaction_type='challenge_completion',
+                    xp_amount=challenge.xp,
+                    description=f"Completed challenge: {challenge.title}"
+                )
+
+                # Update user profile total XP
+                try:
+                    profile = user.profile
+                except UserProfile.DoesNotExist:
+                    profile = UserProfile.objects.create(user=user)
+                profile.update_total_xp()
+            else:
+                xp_message = ""
+
+            user_progress.is_completed = True
+            user_progress.completed_at = timezone.now()
+            user_progress.best_query = user_query
+            user_progress.save()
+
+        return {
+            'success': True,
+            'correct': True,
+            'message': f'Congratulations! Your solution is correct!{xp_message}',
+            'attempts': user_progress.attempts,
+            'user_result': user_result,
+            'expected_result': expected_result,
+            'xp_earned': user_progress.xp_earned
+        }
+    else:
+        user_progress.save()
+        return {
+            'success': True,
+            'correct': False,
+            'message': 'Your query executed successfully, but the result doesn\'t match the expected output.',
+            'attempts': user_progress.attempts,
+            'user_result': user_result,
+            'expected_result': expected_result,
+            'hint': challenge.hint if user_progress.attempts >= 3 else None
+        }
@@ -3,7 +3,7 @@ from django_ckeditor_5.widgets import CKEditor5Widget
 from django.contrib.auth import get_user_model
 import json
 import re
-import sqlparse
+from editor.sql_lexer import iter_statements
 from .models import Challenge, UserChallengeSubscription, ChallengeSubscriptionPlan
 
 User = get_user_model()
@@ -16,29 +16,25 @@ class SQLValidationError(Exception):
 
 def validate_sql_syntax(sql_text, statement_type="SQL"):
     """
-    Enhanced SQL syntax validation using sqlparse library.
+    Enhanced SQL syntax validation using the shared SQL lexer.
     Returns (is_valid, error_message)
     """
     if not sql_text or not sql_text.strip():
         return True, ""  # Empty SQL is allowed for optional fields
 
     try:
-        # Parse the SQL
-        parsed = sqlparse.parse(sql_text)
+        # Split the SQL into statements
+        parsed = list(iter_statements(sql_text))
 
         if not parsed:
             return False, f"{statement_type} appears to be empty or invalid"
 
         # Check for basic syntax issues
         for statement in parsed:
-            if not statement.tokens:
-                continue
-
-            # Convert to string and check for common issues
-            sql_str = str(statement).strip()
+            sql_str = statement.text
 
             # Check for missing semicolon at the end (if multiple statements)
-            if len(parsed) > 1 and not sql_str.endswith(';'):
+            if len(parsed) > 1 and not statement.terminated:
                 return False, f"{statement_type} statements should end with semicolon when multiple statements are present"
 
             # Check for obvious syntax errors (unmatched parentheses)
@@ -134,14 +130,12 @@ def extract_table_info_from_schema(schema_sql):
     tables_info = {}
 
     try:
-        parsed = sqlparse.parse(schema_sql)
-
-        for statement in parsed:
-            sql_str = str(statement).strip().upper()
+        for statement in iter_statements(schema_sql):
+            sql_str = statement.text.upper()
 
             if sql_str.startswith('CREATE TABLE'):
                 # Extract table name and column info
-                table_info = _parse_create_table_statement(str(statement))
+                table_info = _parse_create_table_statement(statement.text)
                 if table_info:
                     tables_info[table_info['name']] = table_info
 
@@ -285,10 +279,8 @@ def validate_insert_statements_against_schema(insert_sql, tables_info):
         return False, "No table schema found to validate against"
 
     try:
-        parsed = sqlparse.parse(insert_sql)
-
-        for statement in parsed:
-            sql_str = str(statement).strip()
+        for statement in iter_statements(insert_sql):
+            sql_str = statement.text
             sql_upper = sql_str.upper()
 
             if sql_upper.startswith('INSERT'):
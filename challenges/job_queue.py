@@ -0,0 +1,425 @@
+"""
+Database-backed job queue for challenge Run and Submit requests.
+
+With CHALLENGE_JOB_QUEUE_ENABLED the challenge views no longer provision,
+load and query databases inside the web worker. They store a
+ChallengeQueryJob and return its id; the page polls the job endpoint until
+the result is there. Jobs are executed by `python manage.py run_query_workers`,
+which runs a QueryWorkerPool:
+
+- a supervisor process claims queued jobs (oldest first) and hands them to a
+  fixed set of forked worker processes, with at most
+  CHALLENGE_JOB_ENGINE_CONCURRENCY[engine] jobs per engine at a time
+- a job that runs longer than CHALLENGE_JOB_TIMEOUT_SECONDS, or that was
+  cancelled because the user ran a newer query, has its worker process
+  stopped and replaced. The worker gets SIGTERM first, which interrupts the
+  job so its cleanup code runs, and SIGKILL after STOP_GRACE_SECONDS. The
+  temporary databases and template builds the worker still held are then
+  cleaned up by the supervisor (job_resources.py)
+- finished jobs are deleted after CHALLENGE_JOB_RETENTION_SECONDS
+
+Limits apply per supervisor; run one supervisor per host.
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# How often the supervisor looks for new jobs, finished jobs and cancellations
+POLL_INTERVAL_SECONDS = 0.2
+
+# How often finished jobs are deleted and lost jobs are recovered
+CLEANUP_INTERVAL_SECONDS = 60
+
+# Running jobs that are this far past their timeout belonged to a supervisor that died
+ORPHAN_GRACE_SECONDS = 30
+
+# How long a stopped worker gets to clean up before it is killed
+STOP_GRACE_SECONDS = 5
+
+# Suggested delay between two polls of the job endpoint
+CLIENT_POLL_INTERVAL_MS = 300
+
+UNFINISHED_STATUSES = ('queued', 'running')
+
+
+def is_job_queue_enabled():
+    """Check whether Run and Submit should be queued for the query workers"""
+    return getattr(settings, 'CHALLENGE_JOB_QUEUE_ENABLED', False)
+
+
+def get_worker_count():
+    return max(1, getattr(settings, 'CHALLENGE_JOB_WORKERS', 4))
+
+
+def get_job_timeout():
+    return getattr(settings, 'CHALLENGE_JOB_TIMEOUT_SECONDS', 30)
+
+
+def get_engine_concurrency(engine):
+    """Maximum number of jobs running at the same time on an engine"""
+    limits = getattr(settings, 'CHALLENGE_JOB_ENGINE_CONCURRENCY', {})
+    return limits.get(engine, get_worker_count())
+
+
+def enqueue_job(user, challenge, kind, query, engine):
+    """
+    Queue a Run or Submit. Unfinished jobs of the same kind by the same user on
+    the same challenge are cancelled, so re-running replaces the previous run.
+    """
+    from .models import ChallengeQueryJob
+
+    cancel_jobs(user, challenge, kind)
+    return ChallengeQueryJob.objects.create(
+        user=user,
+        challenge=challenge,
+        kind=kind,
+        query=query,
+        engine=engine,
+    )
+
+
+def cancel_jobs(user, challenge, kind):
+    """Cancel unfinished jobs; running ones are stopped by the supervisor. Returns the count."""
+    from .models import ChallengeQueryJob
+
+    return ChallengeQueryJob.objects.filter(
+        user=user,
+        challenge=challenge,
+        kind=kind,
+        status__in=UNFINISHED_STATUSES
+    ).update(
+        status='cancelled',
+        finished_at=timezone.now(),
+        result={'success': False, 'error': 'Cancelled because a newer query was run.'}
+    )
+
+
+def get_job_response(job, result_format='objects'):
+    """
+    JSON payload describing a job for the page that polls it. Results are stored
+    as objects and converted to the requested result_format when sent.
+    """
+    from django.urls import reverse
+    from editor.result_format import COLUMNAR, apply_result_format
+
+    result = None
+    if job.is_finished and job.result is not None:
+        result = apply_result_format(dict(job.result), result_format)
+
+    poll_url = reverse('challenges:challenge_query_job', args=[job.id])
+    if result_format == COLUMNAR:
+        poll_url += f'?format={COLUMNAR}'
+
+    return {
+        'success': True,
+        'job_id': str(job.id),
+        'status': job.status,
+        'done': job.is_finished,
+        'result': result,
+        'poll_url': poll_url,
+        'poll_interval': CLIENT_POLL_INTERVAL_MS,
+    }
+
+
+def claim_next_job(running_per_engine):
+    """
+    Claim the oldest queued job on an engine that has a free slot and mark it running.
+    running_per_engine maps engines to the number of jobs this supervisor is running.
+    """
+    from .models import ChallengeQueryJob
+
+    full_engines = [
+        engine for engine, running in running_per_engine.items()
+        if running >= get_engine_concurrency(engine)
+    ]
+    candidates = ChallengeQueryJob.objects.filter(status='queued').exclude(
+        engine__in=full_engines
+    ).order_by('created_at').values_list('pk', flat=True)[:10]
+
+    for pk in candidates:
+        # Only one supervisor wins the conditional update
+        claimed = ChallengeQueryJob.objects.filter(pk=pk, status='queued').update(
+            status='running',
+            started_at=timezone.now()
+        )
+        if claimed:
+            return ChallengeQueryJob.objects.get(pk=pk)
+    return None
+
+
+def finish_job(job_id, status, result):
+    """Record the outcome of a running job unless it has already finished (e.g. was cancelled)"""
+    from .models import ChallengeQueryJob
+
+    return ChallengeQueryJob.objects.filter(pk=job_id, status='running').update(
+        status=status,
+        result=result,
+        finished_at=timezone.now()
+    )
+
+
+def execute_job(job_id):
+    """Run a claimed job and store its result (called in a worker process)"""
+    from .execution import run_challenge_query, submit_challenge_query
+    from .models import ChallengeQueryJob
+
+    try:
+        job = ChallengeQueryJob.objects.select_related('challenge', 'user').get(pk=job_id)
+        if job.status != 'running':
+            return
+        if job.kind == 'submit':
+            result = submit_challenge_query(job.challenge, job.user, job.query, job.engine)
+        else:
+            result = run_challenge_query(job.challenge, job.user, job.query, job.engine)
+        finish_job(job_id, 'done', result)
+    except Exception as e:
+        print(f"Query job {job_id} failed: {e}")
+        finish_job(job_id, 'failed', {'success': False, 'error': f'An error occurred: {str(e)}'})
+
+
+def collect_finished_jobs(running_job_ids=()):
+    """
+    Delete finished jobs past the retention period and fail running jobs that
+    no supervisor is watching any more. Returns (deleted, recovered).
+    """
+    from .models import ChallengeQueryJob
+
+    now = timezone.now()
+    retention = getattr(settings, 'CHALLENGE_JOB_RETENTION_SECONDS', 3600)
+    deleted, _ = ChallengeQueryJob.objects.exclude(status__in=UNFINISHED_STATUSES).filter(
+        created_at__lt=now - timedelta(seconds=retention)
+    ).delete()
+
+    lost = ChallengeQueryJob.objects.filter(
+        status='running',
+        started_at__lt=now - timedelta(seconds=get_job_timeout() + ORPHAN_GRACE_SECONDS)
+    ).exclude(pk__in=list(running_job_ids)).values_list('pk', flat=True)
+    recovered = 0
+    for pk in lost:
+        recovered += finish_job(pk, 'failed', {'success': False, 'error': 'The query worker stopped before the query finished.'})
+
+    return deleted, recovered
+
+
+class JobStopped(BaseException):
+    """
+    Raised in a worker process by SIGTERM. Not an Exception, so the job's
+    error handling does not swallow it, but its finally blocks still run.
+    """
+
+
+def _stop_job(signum, frame):
+    raise JobStopped()
+
+
+def _worker_main(tasks, finished, resource_dir):
+    """Worker process loop: execute job ids from tasks, report them on finished"""
+    from django.db import close_old_connections
+    from sqlplayground.query_timing import flush_histogram
+
+    from .job_resources import start_tracking
+
+    # Ctrl-C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _stop_job)
+    start_tracking(os.path.join(resource_dir, f'{os.getpid()}.log'))
+
+    try:
+        while True:
+            job_id = tasks.get()
+            if job_id is None:
+                break
+            close_old_connections()
+            execute_job(job_id)
+            # Workers are killed rather than exiting, so their spans are written now
+            flush_histogram()
+            finished.put((os.getpid(), job_id))
+    except JobStopped:
+        pass
+
+
+class QueryWorkerPool:
+    """
+    Supervisor for a fixed number of query worker processes.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self.size = workers or get_worker_count()
+        self.timeout = timeout or get_job_timeout()
+        self.context = multiprocessing.get_context('fork')
+        self.finished = self.context.Queue()
+        self.workers = {}  # pid -> {'process', 'tasks', 'job_id', 'engine', 'deadline'}
+        self.stopped_workers = {}  # pid -> (process, time to kill it)
+        self.resource_dir = tempfile.mkdtemp(prefix='challenge-query-workers-')
+        self.stopping = False
+        self._last_cleanup = 0
+
+    def start(self):
+        while len(self.workers) < self.size:
+            self._spawn()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stopping:
+                self.step()
+                time.sleep(POLL_INTERVAL_SECONDS)
+        finally:
+            self.shutdown()
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def step(self):
+        """One supervisor iteration"""
+        self._reap_stopped_workers()
+        self._collect_finished()
+        self._stop_overdue_and_cancelled()
+        self._replace_dead_workers()
+        self._dispatch()
+
+        if time.monotonic() - self._last_cleanup > CLEANUP_INTERVAL_SECONDS:
+            self._last_cleanup = time.monotonic()
+            collect_finished_jobs(self.running_job_ids())
+
+    def running_job_ids(self):
+        return [worker['job_id'] for worker in self.workers.values() if worker['job_id']]
+
+    def running_per_engine(self):
+        running = {}
+        for worker in self.workers.values():
+            if worker['job_id']:
+                running[worker['engine']] = running.get(worker['engine'], 0) + 1
+        return running
+
+    def shutdown(self):
+        """Let running jobs finish (up to the job timeout), then stop the workers"""
+        for worker in self.workers.values():
+            worker['tasks'].put(None)
+
+        deadline = time.monotonic() + self.timeout
+        for pid, worker in list(self.workers.items()):
+            worker['process'].join(max(0, deadline - time.monotonic()))
+            if worker['process'].is_alive():
+                self._stop(pid)
+                if worker['job_id']:
+                    finish_job(worker['job_id'], 'failed', {'success': False, 'error': 'The query worker was stopped.'})
+            else:
+                del self.workers[pid]
+                self._release_resources(pid)
+
+        while self.stopped_workers:
+            self._reap_stopped_workers()
+            time.sleep(POLL_INTERVAL_SECONDS)
+        shutil.rmtree(self.resource_dir, ignore_errors=True)
+
+    def _spawn(self):
+        from django.db import connections
+
+        # A forked worker must not share the supervisor's database connections
+        connections.close_all()
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main, args=(tasks, self.finished, self.resource_dir), daemon=True
+        )
+        process.start()
+        self.workers[process.pid] = {
+            'process': process,
+            'tasks': tasks,
+            'job_id': None,
+            'engine': None,
+            'deadline': None,
+        }
+
+    def _stop(self, pid):
+        """Ask a worker to stop; it is killed if it is still running after STOP_GRACE_SECONDS"""
+        worker = self.workers.pop(pid)
+        worker['process'].terminate()
+        self.stopped_workers[pid] = (worker['process'], time.monotonic() + STOP_GRACE_SECONDS)
+
+    def _reap_stopped_workers(self):
+        """Kill stopped workers past their grace period and clean up after the ones that exited"""
+        for pid, (process, kill_at) in list(self.stopped_workers.items()):
+            if process.is_alive():
+                if time.monotonic() < kill_at:
+                    continue
+                process.kill()
+                process.join(5)
+            else:
+                process.join()
+            del self.stopped_workers[pid]
+            self._release_resources(pid)
+
+    def _release_resources(self, pid):
+        """Drop the databases and reset the template builds a stopped worker left behind"""
+        from .job_resources import release_worker_resources
+
+        released = release_worker_resources(os.path.join(self.resource_dir, f'{pid}.log'))
+        if released:
+            print(f"Released {released} database resource(s) left by query worker {pid}")
+
+    def _collect_finished(self):
+        while True:
+            try:
+                pid, job_id = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers.get(pid)
+            if worker and worker['job_id'] == job_id:
+                worker['job_id'] = worker['engine'] = worker['deadline'] = None
+
+    def _stop_overdue_and_cancelled(self):
+        from .models import ChallengeQueryJob
+
+        running = {worker['job_id']: pid for pid, worker in self.workers.items() if worker['job_id']}
+        if not running:
+            return
+
+        now = time.monotonic()
+        for job_id, pid in running.items():
+            if now > self.workers[pid]['deadline']:
+                print(f"Query job {job_id} timed out after {self.timeout}s, stopping worker {pid}")
+                self._stop(pid)
+                finish_job(job_id, 'timed_out', {
+                    'success': False,
+                    'error': f'Query timed out after {self.timeout} seconds.'
+                })
+
+        cancelled = ChallengeQueryJob.objects.filter(
+            pk__in=[job_id for job_id, pid in running.items() if pid in self.workers],
+            status='cancelled'
+        ).values_list('pk', flat=True)
+        for job_id in cancelled:
+            self._stop(running[job_id])
+
+    def _replace_dead_workers(self):
+        for pid, worker in list(self.workers.items()):
+            if not worker['process'].is_alive():
+                del self.workers[pid]
+                self._release_resources(pid)
+                if worker['job_id']:
+                    finish_job(worker['job_id'], 'failed', {'success': False, 'error': 'The query worker stopped unexpectedly.'})
+        while len(self.workers) < self.size and not self.stopping:
+            self._spawn()
+
+    def _dispatch(self):
+        idle = [worker for worker in self.workers.values() if not worker['job_id']]
+        while idle:
+            job = claim_next_job(self.running_per_engine())
+            if job is None:
+                return
+            worker = idle.pop()
+            worker['job_id'] = job.pk
+            worker['engine'] = job.engine
+            worker['deadline'] = time.monotonic() + self.timeout
+            worker['tasks'].put(job.pk)
@@ -0,0 +1,155 @@
+"""
+Server-side resources held by query worker processes.
+
+A query worker that is killed (job timeout, cancellation, shutdown) gets no
+chance to drop its temporary databases or to finish a template build it
+claimed. While a worker process runs, every such resource is appended to a
+per-process log file when it is acquired and again when it is released.
+After the supervisor has stopped a worker, release_worker_resources() cleans
+up whatever the log still holds:
+
+- 'database': a temporary, sandbox or cloned database (engine, name). Its
+  remaining sessions are terminated and it is dropped.
+- 'template_build': a ChallengeDatabaseVersion claimed for building (pk).
+  The claim and its half-built databases are dropped, so the next request
+  builds it again instead of waiting BUILD_TIMEOUT_SECONDS for it.
+
+Outside worker processes tracking does nothing.
+"""
+
+import json
+import os
+import time
+
+
+# How long to wait for the sessions of a stopped worker to end before dropping a database
+SESSION_EXIT_WAIT_SECONDS = 5
+
+_log_fd = None
+_log_pid = None
+
+
+def start_tracking(path):
+    """Record this process's resources in the log file at path"""
+    global _log_fd, _log_pid
+    _log_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    _log_pid = os.getpid()
+
+
+def track_resource(kind, engine, name):
+    """Record a resource before it is acquired"""
+    _write('+', kind, engine, name)
+
+
+def untrack_resource(kind, engine, name):
+    """Record that a resource has been released"""
+    _write('-', kind, engine, name)
+
+
+def _write(action, kind, engine, name):
+    # The log is not inherited by processes forked from a worker
+    if _log_fd is None or _log_pid != os.getpid():
+        return
+    # One write() per record on an O_APPEND descriptor, so it survives SIGKILL
+    os.write(_log_fd, (json.dumps([action, kind, engine, name]) + '\n').encode('utf-8'))
+
+
+def read_resources(path):
+    """Resources acquired and not released according to a log, in acquisition order"""
+    held = {}
+    try:
+        log = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return []
+
+    with log:
+        for line in log:
+            try:
+                action, kind, engine, name = json.loads(line)
+            except ValueError:
+                # A record cut short by the kill
+                continue
+            if action == '+':
+                held[(kind, engine, name)] = True
+            else:
+                held.pop((kind, engine, name), None)
+    return list(held)
+
+
+def release_worker_resources(path):
+    """
+    Clean up the resources a stopped worker left behind and remove its log.
+    Returns the number of resources released.
+    """
+    released = 0
+    for kind, engine, name in reversed(read_resources(path)):
+        try:
+            if kind == 'template_build':
+                _reset_template_build(name)
+            else:
+                drop_database(engine, name)
+            released += 1
+        except Exception as e:
+            print(f"Could not release {kind} {name} of a stopped query worker: {e}")
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return released
+
+
+def drop_database(engine, name):
+    """Terminate the sessions still using a database and drop it"""
+    from .connection_pool import close_pool, connect_direct
+
+    close_pool(engine, name)
+    # Not pooled: the supervisor forks workers, which must not inherit its connections
+    conn = connect_direct(engine, '' if engine == 'mysql' else None)
+    try:
+        if engine == 'postgresql':
+            conn.autocommit = True
+        cursor = conn.cursor()
+        if engine == 'mysql':
+            sessions = "SELECT id FROM information_schema.processlist WHERE db = %s AND id <> CONNECTION_ID()"
+            cursor.execute(sessions, (name,))
+            for (session_id,) in cursor.fetchall():
+                try:
+                    cursor.execute(f"KILL {int(session_id)}")
+                except Exception:
+                    # The session ended in the meantime
+                    pass
+        else:
+            sessions = "SELECT pid FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()"
+            cursor.execute(f"SELECT pg_terminate_backend(pid) FROM ({sessions}) AS sessions", (name,))
+            cursor.fetchall()
+
+        # Terminated sessions take a moment to go away, and block the drop until they do
+        deadline = time.monotonic() + SESSION_EXIT_WAIT_SECONDS
+        cursor.execute(sessions, (name,))
+        while cursor.fetchall() and time.monotonic() < deadline:
+            time.sleep(0.1)
+            cursor.execute(sessions, (name,))
+
+        if engine == 'mysql':
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        else:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _reset_template_build(version_pk):
+    """Drop a template build that was interrupted, so it is rebuilt on next use"""
+    from .clone_pool import get_clone_source_name
+    from .models import ChallengeDatabaseVersion
+
+    version = ChallengeDatabaseVersion.objects.filter(pk=version_pk, status='building').first()
+    if version is None:
+        return
+
+    drop_database(version.engine, version.database_name)
+    if version.engine == 'postgresql':
+        drop_database('postgresql', get_clone_source_name(version.database_name))
+    version.delete()
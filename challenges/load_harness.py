@@ -0,0 +1,366 @@
+"""
+Concurrent-user load harness for the challenge and editor endpoints.
+
+Each synthetic user is a thread with its own cookie jar. It logs in through
+the real login form, then loops until the run ends: pick an action from the
+weighted mix, send it, record the latency and outcome, and wait a random
+think time. Queued Run/Submit jobs (CHALLENGE_JOB_QUEUE_ENABLED) are polled
+until they finish, so their latency is what the student waits for.
+
+Actions:
+- run: POST /challenges/api/execute/<id>/
+- submit: POST /challenges/api/submit/<id>/
+- editor: POST /editor/api/execute/
+- history: GET /editor/api/history/
+- dashboard: GET /dashboard/
+
+Every request ends as 'ok', 'failed' (the endpoint answered with
+success: false, e.g. a wrong answer) or 'error' (HTTP error status, timeout or
+connection failure). Only errors mean the server could not cope.
+"""
+
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+ACTIONS = ('run', 'submit', 'editor', 'history', 'dashboard')
+
+# Weights of the default action mix, roughly what the Run/Submit pages see
+DEFAULT_MIX = {'run': 45, 'submit': 15, 'editor': 20, 'history': 10, 'dashboard': 10}
+
+EDITOR_QUERIES = [
+    'SELECT * FROM users',
+    'SELECT name, price FROM products WHERE price > 50 ORDER BY price DESC',
+    'SELECT u.name, COUNT(o.id) AS orders FROM users u LEFT JOIN orders o ON o.user_id = u.id GROUP BY u.name',
+]
+
+OK = 'ok'
+FAILED = 'failed'
+ERROR = 'error'
+
+
+def parse_mix(text):
+    """Parse 'run=50,submit=20,...' into {action: weight}"""
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        action, _, weight = part.partition('=')
+        action = action.strip()
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}' (choose from {', '.join(ACTIONS)})")
+        try:
+            mix[action] = int(weight)
+        except ValueError:
+            raise ValueError(f"Weight for '{action}' must be an integer")
+    if not any(mix.values()):
+        raise ValueError('The action mix needs at least one positive weight')
+    return mix
+
+
+def get_load_challenges(challenge_ids=None, limit=5):
+    """
+    Challenges to run and submit against, as [{'id', 'engine', 'queries'}].
+    Each gets its reference query (the correct answer) and a plain SELECT of
+    its first table (usually a wrong answer).
+    """
+    from .models import Challenge
+
+    challenges = Challenge.objects.filter(is_active=True, subscription_type='free').order_by('id')
+    if challenge_ids:
+        challenges = challenges.filter(id__in=challenge_ids)
+    else:
+        challenges = challenges[:limit]
+
+    selected = []
+    for challenge in challenges:
+        table = challenge.tables.order_by('order').first()
+        queries = []
+        if challenge.reference_query:
+            queries.append(challenge.reference_query)
+        if table:
+            queries.append(f'SELECT * FROM {table.table_name}')
+        if not queries:
+            continue
+        engines = [engine for engine in challenge.get_supported_engines() if engine != 'sqlite']
+        selected.append({
+            'id': challenge.id,
+            'engine': 'mysql' if 'mysql' in engines or not engines else engines[0],
+            'queries': queries,
+        })
+    return selected
+
+
+def create_synthetic_users(count, prefix, password):
+    """Create (or reset) verified accounts {prefix}{n}@loadtest.local; returns their emails"""
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    emails = []
+    for n in range(1, count + 1):
+        email = f'{prefix}{n}@loadtest.local'
+        user, _ = User.objects.get_or_create(email=email, defaults={'username': f'{prefix}{n}'})
+        user.is_email_verified = True
+        user.is_active = True
+        user.set_password(password)
+        user.save()
+        emails.append(email)
+    return emails
+
+
+def delete_synthetic_users(prefix):
+    """Delete the accounts created by create_synthetic_users; returns how many"""
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.filter(email__startswith=prefix, email__endswith='@loadtest.local')
+    count = users.count()
+    users.delete()
+    return count
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+class SyntheticUser(threading.Thread):
+    """One simulated student replaying the action mix against the server"""
+
+    def __init__(self, harness, index, email):
+        super().__init__(name=f'load-user-{index}', daemon=True)
+        self.harness = harness
+        self.index = index
+        self.email = email
+        self.random = random.Random(harness.seed + index)
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.csrf_token = ''
+        self.last_url = ''
+        self.last_status = None
+
+    def run(self):
+        harness = self.harness
+        # Spread the logins over the ramp-up period
+        if harness.ramp_up and harness.users > 1:
+            if harness.stop_event.wait(harness.ramp_up * self.index / harness.users):
+                return
+
+        start = time.perf_counter()
+        outcome = self.login()
+        harness.record('login', time.perf_counter() - start, outcome)
+        if outcome != OK:
+            return
+
+        actions = list(harness.mix)
+        weights = [harness.mix[action] for action in actions]
+        while not harness.stop_event.is_set():
+            action = self.random.choices(actions, weights)[0]
+            start = time.perf_counter()
+            try:
+                outcome = getattr(self, f'do_{action}')()
+                if outcome == ERROR:
+                    harness.record_error(action, f'HTTP {self.last_status}')
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                outcome = ERROR
+                harness.record_error(action, e)
+            harness.record(action, time.perf_counter() - start, outcome)
+            harness.stop_event.wait(self.random.uniform(*harness.think_time))
+
+    # HTTP helpers
+
+    def request(self, path, data=None, json_body=None, method=None):
+        """Send a request; returns (status, body bytes). HTTP error statuses are returned, not raised."""
+        url = urllib.parse.urljoin(self.harness.base_url, path)
+        headers = {'Referer': url, 'X-CSRFToken': self.csrf_token}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.harness.timeout) as response:
+                status, content, final_url = response.status, response.read(), response.url
+        except urllib.error.HTTPError as e:
+            status, content, final_url = e.code, e.read(), url
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                self.csrf_token = cookie.value
+        self.last_url = final_url
+        self.last_status = status
+        return status, content
+
+    def json_outcome(self, status, content):
+        if status >= 400:
+            return ERROR
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return ERROR
+        return OK if data.get('success') else FAILED
+
+    def wait_for_job(self, status, content):
+        """Poll a queued Run/Submit until it finishes; returns its outcome"""
+        if status >= 400:
+            return ERROR
+        data = json.loads(content)
+        while data.get('job_id') and not data.get('done'):
+            if self.harness.stop_event.wait(data.get('poll_interval', 1000) / 1000):
+                return FAILED
+            status, content = self.request(data['poll_url'])
+            if status >= 400:
+                return ERROR
+            data = json.loads(content)
+        if data.get('job_id'):
+            data = data.get('result') or {}
+        return OK if data.get('success') else FAILED
+
+    # Actions
+
+    def login(self):
+        try:
+            self.request('/auth/login/')
+            status, _ = self.request('/auth/login/', data={
+                'email': self.email,
+                'password': self.harness.password,
+                'csrfmiddlewaretoken': self.csrf_token,
+            })
+        except (urllib.error.URLError, OSError) as e:
+            self.harness.record_error('login', e)
+            return ERROR
+        if status >= 400 or '/auth/login/' in urllib.parse.urlparse(self.last_url).path:
+            self.harness.record_error('login', f'{self.email} was not logged in (HTTP {status})')
+            return ERROR
+        return OK
+
+    def do_run(self):
+        challenge = self.random.choice(self.harness.challenges)
+        status, content = self.request(f"/challenges/api/execute/{challenge['id']}/", json_body={
+            'query': self.random.choice(challenge['queries']),
+            'engine': challenge['engine'],
+        })
+        return self.wait_for_job(status, content)
+
+    def do_submit(self):
+        challenge = self.random.choice(self.harness.challenges)
+        status, content = self.request(f"/challenges/api/submit/{challenge['id']}/", data={
+            'query': self.random.choice(challenge['queries']),
+            'engine': challenge['engine'],
+        })
+        return self.wait_for_job(status, content)
+
+    def do_editor(self):
+        status, content = self.request('/editor/api/execute/', json_body={
+            'query': self.random.choice(EDITOR_QUERIES),
+        })
+        return self.json_outcome(status, content)
+
+    def do_history(self):
+        status, content = self.request('/editor/api/history/')
+        return self.json_outcome(status, content)
+
+    def do_dashboard(self):
+        status, _ = self.request('/dashboard/')
+        return ERROR if status >= 400 else OK
+
+
+class LoadHarness:
+    """Runs the synthetic users for a fixed duration and aggregates what they saw"""
+
+    def __init__(self, base_url, emails, password, challenges, mix=None, duration=60,
+                 ramp_up=0, think_time=(1.0, 3.0), timeout=30, seed=0):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.emails = emails
+        self.users = len(emails)
+        self.password = password
+        self.challenges = challenges
+        self.mix = {action: weight for action, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+        if not challenges:
+            self.mix.pop('run', None)
+            self.mix.pop('submit', None)
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.timeout = timeout
+        self.seed = seed
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._samples = {}  # action -> [(seconds, outcome)]
+        self._errors = {}  # action -> {message: count}
+        self.elapsed = 0.0
+
+    def record(self, action, seconds, outcome):
+        with self._lock:
+            self._samples.setdefault(action, []).append((seconds, outcome))
+
+    def record_error(self, action, error):
+        message = str(getattr(error, 'reason', error))[:200]
+        with self._lock:
+            errors = self._errors.setdefault(action, {})
+            errors[message] = errors.get(message, 0) + 1
+
+    def run(self):
+        """Start every user, stop them after the duration and return the report"""
+        if not self.mix:
+            raise ValueError('No actions to run: the mix is empty or has only run/submit without challenges')
+
+        threads = [SyntheticUser(self, index, email) for index, email in enumerate(self.emails)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stop_event.wait(self.duration)
+        self.stop_event.set()
+        for thread in threads:
+            thread.join(self.timeout + 5)
+        self.elapsed = time.perf_counter() - start
+        return self.get_report()
+
+    def get_report(self):
+        """{'elapsed', 'users', 'throughput', 'actions': {action: stats}, 'errors'}"""
+        with self._lock:
+            samples = {action: list(values) for action, values in self._samples.items()}
+            errors = {action: dict(messages) for action, messages in self._errors.items()}
+
+        elapsed = self.elapsed or 1e-9
+        actions = {}
+        total = 0
+        for action in ('login',) + ACTIONS:
+            values = samples.get(action)
+            if not values:
+                continue
+            latencies = [seconds * 1000 for seconds, _ in values]
+            outcomes = [outcome for _, outcome in values]
+            count = len(values)
+            if action != 'login':
+                total += count
+            actions[action] = {
+                'requests': count,
+                'throughput': round(count / elapsed, 2),
+                'ok': outcomes.count(OK),
+                'failed': outcomes.count(FAILED),
+                'errors': outcomes.count(ERROR),
+                'error_rate': round(outcomes.count(ERROR) / count, 4),
+                'p50': round(percentile(latencies, 50), 1),
+                'p95': round(percentile(latencies, 95), 1),
+                'p99': round(percentile(latencies, 99), 1),
+                'max': round(max(latencies), 1),
+            }
+        return {
+            'base_url': self.base_url,
+            'users': self.users,
+            'elapsed': round(self.elapsed, 1),
+            'throughput': round(total / elapsed, 2),
+            'actions': actions,
+            'errors': errors,
+        }
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from challenges.query_rewriter import rewrite_query
+from editor.parsed_query import ParsedQuery
+
+
+TABLE_MAPPING = {
+    'employees': 'employees_q1',
+    'departments': 'departments_q1',
+    'salaries': 'salaries_q1',
+    'projects': 'projects_q1',
+}
+
+# Window-function, CTE and nested-subquery queries of the kind students submit
+CORPUS = [
+    # Window functions
+    "SELECT name, salary, ROW_NUMBER() OVER (PARTITION BY department_id ORDER BY salary DESC) AS rn FROM employees",
+    "SELECT e.name, e.salary, LAG(e.salary) OVER (ORDER BY e.hire_date) AS previous_salary, "
+    "SUM(e.salary) OVER (PARTITION BY e.department_id ORDER BY e.hire_date ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS running_total "
+    "FROM employees e WHERE e.salary > 50000 ORDER BY e.hire_date",
+    "SELECT d.name, AVG(e.salary) AS avg_salary, RANK() OVER (ORDER BY AVG(e.salary) DESC) AS salary_rank "
+    "FROM employees e JOIN departments d ON d.id = e.department_id GROUP BY d.name HAVING COUNT(*) > 2",
+    # CTEs
+    "WITH dept_totals AS (SELECT department_id, SUM(salary) AS total FROM employees GROUP BY department_id), "
+    "ranked AS (SELECT department_id, total, DENSE_RANK() OVER (ORDER BY total DESC) AS r FROM dept_totals) "
+    "SELECT d.name, r.total FROM ranked r JOIN departments d ON d.id = r.department_id WHERE r.r <= 3",
+    "WITH RECURSIVE chain(id, manager_id, depth) AS (SELECT id, manager_id, 0 FROM employees WHERE manager_id IS NULL "
+    "UNION ALL SELECT e.id, e.manager_id, c.depth + 1 FROM employees e JOIN chain c ON e.manager_id = c.id) "
+    "SELECT depth, COUNT(*) FROM chain GROUP BY depth ORDER BY depth",
+    "WITH latest AS (SELECT employee_id, MAX(paid_on) AS paid_on FROM salaries GROUP BY employee_id) "
+    "SELECT e.name, s.amount FROM latest l JOIN salaries s ON s.employee_id = l.employee_id AND s.paid_on = l.paid_on "
+    "JOIN employees e ON e.id = l.employee_id",
+    # Nested subqueries, comma joins and set operations
+    "SELECT name FROM employees WHERE salary > (SELECT AVG(salary) FROM employees) "
+    "AND department_id IN (SELECT id FROM departments WHERE location IN (SELECT location FROM departments WHERE budget > 100000))",
+    "SELECT e.name, p.title FROM employees e, projects p, departments d "
+    "WHERE p.department_id = d.id AND e.department_id = d.id AND EXISTS (SELECT 1 FROM salaries s WHERE s.employee_id = e.id)",
+    "SELECT name FROM employees WHERE department_id = 1 UNION SELECT title FROM projects "
+    "UNION ALL SELECT name FROM departments WHERE id NOT IN (SELECT department_id FROM employees)",
+    "SELECT x.department_id, x.cnt FROM (SELECT department_id, COUNT(*) AS cnt FROM employees GROUP BY department_id) x "
+    "WHERE x.cnt = (SELECT MAX(cnt) FROM (SELECT COUNT(*) AS cnt FROM employees GROUP BY department_id) y)",
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure query rewriting on a corpus of window-function, CTE and nested-subquery queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Times the corpus is processed per measurement (default: 200)',
+        )
+        parser.add_argument(
+            '--show',
+            action='store_true',
+            help='Print each rewritten query',
+        )
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        runs = iterations * len(CORPUS)
+
+        self.stdout.write(self.style.SUCCESS('=== Query Rewriter Benchmark ==='))
+        self.stdout.write(f'Corpus: {len(CORPUS)} queries, {iterations} iterations\n')
+
+        # Parse without the memo so every run does the full work
+        started = time.perf_counter()
+        for _ in range(iterations):
+            parsed_queries = [ParsedQuery(query) for query in CORPUS]
+        parse_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for parsed_query in parsed_queries:
+                rewrite_query(parsed_query, TABLE_MAPPING, 1)
+        rewrite_time = time.perf_counter() - started
+
+        self.stdout.write(f'  • parse:   {parse_time / runs * 1e6:8.1f} µs/query')
+        self.stdout.write(f'  • rewrite: {rewrite_time / runs * 1e6:8.1f} µs/query')
+        self.stdout.write(f'  • total:   {(parse_time + rewrite_time) / runs * 1e6:8.1f} µs/query')
+        self.stdout.write('Repeated submissions hit the ParsedQuery and rewrite caches and skip both steps.')
+
+        if options['show']:
+            for parsed_query in parsed_queries:
+                self.stdout.write(f'\n{parsed_query.query}\n  -> {rewrite_query(parsed_query, TABLE_MAPPING, 1)}')
@@ -0,0 +1,87 @@
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from editor.sql_lexer import iter_statements, split_statements, strip_comments
+
+
+class Command(BaseCommand):
+    help = 'Measure SQL lexer throughput on a generated multi-megabyte dataset script'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size-mb',
+            type=float,
+            default=4,
+            help='Approximate size of the generated script in megabytes (default: 4)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement; the fastest run is reported (default: 3)',
+        )
+        parser.add_argument(
+            '--compare-sqlparse',
+            action='store_true',
+            help='Also time sqlparse.split on the same script (slow)',
+        )
+
+    def handle(self, *args, **options):
+        script = self.generate_script(int(options['size_mb'] * 1024 * 1024))
+        size_mb = len(script) / (1024 * 1024)
+        statement_count = len(split_statements(script))
+
+        self.stdout.write(self.style.SUCCESS('=== SQL Lexer Benchmark ==='))
+        self.stdout.write(f'Script: {size_mb:.2f} MB, {statement_count} statements\n')
+
+        measurements = [
+            ('split_statements (string)', lambda: split_statements(script)),
+            ('iter_statements (file-like)', lambda: sum(1 for _ in iter_statements(io.StringIO(script)))),
+            ('strip_comments', lambda: strip_comments(script)),
+        ]
+        if options['compare_sqlparse']:
+            import sqlparse
+            measurements.append(('sqlparse.split', lambda: sqlparse.split(script)))
+
+        for name, function in measurements:
+            elapsed = min(self.time_once(function) for _ in range(max(1, options['repeat'])))
+            self.stdout.write(
+                f'  • {name}: {elapsed * 1000:.0f} ms, '
+                f'{size_mb / elapsed:.1f} MB/s, {statement_count / elapsed:,.0f} statements/s'
+            )
+
+    def time_once(self, function):
+        started = time.perf_counter()
+        function()
+        return time.perf_counter() - started
+
+    def generate_script(self, target_size):
+        """Dataset-style script with the quoting cases the lexer has to get right"""
+        rng = random.Random(42)
+        departments = ['Engineering', 'Sales; EMEA', "O'Brien's team", 'R&D -- research', 'Ops /* night */']
+        parts = [
+            '-- Generated benchmark dataset\n',
+            'CREATE TABLE employees (id INT PRIMARY KEY, name VARCHAR(100), department VARCHAR(100), '
+            'salary DECIMAL(10,2), notes TEXT);\n',
+        ]
+        size = sum(len(part) for part in parts)
+        row_id = 0
+
+        while size < target_size:
+            rows = []
+            for _ in range(50):
+                row_id += 1
+                department = departments[rng.randrange(len(departments))].replace("'", "''")
+                rows.append(
+                    f"({row_id}, 'Employee {row_id}', '{department}', {rng.randint(30000, 150000)}.00, "
+                    f"'note \\'{row_id}\\'; see \"file\"')"
+                )
+            statement = f"/* batch {row_id // 50} */\nINSERT INTO employees (id, name, department, salary, notes) VALUES\n"
+            statement += ',\n'.join(rows) + ';\n'
+            parts.append(statement)
+            size += len(statement)
+
+        return ''.join(parts)
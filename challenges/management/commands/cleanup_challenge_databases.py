@@ -0,0 +1,140 @@
+"""
+Management command to drop persistent challenge query databases that are stale or unused.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from challenges.models import Challenge, ChallengeDatabaseVersion
+
+
+class Command(BaseCommand):
+    help = 'Drop persistent challenge query databases that no longer match their challenge'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--challenge-id',
+            type=int,
+            help='Only clean up databases of this challenge',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Drop every persistent database, including current versions',
+        )
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            help='Also drop current versions that have not been used for this many days',
+        )
+        parser.add_argument(
+            '--orphaned-clones',
+            action='store_true',
+            help='Drop PostgreSQL clone databases left behind by stopped workers '
+                 '(run while no web workers are serving queries)',
+        )
+        parser.add_argument(
+            '--orphaned-sandboxes',
+            action='store_true',
+            help='Drop pooled sandbox databases left behind by stopped workers '
+                 '(run while no web workers are serving queries)',
+        )
+
+    def handle(self, *args, **options):
+        from challenges.provisioning import collect_stale_template_databases, _drop_version
+
+        challenge = None
+        if options.get('challenge_id'):
+            try:
+                challenge = Challenge.objects.get(id=options['challenge_id'])
+            except Challenge.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f"Challenge with ID {options['challenge_id']} does not exist")
+                )
+                return
+
+        dropped = collect_stale_template_databases(challenge, drop_all=options.get('all', False))
+        self.stdout.write(f'Dropped {dropped} stale database(s)')
+
+        idle_days = options.get('idle_days')
+        if idle_days:
+            cutoff = timezone.now() - timedelta(days=idle_days)
+            idle_versions = ChallengeDatabaseVersion.objects.filter(last_used_at__lt=cutoff)
+            if challenge is not None:
+                idle_versions = idle_versions.filter(challenge=challenge)
+
+            idle_dropped = sum(1 for version in idle_versions if _drop_version(version))
+            self.stdout.write(f'Dropped {idle_dropped} idle database(s)')
+
+        if options.get('orphaned_clones'):
+            self.stdout.write(f'Dropped {self.drop_orphaned_clones()} orphaned clone(s)')
+
+        if options.get('orphaned_sandboxes'):
+            self.stdout.write(f'Dropped {self.drop_orphaned_sandboxes()} orphaned sandbox(es)')
+
+        remaining = ChallengeDatabaseVersion.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Cleanup completed! {remaining} database(s) remaining.'))
+
+    def drop_orphaned_clones(self):
+        """Drop every database that matches the clone naming pattern"""
+        from challenges.clone_pool import CLONE_NAME_PATTERN, drop_clone
+        from challenges.connection_pool import get_connection
+
+        try:
+            conn = get_connection('postgresql')
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT datname FROM pg_database WHERE datname LIKE 'challenge\\_%'")
+                names = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'Could not list PostgreSQL databases: {e}'))
+            return 0
+
+        dropped = 0
+        for name in names:
+            if CLONE_NAME_PATTERN.match(name):
+                try:
+                    drop_clone(name)
+                    dropped += 1
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f'Could not drop {name}: {e}'))
+        return dropped
+
+    def drop_orphaned_sandboxes(self):
+        """Drop every database that matches the sandbox naming pattern, on both engines"""
+        from challenges.connection_pool import get_connection
+        from challenges.sandbox_pool import SANDBOX_NAME_PATTERN, drop_sandbox_database
+
+        listings = {
+            'mysql': ('', "SHOW DATABASES LIKE 'challenge\\_sandbox\\_%'"),
+            'postgresql': (None, "SELECT datname FROM pg_database WHERE datname LIKE 'challenge\\_sandbox\\_%'"),
+        }
+
+        dropped = 0
+        for engine, (database, sql) in listings.items():
+            try:
+                conn = get_connection(engine, database)
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(sql)
+                    names = [row[0] for row in cursor.fetchall()]
+                    cursor.close()
+                finally:
+                    conn.close()
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'Could not list {engine} databases: {e}'))
+                continue
+
+            for name in names:
+                if SANDBOX_NAME_PATTERN.match(name):
+                    try:
+                        drop_sandbox_database(engine, name)
+                        dropped += 1
+                    except Exception as e:
+                        self.stdout.write(self.style.WARNING(f'Could not drop {name}: {e}'))
+        return dropped
@@ -0,0 +1,138 @@
+"""
+Management command that puts concurrent-user load on a running server.
+
+Logs in N synthetic students and replays a weighted mix of challenge Run and
+Submit, editor execute, query history and dashboard requests with think
+times (see challenges/load_harness.py), then reports throughput, error rates
+and latency percentiles per action. Use it against a local dev server or a
+gunicorn/Passenger deployment to size worker counts and DB connection limits.
+
+The synthetic accounts are created in the database this command is configured
+with, so point it at the same database as the server under test.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from challenges.load_harness import (
+    DEFAULT_MIX, LoadHarness, create_synthetic_users, delete_synthetic_users, get_load_challenges, parse_mix
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay a mix of Run, Submit, editor, history and dashboard requests from concurrent synthetic users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://127.0.0.1:8000',
+            help='Server to load (default: http://127.0.0.1:8000)',
+        )
+        parser.add_argument('--users', type=int, default=10, help='Concurrent synthetic users (default: 10)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run (default: 60)')
+        parser.add_argument(
+            '--ramp-up',
+            type=float,
+            default=0,
+            help='Seconds over which the users log in (default: all at once)',
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            nargs=2,
+            default=[1.0, 3.0],
+            metavar=('MIN', 'MAX'),
+            help='Random pause between a user\'s requests in seconds (default: 1 3)',
+        )
+        parser.add_argument(
+            '--mix',
+            default=','.join(f'{action}={weight}' for action, weight in DEFAULT_MIX.items()),
+            help='Action weights, e.g. run=60,submit=20,editor=20 (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--challenges',
+            type=int,
+            nargs='+',
+            help='Challenge IDs to run and submit against (default: the first 5 free challenges)',
+        )
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds (default: 30)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the action and think time sequence')
+        parser.add_argument('--user-prefix', default='loadtest', help='Prefix of the synthetic account emails')
+        parser.add_argument('--password', default='loadtest-password', help='Password of the synthetic accounts')
+        parser.add_argument('--output', help='Also write the report to this JSON file')
+        parser.add_argument(
+            '--keep-users',
+            action='store_true',
+            help='Keep the synthetic accounts after the run (they are deleted by default)',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        think_min, think_max = options['think_time']
+        if think_min < 0 or think_max < think_min:
+            raise CommandError('--think-time needs 0 <= MIN <= MAX')
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        challenges = get_load_challenges(options['challenges'])
+        if not challenges and (mix.get('run') or mix.get('submit')):
+            self.stdout.write(self.style.WARNING(
+                'No free active challenges with a reference query or table found: Run and Submit are skipped'
+            ))
+
+        emails = create_synthetic_users(options['users'], options['user_prefix'], options['password'])
+        harness = LoadHarness(
+            options['base_url'],
+            emails,
+            options['password'],
+            challenges,
+            mix=mix,
+            duration=options['duration'],
+            ramp_up=options['ramp_up'],
+            think_time=(think_min, think_max),
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loading {harness.base_url} with {harness.users} user(s) for {options['duration']:g}s, "
+            f"mix {', '.join(f'{action}={weight}' for action, weight in harness.mix.items())}, "
+            f"challenges {[challenge['id'] for challenge in challenges]}"
+        ))
+        try:
+            report = harness.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if not options['keep_users']:
+                delete_synthetic_users(options['user_prefix'])
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"\n{report['users']} user(s), {report['elapsed']}s, {report['throughput']} req/s overall\n"
+        )
+        self.stdout.write(
+            f"{'action':<10} {'requests':>8} {'req/s':>7} {'ok':>6} {'failed':>6} {'errors':>6} "
+            f"{'err %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for action, stats in report['actions'].items():
+            line = (
+                f"{action:<10} {stats['requests']:>8} {stats['throughput']:>7} {stats['ok']:>6} "
+                f"{stats['failed']:>6} {stats['errors']:>6} {stats['error_rate']:>6.1%} {stats['p50']:>8} "
+                f"{stats['p95']:>8} {stats['p99']:>8} {stats['max']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if stats['errors'] else line)
+
+        for action, messages in report['errors'].items():
+            for message, count in sorted(messages.items(), key=lambda item: -item[1]):
+                self.stdout.write(self.style.WARNING(f'  {action}: {count} x {message}'))
@@ -0,0 +1,46 @@
+"""
+Management command that executes queued challenge Run and Submit jobs.
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand
+
+from challenges.job_queue import QueryWorkerPool, get_engine_concurrency, is_job_queue_enabled
+
+
+class Command(BaseCommand):
+    help = 'Run the query worker pool that executes queued challenge Run and Submit jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of worker processes (default: CHALLENGE_JOB_WORKERS)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            help='Seconds before a running job is stopped (default: CHALLENGE_JOB_TIMEOUT_SECONDS)',
+        )
+
+    def handle(self, *args, **options):
+        pool = QueryWorkerPool(workers=options.get('workers'), timeout=options.get('timeout'))
+
+        if not is_job_queue_enabled():
+            self.stdout.write(self.style.WARNING(
+                'CHALLENGE_JOB_QUEUE_ENABLED is off: the web workers execute queries themselves '
+                'and will not queue any jobs'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Starting {pool.size} query worker(s), {pool.timeout}s timeout, '
+            f'MySQL concurrency {get_engine_concurrency("mysql")}, '
+            f'PostgreSQL concurrency {get_engine_concurrency("postgresql")}'
+        ))
+
+        signal.signal(signal.SIGTERM, pool.stop)
+        signal.signal(signal.SIGINT, pool.stop)
+        pool.run_forever()
+
+        self.stdout.write('Query workers stopped')
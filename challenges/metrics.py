@@ -0,0 +1,65 @@
+"""
+The /metrics endpoint: the query phase histogram of sqlplayground/query_timing.py
+and the connection pool, sandbox pool and engine health gauges in the
+Prometheus text format.
+"""
+
+
+METRIC_PREFIX = 'kodesql'
+
+
+def _labels(**labels):
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render_prometheus():
+    """Render the phase histogram and pool and engine gauges in the Prometheus text format"""
+    from sqlplayground.query_timing import BUCKETS, collect_histogram
+
+    from .connection_pool import get_pool_stats
+    from .engine_health import CLOSED, get_engine_health
+    from .sandbox_pool import get_sandbox_pool_stats
+
+    name = f'{METRIC_PREFIX}_query_phase_seconds'
+    lines = [
+        f'# HELP {name} Time spent in each phase of challenge query execution',
+        f'# TYPE {name} histogram',
+    ]
+    for (phase, engine), series in sorted(collect_histogram().items()):
+        for bound, count in zip(BUCKETS, series):
+            lines.append(f'{name}_bucket{_labels(phase=phase, engine=engine, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(phase=phase, engine=engine, le="+Inf")} {series[-1]}')
+        lines.append(f'{name}_sum{_labels(phase=phase, engine=engine)} {series[-2]:.6f}')
+        lines.append(f'{name}_count{_labels(phase=phase, engine=engine)} {series[-1]}')
+
+    pool_stats = get_pool_stats()
+    for metric, key, help_text in (
+        ('connection_pool_size', 'size', 'Open connections per query connection pool'),
+        ('connection_pool_idle', 'idle', 'Idle connections per query connection pool'),
+    ):
+        lines.append(f'# HELP {METRIC_PREFIX}_{metric} {help_text}')
+        lines.append(f'# TYPE {METRIC_PREFIX}_{metric} gauge')
+        for stats in pool_stats:
+            labels = _labels(engine=stats['engine'], database=stats['database'])
+            lines.append(f'{METRIC_PREFIX}_{metric}{labels} {stats[key]}')
+
+    sandbox_stats = get_sandbox_pool_stats()
+    for key in ('size', 'free', 'leased', 'recycling'):
+        lines.append(f'# TYPE {METRIC_PREFIX}_sandbox_pool_{key} gauge')
+        for stats in sandbox_stats:
+            lines.append(f'{METRIC_PREFIX}_sandbox_pool_{key}{_labels(engine=stats["engine"])} {stats[key]}')
+    for key in ('leases', 'reused', 'reloads', 'recycles', 'full_recycles', 'leaks', 'exhausted', 'failures'):
+        lines.append(f'# TYPE {METRIC_PREFIX}_sandbox_pool_{key}_total counter')
+        for stats in sandbox_stats:
+            lines.append(f'{METRIC_PREFIX}_sandbox_pool_{key}_total{_labels(engine=stats["engine"])} {stats[key]}')
+
+    lines.append(f'# HELP {METRIC_PREFIX}_engine_available Whether the engine circuit breaker is closed')
+    lines.append(f'# TYPE {METRIC_PREFIX}_engine_available gauge')
+    for engine, state in get_engine_health().items():
+        lines.append(f'{METRIC_PREFIX}_engine_available{_labels(engine=engine)} {int(state["state"] == CLOSED)}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0006_alter_challengesubscriptionplan_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallengeDatabaseVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('engine', models.CharField(max_length=20)),
+                ('flag_id', models.PositiveSmallIntegerField(help_text='1 for run dataset, 2 for submit dataset')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('database_name', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('building', 'Building'), ('ready', 'Ready'), ('failed', 'Failed')], default='building', max_length=10)),
+                ('error_message', models.TextField(blank=True)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('challenge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='database_versions', to='challenges.challenge')),
+            ],
+            options={
+                'unique_together': {('challenge', 'engine', 'flag_id', 'content_hash')},
+            },
+        ),
+    ]
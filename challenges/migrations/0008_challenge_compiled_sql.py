@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0007_challengedatabaseversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='compiled_sql',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
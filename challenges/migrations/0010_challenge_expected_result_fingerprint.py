@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0009_challengequeryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='expected_result_fingerprint',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
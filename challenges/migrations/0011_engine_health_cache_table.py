@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+# The database cache table behind CACHES['engine_health'] when REDIS_URL is not set
+CACHE_TABLE = 'challenge_engine_health_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', CACHE_TABLE, database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_cache_table(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {schema_editor.quote_name(CACHE_TABLE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0010_challenge_expected_result_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
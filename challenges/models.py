@@ -2,8 +2,10 @@ from django.db import models
 from django.conf import settings
 from django_ckeditor_5.fields import CKEditor5Field
 from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import timedelta
 import json
+import uuid
 
 
 class ChallengeTable(models.Model):
@@ -406,6 +408,13 @@ class Challenge(models.Model):
 
     is_active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
+
+    # Processed SQL, table mapping and parsed datasets derived at save time (see compiled_sql.py)
+    compiled_sql = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Canonical digests of expected_result used for grading (see result_fingerprint.py)
+    expected_result_fingerprint = models.JSONField(default=dict, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -425,12 +434,66 @@ class Challenge(models.Model):
             )['max_order']
             self.order = (max_order or 0) + 1
 
+        # Fingerprint the expected result in the same write that stores it
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'expected_result' in update_fields:
+            from .result_fingerprint import fingerprint_result
+            self.expected_result_fingerprint = fingerprint_result(self.expected_result)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'expected_result_fingerprint'}
+
         # Save first to ensure we have an ID
         super().save(*args, **kwargs)
 
+        # Precompile execution artifacts unless only unrelated fields were saved
+        from .compiled_sql import SOURCE_FIELDS
+        if update_fields is None or SOURCE_FIELDS.intersection(update_fields):
+            try:
+                self.refresh_compiled_sql()
+            except Exception as e:
+                # Drop stale artifacts; they are compiled again on first execution
+                print(f"❌ Error compiling SQL for challenge {self.title}: {str(e)}")
+                Challenge.objects.filter(pk=self.pk).update(compiled_sql={})
+                self.compiled_sql = {}
+
         # Auto-generate expected results for dual-dataset challenges
         self._generate_expected_results_if_needed()
 
+    def get_compiled_sql(self):
+        """
+        Return the precompiled execution artifacts, compiling them first if they
+        are missing or were produced by an older compiler version.
+        """
+        from .compiled_sql import is_current
+
+        if not is_current(self.compiled_sql):
+            self.refresh_compiled_sql()
+        return self.compiled_sql
+
+    def refresh_compiled_sql(self):
+        """Recompile execution artifacts and store them without a full save()"""
+        from .compiled_sql import compile_challenge_sql
+
+        self.compiled_sql = compile_challenge_sql(self)
+        # Unsaved challenges (e.g. form validation) only keep the artifacts in memory
+        if self.pk is not None and not self._state.adding:
+            Challenge.objects.filter(pk=self.pk).update(compiled_sql=self.compiled_sql)
+
+    def get_expected_result_fingerprint(self):
+        """
+        Return the grading fingerprint of expected_result, rebuilding it if it is
+        missing, from an older version or does not fit the stored result.
+        """
+        from .result_fingerprint import fingerprint_result, is_current
+
+        if not is_current(self.expected_result_fingerprint, self.expected_result):
+            self.expected_result_fingerprint = fingerprint_result(self.expected_result)
+            if self.pk is not None and not self._state.adding:
+                Challenge.objects.filter(pk=self.pk).update(
+                    expected_result_fingerprint=self.expected_result_fingerprint
+                )
+        return self.expected_result_fingerprint
+
     def _generate_expected_results_if_needed(self):
         """
         Automatically generate expected results by executing the reference query
@@ -523,6 +586,34 @@ class Challenge(models.Model):
         else:
             return self.process_dataset_sql(self.submit_dataset_sql, flag_id)
 
+    def get_content_hash(self):
+        """
+        Hash of everything that determines what a loaded challenge database contains.
+        Changes whenever the schema or a dataset of the challenge or one of its tables changes.
+        """
+        import hashlib
+        from .provisioning import DATABASE_LAYOUT_VERSION
+
+        tables = []
+        if self.pk:
+            for table in self.tables.all().order_by('order', 'table_name'):
+                tables.append([
+                    table.table_name,
+                    table.schema_sql,
+                    table.run_dataset_sql,
+                    table.submit_dataset_sql,
+                ])
+
+        content = {
+            'id': self.pk,
+            'schema_sql': self.schema_sql,
+            'run_dataset_sql': self.run_dataset_sql,
+            'submit_dataset_sql': self.submit_dataset_sql,
+            'tables': tables,
+            'layout': DATABASE_LAYOUT_VERSION,
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
     def has_multi_table_setup(self):
         """Check if this challenge uses the new multi-table system"""
         return self.tables.exists()
@@ -699,6 +790,15 @@ class Challenge(models.Model):
                 engine='mysql'
             )
 
+            if result['success'] and result.get('truncated'):
+                # The governor dropped rows past its caps; a partial result would
+                # become the expected output and pass partial user results
+                return False, (
+                    f"Reference query result is too large to store: it was truncated at "
+                    f"{result.get('row_count', 0)} rows. Raise QUERY_MAX_RESULT_ROWS / "
+                    f"QUERY_MAX_RESULT_BYTES or narrow the query."
+                )
+
             if result['success']:
                 # Ensure consistent column ordering before normalization
                 raw_results = result['results']
@@ -741,7 +841,7 @@ class Challenge(models.Model):
     def _validate_dual_dataset_query(self, user_query, engine, is_test_mode):
         """Validate query using the new dual-dataset system"""
         try:
-            from .utils import execute_dual_dataset_query, normalize_json_result
+            from .utils import execute_dual_dataset_query
 
             flag_id = 1 if is_test_mode else 2
 
@@ -753,46 +853,58 @@ class Challenge(models.Model):
                 engine=engine
             )
 
+            return self.grade_query_result(result, is_test_mode)
+
+        except Exception as e:
+            return False, f"Error validating query: {str(e)}"
+
+    def grade_query_result(self, result, is_test_mode=False):
+        """
+        Grade an already executed query result against the expected result.
+
+        Lets callers that need the result set anyway (e.g. submit) execute the
+        query once and grade that same result.
+
+        Args:
+            result: Result dict from execute_dual_dataset_query
+            is_test_mode: If True, only report success (run dataset has no expected result)
+
+        Returns:
+            Tuple of (is_correct, message)
+        """
+        try:
             if not result['success']:
                 return False, f"Query execution failed: {result['error']}"
 
             if is_test_mode:
                 # For test mode, just return success (no validation against expected result)
                 return True, f"Query executed successfully on test dataset. Returned {result.get('row_count', 0)} rows."
+            elif result.get('truncated'):
+                # Only the first rows were fetched, so a match would not mean the whole result matches
+                return False, (
+                    f"Query result is too large to grade: it was truncated after "
+                    f"{result.get('row_count', 0)} rows. Check for a missing join condition or filter."
+                )
             else:
-                # For submit mode, compare with expected result using consistent column ordering
-                from .utils import ensure_consistent_column_order
-
-                # Apply consistent column ordering to user results
-                raw_user_results = result['results']
-                columns = result.get('columns', [])
-                ordered_user_results = ensure_consistent_column_order(raw_user_results, columns)
-
-                # Normalize both results for comparison with EXACT ORDER MATCHING
-                from .utils import normalize_json_result_with_exact_order
+                # For submit mode, hash the user's rows against the expected result fingerprint
+                from .result_fingerprint import compare_to_fingerprint
 
-                user_result = normalize_json_result_with_exact_order(ordered_user_results)
-                expected_result = normalize_json_result_with_exact_order(self.expected_result)
+                user_result = result.get('results', [])
+                fingerprint = self.get_expected_result_fingerprint()
+                outcome = compare_to_fingerprint(user_result, fingerprint)
 
-                if user_result == expected_result:
+                if outcome == 'match':
                     return True, "Query result matches expected output"
-                else:
-                    # Provide more detailed error message for debugging
-                    user_count = len(user_result) if isinstance(user_result, list) else 1
-                    expected_count = len(expected_result) if isinstance(expected_result, list) else 1
-
-                    if user_count != expected_count:
-                        return False, f"Query result does not match expected output. Expected {expected_count} rows, got {user_count} rows."
-                    else:
-                        # Check if it's a row order issue
-                        # Try comparing with sorted results to see if content matches but order is wrong
-                        user_result_sorted = normalize_json_result(ordered_user_results, preserve_order=False)
-                        expected_result_sorted = normalize_json_result(self.expected_result, preserve_order=False)
 
-                        if user_result_sorted == expected_result_sorted:
-                            return False, f"Query result has correct data but wrong row order. Check your ORDER BY clause."
-                        else:
-                            return False, f"Query result does not match expected output. Expected {expected_count} rows with different values or order."
+                # Provide more detailed error message for debugging
+                expected_count = fingerprint['row_count']
+                if outcome == 'row_count':
+                    user_count = len(user_result) if isinstance(user_result, list) else 1
+                    return False, f"Query result does not match expected output. Expected {expected_count} rows, got {user_count} rows."
+                elif outcome == 'wrong_order':
+                    return False, f"Query result has correct data but wrong row order. Check your ORDER BY clause."
+                else:
+                    return False, f"Query result does not match expected output. Expected {expected_count} rows with different values or order."
 
         except Exception as e:
             return False, f"Error validating query: {str(e)}"
@@ -870,11 +982,19 @@ class Challenge(models.Model):
 
     def get_supported_engines(self):
         """Get list of supported database engines for this challenge"""
+        from .sqlite_engine import is_sqlite_engine_enabled
+
         if self.supported_engines:
             # Filter out SQLite if it exists in the list
-            return [engine for engine in self.supported_engines if engine != 'sqlite']
-        # Default to MySQL and PostgreSQL (hosting service engines)
-        return ['mysql', 'postgresql']
+            engines = [engine for engine in self.supported_engines if engine != 'sqlite']
+        else:
+            # Default to MySQL and PostgreSQL (hosting service engines)
+            engines = ['mysql', 'postgresql']
+
+        # The in-memory SQLite engine is offered to every challenge as a practice mode
+        if is_sqlite_engine_enabled():
+            engines.append('sqlite')
+        return engines
 
     def supports_engine(self, engine):
         """Check if challenge supports a specific database engine"""
@@ -963,6 +1083,81 @@ class Challenge(models.Model):
                     cursor.execute(insert_sql, list(row.values()))
 
 
+class ChallengeDatabaseVersion(models.Model):
+    """
+    A persistent, fully loaded query database for one challenge dataset on one engine.
+    Keyed by the challenge content hash so edits produce a new version.
+    """
+    STATUS_CHOICES = [
+        ('building', 'Building'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='database_versions')
+    engine = models.CharField(max_length=20)
+    flag_id = models.PositiveSmallIntegerField(help_text="1 for run dataset, 2 for submit dataset")
+    content_hash = models.CharField(max_length=64)
+    database_name = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='building')
+    error_message = models.TextField(blank=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['challenge', 'engine', 'flag_id', 'content_hash']
+
+    def __str__(self):
+        return f"{self.database_name} ({self.engine}, {self.status})"
+
+
+class ChallengeQueryJob(models.Model):
+    """
+    A queued Run or Submit of a challenge query, executed by a query worker
+    process (see job_queue.py). result holds the JSON response for the page.
+    """
+    KIND_CHOICES = [
+        ('run', 'Run'),
+        ('submit', 'Submit'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+        ('timed_out', 'Timed out'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='challenge_query_jobs')
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='query_jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    engine = models.CharField(max_length=20)
+    query = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'challenge', 'kind', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.engine}, {self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status not in ('queued', 'running')
+
+
 class UserChallengeProgress(models.Model):
     """
     Track user progress on challenges.
@@ -1227,9 +1422,32 @@ class UserChallengeSubscription(models.Model):
 
 
 # Signal to automatically ensure column ordering when challenge tables are created
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 
+@receiver(post_save, sender=ChallengeTable)
+@receiver(post_delete, sender=ChallengeTable)
+def recompile_challenge_sql_on_table_change(sender, instance, **kwargs):
+    """
+    Recompile the challenge's execution artifacts when one of its tables changes.
+    Registered before the column-ordering receiver so that it runs on fresh artifacts.
+    """
+    challenge = Challenge.objects.filter(pk=instance.challenge_id).first()
+    if challenge is None:
+        return
+    try:
+        challenge.refresh_compiled_sql()
+    except Exception as e:
+        print(f"❌ Error compiling SQL for challenge {challenge.pk}: {str(e)}")
+        Challenge.objects.filter(pk=challenge.pk).update(compiled_sql={})
+        challenge.compiled_sql = {}
+
+    # Keep an already loaded challenge instance in sync (used by the receivers below)
+    if 'challenge' in instance._state.fields_cache:
+        instance.challenge.compiled_sql = challenge.compiled_sql
+
+
 @receiver(post_save, sender=ChallengeTable)
 def auto_apply_column_ordering_on_table_creation(sender, instance, created, **kwargs):
     """
@@ -1282,3 +1500,37 @@ def auto_apply_column_ordering_on_table_creation(sender, instance, created, **kw
         # Remove flag if it exists
         if hasattr(challenge, '_applying_column_ordering'):
             delattr(challenge, '_applying_column_ordering')
+
+
+@receiver(post_save, sender=Challenge)
+@receiver(post_save, sender=ChallengeTable)
+@receiver(post_delete, sender=ChallengeTable)
+def collect_stale_challenge_databases(sender, instance, **kwargs):
+    """
+    Drop persistent query databases that no longer match the edited challenge.
+    The next query builds a fresh version from the new content.
+    """
+    challenge_id = instance.pk if sender is Challenge else instance.challenge_id
+
+    def collect():
+        from .provisioning import collect_stale_template_databases
+
+        challenge = Challenge.objects.filter(pk=challenge_id).first()
+        if challenge is None or not challenge.database_versions.exists():
+            return
+        try:
+            collect_stale_template_databases(challenge)
+        except Exception as e:
+            print(f"❌ Error collecting stale databases for challenge {challenge_id}: {str(e)}")
+
+    transaction.on_commit(collect)
+
+
+@receiver(pre_delete, sender=Challenge)
+def drop_challenge_databases_on_delete(sender, instance, **kwargs):
+    """Drop persistent query databases before their challenge disappears"""
+    try:
+        from .provisioning import drop_challenge_template_databases
+        drop_challenge_template_databases(instance)
+    except Exception as e:
+        print(f"❌ Error dropping databases for challenge {instance.pk}: {str(e)}")
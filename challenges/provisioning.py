@@ -0,0 +1,403 @@
+"""
+Persistent, pre-loaded query databases for challenge execution.
+
+Instead of creating, loading and dropping a temporary database on every Run and
+Submit, each challenge dataset is loaded once per engine into a database keyed
+by the challenge content hash. Read-only queries run directly against that
+database inside a read-only transaction. Anything that writes gets a private
+database (a sandbox lease, on PostgreSQL a clone of the template from
+clone_pool.py, or the temporary database path in utils.py). Rolling back DML
+on the shared database is not enough: it does not undo AUTO_INCREMENT or
+sequence advances, so inserted ids would depend on who ran before, and its
+row locks would make concurrent students wait on each other.
+
+A template database holds a single dataset, so it also gets a view per table
+under the original table name that selects that dataset from the unique
+{table}_q{id} table. Queries that run here are executed as written; only the
+temporary database path still needs the query rewriter.
+"""
+
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# Bump when the layout of template databases changes; it is part of the
+# challenge content hash, so existing templates are rebuilt
+DATABASE_LAYOUT_VERSION = 2
+
+# A build that has not finished after this long is considered abandoned
+BUILD_TIMEOUT_SECONDS = 600
+
+# How long to keep using temporary databases after a template build failed
+FAILED_RETRY_SECONDS = 300
+
+# Only touch last_used_at this often to avoid a write on every query
+LAST_USED_UPDATE_SECONDS = 300
+
+READ_ONLY_PREFIXES = ('SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN')
+
+# Keywords that mean a statement may write, even if it starts with SELECT/WITH
+WRITE_KEYWORDS_PATTERN = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|REPLACE|MERGE|CREATE|ALTER|DROP|TRUNCATE|RENAME|'
+    r'GRANT|REVOKE|LOCK|UNLOCK|CALL|HANDLER|LOAD|INTO|COPY|SET|NEXTVAL|SETVAL)\b',
+    re.IGNORECASE
+)
+
+
+def is_template_execution_enabled():
+    """Check whether read-only queries should use persistent template databases"""
+    return getattr(settings, 'CHALLENGE_TEMPLATE_DATABASES_ENABLED', True)
+
+
+def is_read_only_query(statements):
+    """
+    Check if every statement only reads data and can safely run on a shared database.
+    Errs on the side of caution: anything that mentions a write keyword is treated as a write.
+    """
+    if not statements:
+        return False
+
+    for statement in statements:
+        statement_upper = statement.strip().upper()
+        if not statement_upper.startswith(READ_ONLY_PREFIXES):
+            return False
+        if WRITE_KEYWORDS_PATTERN.search(statement_upper):
+            return False
+
+    return True
+
+
+def get_template_database_name(challenge, flag_id, content_hash):
+    """Database name for a challenge dataset version (fits MySQL and PostgreSQL limits)"""
+    return f"challenge_{challenge.id}_v{content_hash[:12]}_d{flag_id}"
+
+
+def execute_on_template_database(challenge, flag_id, engine, schema_sql, dataset_sql, query, load_plan=None):
+    """
+    Execute a user query (string or ParsedQuery, using the original table names)
+    against the persistent database for this dataset.
+
+    Returns the usual result dict, or None when the query has to run in a
+    private database instead (anything that writes, or no template is available yet).
+    """
+    from editor.parsed_query import as_parsed_query
+
+    if not is_template_execution_enabled():
+        return None
+
+    # Unsaved challenges (e.g. form validation) have nothing to key a template on
+    if challenge.pk is None or challenge._state.adding:
+        return None
+
+    statements = as_parsed_query(query).statement_texts
+    if not is_read_only_query(statements):
+        return None
+
+    database_name = get_template_database(challenge, flag_id, engine, schema_sql, dataset_sql, load_plan)
+    if not database_name:
+        return None
+
+    if engine == 'mysql':
+        return _execute_mysql_on_template(database_name, statements)
+    elif engine == 'postgresql':
+        return _execute_postgresql_on_template(database_name, statements)
+    return None
+
+
+def get_template_database(challenge, flag_id, engine, schema_sql, dataset_sql, load_plan=None):
+    """
+    Return the name of a ready template database for this challenge dataset,
+    building it first if this worker is the one to claim the build.
+
+    Returns None while another worker is building it or after a recent failed build.
+    """
+    from .job_resources import track_resource, untrack_resource
+    from .models import ChallengeDatabaseVersion
+
+    compiled = challenge.get_compiled_sql()
+    content_hash = compiled['content_hash']
+    view_statements = compiled.get('dataset_views', {}).get(str(flag_id), ())
+    version, created = ChallengeDatabaseVersion.objects.get_or_create(
+        challenge=challenge,
+        engine=engine,
+        flag_id=flag_id,
+        content_hash=content_hash,
+        defaults={
+            'database_name': get_template_database_name(challenge, flag_id, content_hash),
+            'status': 'building',
+        }
+    )
+
+    if not created:
+        now = timezone.now()
+
+        if version.status == 'ready':
+            if not version.last_used_at or version.last_used_at < now - timedelta(seconds=LAST_USED_UPDATE_SECONDS):
+                ChallengeDatabaseVersion.objects.filter(pk=version.pk).update(last_used_at=now)
+            return version.database_name
+
+        if version.status == 'building':
+            retry_after = timedelta(seconds=BUILD_TIMEOUT_SECONDS)
+        else:
+            retry_after = timedelta(seconds=FAILED_RETRY_SECONDS)
+
+        if version.updated_at > now - retry_after:
+            return None
+
+        # Claim the rebuild; only one worker wins the conditional update
+        claimed = ChallengeDatabaseVersion.objects.filter(
+            pk=version.pk,
+            status=version.status,
+            updated_at=version.updated_at
+        ).update(status='building', updated_at=now)
+        if not claimed:
+            return None
+
+    # A query worker killed during the build has its claim reset (job_resources.py)
+    track_resource('template_build', engine, version.pk)
+    try:
+        build_template_database(engine, version.database_name, schema_sql, dataset_sql, load_plan, view_statements)
+    except Exception as e:
+        print(f"Failed to build template database {version.database_name}: {e}")
+        ChallengeDatabaseVersion.objects.filter(pk=version.pk).update(
+            status='failed',
+            error_message=str(e),
+            updated_at=timezone.now()
+        )
+        untrack_resource('template_build', engine, version.pk)
+        return None
+
+    ChallengeDatabaseVersion.objects.filter(pk=version.pk).update(
+        status='ready',
+        error_message='',
+        last_used_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    untrack_resource('template_build', engine, version.pk)
+
+    # A new version is live, so older versions of this challenge can go
+    collect_stale_template_databases(challenge)
+
+    return version.database_name
+
+
+def build_template_database(engine, database_name, schema_sql, dataset_sql, load_plan=None, view_statements=()):
+    """
+    Create (or recreate) a database and load the challenge schema and dataset into it,
+    followed by the dataset views (compiled_sql.build_dataset_view_statements)
+    """
+    from .connection_pool import close_pool, get_connection
+    from .utils import _load_challenge_sql
+
+    if engine == 'mysql':
+        close_pool('mysql', database_name)
+        conn = get_connection('mysql', '')
+        try:
+            cursor = conn.cursor(buffered=True)
+            cursor.execute(f"DROP DATABASE IF EXISTS `{database_name}`")
+            cursor.execute(f"CREATE DATABASE `{database_name}`")
+            cursor.execute(f"USE `{database_name}`")
+            _load_challenge_sql(cursor, 'mysql', schema_sql, dataset_sql, load_plan)
+            for statement in view_statements:
+                cursor.execute(statement)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    elif engine == 'postgresql':
+        from .clone_pool import get_clone_source_name
+        from .connection_pool import connect_direct
+
+        drop_template_database('postgresql', database_name)
+
+        # Load an untouched clone source first. PostgreSQL can only copy a database
+        # nobody is connected to, so queries never use it directly.
+        source_name = get_clone_source_name(database_name)
+        admin_conn = get_connection('postgresql')
+        try:
+            admin_conn.autocommit = True
+            admin_cursor = admin_conn.cursor()
+            admin_cursor.execute(f"CREATE DATABASE {source_name}")
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+
+        conn = connect_direct('postgresql', source_name)
+        try:
+            cursor = conn.cursor()
+            _load_challenge_sql(cursor, 'postgresql', schema_sql, dataset_sql, load_plan)
+            for statement in view_statements:
+                cursor.execute(statement)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        # The query database itself is a file-level copy of the source
+        admin_conn = get_connection('postgresql')
+        try:
+            admin_conn.autocommit = True
+            admin_cursor = admin_conn.cursor()
+            admin_cursor.execute(f"CREATE DATABASE {database_name} TEMPLATE {source_name}")
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+
+    else:
+        raise ValueError(f"Unsupported engine: {engine}")
+
+
+def drop_template_database(engine, database_name):
+    """Drop a template database if it exists"""
+    from .connection_pool import close_pool, get_connection
+
+    # Pooled connections to the database would block (PostgreSQL) or outlive the drop
+    close_pool(engine, database_name)
+
+    if engine == 'mysql':
+        conn = get_connection('mysql', '')
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP DATABASE IF EXISTS `{database_name}`")
+            cursor.close()
+        finally:
+            conn.close()
+
+    elif engine == 'postgresql':
+        from .clone_pool import get_clone_pool, get_clone_source_name
+
+        source_name = get_clone_source_name(database_name)
+        clone_pool = get_clone_pool()
+        clone_pool.discard_source(source_name)
+
+        try:
+            conn = get_connection('postgresql')
+            try:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"DROP DATABASE IF EXISTS {database_name}")
+                cursor.execute(f"DROP DATABASE IF EXISTS {source_name}")
+                cursor.close()
+            finally:
+                conn.close()
+        finally:
+            clone_pool.restore_source(source_name)
+
+    else:
+        raise ValueError(f"Unsupported engine: {engine}")
+
+
+def collect_stale_template_databases(challenge=None, drop_all=False):
+    """
+    Drop template databases that no longer match their challenge's content.
+
+    Args:
+        challenge: Only collect versions of this challenge (default: all challenges)
+        drop_all: Drop every version, including current ones
+
+    Returns:
+        Number of databases dropped
+    """
+    from .models import ChallengeDatabaseVersion
+
+    versions = ChallengeDatabaseVersion.objects.select_related('challenge')
+    if challenge is not None:
+        versions = versions.filter(challenge=challenge)
+
+    current_hashes = {}
+    dropped = 0
+
+    for version in versions:
+        if not drop_all:
+            if version.challenge_id not in current_hashes:
+                current_hashes[version.challenge_id] = version.challenge.get_content_hash()
+            if version.content_hash == current_hashes[version.challenge_id]:
+                continue
+
+        if _drop_version(version):
+            dropped += 1
+
+    return dropped
+
+
+def drop_challenge_template_databases(challenge):
+    """Drop every template database of a challenge (used before the challenge is deleted)"""
+    from .models import ChallengeDatabaseVersion
+
+    for version in ChallengeDatabaseVersion.objects.filter(challenge=challenge):
+        _drop_version(version)
+
+
+def _drop_version(version):
+    """Drop a version's database and forget about it. Keeps the row if the drop fails."""
+    try:
+        drop_template_database(version.engine, version.database_name)
+    except Exception as e:
+        print(f"Could not drop template database {version.database_name}: {e}")
+        return False
+
+    version.delete()
+    return True
+
+
+def _execute_mysql_on_template(database_name, statements):
+    """Run read-only statements on a MySQL template database in a READ ONLY transaction"""
+    from .connection_pool import get_connection
+    from editor.query_governor import describe_error
+    from .utils import _collect_statement_results
+
+    conn = None
+    try:
+        conn = get_connection('mysql', database_name)
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("START TRANSACTION READ ONLY")
+        result = _collect_statement_results(conn, cursor, statements, 'mysql', commit_modifications=False)
+        cursor.close()
+        return result
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'MySQL Error: {describe_error("mysql", e)}'
+        }
+    finally:
+        if conn is not None:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+
+
+def _execute_postgresql_on_template(database_name, statements):
+    """Run read-only statements on a PostgreSQL template database in a READ ONLY transaction"""
+    import psycopg2.extras
+    from .connection_pool import get_connection
+    from editor.query_governor import describe_error
+    from .utils import _collect_statement_results
+
+    conn = None
+    try:
+        conn = get_connection('postgresql', database_name)
+        conn.set_session(readonly=True)
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        result = _collect_statement_results(conn, cursor, statements, 'postgresql', commit_modifications=False)
+        cursor.close()
+        return result
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'PostgreSQL Error: {describe_error("postgresql", e)}'
+        }
+    finally:
+        if conn is not None:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
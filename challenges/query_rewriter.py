@@ -0,0 +1,107 @@
+"""
+Rewriting of student queries for the dual-dataset tables.
+
+Challenge tables are stored once per challenge under unique names
+({table}_q{challenge_id}) and hold both datasets, told apart by flag_id. The
+rewriter walks the table references that the ParsedQuery found in a single
+pass over the tokens and replaces each one in place:
+
+- a table scanned by a query (FROM, JOIN or a comma join, at any depth, in
+  CTEs, subqueries and every branch of a UNION) becomes a derived table that
+  selects the requested dataset, aliased to the original name unless the
+  query gave it an alias:
+      FROM employees e  ->  FROM (SELECT * FROM employees_q5 WHERE flag_id = 1) e
+  Both MySQL and PostgreSQL merge such derived tables into the outer query,
+  so the flag_id predicate still reaches the table's indexes.
+- the target of INSERT, UPDATE, DELETE and DDL is renamed to the unique name.
+
+Where MySQL does not accept a derived table, a scanned table is only renamed
+(aliased to its original name): before an index hint (FROM t USE INDEX (...))
+and in the table list of a multi-table DELETE (DELETE t1 FROM t1 JOIN t2,
+DELETE FROM t1 USING t1 JOIN t2), whose target names are left as written.
+Rewritten queries run on private databases that hold only the requested
+dataset, so the rename still reads the right rows. Schema-qualified names
+(public.employees) are matched by their table name and lose the qualifier,
+since the query runs in a database of its own; names in the system schemas
+are left alone, as are names that refer to a CTE. Rewritten queries are cached
+per compiled challenge version, dataset and query text.
+"""
+
+from editor.parsed_query import as_parsed_query
+
+
+MAX_CACHED_REWRITES = 512
+
+# Schemas whose tables are never challenge tables
+SYSTEM_SCHEMAS = frozenset(['information_schema', 'pg_catalog', 'mysql', 'performance_schema', 'sys'])
+
+_rewrites = {}
+
+
+def rewrite_query(parsed_query, table_mapping, flag_id, has_flag_id=True):
+    """
+    Rewrite a ParsedQuery for one dataset. table_mapping maps original table
+    names to unique table names. Without flag_id columns tables are only renamed.
+    """
+    mapping = {name.lower(): unique_name for name, unique_name in table_mapping.items()}
+    query = parsed_query.query
+
+    parts = []
+    position = 0
+    for reference in parsed_query.table_references:
+        if reference.is_cte or reference.context == 'delete_target':
+            continue
+        schema, _, table_name = reference.name.rpartition('.')
+        if schema.lower() in SYSTEM_SCHEMAS:
+            continue
+        unique_name = mapping.get(table_name.lower())
+        if unique_name is None:
+            continue
+
+        original = query[reference.start:reference.end]
+        if schema:
+            # Columns can still be qualified with the table name
+            original = table_name
+        if reference.context == 'delete_join' or (reference.context == 'scan' and reference.has_index_hint):
+            # MySQL takes no derived table here
+            replacement = unique_name if reference.has_alias else f'{unique_name} {original}'
+        elif reference.context == 'scan':
+            if has_flag_id:
+                replacement = f'(SELECT * FROM {unique_name} WHERE flag_id = {int(flag_id)})'
+            else:
+                replacement = unique_name
+            if not reference.has_alias:
+                # Keep qualified column references (employees.name) working
+                replacement = f'{replacement} {original}'
+        elif reference.context == 'update' and not reference.has_alias:
+            replacement = f'{unique_name} AS {original}'
+        else:
+            replacement = unique_name
+
+        parts.append(query[position:reference.start])
+        parts.append(replacement)
+        position = reference.end
+
+    if not parts:
+        return query
+    parts.append(query[position:])
+    return ''.join(parts)
+
+
+def rewrite_challenge_query(query, challenge, flag_id, compiled=None):
+    """
+    Rewrite a query string or ParsedQuery for one dataset of a challenge,
+    using (and caching by) the challenge's compiled SQL version.
+    """
+    parsed_query = as_parsed_query(query)
+    if compiled is None:
+        compiled = challenge.get_compiled_sql()
+
+    key = (compiled.get('version'), flag_id, parsed_query.query)
+    rewritten = _rewrites.get(key)
+    if rewritten is None:
+        rewritten = rewrite_query(parsed_query, compiled['table_mapping'], flag_id, compiled['has_flag_id'])
+        if len(_rewrites) >= MAX_CACHED_REWRITES:
+            _rewrites.clear()
+        _rewrites[key] = rewritten
+    return rewritten
@@ -0,0 +1,131 @@
+"""
+Result cache for challenge query runs.
+
+Students re-run the same queries against the same dataset all the time. Results
+of deterministic, read-only queries are cached in the 'query_results' Django
+cache (Redis when REDIS_URL is set, local memory otherwise) under a key made
+of the challenge content hash, dataset flag, engine and a fingerprint of the
+query text. Editing a challenge changes its content hash, so old entries are
+never read again and simply expire.
+
+Only Run (flag_id 1) results are cached. Submit results are graded, and
+grading compares column names, so they are always computed afresh.
+"""
+
+import hashlib
+import re
+
+from django.conf import settings
+
+
+CACHE_ALIAS = 'query_results'
+
+# Functions whose value depends on time, randomness or session state
+NON_DETERMINISTIC_WORDS = frozenset("""
+    NOW CURDATE CURTIME SYSDATE CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP
+    LOCALTIME LOCALTIMESTAMP UTC_DATE UTC_TIME UTC_TIMESTAMP UNIX_TIMESTAMP
+    CLOCK_TIMESTAMP STATEMENT_TIMESTAMP TRANSACTION_TIMESTAMP TIMEOFDAY
+    RAND RANDOM UUID UUID_SHORT GEN_RANDOM_UUID SLEEP PG_SLEEP
+    CONNECTION_ID PG_BACKEND_PID TXID_CURRENT LAST_INSERT_ID ROW_COUNT FOUND_ROWS
+    USER CURRENT_USER SESSION_USER SYSTEM_USER DATABASE SCHEMA VERSION
+""".split())
+
+# Whitespace and semicolons after the last statement
+TRAILING_PATTERN = re.compile(r'[\s;]+$')
+
+
+def is_result_cache_enabled():
+    """Check whether challenge query results should be cached"""
+    return getattr(settings, 'CHALLENGE_RESULT_CACHE_ENABLED', True)
+
+
+def get_query_fingerprint(query):
+    """
+    A comment-free query as written, without surrounding whitespace and
+    trailing semicolons. Case and inner whitespace are kept: MySQL names an
+    unaliased column after its expression exactly as typed (count(*) and
+    COUNT(*) are different columns).
+    """
+    return TRAILING_PATTERN.sub('', query.strip())
+
+
+def is_cacheable_query(query):
+    """
+    Only deterministic, read-only SELECT/WITH queries are cached.
+    query may be a string or a ParsedQuery.
+    """
+    from editor.parsed_query import as_parsed_query
+    from .provisioning import is_read_only_query
+
+    parsed_query = as_parsed_query(query)
+    if parsed_query.is_empty or not is_read_only_query(parsed_query.statement_texts):
+        return False
+
+    if any(kind not in ('SELECT', 'WITH') for kind in parsed_query.statement_kinds):
+        return False
+
+    # Only words are checked, so a string like 'now' does not disable caching
+    previous = None
+    for token in parsed_query.tokens:
+        if token.kind == 'word' and token.text.upper() in NON_DETERMINISTIC_WORDS:
+            return False
+        if token.text == '@' and previous == '@':
+            return False
+        previous = token.text
+
+    return True
+
+
+def get_cache_key(challenge, flag_id, engine, query):
+    """Cache key for a query run on one dataset of one challenge version"""
+    from editor.parsed_query import as_parsed_query
+
+    fingerprint = get_query_fingerprint(as_parsed_query(query).clean_query)
+    fingerprint = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+    return f"challenge_result:{challenge.get_compiled_sql()['content_hash']}:{flag_id}:{engine.lower()}:{fingerprint}"
+
+
+def get_cached_result(challenge, flag_id, engine, query):
+    """
+    Return (cache_key, cached result or None). cache_key is None when the query
+    must not be cached at all.
+    """
+    from django.core.cache import caches
+
+    if not is_result_cache_enabled():
+        return None, None
+
+    # Submit results are graded on their column names; never serve them from the cache
+    if flag_id != 1:
+        return None, None
+
+    # Unsaved challenges (e.g. form validation) have no stable content hash
+    if challenge.pk is None or challenge._state.adding:
+        return None, None
+
+    if not is_cacheable_query(query):
+        return None, None
+
+    cache_key = get_cache_key(challenge, flag_id, engine, query)
+    try:
+        result = caches[CACHE_ALIAS].get(cache_key)
+    except Exception as e:
+        print(f"Query result cache unavailable: {e}")
+        return None, None
+
+    if result is not None:
+        result['cached'] = True
+    return cache_key, result
+
+
+def store_result(cache_key, result):
+    """Cache a successful result that was produced by the requested engine"""
+    from django.core.cache import caches
+
+    if cache_key is None or not result.get('success') or result.get('fallback_used'):
+        return
+
+    try:
+        caches[CACHE_ALIAS].set(cache_key, result, getattr(settings, 'CHALLENGE_RESULT_CACHE_TIMEOUT', 300))
+    except Exception as e:
+        print(f"Could not cache query result: {e}")
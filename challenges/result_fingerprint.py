@@ -0,0 +1,165 @@
+"""
+Canonical fingerprints of query results for grading.
+
+Grading used to normalize the user's rows and the stored expected result into
+new dicts on every submit, and to sort both by json.dumps() to tell a wrong
+row order from wrong data. Instead, the expected result is fingerprinted once
+when it is stored (Challenge.expected_result_fingerprint) and the user's rows
+are hashed one at a time against it:
+
+- every value is canonicalised per type with the same rules as
+  normalize_json_result (numbers compare by value, so 5, 5.0 and Decimal('5')
+  are equal; strings are stripped; dates use their ISO format), and the
+  flag_id column is ignored
+- each row is hashed from its column names and canonical values, so column
+  order within a row does not matter
+- the ordered digest chains the row hashes in order; per-row prefixes let the
+  comparison stop at the first row that differs
+- the multiset digest is the sum of the row hashes, which does not depend on
+  the row order and answers "right rows, wrong order" in one O(n) pass
+
+Bump FINGERPRINT_VERSION whenever the canonicalisation changes; stored
+fingerprints from an older version are rebuilt on first use.
+"""
+
+import datetime
+import decimal
+import hashlib
+import math
+
+
+FINGERPRINT_VERSION = 1
+
+# Length in hex characters of the row hash prefixes kept for early exit
+ROW_PREFIX_LENGTH = 16
+
+# The multiset digest is the sum of the row hashes modulo this value
+_MULTISET_MODULUS = 1 << 256
+
+_IGNORED_COLUMN = 'flag_id'
+
+
+def canonical_value(value):
+    """
+    Encode a value as a type-tagged string: equal encodings mean the values
+    are equal under normalize_json_result.
+    """
+    if value is None:
+        return 'z'
+    if isinstance(value, bool):
+        # bool(value) == int(value) in the old comparison
+        return f'n{int(value)}'
+    if isinstance(value, int):
+        return f'n{value}'
+    if isinstance(value, (float, decimal.Decimal)):
+        number = round(float(value), 10)
+        if math.isfinite(number) and number.is_integer():
+            return f'n{int(number)}'
+        return f'n{number!r}'
+
+    if isinstance(value, str):
+        text = value.strip()
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        text = value.isoformat()
+    elif isinstance(value, bytes):
+        text = value.decode('utf-8', errors='ignore')
+    else:
+        text = str(value)
+    # Length-prefixed so that no text can run into the next value
+    return f's{len(text)}:{text}'
+
+
+def _row_columns(row):
+    return sorted(key for key in row if key.lower() != _IGNORED_COLUMN)
+
+
+def _row_digest(row, columns):
+    """Hash one row; columns are the row's sorted column names"""
+    if isinstance(row, dict):
+        parts = [f'{len(column)}:{column}={canonical_value(row[column])}' for column in columns]
+        encoded = '\x1e'.join(parts)
+    else:
+        encoded = canonical_value(row)
+    return hashlib.sha256(encoded.encode('utf-8')).digest()
+
+
+def iter_row_digests(rows):
+    """Yield the hash of each row, sorting the column names once per column set"""
+    keys = None
+    columns = None
+    for row in rows:
+        if isinstance(row, dict) and row.keys() != keys:
+            keys = row.keys()
+            columns = _row_columns(row)
+        yield _row_digest(row, columns)
+
+
+def fingerprint_result(result):
+    """Build the stored fingerprint of an expected result"""
+    rows = result if isinstance(result, list) else [result]
+
+    ordered = hashlib.sha256()
+    multiset = 0
+    prefixes = []
+    for digest in iter_row_digests(rows):
+        ordered.update(digest)
+        multiset = (multiset + int.from_bytes(digest, 'big')) % _MULTISET_MODULUS
+        prefixes.append(digest.hex()[:ROW_PREFIX_LENGTH])
+
+    first_row = rows[0] if rows else None
+    return {
+        'version': FINGERPRINT_VERSION,
+        'row_count': len(rows),
+        'columns': _row_columns(first_row) if isinstance(first_row, dict) else [],
+        'ordered': ordered.hexdigest(),
+        'multiset': f'{multiset:064x}',
+        'row_prefixes': prefixes,
+    }
+
+
+def is_current(fingerprint, expected_result):
+    """Check that a stored fingerprint was built by this version for this result"""
+    expected_count = len(expected_result) if isinstance(expected_result, list) else 1
+    return (
+        bool(fingerprint)
+        and fingerprint.get('version') == FINGERPRINT_VERSION
+        and fingerprint.get('row_count') == expected_count
+    )
+
+
+def compare_to_fingerprint(rows, fingerprint):
+    """
+    Compare result rows with an expected result fingerprint.
+
+    Returns one of:
+        'match'        same rows in the same order
+        'row_count'    a different number of rows
+        'wrong_order'  the same rows in a different order
+        'mismatch'     different columns or values
+    """
+    rows = rows if isinstance(rows, list) else [rows]
+    if len(rows) != fingerprint['row_count']:
+        return 'row_count'
+
+    first_row = rows[0] if rows else None
+    if isinstance(first_row, dict) and _row_columns(first_row) != fingerprint['columns']:
+        return 'mismatch'
+
+    prefixes = fingerprint['row_prefixes']
+    ordered = hashlib.sha256()
+    in_order = True
+    multiset = 0
+    for index, digest in enumerate(iter_row_digests(rows)):
+        if in_order:
+            if digest.hex()[:ROW_PREFIX_LENGTH] == prefixes[index]:
+                ordered.update(digest)
+            else:
+                # Stop comparing the order; only the multiset can still match
+                in_order = False
+        multiset = (multiset + int.from_bytes(digest, 'big')) % _MULTISET_MODULUS
+
+    if in_order and ordered.hexdigest() == fingerprint['ordered']:
+        return 'match'
+    if f'{multiset:064x}' == fingerprint['multiset']:
+        return 'wrong_order'
+    return 'mismatch'
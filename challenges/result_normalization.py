@@ -0,0 +1,235 @@
+"""
+Normalization of query results for comparison between MySQL and PostgreSQL.
+
+normalize_json_result used to call an isinstance chain for every value, build
+each row dict key by key, and sort unordered results by
+json.dumps(row, sort_keys=True). Here:
+
+- values are normalized through a dispatch table keyed by their exact type.
+  The table holds C-level callables where one exists (int, bool, str.strip,
+  date.isoformat, round with ndigits=10), looked up for a whole row with
+  chained map() calls. Subclasses are resolved
+  through the isinstance chain once and added to the table.
+- rounding a float and formatting a date are the expensive conversions, and
+  result columns repeat values, so within one call they are memoized per
+  distinct value
+- results whose rows all have the same columns in the same order (every
+  query result) have the kept columns (all but flag_id) worked out once and
+  are read with a single itemgetter per row
+- unordered results are sorted by tuples of the normalized values in column
+  name order. Only when a column mixes NULLs, numbers and text (which do not
+  compare) are the values tagged by kind, giving the same order.
+
+The normalization rules are the ones result_fingerprint.canonical_value
+relies on: booleans and integers are kept, floats and Decimals become floats
+rounded to 10 places, dates use their ISO format, strings are stripped, bytes
+are decoded and anything else becomes its str(). Rounding stays with Python's
+round(), which is correctly rounded; a vectorized np.round scales the value
+first and can disagree with it in the last digit.
+"""
+
+import datetime
+import decimal
+from functools import partial
+from itertools import repeat
+from operator import itemgetter
+
+
+IGNORED_COLUMN = 'flag_id'
+
+# Sort tags for normalized values
+_NULL, _NUMBER, _TEXT = 0, 1, 2
+
+# C-level function that returns None for any argument
+_none = {}.get
+
+_round_float = partial(round, ndigits=10)
+
+
+def _round_number(value):
+    return round(float(value), 10)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _strip(value):
+    return value.strip()
+
+
+def _decode(value):
+    return value.decode('utf-8', errors='ignore')
+
+
+def _resolve_normalizer(value_type):
+    """Normalizer for a type missing from NORMALIZERS (subclasses and other types)"""
+    if issubclass(value_type, bool):
+        return bool
+    if issubclass(value_type, int):
+        return int
+    if issubclass(value_type, (float, decimal.Decimal)):
+        return _round_number
+    if issubclass(value_type, (datetime.datetime, datetime.date)):
+        return _isoformat
+    if issubclass(value_type, str):
+        return _strip
+    if issubclass(value_type, bytes):
+        return _decode
+    return str
+
+
+class _NormalizerTable(dict):
+    """{type: normalizer}; types looked up for the first time are resolved and kept"""
+
+    def __missing__(self, value_type):
+        normalizer = self[value_type] = _resolve_normalizer(value_type)
+        return normalizer
+
+
+NORMALIZERS = _NormalizerTable({
+    type(None): _none,
+    bool: bool,
+    int: int,
+    float: _round_float,
+    decimal.Decimal: _round_number,
+    datetime.datetime: datetime.datetime.isoformat,
+    datetime.date: datetime.date.isoformat,
+    str: str.strip,
+    bytes: _decode,
+})
+
+
+# Types whose normalized values are memoized within one normalize_json_result call
+MEMOIZED_TYPES = (float, decimal.Decimal, datetime.datetime, datetime.date)
+
+
+class _Memo(dict):
+    """{value: normalized value} for one type; lookups of new values compute them"""
+
+    __slots__ = ('normalizer',)
+
+    def __init__(self, normalizer):
+        super().__init__()
+        self.normalizer = normalizer
+
+    def __missing__(self, value):
+        normalized = self[value] = self.normalizer(value)
+        return normalized
+
+
+class _CallNormalizers(dict):
+    """Dispatch table for one call: NORMALIZERS with the memoized types wrapped"""
+
+    def __init__(self):
+        super().__init__(NORMALIZERS)
+        for value_type in MEMOIZED_TYPES:
+            self[value_type] = _Memo(NORMALIZERS[value_type]).__getitem__
+
+    def __missing__(self, value_type):
+        normalizer = self[value_type] = NORMALIZERS[value_type]
+        return normalizer
+
+
+def normalize_value(value):
+    """Normalize one value for cross-database comparison"""
+    return NORMALIZERS[value.__class__](value)
+
+
+def _normalize_values(values, normalizer):
+    """Normalize a tuple of values; normalizer maps a type to its normalizer"""
+    # operator.call would avoid the generator frame, but needs Python 3.11
+    return tuple(convert(value) for convert, value in zip(map(normalizer, map(type, values)), values))
+
+
+def _value_sort_key(value):
+    if value is None:
+        return (_NULL, 0)
+    if value.__class__ is str:
+        return (_TEXT, value)
+    return (_NUMBER, value)
+
+
+def _canonical_order(keys):
+    """Indices that sort the rows whose sort keys are given"""
+    try:
+        return sorted(range(len(keys)), key=keys.__getitem__)
+    except TypeError:
+        # A column mixes NULLs, numbers and text: compare (kind, value) instead
+        tagged = [tuple(map(_value_sort_key, key)) for key in keys]
+        return sorted(range(len(keys)), key=tagged.__getitem__)
+
+
+def _row_getter(columns):
+    """Callable returning a row's values for columns as a tuple"""
+    if len(columns) == 1:
+        column = columns[0]
+        return lambda row: (row[column],)
+    return itemgetter(*columns)
+
+
+def _normalize_uniform_rows(rows, layout, preserve_order):
+    """Normalize dict rows that all have the same keys in the same order"""
+    columns = tuple(key for key in layout if key.lower() != IGNORED_COLUMN)
+    if not columns:
+        return [{} for _ in rows]
+
+    normalizer = _CallNormalizers().__getitem__
+    values = [_normalize_values(row_values, normalizer) for row_values in map(_row_getter(columns), rows)]
+    normalized = list(map(dict, map(zip, repeat(columns), values)))
+    if preserve_order:
+        return normalized
+
+    sorted_columns = tuple(sorted(columns))
+    if sorted_columns != columns:
+        positions = tuple(columns.index(column) for column in sorted_columns)
+        values = list(map(_row_getter(positions), values))
+    return list(map(normalized.__getitem__, _canonical_order(values)))
+
+
+def _normalize_rows(rows, preserve_order):
+    """Normalize rows with different column layouts, or scalar rows"""
+    normalizer = _CallNormalizers().__getitem__
+    normalized = []
+    keys = []
+    layout = None
+    columns = ()
+    sorted_columns = ()
+
+    for row in rows:
+        if not isinstance(row, dict):
+            value = normalizer(row.__class__)(row)
+            normalized.append(value)
+            keys.append((0, (), (_value_sort_key(value),)))
+            continue
+
+        row_layout = tuple(row)
+        if row_layout != layout:
+            layout = row_layout
+            columns = tuple(key for key in row_layout if key.lower() != IGNORED_COLUMN)
+            sorted_columns = tuple(sorted(columns))
+
+        normalized_row = dict(zip(columns, _normalize_values(tuple(row[column] for column in columns), normalizer)))
+        normalized.append(normalized_row)
+        keys.append((1, sorted_columns, tuple(_value_sort_key(normalized_row[column]) for column in sorted_columns)))
+
+    if preserve_order:
+        return normalized
+    return [normalized[index] for index in sorted(range(len(keys)), key=keys.__getitem__)]
+
+
+def normalize_json_result(result, preserve_order=False):
+    """
+    Normalize a query result: a list of rows (dicts, or scalars) or a single
+    value. Dict rows keep their column order without the flag_id column.
+    Unless preserve_order is set, the rows are sorted into a canonical order so
+    results from engines that return rows in different orders compare equal.
+    """
+    if not isinstance(result, list):
+        return normalize_value(result)
+
+    if result and all(map(isinstance, result, repeat(dict))):
+        layout = tuple(result[0])
+        if all(map(layout.__eq__, map(tuple, result))):
+            return _normalize_uniform_rows(result, layout, preserve_order)
+    return _normalize_rows(result, preserve_order)
@@ -0,0 +1,674 @@
+"""
+Reusable sandbox databases for queries that need a private database.
+
+Schema changes and other queries that cannot run on the shared template
+database used to get a temporary database: CREATE DATABASE, load the schema
+and dataset, run the query, DROP DATABASE. With CHALLENGE_SANDBOX_POOL_ENABLED
+each worker process instead keeps up to CHALLENGE_SANDBOX_POOL_SIZE sandbox
+databases per engine, created once and leased to one query at a time through
+DatabaseEngineManager.lease_sandbox / release_sandbox:
+
+- a sandbox remembers which challenge dataset version it holds; a lease
+  prefers a clean sandbox that already holds the requested dataset and
+  otherwise reloads a free one (tables are replaced, the database is kept)
+- when a lease is released, its statements are classified (classify_changes)
+  and a background thread recycles only what they touched: tables whose rows
+  changed are truncated and reloaded, tables whose definition changed are
+  recreated and tables the user created are dropped. Statements the
+  classification does not understand reload the whole sandbox, and so does
+  any change when the schema or the query declares foreign keys with
+  referential actions (ON DELETE/UPDATE CASCADE, SET NULL, SET DEFAULT) or
+  triggers, which change tables the statements do not name
+- a lease not released within CHALLENGE_SANDBOX_LEASE_SECONDS is counted as
+  leaked and reclaimed: its connection is terminated on the server and the
+  sandbox fully reloaded. A sandbox whose connection cannot be terminated is
+  retired instead of being reloaded under a query that may still be running
+- when no sandbox frees up within CHALLENGE_SANDBOX_CHECKOUT_TIMEOUT the
+  caller falls back to a temporary database
+
+get_sandbox_pool_stats() reports pool sizes and recycle counters.
+"""
+
+import atexit
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+
+
+# Matches databases created by this module (see SandboxPool._new_sandbox_name)
+SANDBOX_NAME_PATTERN = re.compile(r'^challenge_sandbox_[0-9a-f]{8}_\d+$')
+
+# Statements that only read, unless they write INTO / UPDATE / DELETE somewhere
+READ_KINDS = frozenset(['SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN', 'VALUES', 'TABLE'])
+
+# Statements that change rows of the tables they name
+DATA_KINDS = frozenset(['INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'TRUNCATE'])
+
+# Statements that change table definitions
+SCHEMA_KINDS = frozenset(['CREATE', 'ALTER', 'DROP', 'RENAME'])
+
+# Statements that change nothing that outlives the connection
+TRANSACTION_KINDS = frozenset(['BEGIN', 'START', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE'])
+
+_WRITE_CONTEXTS = frozenset(['into', 'update', 'delete'])
+
+# Schema features whose effects reach tables a statement does not name
+SIDE_EFFECT_PATTERN = re.compile(
+    r'\bON\s+(?:DELETE|UPDATE)\s+(?:CASCADE|SET\s+NULL|SET\s+DEFAULT)\b|\bTRIGGER\b',
+    re.IGNORECASE
+)
+
+# How long to wait for the connection of a leaked lease to go away
+TERMINATE_WAIT_SECONDS = 5
+
+MAX_CACHED_TABLE_PLANS = 64
+
+# data_tables: tables whose rows may have changed; schema_tables: tables whose
+# definition may have changed; full_reset: the whole sandbox has to be reloaded
+SandboxChanges = namedtuple('SandboxChanges', ['data_tables', 'schema_tables', 'full_reset'])
+
+NO_CHANGES = SandboxChanges(frozenset(), frozenset(), False)
+FULL_RESET = SandboxChanges(frozenset(), frozenset(), True)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_table_plans = {}
+
+
+def is_sandbox_pool_enabled():
+    """Check whether private databases are leased from the sandbox pool"""
+    return getattr(settings, 'CHALLENGE_SANDBOX_POOL_ENABLED', False)
+
+
+def _table_key(name):
+    return name.strip('`"').lower()
+
+
+def classify_changes(query):
+    """
+    Work out what a (processed) query can have changed in a sandbox.
+    Returns a SandboxChanges.
+    """
+    from editor.parsed_query import as_parsed_query, parse_query
+
+    data_tables = set()
+    schema_tables = set()
+    for text in as_parsed_query(query).statement_texts:
+        statement = parse_query(text)
+        if not statement.statement_kinds:
+            continue
+        kind = statement.statement_kinds[0]
+        references = [reference for reference in statement.table_references if not reference.is_cte]
+
+        if kind in TRANSACTION_KINDS:
+            continue
+        if kind in READ_KINDS:
+            if any(reference.context in _WRITE_CONTEXTS for reference in references):
+                # Multi-table writes may change any table they name
+                data_tables.update(_table_key(reference.name) for reference in references)
+            continue
+        if SIDE_EFFECT_PATTERN.search(text):
+            # Cascading foreign keys or triggers the user added
+            return FULL_RESET
+        if kind in DATA_KINDS:
+            data_tables.update(_table_key(reference.name) for reference in references)
+            continue
+        if kind in SCHEMA_KINDS:
+            named = [reference for reference in references if reference.context == 'table']
+            if not named:
+                # Indexes, views, functions, ...
+                return FULL_RESET
+            schema_tables.update(_table_key(reference.name) for reference in named)
+            continue
+        return FULL_RESET
+
+    if not data_tables and not schema_tables:
+        return NO_CHANGES
+    return SandboxChanges(frozenset(data_tables), frozenset(schema_tables), False)
+
+
+def get_table_plan(compiled, engine, flag_id):
+    """
+    Split the load plan of a dataset by table: an ordered dict of table ->
+    schema statements, and the dataset operations as (table, operation) pairs
+    in load order. Returns None if some statement cannot be tied to one table,
+    or if the schema has cascading foreign keys or triggers: a change to one
+    table can then change others, so the sandbox is always fully reloaded.
+    """
+    from editor.parsed_query import parse_query
+    from .compiled_sql import get_load_plan
+
+    key = (compiled.get('version'), engine, flag_id)
+    if key in _table_plans:
+        return _table_plans[key]
+
+    schema_statements, operations = get_load_plan(compiled, engine, flag_id)
+    plan = None
+    tables = {}
+    table_operations = []
+    for statement in schema_statements:
+        if SIDE_EFFECT_PATTERN.search(statement):
+            break
+        names = parse_query(statement).tables
+        if len(names) != 1:
+            break
+        tables.setdefault(_table_key(names[0]), []).append(statement)
+    else:
+        for operation in operations:
+            if operation[0] == 'sql':
+                names = parse_query(operation[1]).tables
+                if len(names) != 1:
+                    break
+                table = names[0]
+            else:
+                table = operation[1]
+            table_operations.append((_table_key(table), operation))
+        else:
+            plan = (tables, table_operations)
+
+    if len(_table_plans) >= MAX_CACHED_TABLE_PLANS:
+        _table_plans.clear()
+    _table_plans[key] = plan
+    return plan
+
+
+class Sandbox:
+    """One pooled database and what it holds"""
+
+    def __init__(self, name):
+        self.name = name
+        self.created = False
+        self.state = 'leased'  # 'free', 'leased', 'recycling' or 'retired'
+        self.compiled = None
+        self.flag_id = None
+        self.changes = NO_CHANGES
+        self.lease_id = None
+        self.leased_by = None
+        self.backend_id = None  # server-side id of the lease's connection
+        self.stale_backend_id = None  # connection of a reclaimed lease, to terminate before recycling
+        self.expires_at = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def loaded_key(self):
+        if self.compiled is None:
+            return None
+        return (self.compiled['version'], self.flag_id)
+
+
+class SandboxLease:
+    """A sandbox checked out for one query; connection is open on the sandbox database"""
+
+    def __init__(self, pool, sandbox, lease_id, connection):
+        self.pool = pool
+        self.sandbox = sandbox
+        self.lease_id = lease_id
+        self.connection = connection
+
+    @property
+    def database_name(self):
+        return self.sandbox.name
+
+
+class SandboxPool:
+    """
+    Up to size sandbox databases on one engine, leased one query at a time.
+    """
+
+    def __init__(self, engine, size, lease_seconds=60, checkout_timeout=2):
+        self.engine = engine
+        self.size = size
+        self.lease_seconds = lease_seconds
+        self.checkout_timeout = checkout_timeout
+        self.stats = {
+            'leases': 0,
+            'reused': 0,
+            'reloads': 0,
+            'recycles': 0,
+            'full_recycles': 0,
+            'leaks': 0,
+            'retired': 0,
+            'exhausted': 0,
+            'failures': 0,
+        }
+
+        self._token = uuid.uuid4().hex[:8]
+        self._counter = itertools.count(1)
+        self._sandboxes = []
+        self._retired = []
+        self._condition = threading.Condition()
+        self._tasks = queue.Queue()
+        self._worker = None
+        self._pid = os.getpid()
+
+    def lease(self, compiled, flag_id):
+        """
+        Check out a sandbox holding the dataset, loading it first if needed.
+        Returns a SandboxLease, or None if no sandbox is available.
+        """
+        from .connection_pool import get_connection
+
+        key = (compiled['version'], flag_id)
+        deadline = time.monotonic() + self.checkout_timeout
+
+        with self._condition:
+            while True:
+                self._reclaim_expired_locked()
+                sandbox = self._pick_locked(key)
+                if sandbox is None and len(self._sandboxes) < self.size:
+                    sandbox = Sandbox(self._new_sandbox_name())
+                    self._sandboxes.append(sandbox)
+                if sandbox is not None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['exhausted'] += 1
+                    return None
+                self._condition.wait(remaining)
+
+            lease_id = uuid.uuid4().hex
+            sandbox.state = 'leased'
+            sandbox.lease_id = lease_id
+            sandbox.leased_by = threading.current_thread().name
+            sandbox.expires_at = time.monotonic() + self.lease_seconds
+            sandbox.last_used = time.monotonic()
+            self.stats['leases'] += 1
+
+        try:
+            if not sandbox.created:
+                self._create_database(sandbox)
+            if sandbox.loaded_key == key:
+                self.stats['reused'] += 1
+            else:
+                self._reload(sandbox, compiled, flag_id)
+                self.stats['reloads'] += 1
+            connection = get_connection(self.engine, sandbox.name)
+            backend_id = self._backend_id(connection)
+        except Exception as e:
+            print(f"Could not prepare sandbox {sandbox.name}: {e}")
+            with self._condition:
+                self.stats['failures'] += 1
+                sandbox.compiled = None
+                sandbox.state = 'free'
+                sandbox.lease_id = None
+                self._condition.notify()
+            return None
+
+        with self._condition:
+            sandbox.backend_id = backend_id
+        return SandboxLease(self, sandbox, lease_id, connection)
+
+    def release(self, lease, query=''):
+        """
+        Return a lease. Tables the query may have changed are recycled in the
+        background before the sandbox is leased again.
+        """
+        changes = classify_changes(query) if query else NO_CHANGES
+
+        try:
+            if changes.schema_tables or changes.full_reset:
+                # Temporary tables and other session objects go with the connection
+                lease.connection.discard()
+            else:
+                lease.connection.close()
+        except Exception:
+            pass
+
+        sandbox = lease.sandbox
+        with self._condition:
+            if sandbox.lease_id != lease.lease_id:
+                # Reclaimed as leaked in the meantime
+                return
+            sandbox.lease_id = None
+            sandbox.leased_by = None
+            sandbox.backend_id = None
+            if changes == NO_CHANGES:
+                sandbox.state = 'free'
+                self._condition.notify()
+                return
+            sandbox.state = 'recycling'
+            sandbox.changes = changes
+        self._schedule(sandbox)
+
+    def get_stats(self):
+        """Snapshot of the pool for monitoring"""
+        with self._condition:
+            states = [sandbox.state for sandbox in self._sandboxes]
+            return dict(
+                self.stats,
+                engine=self.engine,
+                size=len(states),
+                max_size=self.size,
+                free=states.count('free'),
+                leased=states.count('leased'),
+                recycling=states.count('recycling'),
+            )
+
+    def close(self):
+        """Drop every sandbox database (called at process exit)"""
+        with self._condition:
+            sandboxes = [sandbox for sandbox in self._sandboxes + self._retired if sandbox.created]
+            self._sandboxes = []
+            self._retired = []
+        for sandbox in sandboxes:
+            try:
+                drop_sandbox_database(self.engine, sandbox.name)
+            except Exception as e:
+                print(f"Could not drop sandbox {sandbox.name}: {e}")
+
+    def _new_sandbox_name(self):
+        return f"challenge_sandbox_{self._token}_{next(self._counter)}"
+
+    def _pick_locked(self, key):
+        free = [sandbox for sandbox in self._sandboxes if sandbox.state == 'free']
+        for sandbox in free:
+            if sandbox.loaded_key == key:
+                return sandbox
+        if not free:
+            return None
+        # Reload the sandbox that has been idle the longest
+        return min(free, key=lambda sandbox: sandbox.last_used)
+
+    def _reclaim_expired_locked(self):
+        now = time.monotonic()
+        for sandbox in self._sandboxes:
+            # A lease still preparing its sandbox has no connection to terminate yet
+            if sandbox.state == 'leased' and sandbox.backend_id is not None and sandbox.expires_at <= now:
+                print(
+                    f"Sandbox {sandbox.name} leased by {sandbox.leased_by} was not released "
+                    f"within {self.lease_seconds}s, reclaiming it"
+                )
+                self.stats['leaks'] += 1
+                sandbox.lease_id = None
+                sandbox.leased_by = None
+                sandbox.stale_backend_id = sandbox.backend_id
+                sandbox.backend_id = None
+                sandbox.state = 'recycling'
+                sandbox.changes = FULL_RESET
+                self._schedule(sandbox)
+
+    def _schedule(self, sandbox):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f'challenge-sandbox-{self.engine}', daemon=True)
+            self._worker.start()
+        self._tasks.put(sandbox)
+
+    def _run(self):
+        while True:
+            self._process(self._tasks.get())
+
+    def _process(self, sandbox):
+        """Recycle a released or reclaimed sandbox and free it"""
+        if sandbox.stale_backend_id is not None:
+            # The reclaimed lease may still be running a query on the sandbox
+            if not self._terminate_backend(sandbox.stale_backend_id):
+                print(f"Could not terminate the connection of reclaimed sandbox {sandbox.name}, retiring it")
+                with self._condition:
+                    self.stats['retired'] += 1
+                    self._sandboxes.remove(sandbox)
+                    self._retired.append(sandbox)
+                    sandbox.state = 'retired'
+                    self._condition.notify()
+                return
+            sandbox.stale_backend_id = None
+
+        try:
+            self._recycle(sandbox)
+        except Exception as e:
+            print(f"Could not recycle sandbox {sandbox.name}: {e}")
+            sandbox.compiled = None
+        with self._condition:
+            sandbox.changes = NO_CHANGES
+            sandbox.state = 'free'
+            self._condition.notify()
+
+    def _backend_id(self, connection):
+        """Server-side id of a connection, used to terminate it if its lease leaks"""
+        if self.engine == 'mysql':
+            return connection.connection_id
+        return connection.get_backend_pid()
+
+    def _terminate_backend(self, backend_id):
+        """
+        Terminate a connection on the server and wait until it is gone.
+        Returns True once it no longer exists.
+        """
+        from .connection_pool import get_connection
+
+        try:
+            conn = get_connection(self.engine, '' if self.engine == 'mysql' else None)
+        except Exception as e:
+            print(f"Could not connect to terminate {self.engine} connection {backend_id}: {e}")
+            return False
+
+        try:
+            cursor = self._cursor(conn)
+            if self.engine == 'mysql':
+                try:
+                    cursor.execute(f"KILL {int(backend_id)}")
+                except Exception:
+                    # Unknown thread id: the connection has already gone
+                    pass
+                check = "SELECT COUNT(*) FROM information_schema.processlist WHERE id = %s"
+            else:
+                cursor.execute("SELECT pg_terminate_backend(%s)", (backend_id,))
+                cursor.fetchall()
+                check = "SELECT COUNT(*) FROM pg_stat_activity WHERE pid = %s"
+
+            deadline = time.monotonic() + TERMINATE_WAIT_SECONDS
+            while True:
+                cursor.execute(check, (backend_id,))
+                if not cursor.fetchone()[0]:
+                    return True
+                if self.engine == 'postgresql':
+                    conn.rollback()
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.1)
+        except Exception as e:
+            print(f"Could not terminate {self.engine} connection {backend_id}: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def _create_database(self, sandbox):
+        from .connection_pool import get_connection
+        from .job_resources import track_resource
+
+        track_resource('database', self.engine, sandbox.name)
+        conn = get_connection(self.engine, '' if self.engine == 'mysql' else None)
+        try:
+            if self.engine == 'postgresql':
+                conn.autocommit = True
+            cursor = conn.cursor()
+            if self.engine == 'mysql':
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{sandbox.name}`")
+            else:
+                cursor.execute(f"CREATE DATABASE {sandbox.name}")
+            cursor.close()
+        finally:
+            conn.close()
+        sandbox.created = True
+
+    def _cursor(self, conn):
+        if self.engine == 'mysql':
+            return conn.cursor(buffered=True)
+        return conn.cursor()
+
+    def _list_tables(self, cursor):
+        """Tables and views in the sandbox as {lower-case name: (name, is_view)}"""
+        schema = 'DATABASE()' if self.engine == 'mysql' else 'current_schema()'
+        cursor.execute(
+            f"SELECT table_name, table_type FROM information_schema.tables WHERE table_schema = {schema}"
+        )
+        return {name.lower(): (name, table_type == 'VIEW') for name, table_type in cursor.fetchall()}
+
+    def _quote(self, name):
+        return f'`{name}`' if self.engine == 'mysql' else f'"{name}"'
+
+    def _reload(self, sandbox, compiled, flag_id):
+        """Replace everything in the sandbox with a freshly loaded dataset"""
+        from .compiled_sql import get_load_plan
+        from .connection_pool import get_connection
+        from .utils import _load_challenge_sql
+
+        sandbox.compiled = None
+        conn = get_connection(self.engine, sandbox.name)
+        try:
+            cursor = self._cursor(conn)
+            if self.engine == 'mysql':
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                for name, is_view in self._list_tables(cursor).values():
+                    cursor.execute(f"DROP {'VIEW' if is_view else 'TABLE'} IF EXISTS {self._quote(name)}")
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+                # Procedures, functions and events users created outlive their tables
+                cursor.execute(
+                    "SELECT routine_type, routine_name FROM information_schema.routines "
+                    "WHERE routine_schema = DATABASE()"
+                )
+                for routine_type, name in cursor.fetchall():
+                    cursor.execute(f"DROP {routine_type} IF EXISTS {self._quote(name)}")
+                cursor.execute("SELECT event_name FROM information_schema.events WHERE event_schema = DATABASE()")
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f"DROP EVENT IF EXISTS {self._quote(name)}")
+            else:
+                # Also removes sequences, types and functions created by users
+                cursor.execute("DROP SCHEMA IF EXISTS public CASCADE")
+                cursor.execute("CREATE SCHEMA public")
+
+            _load_challenge_sql(
+                cursor, self.engine, compiled['schema_sql'], compiled['datasets'][str(flag_id)],
+                get_load_plan(compiled, self.engine, flag_id)
+            )
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.discard()
+            raise
+        conn.close()
+        sandbox.compiled = compiled
+        sandbox.flag_id = flag_id
+
+    def _recycle(self, sandbox):
+        """Put back the tables a released lease may have changed"""
+        if sandbox.compiled is None:
+            return
+        plan = get_table_plan(sandbox.compiled, self.engine, sandbox.flag_id)
+        if sandbox.changes.full_reset or plan is None:
+            self._full_recycle(sandbox)
+            return
+        try:
+            self._recycle_tables(sandbox, plan)
+        except Exception as e:
+            print(f"Recycling tables of sandbox {sandbox.name} failed, reloading it: {e}")
+            self._full_recycle(sandbox)
+            return
+        self.stats['recycles'] += 1
+
+    def _full_recycle(self, sandbox):
+        self._reload(sandbox, sandbox.compiled, sandbox.flag_id)
+        self.stats['full_recycles'] += 1
+
+    def _recycle_tables(self, sandbox, plan):
+        from .connection_pool import get_connection
+        from .dataset_loader import load_operations
+
+        tables, table_operations = plan
+        changes = sandbox.changes
+
+        conn = get_connection(self.engine, sandbox.name)
+        try:
+            cursor = self._cursor(conn)
+            if self.engine == 'mysql':
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+
+            present = self._list_tables(cursor)
+
+            # Tables and views the user created
+            for key, (name, is_view) in present.items():
+                if key not in tables:
+                    cascade = '' if self.engine == 'mysql' else ' CASCADE'
+                    cursor.execute(f"DROP {'VIEW' if is_view else 'TABLE'} IF EXISTS {self._quote(name)}{cascade}")
+
+            recreate = [table for table in tables if table in changes.schema_tables or table not in present]
+            truncate = [table for table in tables if table in changes.data_tables and table not in recreate]
+
+            for table in reversed(recreate):
+                if table in present:
+                    cursor.execute(f"DROP TABLE IF EXISTS {self._quote(present[table][0])}")
+            for table in recreate:
+                for statement in tables[table]:
+                    cursor.execute(statement)
+
+            if truncate:
+                if self.engine == 'mysql':
+                    for table in truncate:
+                        cursor.execute(f"TRUNCATE TABLE {self._quote(present[table][0])}")
+                else:
+                    names = ', '.join(self._quote(present[table][0]) for table in truncate)
+                    cursor.execute(f"TRUNCATE TABLE {names} RESTART IDENTITY")
+
+            reload = set(recreate) | set(truncate)
+            load_operations(cursor, self.engine, [
+                operation for table, operation in table_operations if table in reload
+            ])
+
+            if self.engine == 'mysql':
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.discard()
+            raise
+        conn.close()
+
+
+def drop_sandbox_database(engine, name):
+    """Drop a sandbox database"""
+    from .connection_pool import close_pool, get_connection
+    from .job_resources import untrack_resource
+
+    close_pool(engine, name)
+    conn = get_connection(engine, '' if engine == 'mysql' else None)
+    try:
+        if engine == 'postgresql':
+            conn.autocommit = True
+        cursor = conn.cursor()
+        if engine == 'mysql':
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        else:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+        cursor.close()
+    finally:
+        conn.close()
+    untrack_resource('database', engine, name)
+
+
+def get_sandbox_pool(engine):
+    """Return this process's sandbox pool for an engine, creating it on first use"""
+    with _pools_lock:
+        pool = _pools.get(engine)
+        if pool is None or pool._pid != os.getpid():
+            pool = SandboxPool(
+                engine,
+                getattr(settings, 'CHALLENGE_SANDBOX_POOL_SIZE', 4),
+                getattr(settings, 'CHALLENGE_SANDBOX_LEASE_SECONDS', 60),
+                getattr(settings, 'CHALLENGE_SANDBOX_CHECKOUT_TIMEOUT', 2),
+            )
+            _pools[engine] = pool
+            atexit.register(pool.close)
+        return pool
+
+
+def get_sandbox_pool_stats():
+    """Snapshot of every sandbox pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.get_stats() for pool in pools]
@@ -0,0 +1,259 @@
+"""
+Single-pass MySQL to PostgreSQL dialect translator for challenge SQL.
+
+Challenge schemas and datasets are written in MySQL. The translator walks the
+tokens from editor.sql_lexer once (MySQL quoting rules, so string literals and
+comments are never rewritten) and emits PostgreSQL:
+
+- integer display widths and UNSIGNED/ZEROFILL are dropped; TINYINT becomes
+  SMALLINT, MEDIUMINT becomes INTEGER
+- <int type> ... AUTO_INCREMENT becomes SERIAL/SMALLSERIAL/BIGSERIAL
+- DATETIME, DOUBLE, FLOAT, the TEXT and BLOB variants map to TIMESTAMP,
+  DOUBLE PRECISION, REAL, TEXT and BYTEA
+- `identifiers` become "identifiers"; strings with backslash escapes become
+  E'...' escape strings
+- table options (ENGINE=, [DEFAULT] CHARSET=, CHARACTER SET, COLLATE,
+  ROW_FORMAT=, AUTO_INCREMENT=, COMMENT=), column COMMENT '...' and
+  ON UPDATE CURRENT_TIMESTAMP are removed
+- INSERT IGNORE becomes INSERT ... ON CONFLICT DO NOTHING
+- CURDATE(), CURTIME(), SYSDATE(), UTC_TIMESTAMP() and IFNULL( map to their
+  PostgreSQL equivalents
+
+Translations are memoized by content hash. The results for a challenge's
+schema and datasets are also stored in its compiled artifact (compiled_sql.py),
+so the PostgreSQL path does not translate at request time.
+"""
+
+import hashlib
+
+from editor.sql_lexer import tokenize
+
+
+MAX_CACHED_TRANSLATIONS = 256
+
+# MySQL integer type -> (PostgreSQL type, serial type used with AUTO_INCREMENT)
+INTEGER_TYPES = {
+    'TINYINT': ('SMALLINT', 'SMALLSERIAL'),
+    'SMALLINT': ('SMALLINT', 'SMALLSERIAL'),
+    'MEDIUMINT': ('INTEGER', 'SERIAL'),
+    'INT': ('INT', 'SERIAL'),
+    'INTEGER': ('INTEGER', 'SERIAL'),
+    'BIGINT': ('BIGINT', 'BIGSERIAL'),
+}
+
+TYPE_MAPPINGS = {
+    'DATETIME': 'TIMESTAMP',
+    'FLOAT': 'REAL',
+    'TINYTEXT': 'TEXT',
+    'MEDIUMTEXT': 'TEXT',
+    'LONGTEXT': 'TEXT',
+    'TINYBLOB': 'BYTEA',
+    'BLOB': 'BYTEA',
+    'MEDIUMBLOB': 'BYTEA',
+    'LONGBLOB': 'BYTEA',
+}
+
+# Functions called with no arguments: NAME() -> replacement
+NILADIC_FUNCTIONS = {
+    'CURDATE': 'CURRENT_DATE',
+    'CURTIME': 'CURRENT_TIME',
+    'SYSDATE': 'NOW()',
+    'UTC_TIMESTAMP': "(NOW() AT TIME ZONE 'UTC')",
+}
+
+RENAMED_FUNCTIONS = {
+    'IFNULL': 'COALESCE',
+}
+
+# Table options removed along with "= value"
+TABLE_OPTIONS = frozenset(['ENGINE', 'ROW_FORMAT', 'AUTO_INCREMENT', 'COMMENT', 'CHARSET', 'COLLATE'])
+
+_SKIPPED = ('space', 'comment')
+
+_translations = {}
+
+
+def translate_mysql_to_postgresql(sql):
+    """Translate MySQL SQL to PostgreSQL, memoized by content hash"""
+    if not sql:
+        return sql
+
+    key = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+    translated = _translations.get(key)
+    if translated is None:
+        translated = _translate(sql)
+        if len(_translations) >= MAX_CACHED_TRANSLATIONS:
+            _translations.clear()
+        _translations[key] = translated
+    return translated
+
+
+def clear_translations():
+    _translations.clear()
+
+
+def _next(tokens, index):
+    """Index of the next token after index that is not whitespace or a comment"""
+    index += 1
+    while index < len(tokens) and tokens[index].kind in _SKIPPED:
+        index += 1
+    return index
+
+
+def _is(tokens, index, kind, text=None):
+    if index >= len(tokens) or tokens[index].kind != kind:
+        return False
+    return text is None or tokens[index].text.upper() == text
+
+
+def _drop_trailing_space(out):
+    while out and out[-1].isspace():
+        out.pop()
+
+
+def _skip_arguments(tokens, index):
+    """If a parenthesized argument list follows index, return the index of its ')'; else index"""
+    position = _next(tokens, index)
+    if not _is(tokens, position, 'punct', '('):
+        return index
+    depth = 0
+    while position < len(tokens):
+        token = tokens[position]
+        if token.kind == 'punct' and token.text == '(':
+            depth += 1
+        elif token.kind == 'punct' and token.text == ')':
+            depth -= 1
+            if depth == 0:
+                return position
+        elif token.kind == 'semicolon':
+            return index
+        position += 1
+    return index
+
+
+def _skip_option_value(tokens, index):
+    """Index of the last token of an option value: [=] value"""
+    position = _next(tokens, index)
+    if _is(tokens, position, 'punct', '='):
+        position = _next(tokens, position)
+    if position < len(tokens) and tokens[position].kind in ('word', 'number', 'string', 'quoted'):
+        return position
+    return index
+
+
+def _backtick_to_double(text):
+    inner = text[1:-1] if len(text) > 1 and text.endswith('`') else text[1:]
+    return '"' + inner.replace('``', '`').replace('"', '""') + '"'
+
+
+def _end_insert_ignore(out):
+    """Append ON CONFLICT DO NOTHING before the whitespace that ends the statement"""
+    trailing = []
+    while out and out[-1].isspace():
+        trailing.append(out.pop())
+    out.append(' ON CONFLICT DO NOTHING')
+    out.extend(reversed(trailing))
+
+
+def _translate(sql):
+    tokens = list(tokenize(sql, backslash_escapes=True))
+    out = []
+    serial_slot = None  # (index in out, serial type) of the current column's integer type
+    insert_ignore = False
+    statement_head = None  # first word of the current statement
+    depth = 0
+    index = 0
+
+    while index < len(tokens):
+        kind, text, _ = tokens[index]
+
+        if kind == 'word':
+            upper = text.upper()
+            following = _next(tokens, index)
+            if statement_head is None:
+                statement_head = upper
+            ddl = statement_head in ('CREATE', 'ALTER')
+
+            if upper in INTEGER_TYPES:
+                pg_type, serial_type = INTEGER_TYPES[upper]
+                out.append(pg_type)
+                serial_slot = (len(out) - 1, serial_type)
+                # Display width and sign/padding attributes have no PostgreSQL equivalent
+                index = _skip_arguments(tokens, index)
+                following = _next(tokens, index)
+                while _is(tokens, following, 'word') and tokens[following].text.upper() in ('UNSIGNED', 'ZEROFILL'):
+                    index = following
+                    following = _next(tokens, index)
+            elif ddl and upper == 'AUTO_INCREMENT' and _is(tokens, following, 'punct', '='):
+                _drop_trailing_space(out)
+                index = _skip_option_value(tokens, index)
+            elif ddl and upper == 'AUTO_INCREMENT':
+                _drop_trailing_space(out)
+                if serial_slot is not None:
+                    position, serial_type = serial_slot
+                    out[position] = serial_type
+            elif upper in ('DOUBLE', 'FLOAT') and _is(tokens, following, 'punct', '('):
+                out.append('DOUBLE PRECISION' if upper == 'DOUBLE' else 'REAL')
+                index = _skip_arguments(tokens, index)
+            elif upper == 'DOUBLE':
+                out.append(text if _is(tokens, following, 'word', 'PRECISION') else 'DOUBLE PRECISION')
+            elif upper in TYPE_MAPPINGS:
+                out.append(TYPE_MAPPINGS[upper])
+            elif ddl and upper == 'DEFAULT' and _is(tokens, following, 'word') and \
+                    tokens[following].text.upper() in ('CHARSET', 'CHARACTER', 'COLLATE'):
+                # DEFAULT CHARSET=...: the option that follows is removed too
+                _drop_trailing_space(out)
+            elif ddl and upper == 'CHARACTER' and _is(tokens, following, 'word', 'SET'):
+                _drop_trailing_space(out)
+                index = _skip_option_value(tokens, following)
+            elif ddl and (upper in ('CHARSET', 'COLLATE') or (
+                depth == 0 and upper in TABLE_OPTIONS and _is(tokens, following, 'punct', '=')
+            )):
+                _drop_trailing_space(out)
+                index = _skip_option_value(tokens, index)
+            elif ddl and upper == 'COMMENT' and _is(tokens, following, 'string'):
+                _drop_trailing_space(out)
+                index = following
+            elif ddl and upper == 'ON' and _is(tokens, following, 'word', 'UPDATE') and \
+                    _is(tokens, _next(tokens, following), 'word', 'CURRENT_TIMESTAMP'):
+                _drop_trailing_space(out)
+                index = _skip_arguments(tokens, _next(tokens, following))
+            elif upper == 'INSERT' and _is(tokens, following, 'word', 'IGNORE'):
+                out.append(text)
+                insert_ignore = True
+                index = following
+            elif upper in NILADIC_FUNCTIONS and _is(tokens, following, 'punct', '(') and \
+                    _is(tokens, _next(tokens, following), 'punct', ')'):
+                out.append(NILADIC_FUNCTIONS[upper])
+                index = _next(tokens, following)
+            elif upper in RENAMED_FUNCTIONS and _is(tokens, following, 'punct', '('):
+                out.append(RENAMED_FUNCTIONS[upper])
+            else:
+                out.append(text)
+        elif kind == 'quoted' and text.startswith('`'):
+            out.append(_backtick_to_double(text))
+        elif kind == 'string' and '\\' in text:
+            # MySQL backslash escapes are only read in PostgreSQL escape strings
+            out.append('E' + text)
+        elif kind == 'semicolon':
+            if insert_ignore:
+                _end_insert_ignore(out)
+                insert_ignore = False
+            serial_slot = None
+            statement_head = None
+            depth = 0
+            out.append(text)
+        else:
+            if kind == 'punct':
+                if text == ',':
+                    serial_slot = None
+                elif text == '(':
+                    depth += 1
+                elif text == ')':
+                    depth -= 1
+            out.append(text)
+        index += 1
+
+    if insert_ignore:
+        _end_insert_ignore(out)
+    return ''.join(out)
@@ -0,0 +1,153 @@
+"""
+In-memory SQLite execution engine for challenges.
+
+Each challenge dataset version gets one in-memory SQLite template per process,
+loaded once from the compiled (MySQL-dialect) schema, adapted to SQLite by
+DatabaseEngineManager._adapt_sql_for_engine, and the parsed dataset rows. Every
+query runs on a private copy made with sqlite3.Connection.backup, which copies
+database pages in memory and takes microseconds for challenge-sized datasets.
+
+Like the template databases of the other engines, the dataset is exposed
+through views named after the original tables; read-only queries run as
+written and anything else has its table names rewritten to the unique
+table names first.
+
+The engine serves the SQLite practice mode for Run, the fallback for Run when
+neither MySQL nor PostgreSQL can be reached, and local runs (CI and benchmarks) that
+have no database server at all.
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def is_sqlite_engine_enabled():
+    """Check whether users can pick the SQLite practice engine"""
+    return getattr(settings, 'CHALLENGE_SQLITE_ENGINE_ENABLED', False)
+
+
+def is_sqlite_fallback_enabled():
+    """Check whether queries fall back to SQLite when no database server is reachable"""
+    return getattr(settings, 'CHALLENGE_SQLITE_FALLBACK_ENABLED', True)
+
+
+def get_template_cache_size():
+    return getattr(settings, 'CHALLENGE_SQLITE_TEMPLATE_CACHE_SIZE', 64)
+
+
+def build_sqlite_template(compiled, flag_id):
+    """Create an in-memory database holding one dataset of a compiled challenge"""
+    from .compiled_sql import get_load_plan
+    from .dataset_loader import load_operations
+    from .utils import DatabaseEngineManager
+
+    schema_statements, operations = get_load_plan(compiled, 'mysql', flag_id)
+
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    try:
+        cursor = conn.cursor()
+        manager = DatabaseEngineManager('sqlite')
+        for statement in schema_statements:
+            cursor.execute(manager._adapt_sql_for_engine(statement, 'sqlite'))
+        load_operations(cursor, 'sqlite', operations)
+
+        # SQLite cannot change column defaults; writes are rewritten to the real tables
+        for statement in compiled['dataset_views'][str(flag_id)]:
+            if statement.startswith('CREATE VIEW'):
+                cursor.execute(statement)
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def get_sqlite_template(compiled, flag_id):
+    """Return the loaded template for a compiled challenge version and dataset"""
+    key = (compiled['version'], flag_id)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+
+    template = build_sqlite_template(compiled, flag_id)
+
+    with _templates_lock:
+        existing = _templates.get(key)
+        if existing is not None:
+            # Another thread loaded the same version meanwhile
+            template.close()
+            return existing
+        _templates[key] = template
+        while len(_templates) > get_template_cache_size():
+            _, evicted = _templates.popitem(last=False)
+            evicted.close()
+    return template
+
+
+def clone_sqlite_template(template):
+    """Copy a template into a new private in-memory database"""
+    conn = sqlite3.connect(':memory:')
+    # Reading a template is safe from any thread; the lock keeps backups of the
+    # same connection from interleaving
+    with _templates_lock:
+        template.backup(conn)
+    return conn
+
+
+def clear_sqlite_templates():
+    """Close and forget all loaded templates"""
+    with _templates_lock:
+        while _templates:
+            _, template = _templates.popitem()
+            template.close()
+
+
+def execute_on_sqlite(challenge, flag_id, query, compiled=None):
+    """
+    Execute a user query (string or ParsedQuery, using the original table
+    names) on a private copy of the challenge's in-memory SQLite template.
+    """
+    from editor.parsed_query import as_parsed_query
+    from editor.query_governor import describe_error
+    from .provisioning import is_read_only_query
+    from .query_rewriter import rewrite_query
+    from .utils import _collect_statement_results, _split_sql_statements
+
+    parsed_query = as_parsed_query(query)
+    if compiled is None:
+        compiled = challenge.get_compiled_sql()
+
+    conn = None
+    try:
+        conn = clone_sqlite_template(get_sqlite_template(compiled, flag_id))
+        cursor = conn.cursor()
+
+        statements = parsed_query.statement_texts
+        if not is_read_only_query(statements):
+            # The dataset views are read-only in SQLite. The copy holds a single
+            # dataset, so tables are only renamed and inserted rows stay visible.
+            rewritten = rewrite_query(parsed_query, compiled['table_mapping'], flag_id, has_flag_id=False)
+            statements = _split_sql_statements(rewritten)
+
+        result = _collect_statement_results(conn, cursor, statements, 'sqlite')
+        cursor.close()
+        return result
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'SQLite Error: {describe_error("sqlite", e)}'
+        }
+    finally:
+        if conn is not None:
+            conn.close()
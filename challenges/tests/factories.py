@@ -0,0 +1,38 @@
+"""
+Test data shared by the challenge tests.
+"""
+
+from challenges.models import Challenge, ChallengeTable
+
+
+EMPLOYEES_SCHEMA_SQL = "CREATE TABLE employees (id INT PRIMARY KEY, name VARCHAR(50))"
+EMPLOYEES_RUN_DATASET_SQL = "INSERT INTO employees (id, name) VALUES (1, 'Ann');"
+EMPLOYEES_SUBMIT_DATASET_SQL = "INSERT INTO employees (id, name) VALUES (2, 'Bob');"
+
+
+def create_employees_challenge(
+    title="Employees Challenge",
+    schema_sql=EMPLOYEES_SCHEMA_SQL,
+    run_dataset_sql=EMPLOYEES_RUN_DATASET_SQL,
+    submit_dataset_sql=EMPLOYEES_SUBMIT_DATASET_SQL,
+    **fields
+):
+    """
+    Create an easy challenge with one employees table (Ann in the Run dataset,
+    Bob in the Submit dataset), reloaded after saving the table compiled it.
+    """
+    challenge = Challenge.objects.create(
+        title=title,
+        description=f"Testing the {title}",
+        difficulty="easy",
+        **fields
+    )
+    ChallengeTable.objects.create(
+        challenge=challenge,
+        table_name="employees",
+        schema_sql=schema_sql,
+        run_dataset_sql=run_dataset_sql,
+        submit_dataset_sql=submit_dataset_sql,
+    )
+    challenge.refresh_from_db()
+    return challenge
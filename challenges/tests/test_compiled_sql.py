@@ -0,0 +1,55 @@
+"""
+Tests for precompiled challenge SQL artifacts.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+
+from challenges import compiled_sql
+from challenges.compiled_sql import decode_operations, encode_operations, get_load_plan
+from challenges.dataset_loader import Number, parse_dataset
+from challenges.models import Challenge
+from challenges.tests.factories import create_employees_challenge
+
+
+class CompiledSqlTestCase(TestCase):
+    """Test that artifacts are compiled at save time and stay in sync."""
+
+    def setUp(self):
+        self.challenge = create_employees_challenge(
+            "Compiled Challenge",
+            schema_sql="CREATE TABLE employees (id INT PRIMARY KEY, name VARCHAR(50), salary DECIMAL(10,2))",
+            run_dataset_sql="INSERT INTO employees (id, name, salary) VALUES (1, 'Ann', 1200.50);",
+            submit_dataset_sql="INSERT INTO employees (id, name, salary) VALUES (2, 'Bob', NULL);",
+        )
+        self.table = self.challenge.tables.get()
+
+    def test_table_changes_recompile_challenge(self):
+        stored = Challenge.objects.get(pk=self.challenge.pk).compiled_sql
+        self.assertEqual(stored['content_hash'], self.challenge.get_content_hash())
+        self.assertEqual(stored['table_mapping'], {'employees': f'employees_q{self.challenge.pk}'})
+        self.assertIn("'Ann'", stored['datasets']['1'])
+
+        self.table.run_dataset_sql = "INSERT INTO employees (id, name, salary) VALUES (3, 'Cy', 10);"
+        self.table.save()
+
+        stored = Challenge.objects.get(pk=self.challenge.pk).compiled_sql
+        self.assertEqual(stored['content_hash'], self.challenge.get_content_hash())
+        self.assertIn("'Cy'", stored['datasets']['1'])
+
+    def test_outdated_compiler_version_is_rebuilt(self):
+        challenge = Challenge.objects.get(pk=self.challenge.pk)
+        with mock.patch.object(compiled_sql, 'COMPILER_VERSION', compiled_sql.COMPILER_VERSION + 1):
+            artifacts = challenge.get_compiled_sql()
+            self.assertEqual(artifacts['compiler_version'], compiled_sql.COMPILER_VERSION)
+
+    def test_operations_survive_json_round_trip(self):
+        for engine in ('mysql', 'postgresql'):
+            operations = parse_dataset(engine, self.challenge.get_all_dataset_sql(1))
+            self.assertEqual(decode_operations(encode_operations(operations)), operations)
+
+        schema_statements, operations = get_load_plan(self.challenge.get_compiled_sql(), 'postgresql', 2)
+        self.assertEqual(len(schema_statements), 1)
+        self.assertEqual(operations[0][3], (('2', 'Bob', None),))
+        self.assertIsInstance(operations[0][3][0][0], Number)
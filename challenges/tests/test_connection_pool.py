@@ -0,0 +1,112 @@
+"""
+Tests for the query engine connection pool.
+"""
+
+import os
+import unittest
+
+from django.test import SimpleTestCase
+
+from challenges.connection_pool import ConnectionPool, PoolExhaustedError, get_connection
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.resets = 0
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(ConnectionPool):
+    """Pool that hands out fake connections instead of talking to a server."""
+
+    def __init__(self, **options):
+        super().__init__('fake', {}, **options)
+        self.opened = []
+        self.healthy = True
+
+    def _connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def _is_healthy(self, raw):
+        return self.healthy
+
+    def _reset_session(self, raw):
+        raw.resets += 1
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    """Test reuse, limits, eviction and health checks of ConnectionPool."""
+
+    def test_connections_are_reused_and_reset(self):
+        pool = FakePool(max_size=2)
+        first = pool.acquire()
+        raw = first._raw
+        first.close()
+        first.close()  # closing twice must not return it twice
+
+        second = pool.acquire()
+        self.assertIs(second._raw, raw)
+        self.assertEqual(raw.resets, 1)
+        self.assertEqual(len(pool.opened), 1)
+        self.assertFalse(raw.closed)
+
+    def test_checkout_times_out_when_pool_is_full(self):
+        pool = FakePool(max_size=1, checkout_timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            pool.acquire()
+
+        held.close()
+        pool.acquire()
+
+    def test_idle_and_unhealthy_connections_are_replaced(self):
+        pool = FakePool(max_size=2, idle_timeout=0)
+        connection = pool.acquire()
+        raw = connection._raw
+        connection.close()
+        pool.evict_idle()
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool._size, 0)
+
+        pool = FakePool(max_size=2, health_check_interval=0)
+        connection = pool.acquire()
+        raw = connection._raw
+        connection.close()
+        pool.healthy = False
+        replacement = pool.acquire()
+        self.assertIsNot(replacement._raw, raw)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool._size, 1)
+
+
+class ForkedChildTestCase(SimpleTestCase):
+    """Test that a forked child cannot close the connections of its parent."""
+
+    def test_child_detaches_inherited_connections(self):
+        try:
+            conn = get_connection('postgresql')
+        except Exception as e:
+            raise unittest.SkipTest(f'PostgreSQL is not available: {e}')
+        raw = conn._raw
+        conn.close()
+
+        pid = os.fork()
+        if pid == 0:
+            # What garbage collection or exit would do to the inherited connection
+            raw.close()
+            os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        conn = get_connection('postgresql')
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+        finally:
+            conn.close()
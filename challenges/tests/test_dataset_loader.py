@@ -0,0 +1,65 @@
+"""
+Tests for parsing dataset INSERT statements for bulk loading.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from challenges import dataset_loader
+from challenges.dataset_loader import load_operations, parse_dataset, parse_insert
+
+
+class DatasetLoaderTestCase(SimpleTestCase):
+    """Test which statements are bulk-loaded and how their values are parsed."""
+
+    def test_parse_literal_values(self):
+        table, columns, rows = parse_insert(
+            "INSERT INTO employees_q1 (id, `name`, salary) VALUES (1, 'it''s', -2.5), (2, NULL, 1e3)",
+            'postgresql'
+        )
+        self.assertEqual(table, 'employees_q1')
+        self.assertEqual(columns, ('id', '`name`', 'salary'))
+        self.assertEqual(rows, [('1', "it's", '-2.5'), ('2', None, '1e3')])
+
+    def test_backslash_escapes_follow_engine(self):
+        _, _, mysql_rows = parse_insert(r"INSERT INTO t (a) VALUES ('a\nb')", 'mysql')
+        _, _, pg_rows = parse_insert(r"INSERT INTO t (a) VALUES ('a\nb')", 'postgresql')
+        self.assertEqual(mysql_rows, [('a\nb',)])
+        self.assertEqual(pg_rows, [('a\\nb',)])
+
+    def test_statements_that_are_not_plain_literals_run_as_written(self):
+        self.assertIsNone(parse_insert("INSERT INTO t (a) VALUES (NOW())", 'mysql'))
+        self.assertIsNone(parse_insert("INSERT INTO t VALUES (1)", 'mysql'))
+        self.assertIsNone(parse_insert("INSERT INTO t (a) VALUES (1) ON DUPLICATE KEY UPDATE a = 2", 'mysql'))
+        self.assertIsNone(parse_insert("INSERT INTO t (a, b) VALUES (1)", 'mysql'))
+        self.assertIsNone(parse_insert("INSERT INTO t (a) SELECT 1", 'mysql'))
+
+    def test_consecutive_inserts_are_merged_in_order(self):
+        operations = parse_dataset('mysql', (
+            "INSERT INTO t (a) VALUES (1);\n"
+            "INSERT INTO t (a) VALUES (2), (3);\n"
+            "UPDATE t SET flag_id = 1 WHERE flag_id = 0;\n"
+            "INSERT INTO t (a) VALUES (4);"
+        ))
+        self.assertEqual([operation[0] for operation in operations], ['rows', 'sql', 'rows'])
+        self.assertEqual(operations[0][3], (('1',), ('2',), ('3',)))
+        self.assertEqual(len(operations[0][4]), 2)
+
+    def test_failed_mysql_batch_undoes_earlier_batches_before_replay(self):
+        """Rows from batches that succeeded must not be loaded twice by the replay."""
+        operations = parse_dataset('mysql', "INSERT INTO t (a) VALUES (1), (2), (3);")
+        cursor = mock.Mock()
+        cursor.nextset.return_value = None
+        cursor.executemany.side_effect = [None, Exception('Duplicate entry')]
+
+        with mock.patch.object(dataset_loader, 'MYSQL_BATCH_SIZE', 2):
+            load_operations(cursor, 'mysql', operations)
+
+        executed = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(executed, [
+            "SAVEPOINT dataset_bulk_load",
+            "ROLLBACK TO SAVEPOINT dataset_bulk_load",
+            "INSERT INTO t (a) VALUES (1), (2), (3)",
+            "RELEASE SAVEPOINT dataset_bulk_load",
+        ])
@@ -0,0 +1,108 @@
+"""
+Tests for the database engine circuit breakers.
+"""
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from challenges import engine_health
+from challenges.tests.factories import create_employees_challenge
+from challenges.utils import execute_dual_dataset_query
+
+
+MYSQL_DOWN = {'success': False, 'error': "MySQL Error: 2003: Can't connect to MySQL server on '127.0.0.1:3306'"}
+POSTGRESQL_OK = {'success': True, 'results': [{'name': 'Ann'}], 'row_count': 1}
+
+
+@override_settings(ENGINE_HEALTH_FAILURE_THRESHOLD=2, CHALLENGE_RESULT_CACHE_ENABLED=False)
+class EngineHealthTestCase(TestCase):
+    """Test opening, routing around and closing the breakers."""
+
+    def setUp(self):
+        caches[engine_health.CACHE_ALIAS].clear()
+        self.addCleanup(caches[engine_health.CACHE_ALIAS].clear)
+        engine_health._healthy_until.clear()
+        self.addCleanup(engine_health._healthy_until.clear)
+        # No background probe threads in tests
+        patcher = mock.patch('challenges.engine_health.ensure_probes_running')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.challenge = create_employees_challenge("Engine Health Challenge")
+
+    def _fake_engines(self, outcomes):
+        calls = []
+
+        def execute(challenge, flag_id, engine, *args, **kwargs):
+            calls.append(engine)
+            return dict(outcomes[engine])
+
+        return calls, mock.patch('challenges.utils._execute_on_engine', side_effect=execute)
+
+    def test_breaker_opens_after_threshold(self):
+        engine_health.record_engine_failure('mysql', 'down')
+        self.assertEqual(engine_health.get_engine_state('mysql')['state'], engine_health.CLOSED)
+
+        engine_health.record_engine_failure('mysql', 'down')
+        self.assertEqual(engine_health.get_engine_state('mysql')['state'], engine_health.OPEN)
+        self.assertFalse(engine_health.is_engine_available('mysql'))
+        self.assertEqual(engine_health.get_available_engines(['mysql', 'postgresql']), ['postgresql'])
+
+    def test_open_breaker_routes_straight_to_postgresql(self):
+        calls, patcher = self._fake_engines({'mysql': MYSQL_DOWN, 'postgresql': POSTGRESQL_OK})
+        with patcher:
+            for _ in range(2):
+                execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees', 1, engine='mysql')
+            self.assertEqual(calls, ['mysql', 'postgresql', 'mysql', 'postgresql'])
+
+            calls.clear()
+            result = execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees', 1, engine='mysql')
+
+        self.assertEqual(calls, ['postgresql'])
+        self.assertTrue(result['success'])
+        self.assertTrue(result['fallback_used'])
+        self.assertEqual(result['original_engine'], 'mysql')
+
+    @override_settings(ENGINE_HEALTH_COOLDOWN_SECONDS=0)
+    def test_half_open_trial_closes_breaker(self):
+        engine_health.record_engine_failure('mysql', 'down')
+        engine_health.record_engine_failure('mysql', 'down')
+
+        # After the cooldown a trial is let through and its success closes the breaker
+        self.assertTrue(engine_health.is_engine_available('mysql'))
+        self.assertEqual(engine_health.get_engine_state('mysql')['state'], engine_health.HALF_OPEN)
+        engine_health.record_engine_success('mysql')
+
+        self.assertEqual(engine_health.get_engine_state('mysql'), {'state': engine_health.CLOSED, 'failures': 0})
+        self.assertTrue(engine_health.is_engine_available('mysql'))
+
+    def test_query_errors_do_not_count_as_failures(self):
+        calls, patcher = self._fake_engines({
+            'mysql': {'success': False, 'error': "MySQL Error: 1146: Table 'x' doesn't exist"},
+        })
+        with patcher:
+            for _ in range(3):
+                execute_dual_dataset_query(self.challenge, 'SELECT * FROM missing', 1, engine='mysql')
+
+        self.assertEqual(calls, ['mysql'] * 3)
+        self.assertEqual(engine_health.get_engine_state('mysql')['state'], engine_health.CLOSED)
+
+    def test_healthy_engine_does_not_read_shared_cache(self):
+        self.assertTrue(engine_health.is_engine_available('mysql'))
+
+        with mock.patch('challenges.engine_health._get_cache') as get_cache:
+            for _ in range(3):
+                self.assertTrue(engine_health.is_engine_available('mysql'))
+                engine_health.record_engine_success('mysql')
+        get_cache.assert_not_called()
+
+        # Another process opened the breaker; it is noticed once the local state expires
+        caches[engine_health.CACHE_ALIAS].set(
+            engine_health._state_key('mysql'),
+            {'state': engine_health.OPEN, 'failures': 2, 'opened_at': engine_health.time.time()},
+        )
+        self.assertTrue(engine_health.is_engine_available('mysql'))
+        engine_health._healthy_until.clear()
+        self.assertFalse(engine_health.is_engine_available('mysql'))
@@ -0,0 +1,114 @@
+"""
+Tests for grading challenge submissions from a single query execution.
+"""
+
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from challenges.models import Challenge
+from challenges.result_fingerprint import compare_to_fingerprint, fingerprint_result
+from challenges.tests.factories import create_employees_challenge
+
+User = get_user_model()
+
+
+class GradingTestCase(TestCase):
+    """Test that submissions are graded from the result they already executed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='grader',
+            email='grader@test.com',
+            password='testpass123'
+        )
+        self.challenge = create_employees_challenge("Grading Challenge", expected_result=[{"name": "Bob"}])
+        # Saving tables regenerates the expected result; pin it for the test
+        Challenge.objects.filter(pk=self.challenge.pk).update(
+            expected_result=[{"name": "Bob"}], expected_result_fingerprint={}
+        )
+        self.challenge.refresh_from_db()
+
+    def test_grade_query_result(self):
+        correct = {'success': True, 'results': [{'name': 'Bob'}], 'columns': ['name'], 'row_count': 1}
+        wrong = {'success': True, 'results': [{'name': 'Ann'}], 'columns': ['name'], 'row_count': 1}
+        failed = {'success': False, 'error': 'syntax error'}
+
+        self.assertEqual(self.challenge.grade_query_result(correct), (True, "Query result matches expected output"))
+        self.assertFalse(self.challenge.grade_query_result(wrong)[0])
+        is_correct, message = self.challenge.grade_query_result(failed)
+        self.assertFalse(is_correct)
+        self.assertIn("Query execution failed", message)
+
+    def test_truncated_results_are_not_graded(self):
+        truncated = {'success': True, 'results': [{'name': 'Bob'}], 'columns': ['name'], 'row_count': 1, 'truncated': True}
+
+        is_correct, message = self.challenge.grade_query_result(truncated)
+        self.assertFalse(is_correct)
+        self.assertIn("too large to grade", message)
+
+        self.challenge.reference_query = "SELECT name FROM employees"
+        with mock.patch('challenges.utils.execute_dual_dataset_query', return_value=truncated):
+            stored, message = self.challenge.execute_reference_query()
+        self.assertFalse(stored)
+        self.challenge.refresh_from_db()
+        self.assertEqual(self.challenge.expected_result, [{"name": "Bob"}])
+
+    def test_submit_executes_query_once(self):
+        result = {'success': True, 'results': [{'name': 'Bob'}], 'columns': ['name'], 'row_count': 1}
+        self.client.force_login(self.user)
+
+        with mock.patch('challenges.utils.execute_dual_dataset_query', return_value=result) as execute:
+            response = self.client.post(
+                reverse('challenges:submit_challenge', args=[self.challenge.id]),
+                {'query': 'SELECT name FROM employees', 'engine': 'postgresql'},
+                secure=True,
+            )
+
+        self.assertEqual(execute.call_count, 1)
+        self.assertTrue(response.json()['correct'])
+
+    def test_expected_result_is_fingerprinted_on_save(self):
+        self.challenge.expected_result = [{"name": "Bob"}, {"name": "Ann"}]
+        self.challenge.save(update_fields=['expected_result'])
+        self.challenge.refresh_from_db()
+
+        self.assertEqual(self.challenge.expected_result_fingerprint['row_count'], 2)
+        reordered = {'success': True, 'results': [{'name': 'Ann'}, {'name': 'Bob'}], 'columns': ['name'], 'row_count': 2}
+        is_correct, message = self.challenge.grade_query_result(reordered)
+        self.assertFalse(is_correct)
+        self.assertIn("wrong row order", message)
+
+
+class ResultFingerprintTestCase(SimpleTestCase):
+    """Test canonical row hashing of query results."""
+
+    expected = [
+        {'dept': 'IT', 'total': 30.0, 'hired': '2020-01-02', 'manager': None},
+        {'dept': 'HR', 'total': 12.5, 'hired': '2021-03-04', 'manager': 'Ann'},
+    ]
+
+    def test_values_are_canonicalised_per_type(self):
+        rows = [
+            {'total': Decimal('30.00'), 'dept': 'IT ', 'manager': None, 'hired': datetime.date(2020, 1, 2), 'flag_id': 2},
+            {'total': Decimal('12.5'), 'dept': 'HR', 'manager': 'Ann', 'hired': datetime.date(2021, 3, 4), 'flag_id': 2},
+        ]
+        self.assertEqual(compare_to_fingerprint(rows, fingerprint_result(self.expected)), 'match')
+
+        # Numbers and their text are different values
+        rows[0]['total'] = '30'
+        self.assertEqual(compare_to_fingerprint(rows, fingerprint_result(self.expected)), 'mismatch')
+
+    def test_order_count_and_column_differences(self):
+        fingerprint = fingerprint_result(self.expected)
+
+        self.assertEqual(compare_to_fingerprint(self.expected[::-1], fingerprint), 'wrong_order')
+        self.assertEqual(compare_to_fingerprint(self.expected[:1], fingerprint), 'row_count')
+        renamed = [{('department' if key == 'dept' else key): value for key, value in row.items()} for row in self.expected]
+        self.assertEqual(compare_to_fingerprint(renamed, fingerprint), 'mismatch')
+        duplicated = [self.expected[0], self.expected[0]]
+        self.assertEqual(compare_to_fingerprint(duplicated, fingerprint), 'mismatch')
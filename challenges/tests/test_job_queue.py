@@ -0,0 +1,151 @@
+"""
+Tests for the challenge Run/Submit job queue.
+"""
+
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from challenges.job_queue import QueryWorkerPool, claim_next_job, enqueue_job, execute_job
+from challenges.job_resources import read_resources, release_worker_resources
+from challenges.models import Challenge, ChallengeDatabaseVersion, ChallengeQueryJob
+
+User = get_user_model()
+
+
+@override_settings(CHALLENGE_JOB_QUEUE_ENABLED=True, CHALLENGE_JOB_ENGINE_CONCURRENCY={'mysql': 1, 'postgresql': 1})
+class JobQueueTestCase(TestCase):
+    """Test queuing, claiming, cancelling and polling of challenge query jobs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='queued',
+            email='queued@test.com',
+            password='testpass123'
+        )
+        self.challenge = Challenge.objects.create(
+            title="Queued Challenge",
+            description="Testing the job queue",
+            difficulty="easy",
+            schema_sql="CREATE TABLE employees (id INT PRIMARY KEY, name VARCHAR(50))",
+            run_dataset_sql="INSERT INTO employees (id, name) VALUES (1, 'Ann');",
+            submit_dataset_sql="INSERT INTO employees (id, name) VALUES (2, 'Bob');",
+        )
+
+    def test_run_is_queued_and_polled(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('challenges:execute_challenge_query', args=[self.challenge.id]),
+            json.dumps({'query': 'SELECT name FROM employees', 'engine': 'postgresql'}),
+            content_type='application/json',
+            secure=True,
+        )
+        data = response.json()
+        self.assertEqual(data['status'], 'queued')
+        self.assertFalse(data['done'])
+
+        job = claim_next_job({})
+        self.assertEqual(str(job.pk), data['job_id'])
+        result = {'success': True, 'results': [{'name': 'Ann'}], 'columns': ['name'], 'row_count': 1}
+        with mock.patch('challenges.execution.run_challenge_query', return_value=result) as run:
+            execute_job(job.pk)
+        self.assertEqual(run.call_args[0][2], 'SELECT name FROM employees')
+
+        poll = self.client.get(data['poll_url'], secure=True).json()
+        self.assertTrue(poll['done'])
+        self.assertEqual(poll['status'], 'done')
+        self.assertEqual(poll['result'], result)
+
+        # Jobs are only visible to their owner
+        other = User.objects.create_user(username='other', email='other@test.com', password='testpass123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(data['poll_url'], secure=True).status_code, 404)
+
+    def test_rerun_cancels_previous_run(self):
+        first = enqueue_job(self.user, self.challenge, 'run', 'SELECT 1', 'mysql')
+        submit = enqueue_job(self.user, self.challenge, 'submit', 'SELECT 1', 'mysql')
+        second = enqueue_job(self.user, self.challenge, 'run', 'SELECT 2', 'mysql')
+
+        statuses = dict(ChallengeQueryJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[first.pk], 'cancelled')
+        self.assertEqual(statuses[submit.pk], 'queued')
+        self.assertEqual(statuses[second.pk], 'queued')
+
+    def test_claims_respect_engine_concurrency(self):
+        mysql_job = enqueue_job(self.user, self.challenge, 'run', 'SELECT 1', 'mysql')
+        postgresql_job = enqueue_job(self.user, self.challenge, 'submit', 'SELECT 1', 'postgresql')
+
+        # MySQL is at its limit, so the older MySQL job waits
+        self.assertEqual(claim_next_job({'mysql': 1}).pk, postgresql_job.pk)
+        self.assertIsNone(claim_next_job({'mysql': 1, 'postgresql': 1}))
+        self.assertEqual(claim_next_job({'postgresql': 1}).pk, mysql_job.pk)
+
+
+class WorkerResourcesTestCase(TestCase):
+    """Test that what a stopped worker held is found and released."""
+
+    def write_log(self, lines):
+        handle, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as log:
+            log.write(''.join(json.dumps(line) + '\n' for line in lines) + '["+", "datab')
+        return path
+
+    def test_only_unreleased_resources_are_held(self):
+        path = self.write_log([
+            ['+', 'database', 'mysql', 'challenge_1_temp_a'],
+            ['+', 'database', 'postgresql', 'challenge_1_temp_b'],
+            ['-', 'database', 'mysql', 'challenge_1_temp_a'],
+        ])
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        self.assertEqual(read_resources(path), [('database', 'postgresql', 'challenge_1_temp_b')])
+
+    def test_interrupted_template_build_is_reset(self):
+        challenge = Challenge.objects.create(title="Build Challenge", description="Testing builds", difficulty="easy")
+        version = ChallengeDatabaseVersion.objects.create(
+            challenge=challenge, engine='postgresql', flag_id=1, content_hash='a' * 64,
+            database_name='challenge_1_vaaaaaaaaaaaa_d1', status='building',
+        )
+        path = self.write_log([
+            ['+', 'template_build', 'postgresql', version.pk],
+            ['+', 'database', 'postgresql', 'challenge_1_temp_b'],
+        ])
+
+        with mock.patch('challenges.job_resources.drop_database') as drop_database:
+            self.assertEqual(release_worker_resources(path), 2)
+
+        dropped = [call.args for call in drop_database.call_args_list]
+        self.assertEqual(dropped, [
+            ('postgresql', 'challenge_1_temp_b'),
+            ('postgresql', 'challenge_1_vaaaaaaaaaaaa_d1'),
+            ('postgresql', 'challenge_1_vaaaaaaaaaaaa_d1_t'),
+        ])
+        self.assertFalse(ChallengeDatabaseVersion.objects.filter(pk=version.pk).exists())
+        self.assertFalse(os.path.exists(path))
+
+
+class WorkerStopTestCase(SimpleTestCase):
+    """Test that stopped workers exit on SIGTERM and are cleaned up after."""
+
+    def test_stopped_worker_resources_are_released(self):
+        pool = QueryWorkerPool(workers=1)
+        pool.start()
+        self.addCleanup(pool.shutdown)
+        pid = next(iter(pool.workers))
+        with open(os.path.join(pool.resource_dir, f'{pid}.log'), 'w') as log:
+            log.write(json.dumps(['+', 'database', 'mysql', 'challenge_1_temp_c']) + '\n')
+
+        with mock.patch('challenges.job_resources.drop_database') as drop_database:
+            pool._stop(pid)
+            deadline = time.monotonic() + 10
+            while pool.stopped_workers and time.monotonic() < deadline:
+                pool._reap_stopped_workers()
+                time.sleep(0.05)
+
+        self.assertEqual(pool.stopped_workers, {})
+        drop_database.assert_called_once_with('mysql', 'challenge_1_temp_c')
@@ -0,0 +1,60 @@
+"""
+Tests for the concurrent-user load harness.
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from challenges.load_harness import (
+    LoadHarness, create_synthetic_users, delete_synthetic_users, get_load_challenges, parse_mix
+)
+from challenges.sqlite_engine import clear_sqlite_templates
+from challenges.tests.factories import create_employees_challenge
+
+
+class ParseMixTestCase(SimpleTestCase):
+    """Test parsing of the action weights."""
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('run=3, history=1'), {'run': 3, 'history': 1})
+        with self.assertRaises(ValueError):
+            parse_mix('run=3,delete=1')
+        with self.assertRaises(ValueError):
+            parse_mix('run=0')
+
+
+@override_settings(
+    CHALLENGE_RESULT_CACHE_ENABLED=False,
+    CHALLENGE_WARMUP_ENABLED=False,
+    SECURE_SSL_REDIRECT=False,
+    SESSION_COOKIE_SECURE=False,
+    CSRF_COOKIE_SECURE=False,
+)
+class LoadHarnessTestCase(LiveServerTestCase):
+    """Run a short load against the live test server."""
+
+    def setUp(self):
+        self.addCleanup(clear_sqlite_templates)
+        self.challenge = create_employees_challenge("Load Challenge")
+
+    def test_users_log_in_and_replay_the_mix(self):
+        challenges = get_load_challenges([self.challenge.id])
+        self.assertEqual(challenges[0]['queries'], ['SELECT * FROM employees'])
+
+        emails = create_synthetic_users(2, 'harness', 'harness-password')
+        harness = LoadHarness(
+            self.live_server_url, emails, 'harness-password', challenges,
+            mix={'run': 2, 'history': 1, 'dashboard': 1}, duration=4, think_time=(0.05, 0.1),
+        )
+        report = harness.run()
+
+        self.assertEqual(report['actions']['login']['ok'], 2, report['errors'])
+        self.assertGreater(report['throughput'], 0)
+        for action in ('run', 'history', 'dashboard'):
+            stats = report['actions'].get(action)
+            if stats:
+                self.assertEqual(stats['errors'], 0, report['errors'])
+                self.assertLessEqual(stats['p50'], stats['p99'])
+
+        self.assertEqual(delete_synthetic_users('harness'), 2)
+        self.assertFalse(get_user_model().objects.filter(email__endswith='@loadtest.local').exists())
@@ -0,0 +1,92 @@
+"""
+Tests for persistent challenge query database provisioning.
+"""
+
+from django.test import TestCase
+
+from challenges.clone_pool import CLONE_NAME_PATTERN, get_clone_name, get_clone_source_name
+from challenges.compiled_sql import build_dataset_view_statements
+from challenges.models import ChallengeDatabaseVersion
+from challenges.provisioning import (
+    execute_on_template_database, is_read_only_query, get_template_database_name
+)
+from challenges.tests.factories import create_employees_challenge
+
+
+class ProvisioningTestCase(TestCase):
+    """Test content hashing and query classification used by template databases."""
+
+    def setUp(self):
+        self.challenge = create_employees_challenge("Provisioning Challenge")
+        self.table = self.challenge.tables.get()
+
+    def test_content_hash_changes_with_table_content(self):
+        """Editing a table dataset must produce a new template version."""
+        original_hash = self.challenge.get_content_hash()
+        self.assertEqual(original_hash, self.challenge.get_content_hash())
+
+        self.table.run_dataset_sql = "INSERT INTO employees (id, name) VALUES (3, 'Cy');"
+        self.table.save()
+
+        self.assertNotEqual(original_hash, self.challenge.get_content_hash())
+
+    def test_content_hash_ignores_unrelated_fields(self):
+        """Changing the title or XP must not invalidate loaded databases."""
+        original_hash = self.challenge.get_content_hash()
+        self.challenge.title = "Renamed"
+        self.challenge.xp = 50
+        self.assertEqual(original_hash, self.challenge.get_content_hash())
+
+    def test_template_database_name_fits_engine_limits(self):
+        name = get_template_database_name(self.challenge, 2, self.challenge.get_content_hash())
+        self.assertTrue(name.startswith(f"challenge_{self.challenge.id}_v"))
+        self.assertTrue(name.endswith("_d2"))
+        self.assertLessEqual(len(name), 63)
+
+    def test_clone_names_are_recognisable(self):
+        """Clones must fit PostgreSQL's limit and be found again by the cleanup command."""
+        name = get_template_database_name(self.challenge, 2, self.challenge.get_content_hash())
+        source_name = get_clone_source_name(name)
+        clone_name = get_clone_name(source_name)
+
+        self.assertNotEqual(clone_name, get_clone_name(source_name))
+        self.assertTrue(CLONE_NAME_PATTERN.match(clone_name))
+        self.assertFalse(CLONE_NAME_PATTERN.match(name))
+        self.assertFalse(CLONE_NAME_PATTERN.match(source_name))
+        self.assertLessEqual(len(clone_name), 63)
+
+    def test_read_only_query_classification(self):
+        self.assertTrue(is_read_only_query(["SELECT * FROM employees_q1 WHERE flag_id = 1"]))
+        self.assertTrue(is_read_only_query([
+            "WITH t AS (SELECT id FROM employees_q1) SELECT COUNT(*) FROM t",
+            "SELECT update_date FROM employees_q1",
+        ]))
+
+        self.assertFalse(is_read_only_query([]))
+        self.assertFalse(is_read_only_query(["UPDATE employees_q1 SET name = 'x'"]))
+        self.assertFalse(is_read_only_query(["SELECT 1", "DELETE FROM employees_q1"]))
+        self.assertFalse(is_read_only_query(["SELECT * INTO backup FROM employees_q1"]))
+        self.assertFalse(is_read_only_query(["SELECT * FROM employees_q1 FOR UPDATE"]))
+
+    def test_writes_never_run_on_the_shared_template(self):
+        """Rolled-back DML would still advance sequences and hold row locks on the shared database."""
+        for query in ("INSERT INTO employees (id, name) VALUES (3, 'Cy')",
+                      "UPDATE employees SET name = 'x' WHERE id = 1; SELECT * FROM employees"):
+            self.assertIsNone(execute_on_template_database(
+                self.challenge, 1, 'postgresql', '', '', query
+            ))
+        self.assertFalse(ChallengeDatabaseVersion.objects.filter(challenge=self.challenge).exists())
+
+    def test_dataset_views_use_original_table_names(self):
+        """Template databases expose their dataset as the original tables, so queries run unchanged."""
+        unique_name = self.table.get_unique_table_name()
+        views = self.challenge.get_compiled_sql()['dataset_views']
+
+        self.assertEqual(views['2'], [
+            f"ALTER TABLE {unique_name} ALTER COLUMN flag_id SET DEFAULT 2",
+            f"CREATE VIEW employees AS SELECT * FROM {unique_name} WHERE flag_id = 2",
+        ])
+        self.assertEqual(
+            build_dataset_view_statements({'employees': unique_name}, 1, has_flag_id=False),
+            [f"CREATE VIEW employees AS SELECT * FROM {unique_name}"],
+        )
@@ -0,0 +1,109 @@
+"""
+Tests for the dual-dataset query rewriter.
+"""
+
+from django.test import SimpleTestCase
+
+from challenges.query_rewriter import rewrite_query
+from editor.parsed_query import parse_query
+
+
+MAPPING = {'employees': 'employees_q7', 'departments': 'departments_q7'}
+
+
+def rewrite(query, flag_id=1, has_flag_id=True):
+    return rewrite_query(parse_query(query), MAPPING, flag_id, has_flag_id)
+
+
+def scan(table, flag_id=1):
+    return f'(SELECT * FROM {table}_q7 WHERE flag_id = {flag_id})'
+
+
+class QueryRewriterTestCase(SimpleTestCase):
+    """Test that every scan of a challenge table is scoped to the dataset."""
+
+    def test_aliases_are_kept_or_added(self):
+        self.assertEqual(
+            rewrite('SELECT e.name FROM employees e JOIN departments AS d ON d.id = e.dept_id'),
+            f'SELECT e.name FROM {scan("employees")} e JOIN {scan("departments")} AS d ON d.id = e.dept_id',
+        )
+        self.assertEqual(
+            rewrite('SELECT employees.name FROM Employees WHERE salary > 10 ORDER BY name', flag_id=2),
+            f'SELECT employees.name FROM {scan("employees", 2)} Employees WHERE salary > 10 ORDER BY name',
+        )
+
+    def test_every_scan_is_scoped(self):
+        query = (
+            'WITH ranked AS (SELECT name, RANK() OVER (PARTITION BY dept_id ORDER BY salary DESC) AS r FROM employees) '
+            'SELECT name FROM ranked WHERE r = 1 '
+            'UNION SELECT name FROM employees, departments WHERE dept_id IN (SELECT id FROM departments)'
+        )
+        rewritten = rewrite(query)
+
+        self.assertEqual(rewritten.count(scan('employees')), 2)
+        self.assertEqual(rewritten.count(scan('departments')), 2)
+        # CTE names and window clauses are untouched
+        self.assertIn('FROM ranked WHERE r = 1', rewritten)
+        self.assertIn('OVER (PARTITION BY dept_id ORDER BY salary DESC)', rewritten)
+
+    def test_cte_shadowing_a_table(self):
+        self.assertEqual(
+            rewrite('WITH employees AS (SELECT * FROM employees WHERE salary > 10) SELECT * FROM employees'),
+            f'WITH employees AS (SELECT * FROM {scan("employees")} employees WHERE salary > 10) SELECT * FROM employees',
+        )
+
+    def test_write_targets_are_renamed(self):
+        self.assertEqual(
+            rewrite("UPDATE employees SET salary = 0 WHERE employees.id = 1; "
+                    "DELETE FROM employees WHERE id = 2; INSERT INTO employees (id) VALUES (3)"),
+            "UPDATE employees_q7 AS employees SET salary = 0 WHERE employees.id = 1; "
+            "DELETE FROM employees_q7 WHERE id = 2; INSERT INTO employees_q7 (id) VALUES (3)",
+        )
+
+    def test_without_flag_id_tables_are_only_renamed(self):
+        self.assertEqual(
+            rewrite('SELECT * FROM employees e', has_flag_id=False),
+            'SELECT * FROM employees_q7 e',
+        )
+        self.assertEqual(rewrite("SELECT 'FROM employees' AS note"), "SELECT 'FROM employees' AS note")
+
+    def test_index_hints_keep_a_real_table(self):
+        self.assertEqual(
+            rewrite('SELECT e.name FROM employees e USE INDEX (PRIMARY) JOIN departments d ON d.id = e.dept_id'),
+            f'SELECT e.name FROM employees_q7 e USE INDEX (PRIMARY) JOIN {scan("departments")} d ON d.id = e.dept_id',
+        )
+        self.assertEqual(
+            rewrite('SELECT name FROM employees FORCE INDEX FOR ORDER BY (PRIMARY) ORDER BY id'),
+            'SELECT name FROM employees_q7 employees FORCE INDEX FOR ORDER BY (PRIMARY) ORDER BY id',
+        )
+
+    def test_multi_table_delete(self):
+        self.assertEqual(
+            rewrite("DELETE employees FROM employees JOIN departments d ON d.id = employees.dept_id "
+                    "WHERE d.id IN (SELECT id FROM departments)"),
+            "DELETE employees FROM employees_q7 employees JOIN departments_q7 d ON d.id = employees.dept_id "
+            f"WHERE d.id IN (SELECT id FROM {scan('departments')} departments)",
+        )
+        self.assertEqual(
+            rewrite("DELETE FROM employees USING employees, departments WHERE departments.id = employees.dept_id"),
+            "DELETE FROM employees USING employees_q7 employees, departments_q7 departments "
+            "WHERE departments.id = employees.dept_id",
+        )
+        self.assertEqual(
+            rewrite("DELETE QUICK FROM employees WHERE id = 2"),
+            "DELETE QUICK FROM employees_q7 WHERE id = 2",
+        )
+
+    def test_schema_qualified_names(self):
+        self.assertEqual(
+            rewrite('SELECT employees.name FROM public.employees JOIN "public"."departments" d ON d.id = 1'),
+            f'SELECT employees.name FROM {scan("employees")} employees JOIN {scan("departments")} d ON d.id = 1',
+        )
+        self.assertEqual(
+            rewrite("UPDATE public.employees SET salary = 0; INSERT INTO public.employees (id) VALUES (3)"),
+            "UPDATE employees_q7 AS employees SET salary = 0; INSERT INTO employees_q7 (id) VALUES (3)",
+        )
+        self.assertEqual(
+            rewrite("SELECT * FROM information_schema.tables, pg_catalog.employees"),
+            "SELECT * FROM information_schema.tables, pg_catalog.employees",
+        )
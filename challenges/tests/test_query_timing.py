@@ -0,0 +1,101 @@
+"""
+Tests for the query execution timing spans and the /metrics endpoint.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from challenges.metrics import render_prometheus
+from challenges.sqlite_engine import clear_sqlite_templates
+from challenges.tests.factories import create_employees_challenge
+from sqlplayground import query_timing
+
+User = get_user_model()
+
+
+class QueryTimingTestCase(TestCase):
+    """Test span collection, the histogram and the staff timings block."""
+
+    def setUp(self):
+        query_timing.histogram.reset()
+        self.addCleanup(query_timing.histogram.reset)
+        self.addCleanup(clear_sqlite_templates)
+
+        self.user = User.objects.create_user(username='timed', email='timed@test.com', password='testpass123')
+        self.challenge = create_employees_challenge("Timed Challenge")
+
+    def test_spans_reach_trace_and_histogram(self):
+        with query_timing.trace_request() as trace:
+            for _ in range(2):
+                with query_timing.span('db.execute', 'mysql'):
+                    pass
+        with query_timing.span('db.execute', 'mysql'):
+            pass
+
+        self.assertEqual([name for name, _ in trace], ['db.execute', 'db.execute'])
+        self.assertEqual(list(query_timing.summarize_trace(trace)), ['db.execute'])
+        series = query_timing.histogram.snapshot()[('db.execute', 'mysql')]
+        self.assertEqual(series[-1], 3)
+
+        with override_settings(QUERY_METRICS_DIR=''):
+            text = render_prometheus()
+        self.assertIn('kodesql_query_phase_seconds_count{phase="db.execute",engine="mysql"} 3', text)
+
+    def test_histograms_of_all_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with override_settings(QUERY_METRICS_DIR=directory):
+            for _ in range(2):
+                with query_timing.span('db.execute', 'postgresql'):
+                    pass
+
+            # A query worker that counts one span of its own and exits
+            pid = os.fork()
+            if pid == 0:
+                with query_timing.span('db.execute', 'postgresql'):
+                    pass
+                query_timing.flush_histogram()
+                os._exit(0)
+            os.waitpid(pid, 0)
+
+            for _ in range(2):
+                series = query_timing.collect_histogram()[('db.execute', 'postgresql')]
+                self.assertEqual(series[-1], 3)
+            # The exited worker's file was folded into the archive
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted(['archive.json', 'archive.lock', f'{query_timing.histogram.process_id}.json']),
+            )
+
+    @override_settings(CHALLENGE_SQLITE_ENGINE_ENABLED=True, CHALLENGE_RESULT_CACHE_ENABLED=False)
+    def test_timings_block_is_for_staff_only(self):
+        url = reverse('challenges:execute_challenge_query', args=[self.challenge.id])
+        payload = json.dumps({'query': 'SELECT name FROM employees', 'engine': 'sqlite'})
+
+        self.client.force_login(self.user)
+        data = self.client.post(url, payload, content_type='application/json', secure=True).json()
+        self.assertTrue(data['success'])
+        self.assertNotIn('timings', data)
+
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.post(url, payload, content_type='application/json', secure=True).json()
+        self.assertIn('query.total', data['timings'])
+        self.assertIn('db.execute', data['timings'])
+        self.assertIn('view.run', data['timings'])
+
+    @override_settings(QUERY_METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint_access(self):
+        url = reverse('core:metrics')
+        self.assertEqual(self.client.get(url, secure=True).status_code, 403)
+
+        response = self.client.get(url, secure=True, HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('kodesql_engine_available', response.content.decode())
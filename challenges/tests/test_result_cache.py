@@ -0,0 +1,77 @@
+"""
+Tests for the challenge query result cache.
+"""
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from challenges.result_cache import CACHE_ALIAS, get_query_fingerprint, is_cacheable_query
+from challenges.tests.factories import create_employees_challenge
+from challenges.utils import execute_dual_dataset_query
+
+
+class ResultCacheTestCase(TestCase):
+    """Test query fingerprints, cacheability and cache invalidation."""
+
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.challenge = create_employees_challenge("Cache Challenge")
+        self.table = self.challenge.tables.get()
+
+    def test_fingerprint_keeps_the_query_as_written(self):
+        self.assertEqual(
+            get_query_fingerprint("  SELECT name FROM employees WHERE name = 'Ann'; ;\n"),
+            get_query_fingerprint("SELECT name FROM employees WHERE name = 'Ann'"),
+        )
+        # Literals and identifiers keep their case
+        self.assertNotEqual(
+            get_query_fingerprint("SELECT name FROM employees WHERE name = 'ann'"),
+            get_query_fingerprint("SELECT name FROM employees WHERE name = 'Ann'"),
+        )
+        self.assertNotEqual(
+            get_query_fingerprint("SELECT name AS Name FROM employees"),
+            get_query_fingerprint("SELECT name AS name FROM employees"),
+        )
+        # Unaliased columns are named after the expression as typed
+        self.assertNotEqual(
+            get_query_fingerprint("SELECT COUNT(*) FROM employees"),
+            get_query_fingerprint("select count(*) from employees"),
+        )
+        self.assertNotEqual(
+            get_query_fingerprint("SELECT 1  +  1"),
+            get_query_fingerprint("SELECT 1 + 1"),
+        )
+        self.assertNotEqual(
+            get_query_fingerprint("SELECT COUNT(*) AS Total FROM employees"),
+            get_query_fingerprint("SELECT COUNT(*) AS total FROM employees"),
+        )
+
+    def test_only_deterministic_reads_are_cacheable(self):
+        self.assertTrue(is_cacheable_query("SELECT name FROM employees WHERE note = 'now'"))
+        self.assertFalse(is_cacheable_query("SELECT NOW()"))
+        self.assertFalse(is_cacheable_query("SELECT name FROM employees ORDER BY RAND()"))
+        self.assertFalse(is_cacheable_query("DELETE FROM employees"))
+        self.assertFalse(is_cacheable_query("SHOW TABLES"))
+
+    def test_repeated_runs_hit_cache_until_challenge_changes(self):
+        result = {'success': True, 'results': [{'name': 'Ann'}], 'columns': ['name'], 'row_count': 1}
+
+        with mock.patch('challenges.utils._execute_on_engine', return_value=dict(result)) as execute:
+            execute_dual_dataset_query(self.challenge, "SELECT name FROM employees", 1, engine='postgresql')
+            cached = execute_dual_dataset_query(self.challenge, "SELECT name FROM employees;", 1, engine='postgresql')
+            self.assertEqual(execute.call_count, 1)
+            self.assertTrue(cached['cached'])
+            self.assertEqual(cached['results'], result['results'])
+
+            # Submit results are never read from or written to the cache
+            for _ in range(2):
+                submitted = execute_dual_dataset_query(self.challenge, "SELECT name FROM employees", 2, engine='postgresql')
+                self.assertNotIn('cached', submitted)
+            self.assertEqual(execute.call_count, 3)
+
+            self.table.run_dataset_sql = "INSERT INTO employees (id, name) VALUES (3, 'Cy');"
+            self.table.save()
+            execute_dual_dataset_query(self.challenge, "SELECT name FROM employees", 1, engine='postgresql')
+            self.assertEqual(execute.call_count, 4)
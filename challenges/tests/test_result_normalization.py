@@ -0,0 +1,59 @@
+"""
+Tests for normalize_json_result.
+"""
+
+import datetime
+import decimal
+import itertools
+
+from django.test import SimpleTestCase
+
+from challenges.result_normalization import normalize_json_result, normalize_value
+
+
+class NormalizeResultTestCase(SimpleTestCase):
+    """Test value normalization and the canonical row order."""
+
+    def test_values(self):
+        class Score(int):
+            pass
+
+        self.assertIsNone(normalize_value(None))
+        self.assertIs(normalize_value(True), True)
+        self.assertEqual(normalize_value(Score(7)).__class__, int)
+        self.assertEqual(normalize_value(0.1 + 0.2), 0.3)
+        self.assertEqual(normalize_value(decimal.Decimal('12.50')), 12.5)
+        self.assertEqual(normalize_value(datetime.date(2024, 1, 5)), '2024-01-05')
+        self.assertEqual(normalize_value(datetime.datetime(2024, 1, 5, 9, 30)), '2024-01-05T09:30:00')
+        self.assertEqual(normalize_value('  Ann '), 'Ann')
+        self.assertEqual(normalize_value(b'abc'), 'abc')
+        self.assertEqual(normalize_value(datetime.time(9, 30)), '09:30:00')
+
+    def test_rows_keep_column_order_without_flag_id(self):
+        rows = [
+            {'name': ' Bob ', 'flag_id': 2, 'salary': decimal.Decimal('10.10')},
+            {'name': 'Ann', 'flag_id': 2, 'salary': decimal.Decimal('10.10')},
+        ]
+        normalized = normalize_json_result(rows, preserve_order=True)
+        self.assertEqual(normalized, [{'name': 'Bob', 'salary': 10.1}, {'name': 'Ann', 'salary': 10.1}])
+        self.assertEqual(list(normalized[0]), ['name', 'salary'])
+
+    def test_unordered_results_have_one_canonical_order(self):
+        rows = [
+            {'id': 2, 'name': 'b', 'manager_id': None},
+            {'id': 1, 'name': 'a', 'manager_id': 3},
+            {'id': 3, 'name': 'c', 'manager_id': 1},
+            {'id': 1, 'name': 'a', 'manager_id': None},
+        ]
+        canonical = normalize_json_result(rows)
+        for permutation in itertools.permutations(rows):
+            self.assertEqual(normalize_json_result(list(permutation)), canonical)
+        # Engines return Decimal or float for the same column
+        mixed = [dict(row, id=decimal.Decimal(row['id'])) for row in reversed(rows)]
+        self.assertEqual(normalize_json_result(mixed), canonical)
+
+    def test_mixed_layouts_and_scalars(self):
+        rows = [{'b': 1, 'a': 2}, {'a': 2, 'b': 1}, {'a': 1}]
+        self.assertEqual(normalize_json_result(rows), [{'a': 1}, {'b': 1, 'a': 2}, {'a': 2, 'b': 1}])
+        self.assertEqual(normalize_json_result([' x', None, 2]), [None, 2, 'x'])
+        self.assertEqual(normalize_json_result(decimal.Decimal('1.5')), 1.5)
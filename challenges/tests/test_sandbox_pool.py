@@ -0,0 +1,137 @@
+"""
+Tests for the reusable sandbox database pool.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+
+from challenges.models import ChallengeTable
+from challenges.sandbox_pool import (
+    FULL_RESET, NO_CHANGES, SANDBOX_NAME_PATTERN, SandboxPool, classify_changes, get_table_plan
+)
+from challenges.tests.factories import create_employees_challenge
+
+
+class ClassifyChangesTestCase(TestCase):
+    """Test which tables a query is recorded to have changed."""
+
+    def test_reads_change_nothing(self):
+        self.assertEqual(classify_changes('SELECT * FROM emp_q1; BEGIN; COMMIT'), NO_CHANGES)
+
+    def test_writes_mark_table_data(self):
+        changes = classify_changes("INSERT INTO emp_q1 (id) VALUES (3); DELETE FROM dept_q1 WHERE id = 1")
+        self.assertEqual(changes.data_tables, {'emp_q1', 'dept_q1'})
+        self.assertEqual(changes.schema_tables, frozenset())
+        self.assertFalse(changes.full_reset)
+
+    def test_ddl_marks_table_schema(self):
+        changes = classify_changes("ALTER TABLE emp_q1 ADD COLUMN x INT; CREATE TABLE scratch (id INT)")
+        self.assertEqual(changes.schema_tables, {'emp_q1', 'scratch'})
+
+    def test_unknown_statements_reset_everything(self):
+        self.assertEqual(classify_changes('CREATE VIEW v AS SELECT 1'), FULL_RESET)
+        self.assertEqual(classify_changes('CALL refresh_all()'), FULL_RESET)
+
+    def test_cascades_and_triggers_reset_everything(self):
+        self.assertEqual(classify_changes(
+            "ALTER TABLE emp_q1 ADD FOREIGN KEY (dept_id) REFERENCES dept_q1 (id) ON DELETE CASCADE"
+        ), FULL_RESET)
+        self.assertEqual(classify_changes(
+            "CREATE TRIGGER t AFTER DELETE ON dept_q1 FOR EACH ROW DELETE FROM emp_q1"
+        ), FULL_RESET)
+        self.assertEqual(classify_changes("SELECT 'trigger' AS kind FROM emp_q1"), NO_CHANGES)
+
+
+class SandboxPoolTestCase(TestCase):
+    """Test leasing, reuse, exhaustion and leak reclaiming with the database work mocked."""
+
+    def setUp(self):
+        self.challenge = create_employees_challenge("Sandbox Challenge")
+        self.compiled = self.challenge.get_compiled_sql()
+
+        def reload(pool, sandbox, compiled, flag_id):
+            sandbox.compiled = compiled
+            sandbox.flag_id = flag_id
+
+        for patcher in (
+            mock.patch.object(SandboxPool, '_create_database', autospec=True),
+            mock.patch.object(SandboxPool, '_reload', autospec=True, side_effect=reload),
+            mock.patch.object(SandboxPool, '_schedule', autospec=True),
+            mock.patch('challenges.connection_pool.get_connection'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_table_plan_groups_statements_by_table(self):
+        tables, operations = get_table_plan(self.compiled, 'postgresql', 1)
+        unique_name = self.compiled['table_mapping']['employees'].lower()
+        self.assertEqual(list(tables), [unique_name])
+        self.assertEqual({table for table, _ in operations}, {unique_name})
+
+    def test_clean_sandbox_is_reused_without_reload(self):
+        pool = SandboxPool('postgresql', 1)
+        lease = pool.lease(self.compiled, 1)
+        self.assertTrue(SANDBOX_NAME_PATTERN.match(lease.database_name))
+        pool.release(lease, 'SELECT 1')
+
+        lease = pool.lease(self.compiled, 1)
+        stats = pool.get_stats()
+        self.assertEqual((stats['leases'], stats['reloads'], stats['reused']), (2, 1, 1))
+
+    def test_released_writes_are_recycled(self):
+        pool = SandboxPool('postgresql', 1, checkout_timeout=0)
+        lease = pool.lease(self.compiled, 1)
+        pool.release(lease, 'DELETE FROM employees_q1')
+
+        self.assertEqual(pool.get_stats()['recycling'], 1)
+        SandboxPool._schedule.assert_called_once()
+        # The only sandbox is busy until it is recycled
+        self.assertIsNone(pool.lease(self.compiled, 1))
+        self.assertEqual(pool.get_stats()['exhausted'], 1)
+
+    def test_expired_lease_is_reclaimed(self):
+        pool = SandboxPool('postgresql', 1, lease_seconds=0, checkout_timeout=0)
+        leaked = pool.lease(self.compiled, 1)
+
+        self.assertIsNone(pool.lease(self.compiled, 1))
+        self.assertEqual(pool.get_stats()['leaks'], 1)
+        self.assertEqual(leaked.sandbox.changes, FULL_RESET)
+
+        # Releasing the reclaimed lease later must not free the sandbox again
+        pool.release(leaked, 'SELECT 1')
+        self.assertEqual(pool.get_stats()['recycling'], 1)
+
+    def test_reclaimed_sandbox_waits_for_its_connection(self):
+        pool = SandboxPool('postgresql', 1, lease_seconds=0, checkout_timeout=0)
+        leaked = pool.lease(self.compiled, 1)
+        self.assertIsNone(pool.lease(self.compiled, 1))
+
+        with mock.patch.object(SandboxPool, '_terminate_backend', return_value=True) as terminate, \
+                mock.patch.object(SandboxPool, '_recycle') as recycle:
+            pool._process(leaked.sandbox)
+        terminate.assert_called_once()
+        recycle.assert_called_once()
+        self.assertEqual(pool.get_stats()['free'], 1)
+
+        leaked = pool.lease(self.compiled, 1)
+        self.assertIsNone(pool.lease(self.compiled, 1))
+        with mock.patch.object(SandboxPool, '_terminate_backend', return_value=False), \
+                mock.patch.object(SandboxPool, '_recycle') as recycle:
+            pool._process(leaked.sandbox)
+        # Still possibly in use: never reloaded, no longer leased out
+        recycle.assert_not_called()
+        stats = pool.get_stats()
+        self.assertEqual((stats['size'], stats['retired']), (0, 1))
+
+    def test_cascading_schema_is_always_fully_reloaded(self):
+        ChallengeTable.objects.create(
+            challenge=self.challenge,
+            table_name="badges",
+            schema_sql="CREATE TABLE badges (id INT PRIMARY KEY, employee_id INT, "
+                       "FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE)",
+            run_dataset_sql="INSERT INTO badges (id, employee_id) VALUES (1, 1);",
+            submit_dataset_sql="INSERT INTO badges (id, employee_id) VALUES (1, 1);",
+        )
+        self.challenge.refresh_from_db()
+        self.assertIsNone(get_table_plan(self.challenge.get_compiled_sql(), 'postgresql', 1))
@@ -0,0 +1,99 @@
+"""
+Conformance tests for the MySQL to PostgreSQL dialect translator.
+"""
+
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from challenges import sql_translator
+from challenges.sql_translator import clear_translations, translate_mysql_to_postgresql
+
+
+# (name, MySQL, expected PostgreSQL)
+CORPUS = [
+    ('auto_increment_primary_key',
+     "CREATE TABLE t (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(50))",
+     "CREATE TABLE t (id SERIAL PRIMARY KEY, name VARCHAR(50))"),
+    ('auto_increment_with_attributes',
+     "CREATE TABLE t (id INT(11) UNSIGNED NOT NULL AUTO_INCREMENT, PRIMARY KEY (id))",
+     "CREATE TABLE t (id SERIAL NOT NULL, PRIMARY KEY (id))"),
+    ('bigint_auto_increment',
+     "CREATE TABLE t (id BIGINT AUTO_INCREMENT PRIMARY KEY)",
+     "CREATE TABLE t (id BIGSERIAL PRIMARY KEY)"),
+    ('integer_types',
+     "CREATE TABLE t (a TINYINT(1), b MEDIUMINT, c SMALLINT(6) ZEROFILL, d INT)",
+     "CREATE TABLE t (a SMALLINT, b INTEGER, c SMALLINT, d INT)"),
+    ('other_types',
+     "CREATE TABLE t (a DATETIME, b DOUBLE, c FLOAT(7,4), d LONGTEXT, e BLOB, f DECIMAL(10,2), g DOUBLE PRECISION)",
+     "CREATE TABLE t (a TIMESTAMP, b DOUBLE PRECISION, c REAL, d TEXT, e BYTEA, f DECIMAL(10,2), g DOUBLE PRECISION)"),
+    ('backticks',
+     "CREATE TABLE `order` (`id` INT, `a``b` INT)",
+     'CREATE TABLE "order" ("id" INT, "a`b" INT)'),
+    ('table_options',
+     "CREATE TABLE t (id INT) ENGINE=InnoDB AUTO_INCREMENT=10 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+     "CREATE TABLE t (id INT)"),
+    ('column_attributes',
+     "CREATE TABLE t (name VARCHAR(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin COMMENT 'display name', "
+     "updated DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP)",
+     "CREATE TABLE t (name VARCHAR(20), updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"),
+    ('insert_ignore',
+     "INSERT IGNORE INTO t (id) VALUES (1);\nINSERT INTO t (id) VALUES (2);",
+     "INSERT INTO t (id) VALUES (1) ON CONFLICT DO NOTHING;\nINSERT INTO t (id) VALUES (2);"),
+    ('date_functions',
+     "SELECT CURDATE(), CURTIME(), SYSDATE(), UTC_TIMESTAMP(), IFNULL(a, 0) FROM t",
+     "SELECT CURRENT_DATE, CURRENT_TIME, NOW(), (NOW() AT TIME ZONE 'UTC'), COALESCE(a, 0) FROM t"),
+    ('strings_and_comments_untouched',
+     "-- ENGINE=InnoDB DATETIME\nINSERT INTO t (a) VALUES ('DATETIME `x` AUTO_INCREMENT') /* TINYINT */",
+     "-- ENGINE=InnoDB DATETIME\nINSERT INTO t (a) VALUES ('DATETIME `x` AUTO_INCREMENT') /* TINYINT */"),
+    ('backslash_escapes',
+     "INSERT INTO t (a) VALUES ('It\\'s'), ('plain')",
+     "INSERT INTO t (a) VALUES (E'It\\'s'), ('plain')"),
+    ('options_only_removed_from_ddl',
+     "UPDATE t SET engine = 'InnoDB', comment = 'x' WHERE charset = 'utf8'",
+     "UPDATE t SET engine = 'InnoDB', comment = 'x' WHERE charset = 'utf8'"),
+]
+
+
+class TranslatorConformanceTestCase(SimpleTestCase):
+    """Test every corpus entry translates to the expected PostgreSQL."""
+
+    def setUp(self):
+        clear_translations()
+
+    def test_corpus(self):
+        for name, mysql_sql, expected in CORPUS:
+            with self.subTest(name):
+                self.assertEqual(translate_mysql_to_postgresql(mysql_sql), expected)
+
+    def test_translations_are_memoized(self):
+        sql = "CREATE TABLE t (id INT AUTO_INCREMENT PRIMARY KEY)"
+        translate_mysql_to_postgresql(sql)
+        with mock.patch.object(sql_translator, '_translate') as translate:
+            self.assertEqual(translate_mysql_to_postgresql(sql), "CREATE TABLE t (id SERIAL PRIMARY KEY)")
+        translate.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs a PostgreSQL database')
+class TranslatorPostgreSQLTestCase(TestCase):
+    """Test the translated corpus is accepted by PostgreSQL."""
+
+    def test_translated_corpus_executes(self):
+        for name, mysql_sql, _ in CORPUS:
+            if not mysql_sql.startswith('CREATE TABLE'):
+                continue
+            with self.subTest(name), connection.cursor() as cursor:
+                cursor.execute('SAVEPOINT corpus')
+                cursor.execute(translate_mysql_to_postgresql(mysql_sql))
+                cursor.execute('ROLLBACK TO SAVEPOINT corpus')
+
+        with connection.cursor() as cursor:
+            cursor.execute(translate_mysql_to_postgresql(
+                "CREATE TABLE t (id INT AUTO_INCREMENT PRIMARY KEY, a TEXT)"
+            ))
+            cursor.execute(translate_mysql_to_postgresql(
+                "INSERT IGNORE INTO t (id, a) VALUES (1, 'It\\'s'); INSERT IGNORE INTO t (id, a) VALUES (1, 'dup')"
+            ))
+            cursor.execute("SELECT a FROM t")
+            self.assertEqual(cursor.fetchall(), [("It's",)])
@@ -0,0 +1,75 @@
+"""
+Tests for the in-memory SQLite challenge engine.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+
+from challenges.sqlite_engine import clear_sqlite_templates
+from challenges.tests.factories import create_employees_challenge
+from challenges.utils import DatabaseEngineManager, execute_dual_dataset_query
+
+
+class SqliteEngineTestCase(TestCase):
+    """Test queries on copies of the in-memory SQLite templates."""
+
+    def setUp(self):
+        self.challenge = create_employees_challenge(
+            "SQLite Challenge",
+            schema_sql="CREATE TABLE employees (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(50)) ENGINE=InnoDB",
+            run_dataset_sql="INSERT INTO employees (id, name) VALUES (1, 'Ann'), (2, 'Bob');",
+            submit_dataset_sql="INSERT INTO employees (id, name) VALUES (1, 'Cid');",
+        )
+        self.addCleanup(clear_sqlite_templates)
+
+    def test_datasets_are_exposed_under_original_names(self):
+        run = execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees ORDER BY id', 1, engine='sqlite')
+        submit = execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees', 2, engine='sqlite')
+
+        self.assertEqual(run['results'], [{'name': 'Ann'}, {'name': 'Bob'}])
+        self.assertEqual(submit['results'], [{'name': 'Cid'}])
+
+    def test_modifications_only_change_the_private_copy(self):
+        query = "INSERT INTO employees (name) VALUES ('Dee'); SELECT name FROM employees ORDER BY id"
+        result = execute_dual_dataset_query(self.challenge, query, 1, engine='sqlite')
+        self.assertEqual([row['name'] for row in result['results']], ['Ann', 'Bob', 'Dee'])
+
+        result = execute_dual_dataset_query(self.challenge, 'SELECT COUNT(*) AS n FROM employees', 1, engine='sqlite')
+        self.assertEqual(result['results'], [{'n': 2}])
+
+    def test_falls_back_to_sqlite_without_database_servers(self):
+        unreachable = {'success': False, 'error': 'PostgreSQL Error: could not connect to server: Connection refused'}
+        with mock.patch('challenges.utils._execute_on_engine', return_value=unreachable):
+            result = execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees ORDER BY id', 1, engine='postgresql')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['fallback_engine'], 'sqlite')
+        self.assertEqual(result['results'], [{'name': 'Ann'}, {'name': 'Bob'}])
+
+    def test_submit_is_never_graded_on_sqlite(self):
+        errors = {
+            'mysql': "MySQL Error: 2003: Can't connect to MySQL server",
+            'postgresql': 'PostgreSQL Error: could not connect to server: Connection refused',
+        }
+
+        def unreachable(challenge, flag_id, engine, *args):
+            return {'success': False, 'error': errors[engine]}
+
+        with mock.patch('challenges.utils._execute_on_engine', side_effect=unreachable):
+            result = execute_dual_dataset_query(self.challenge, 'SELECT name FROM employees', 2, engine='mysql')
+
+        self.assertFalse(result['success'])
+        self.assertNotIn('fallback_engine', result)
+
+    def test_mysql_schema_is_adapted(self):
+        adapted = DatabaseEngineManager('sqlite')._adapt_sql_for_engine(
+            "CREATE TABLE t (id INT(11) UNSIGNED AUTO_INCREMENT PRIMARY KEY, "
+            "kind ENUM('a','b') COMMENT 'kind', ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+            'sqlite'
+        )
+        self.assertEqual(
+            adapted,
+            "CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
@@ -0,0 +1,104 @@
+"""
+Tests for the challenge sandbox warm-up and the clone leases it uses.
+"""
+
+import threading
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import TestCase
+
+from challenges import engine_health, sqlite_engine, warmup
+from challenges.clone_pool import ClonePool
+from challenges.tests.factories import create_employees_challenge
+
+
+class WarmupTestCase(TestCase):
+    """Test scheduling and running warm-ups."""
+
+    def setUp(self):
+        cache.clear()
+        caches[engine_health.CACHE_ALIAS].clear()
+        self.addCleanup(sqlite_engine.clear_sqlite_templates)
+
+        self.challenge = create_employees_challenge("Warm-up Challenge")
+
+    @mock.patch('challenges.warmup._ensure_worker')
+    def test_page_views_schedule_one_warmup(self, ensure_worker):
+        with mock.patch.object(warmup, '_tasks') as tasks:
+            self.assertTrue(warmup.schedule_warmup(self.challenge, 'postgresql'))
+            self.assertFalse(warmup.schedule_warmup(self.challenge, 'postgresql'))
+            self.assertTrue(warmup.schedule_warmup(self.challenge, 'sqlite'))
+
+        self.assertEqual(
+            [call.args[0] for call in tasks.put.call_args_list],
+            [(self.challenge.id, 'postgresql'), (self.challenge.id, 'sqlite')]
+        )
+
+    @mock.patch('challenges.engine_health.ensure_probes_running')
+    @mock.patch('challenges.warmup._ensure_worker')
+    def test_no_warmup_while_engine_is_down(self, ensure_worker, ensure_probes_running):
+        for _ in range(engine_health.get_failure_threshold()):
+            engine_health.record_engine_failure('mysql', 'down')
+
+        self.assertFalse(warmup.schedule_warmup(self.challenge, 'mysql'))
+        ensure_worker.assert_not_called()
+
+    def test_warmup_loads_sqlite_template(self):
+        self.assertEqual(warmup.warm_up_challenge(self.challenge.id, 'sqlite'), 'memory')
+
+        compiled = self.challenge.get_compiled_sql()
+        self.assertIn((compiled['version'], warmup.RUN_FLAG_ID), sqlite_engine._templates)
+
+
+class CloneLeaseTestCase(TestCase):
+    """Test that warmed clones are dropped when their lease runs out."""
+
+    @mock.patch('challenges.clone_pool.drop_clone')
+    @mock.patch('challenges.clone_pool.create_clone', return_value='challenge_1_vabc_d1_c0')
+    def test_unused_clones_expire(self, create_clone, drop_clone):
+        pool = ClonePool(1, lease_seconds=0)
+        with mock.patch.object(pool, '_schedule'):
+            pool.warm('challenge_1_vabc_d1_t')
+        pool._fill('challenge_1_vabc_d1_t')
+        self.assertEqual(pool.ready_count('challenge_1_vabc_d1_t'), 1)
+
+        pool.expire_leases()
+
+        self.assertEqual(pool.ready_count('challenge_1_vabc_d1_t'), 0)
+        drop_clone.assert_called_once_with('challenge_1_vabc_d1_c0')
+
+    @mock.patch('challenges.clone_pool.drop_clone')
+    def test_discard_waits_for_clones_being_created(self, drop_clone):
+        pool = ClonePool(1)
+        cloning, finish = threading.Event(), threading.Event()
+
+        def create_clone(source_name):
+            cloning.set()
+            finish.wait(5)
+            return 'challenge_1_vabc_d1_c1'
+
+        with mock.patch('challenges.clone_pool.create_clone', side_effect=create_clone):
+            fill = threading.Thread(target=pool._fill, args=('challenge_1_vabc_d1_t',))
+            fill.start()
+            self.assertTrue(cloning.wait(5))
+
+            discard = threading.Thread(target=pool.discard_source, args=('challenge_1_vabc_d1_t',))
+            discard.start()
+            discard.join(0.2)
+            # Dropping the source now would fail while it is being copied
+            self.assertTrue(discard.is_alive())
+
+            finish.set()
+            discard.join(5)
+            fill.join(5)
+
+        drop_clone.assert_called_once_with('challenge_1_vabc_d1_c1')
+        self.assertEqual(pool.ready_count('challenge_1_vabc_d1_t'), 0)
+        with self.assertRaises(RuntimeError):
+            pool.take('challenge_1_vabc_d1_t')
+
+        pool.restore_source('challenge_1_vabc_d1_t')
+        with mock.patch('challenges.clone_pool.create_clone', return_value='challenge_1_vabc_d1_c2'):
+            with mock.patch.object(pool, '_schedule'):
+                self.assertEqual(pool.take('challenge_1_vabc_d1_t'), 'challenge_1_vabc_d1_c2')
@@ -13,6 +13,7 @@ urlpatterns = [
     path('<int:challenge_id>/', views.challenge_detail, name='challenge_detail'),
     path('api/execute/<int:challenge_id>/', views.execute_challenge_query, name='execute_challenge_query'),
     path('api/submit/<int:challenge_id>/', views.submit_challenge, name='submit_challenge'),
+    path('api/jobs/<uuid:job_id>/', views.challenge_query_job, name='challenge_query_job'),
 
     # Subscription views
     path('subscription/', views.subscription_plans, name='subscription_plans'),
@@ -21,6 +21,21 @@ class DatabaseEngineManager:
         if engine not in self.supported_engines:
             raise ValueError(f"Unsupported database engine: {engine}")
     
+    def lease_sandbox(self, compiled, flag_id):
+        """
+        Lease a pooled sandbox database holding a challenge dataset (see
+        sandbox_pool.py). Returns None if the pool has no sandbox available.
+        """
+        from .sandbox_pool import get_sandbox_pool
+
+        if self.engine == 'sqlite':
+            return None
+        return get_sandbox_pool(self.engine).lease(compiled, flag_id)
+    
+    def release_sandbox(self, lease, query=''):
+        """Return a leased sandbox; the tables query may have changed are recycled"""
+        lease.pool.release(lease, query)
+    
     def get_connection(self, db_path_or_config):
         """
         Get database connection based on engine type.
@@ -41,38 +56,24 @@ class DatabaseEngineManager:
         return conn
     
     def _get_postgresql_connection(self, config):
-        """Get PostgreSQL connection."""
+        """Get a pooled PostgreSQL connection."""
         try:
-            import psycopg2
             from psycopg2.extras import RealDictCursor
+            from .connection_pool import get_connection
 
-            # Use the correct settings variables that match our .env configuration
-            conn = psycopg2.connect(
-                host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-                port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-                database=config.get('database', getattr(settings, 'POSTGRESQL_DB', 'sqlplayground_queries_pg')),
-                user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-                password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-                cursor_factory=RealDictCursor
-            )
+            conn = get_connection('postgresql', config.get('database', getattr(settings, 'POSTGRESQL_DB', 'sqlplayground_queries_pg')))
+            conn.cursor_factory = RealDictCursor
             return conn
         except ImportError:
             raise ImportError("psycopg2 is required for PostgreSQL support. Install with: pip install psycopg2-binary")
     
     def _get_mysql_connection(self, config):
-        """Get MySQL connection."""
+        """Get a pooled MySQL connection."""
         try:
-            import mysql.connector
-
-            # Use the correct settings variables that match our .env configuration
-            conn = mysql.connector.connect(
-                host=getattr(settings, 'MYSQL_HOST', 'localhost'),
-                port=getattr(settings, 'MYSQL_PORT', 3306),
-                database=config.get('database', getattr(settings, 'MYSQL_DB', 'sqlplayground_queries_mysql')),
-                user=getattr(settings, 'MYSQL_USER', 'root'),
-                password=getattr(settings, 'MYSQL_PASSWORD', ''),
-                autocommit=True
-            )
+            from .connection_pool import get_connection
+
+            conn = get_connection('mysql', config.get('database', getattr(settings, 'MYSQL_DB', 'sqlplayground_queries_mysql')))
+            conn.autocommit = True
             return conn
         except ImportError:
             raise ImportError("mysql-connector-python is required for MySQL support. Install with: pip install mysql-connector-python")
@@ -126,6 +127,8 @@ class DatabaseEngineManager:
     
     def _initialize_postgresql_database(self, challenge, user):
         """Initialize PostgreSQL database."""
+        from .connection_pool import close_pool
+
         # Create unique database name for this challenge and user
         db_name = f"challenge_{challenge.id}_user_{user.id}"
         
@@ -137,6 +140,7 @@ class DatabaseEngineManager:
         
         try:
             # Drop database if exists and create new one
+            close_pool(self.engine, db_name)
             admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
             admin_cursor.execute(f"CREATE DATABASE {db_name}")
         finally:
@@ -170,6 +174,8 @@ class DatabaseEngineManager:
     
     def _initialize_mysql_database(self, challenge, user):
         """Initialize MySQL database."""
+        from .connection_pool import close_pool
+
         # Create unique database name for this challenge and user
         db_name = f"challenge_{challenge.id}_user_{user.id}"
         
@@ -180,6 +186,7 @@ class DatabaseEngineManager:
         
         try:
             # Drop database if exists and create new one
+            close_pool(self.engine, db_name)
             admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
             admin_cursor.execute(f"CREATE DATABASE {db_name}")
         finally:
@@ -239,6 +246,22 @@ class DatabaseEngineManager:
         Adapt SQL syntax for different database engines.
         """
         if engine == 'sqlite':
+            # Challenge SQL is written for MySQL; SQLite accepts most of it as is
+            import re
+            sql = re.sub(
+                r'\b(?:TINY|SMALL|MEDIUM|BIG)?INT(?:EGER)?(?:\s*\(\d+\))?(?:\s+UNSIGNED)?'
+                r'(?:\s+NOT\s+NULL)?\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b',
+                'INTEGER PRIMARY KEY AUTOINCREMENT', sql, flags=re.IGNORECASE
+            )
+            sql = re.sub(r'\s+AUTO_INCREMENT\b(?!\s*=)', '', sql, flags=re.IGNORECASE)
+            sql = re.sub(r'\bENUM\s*\([^)]*\)', 'TEXT', sql, flags=re.IGNORECASE)
+            sql = re.sub(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b', '', sql, flags=re.IGNORECASE)
+            sql = re.sub(r"\s+COMMENT\s+'(?:[^'\\]|\\.|'')*'", '', sql, flags=re.IGNORECASE)
+            # Table options after the closing parenthesis of CREATE TABLE
+            sql = re.sub(
+                r'\)(?:\s*(?:ENGINE|(?:DEFAULT\s+)?(?:CHARSET|CHARACTER\s+SET)|COLLATE|AUTO_INCREMENT)\s*=?\s*\w+)+',
+                ')', sql, flags=re.IGNORECASE
+            )
             return sql
         elif engine == 'postgresql':
             # Convert SQLite syntax to PostgreSQL
@@ -291,14 +314,16 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
     - Multiple SELECT statements
     - Complex subqueries and window functions
     - Mixed statement types (SELECT, INSERT, UPDATE, etc.)
+
+    query may be a string or an editor.parsed_query.ParsedQuery.
     """
-    from editor.views import remove_sql_comments
-    import re
+    from editor.parsed_query import as_parsed_query
+    from editor.query_governor import apply_query_limits, describe_error, execute_and_fetch
 
-    # Clean the query
-    clean_query = remove_sql_comments(query).strip()
+    # Comments are removed and statements split when the query is parsed
+    parsed_query = as_parsed_query(query)
 
-    if not clean_query:
+    if parsed_query.is_empty:
         return {
             'success': False,
             'error': 'Query is empty or contains only comments'
@@ -319,12 +344,15 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
 
-        # Split query into individual statements
-        statements = _split_sql_statements(clean_query)
+        statements = parsed_query.statement_texts
 
         all_results = []
         total_changes = 0
         last_insert_id = None
+        truncated = False
+
+        # Time and row limits for the user's statements
+        apply_query_limits(conn, cursor, engine)
 
         for i, statement in enumerate(statements):
             statement = statement.strip()
@@ -332,26 +360,22 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
                 continue
 
             try:
-                # Execute the statement
-                cursor.execute(statement)
-
                 # Determine if this is a SELECT statement or returns results
-                is_select = _is_select_statement(statement)
+                is_select = parsed_query.returns_rows(i)
 
                 if is_select:
-                    # Handle SELECT statements and other statements that return results
-                    rows = cursor.fetchall()
+                    # Handle SELECT statements and other statements that return results,
+                    # fetching at most the governor's row and byte caps
+                    columns, rows, statement_truncated = execute_and_fetch(
+                        conn, cursor, engine, statement, parsed_query.statement_kinds[i]
+                    )
+                    truncated = truncated or statement_truncated
 
                     if rows:
                         # Get column information
-                        if engine == 'postgresql':
-                            columns = list(rows[0].keys()) if rows else []
-                            results = [dict(row) for row in rows]
-                        elif engine == 'mysql':
-                            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                        if engine == 'mysql':
                             results = rows  # Already dictionaries with dictionary=True cursor
-                        else:  # sqlite
-                            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                        else:
                             results = [dict(row) for row in rows]
 
                         # Filter out flag_id column from display if present
@@ -385,6 +409,7 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
                         })
                 else:
                     # Handle INSERT, UPDATE, DELETE, etc.
+                    cursor.execute(statement)
                     if engine != 'postgresql':  # PostgreSQL auto-commits in autocommit mode
                         conn.commit()
 
@@ -416,7 +441,7 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
                 conn.close()
                 return {
                     'success': False,
-                    'error': f'Error in statement {i + 1}: {str(stmt_error)}',
+                    'error': f'Error in statement {i + 1}: {describe_error(engine, stmt_error)}',
                     'statement': statement,
                     'engine': engine
                 }
@@ -428,7 +453,7 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
             # Single statement - return simplified format
             result = all_results[0]
             if result['type'] == 'SELECT':
-                return {
+                response = {
                     'success': True,
                     'results': result['results'],
                     'columns': result['columns'],
@@ -475,7 +500,10 @@ def execute_sql_query_enhanced(engine, db_config_or_path, query):
             if not select_results and modification_results:
                 response['message'] = f'All statements executed successfully. {total_changes} total row(s) affected.'
 
-            return response
+        if truncated:
+            # Rows past the governor's row or byte cap were dropped
+            response['truncated'] = True
+        return response
 
     except Exception as e:
         try:
@@ -500,55 +528,14 @@ def execute_sql_query_multi_engine(engine, db_config_or_path, query):
 def _split_sql_statements(query):
     """
     Split SQL query into individual statements, handling complex cases like:
-    - Semicolons within string literals
+    - Semicolons within string literals, quoted identifiers and dollar quotes
     - CTEs and complex subqueries
     - Multiple statements
+    Comments are removed from the returned statements.
     """
-    import re
-
-    # Remove comments first
-    from editor.views import remove_sql_comments
-    clean_query = remove_sql_comments(query)
-
-    # Simple approach: split by semicolon, but be smart about it
-    # This handles most cases including CTEs
-    statements = []
-    current_statement = ""
-    in_string = False
-    string_char = None
-
-    i = 0
-    while i < len(clean_query):
-        char = clean_query[i]
-
-        # Handle string literals
-        if char in ("'", '"') and not in_string:
-            in_string = True
-            string_char = char
-            current_statement += char
-        elif char == string_char and in_string:
-            # Check if it's escaped
-            if i > 0 and clean_query[i-1] == '\\':
-                current_statement += char
-            else:
-                in_string = False
-                string_char = None
-                current_statement += char
-        elif char == ';' and not in_string:
-            # End of statement
-            if current_statement.strip():
-                statements.append(current_statement.strip())
-            current_statement = ""
-        else:
-            current_statement += char
+    from editor.sql_lexer import split_statements
 
-        i += 1
-
-    # Add the last statement if it doesn't end with semicolon
-    if current_statement.strip():
-        statements.append(current_statement.strip())
-
-    return statements
+    return split_statements(query)
 
 
 def _is_select_statement(statement):
@@ -616,17 +603,12 @@ def execute_query_on_schema(schema_file_path, query, engine='mysql'):
 
 def _execute_mysql_schema_query(db_name, schema_sql, query):
     """Execute query on MySQL with schema"""
-    import mysql.connector
-    from django.conf import settings
+    from .connection_pool import get_connection
+    from editor.query_governor import describe_error
 
     try:
-        # Connect to MySQL server
-        conn = mysql.connector.connect(
-            host=getattr(settings, 'MYSQL_HOST', 'localhost'),
-            user=getattr(settings, 'MYSQL_USER', 'root'),
-            password=getattr(settings, 'MYSQL_PASSWORD', ''),
-            port=getattr(settings, 'MYSQL_PORT', 3306)
-        )
+        # Borrow a server connection from the pool
+        conn = get_connection('mysql', '')
         cursor = conn.cursor(dictionary=True)
 
         # Create temporary database
@@ -660,7 +642,7 @@ def _execute_mysql_schema_query(db_name, schema_sql, query):
     except Exception as e:
         return {
             'success': False,
-            'error': f'MySQL Error: {str(e)}'
+            'error': f'MySQL Error: {describe_error("mysql", e)}'
         }
     finally:
         try:
@@ -674,19 +656,13 @@ def _execute_mysql_schema_query(db_name, schema_sql, query):
 
 def _execute_postgresql_schema_query(db_name, schema_sql, query):
     """Execute query on PostgreSQL with schema (converted from MySQL)"""
-    import psycopg2
     import psycopg2.extras
-    from django.conf import settings
+    from .connection_pool import get_connection, connect_direct
+    from editor.query_governor import describe_error
 
     try:
-        # Connect to PostgreSQL server
-        conn = psycopg2.connect(
-            host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-            user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-            password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-            port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-            database=getattr(settings, 'POSTGRESQL_DB', 'postgres')
-        )
+        # Borrow an admin connection from the pool
+        conn = get_connection('postgresql')
         conn.autocommit = True
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
@@ -695,14 +671,8 @@ def _execute_postgresql_schema_query(db_name, schema_sql, query):
         cursor.close()
         conn.close()
 
-        # Connect to the new database
-        conn = psycopg2.connect(
-            host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-            user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-            password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-            port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-            database=db_name
-        )
+        # Connect to the new database (not pooled, it is dropped right after)
+        conn = connect_direct('postgresql', db_name)
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
         # Convert MySQL schema to PostgreSQL compatible
@@ -737,20 +707,14 @@ def _execute_postgresql_schema_query(db_name, schema_sql, query):
     except Exception as e:
         return {
             'success': False,
-            'error': f'PostgreSQL Error: {str(e)}'
+            'error': f'PostgreSQL Error: {describe_error("postgresql", e)}'
         }
     finally:
         try:
             cursor.close()
             conn.close()
             # Clean up temporary database
-            admin_conn = psycopg2.connect(
-                host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-                user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-                password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-                port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-                database=getattr(settings, 'POSTGRESQL_DB', 'postgres')
-            )
+            admin_conn = get_connection('postgresql')
             admin_conn.autocommit = True
             admin_cursor = admin_conn.cursor()
             admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
@@ -762,46 +726,13 @@ def _execute_postgresql_schema_query(db_name, schema_sql, query):
 
 def convert_mysql_to_postgresql(mysql_sql):
     """
-    Convert MySQL SQL to PostgreSQL compatible SQL.
-    This is a basic converter for common cases.
+    Convert MySQL SQL to PostgreSQL compatible SQL (see sql_translator.py).
+    Translations are memoized by content hash, so repeated calls with the same
+    schema or dataset cost a hash lookup.
     """
-    import re
-
-    # Convert MySQL specific syntax to PostgreSQL
-    pg_sql = mysql_sql
-
-    # Convert INT AUTO_INCREMENT PRIMARY KEY to SERIAL PRIMARY KEY
-    pg_sql = re.sub(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b', 'SERIAL PRIMARY KEY', pg_sql, flags=re.IGNORECASE)
-
-    # Convert standalone AUTO_INCREMENT to SERIAL (fallback)
-    pg_sql = re.sub(r'\bAUTO_INCREMENT\b', 'SERIAL', pg_sql, flags=re.IGNORECASE)
-
-    # Convert MySQL data types to PostgreSQL equivalents
-    type_mappings = {
-        r'\bTINYINT\b': 'SMALLINT',
-        r'\bMEDIUMINT\b': 'INTEGER',
-        r'\bBIGINT\b': 'BIGINT',
-        r'\bVARCHAR\((\d+)\)': r'VARCHAR(\1)',
-        r'\bTEXT\b': 'TEXT',
-        r'\bDATETIME\b': 'TIMESTAMP',
-        r'\bTIMESTAMP\b': 'TIMESTAMP',
-        r'\bDOUBLE\b': 'DOUBLE PRECISION',
-        r'\bFLOAT\b': 'REAL',
-        r'\bDECIMAL\((\d+),(\d+)\)': r'DECIMAL(\1,\2)',
-    }
-
-    for mysql_type, pg_type in type_mappings.items():
-        pg_sql = re.sub(mysql_type, pg_type, pg_sql, flags=re.IGNORECASE)
+    from .sql_translator import translate_mysql_to_postgresql
 
-    # Remove MySQL specific options
-    pg_sql = re.sub(r'\bENGINE\s*=\s*\w+', '', pg_sql, flags=re.IGNORECASE)
-    pg_sql = re.sub(r'\bCHARSET\s*=\s*\w+', '', pg_sql, flags=re.IGNORECASE)
-    pg_sql = re.sub(r'\bCOLLATE\s*=\s*\w+', '', pg_sql, flags=re.IGNORECASE)
-
-    # Convert backticks to double quotes for identifiers
-    pg_sql = re.sub(r'`([^`]+)`', r'"\1"', pg_sql)
-
-    return pg_sql
+    return translate_mysql_to_postgresql(mysql_sql)
 
 
 def ensure_consistent_column_order(results, reference_columns=None):
@@ -851,71 +782,16 @@ def ensure_consistent_column_order(results, reference_columns=None):
 def normalize_json_result(result, preserve_order=False):
     """
     Normalize JSON result for comparison between MySQL and PostgreSQL.
-    Handles different data types and ensures consistent formatting across engines.
+    Handles different data types and ensures consistent formatting across engines
+    (see result_normalization.py).
 
     Args:
         result: The result to normalize
         preserve_order: If True, preserves the original row order (for exact order matching)
     """
-    import json
-    import decimal
-    from datetime import datetime, date
-
-    def normalize_value(value):
-        """Normalize individual values for cross-database consistency"""
-        if value is None:
-            return None
-        elif isinstance(value, bool):
-            # Ensure boolean consistency (MySQL might return 1/0, PostgreSQL true/false)
-            return bool(value)
-        elif isinstance(value, int):
-            return int(value)
-        elif isinstance(value, float):
-            # Round to avoid floating point precision differences
-            return round(float(value), 10)
-        elif isinstance(value, decimal.Decimal):
-            # Convert Decimal to float for consistency
-            return round(float(value), 10)
-        elif isinstance(value, (datetime, date)):
-            # Ensure consistent date/datetime formatting
-            return value.isoformat()
-        elif isinstance(value, str):
-            # Strip whitespace and ensure consistent string formatting
-            return value.strip()
-        elif isinstance(value, bytes):
-            # Handle binary data
-            return value.decode('utf-8', errors='ignore')
-        else:
-            # Convert any other type to string
-            return str(value)
-
-    if isinstance(result, list):
-        normalized = []
-        for row in result:
-            if isinstance(row, dict):
-                normalized_row = {}
-                # Preserve original key order instead of sorting
-                for key in row.keys():
-                    # Skip flag_id column from comparison
-                    if key.lower() != 'flag_id':
-                        normalized_row[key] = normalize_value(row[key])
-                normalized.append(normalized_row)
-            else:
-                normalized.append(normalize_value(row))
-
-        # Only sort if preserve_order is False (for backward compatibility)
-        if not preserve_order:
-            # Sort rows by their string representation for consistent ordering
-            # This handles cases where different engines might return rows in different orders
-            try:
-                normalized.sort(key=lambda x: json.dumps(x, sort_keys=True) if isinstance(x, dict) else str(x))
-            except (TypeError, ValueError):
-                # If sorting fails, keep original order
-                pass
+    from .result_normalization import normalize_json_result as normalize
 
-        return normalized
-    else:
-        return normalize_value(result)
+    return normalize(result, preserve_order)
 
 
 def normalize_json_result_with_exact_order(result):
@@ -932,34 +808,50 @@ def execute_dual_dataset_query(challenge, query, flag_id, engine='mysql'):
 
     Args:
         challenge: Challenge instance with schema_sql, run_dataset_sql, submit_dataset_sql
-        query: SQL query to execute
+        query: SQL query to execute (string or editor.parsed_query.ParsedQuery)
         flag_id: 1 for run dataset, 2 for submit dataset
-        engine: Database engine ('mysql' or 'postgresql')
+        engine: Database engine ('mysql', 'postgresql' or the in-memory 'sqlite')
 
     Returns:
         Dict with success, results, error, etc.
     """
-    import tempfile
-    import os
+    from sqlplayground.query_timing import span
+
+    with span('query.total', engine):
+        return _execute_dual_dataset_query(challenge, query, flag_id, engine)
+
+
+def _execute_dual_dataset_query(challenge, query, flag_id, engine):
     import uuid
-    from editor.views import remove_sql_comments
+    from editor.parsed_query import as_parsed_query
+    from sqlplayground.query_timing import span
 
-    # Clean the query
-    clean_query = remove_sql_comments(query).strip()
+    # Comments, statements and referenced tables are derived once per query
+    with span('query.parse', engine):
+        parsed_query = as_parsed_query(query)
 
-    if not clean_query:
+    if parsed_query.is_empty:
         return {
             'success': False,
             'error': 'Query is empty or contains only comments'
         }
 
+    # Identical deterministic queries on an unchanged challenge return the cached result
+    from .result_cache import get_cached_result, store_result
+    with span('query.cache_lookup', engine):
+        cache_key, cached_result = get_cached_result(challenge, flag_id, engine, parsed_query)
+    if cached_result is not None:
+        return cached_result
+
     # Generate unique database name
     db_name = f"challenge_{challenge.id}_temp_{uuid.uuid4().hex[:8]}"
 
     try:
-        # Get processed schema and dataset SQL (supports both legacy and multi-table systems)
-        schema_sql = challenge.get_all_schema_sql()
-        dataset_sql = challenge.get_all_dataset_sql(flag_id)
+        # Get processed schema and dataset SQL (supports both legacy and multi-table systems),
+        # precompiled when the challenge was saved
+        compiled = challenge.get_compiled_sql()
+        schema_sql = compiled['schema_sql']
+        dataset_sql = compiled['datasets'][str(flag_id)]
 
         if not schema_sql or not dataset_sql:
             return {
@@ -967,27 +859,40 @@ def execute_dual_dataset_query(challenge, query, flag_id, engine='mysql'):
                 'error': 'Schema SQL and dataset SQL are required'
             }
 
-        # Process user query to use unique table names and add flag_id filter
-        processed_query = _process_user_query(clean_query, challenge, flag_id)
-
         if engine.lower() == 'mysql':
             # Try MySQL first, fallback to PostgreSQL if MySQL is not available
-            mysql_result = _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, processed_query)
+            mysql_result = _execute_on_server_engine(challenge, flag_id, 'mysql', db_name, schema_sql, dataset_sql, parsed_query, compiled)
 
-            # Check if MySQL connection failed
-            if not mysql_result['success'] and ('2003' in mysql_result.get('error', '') or "Can't connect to MySQL server" in mysql_result.get('error', '')):
-                print(f"MySQL not available, falling back to PostgreSQL: {mysql_result.get('error')}")
+            # Check if MySQL is down (connection failed or its circuit breaker is open)
+            if mysql_result.get('engine_unavailable'):
                 # Fallback to PostgreSQL
-                pg_result = _execute_postgresql_dual_dataset(db_name, schema_sql, dataset_sql, processed_query)
+                pg_result = _execute_on_server_engine(challenge, flag_id, 'postgresql', db_name, schema_sql, dataset_sql, parsed_query, compiled)
+                if pg_result.get('engine_unavailable'):
+                    pg_result = _execute_sqlite_fallback(challenge, flag_id, parsed_query, compiled, pg_result)
                 # Add a note about the fallback
                 if pg_result.get('success'):
                     pg_result['fallback_used'] = True
                     pg_result['original_engine'] = 'mysql'
                 return pg_result
             else:
+                store_result(cache_key, mysql_result)
                 return mysql_result
         elif engine.lower() == 'postgresql':
-            return _execute_postgresql_dual_dataset(db_name, schema_sql, dataset_sql, processed_query)
+            result = _execute_on_server_engine(challenge, flag_id, 'postgresql', db_name, schema_sql, dataset_sql, parsed_query, compiled)
+            if result.get('engine_unavailable'):
+                result = _execute_sqlite_fallback(challenge, flag_id, parsed_query, compiled, result)
+                if result.get('success'):
+                    result['fallback_used'] = True
+                    result['original_engine'] = 'postgresql'
+                return result
+            store_result(cache_key, result)
+            return result
+        elif engine.lower() == 'sqlite':
+            # In-memory practice engine (see sqlite_engine.py)
+            from .sqlite_engine import execute_on_sqlite
+            result = execute_on_sqlite(challenge, flag_id, parsed_query, compiled)
+            store_result(cache_key, result)
+            return result
         else:
             return {
                 'success': False,
@@ -1001,239 +906,182 @@ def execute_dual_dataset_query(challenge, query, flag_id, engine='mysql'):
         }
 
 
-def _process_user_query(query, challenge, flag_id):
+def _is_connection_error(engine, result):
+    """Check whether a failed result means the database server could not be reached"""
+    error = result.get('error', '')
+    if engine == 'mysql':
+        return '2003' in error or "Can't connect to MySQL server" in error
+    return 'could not connect to server' in error or ('connection to server' in error and 'failed' in error)
+
+
+def _execute_on_server_engine(challenge, flag_id, engine, db_name, schema_sql, dataset_sql, parsed_query, compiled=None):
     """
-    Process user query to use unique table names and add flag_id filter.
-    Only adds flag_id filter if the query references tables from the schema.
+    Execute a query on MySQL or PostgreSQL unless the engine's circuit breaker
+    is open (see engine_health.py), and record whether the server answered.
+    When the engine is unavailable the failed result has engine_unavailable set.
     """
-    import re
-
-    table_mapping = challenge.get_unique_table_names()
-    processed_query = query
-    tables_referenced = []
-    table_aliases = {}  # Map unique_name -> alias
-
-    # Replace table names with unique names and track which tables are referenced
-    for original_name, unique_name in table_mapping.items():
-        # Replace table names in FROM clauses (with optional alias)
-        pattern = r'\bFROM\s+`?' + re.escape(original_name) + r'`?(\s+(\w+))?\b'
-        def replace_from(match):
-            alias = match.group(2) if match.group(2) else None
-            if alias and alias.upper() not in ['WHERE', 'ORDER', 'GROUP', 'HAVING', 'LIMIT', 'SELECT', 'FROM', 'JOIN', 'ON', 'AND', 'OR']:
-                table_aliases[unique_name] = alias
-                return f'FROM {unique_name} {alias}'
-            else:
-                # If alias is a SQL keyword, preserve it after the table name
-                if alias:
-                    return f'FROM {unique_name} {alias}'
-                else:
-                    return f'FROM {unique_name}'
-
-        if re.search(pattern, processed_query, flags=re.IGNORECASE):
-            tables_referenced.append((original_name, unique_name))
-        processed_query = re.sub(pattern, replace_from, processed_query, flags=re.IGNORECASE)
-
-        # Replace table names in JOIN clauses (with optional alias)
-        pattern = r'\bJOIN\s+`?' + re.escape(original_name) + r'`?(\s+(\w+))?\b'
-        def replace_join(match):
-            alias = match.group(2) if match.group(2) else None
-            if alias and alias.upper() not in ['WHERE', 'ORDER', 'GROUP', 'HAVING', 'LIMIT', 'SELECT', 'FROM', 'JOIN', 'ON', 'AND', 'OR']:
-                table_aliases[unique_name] = alias
-                return f'JOIN {unique_name} {alias}'
-            else:
-                return f'JOIN {unique_name}'
-
-        if re.search(pattern, processed_query, flags=re.IGNORECASE):
-            if (original_name, unique_name) not in tables_referenced:
-                tables_referenced.append((original_name, unique_name))
-        processed_query = re.sub(pattern, replace_join, processed_query, flags=re.IGNORECASE)
-
-    # Only add flag_id filter if the query references tables from the schema
-    if not tables_referenced:
-        # Query doesn't reference any schema tables (e.g., "SELECT 1 as test")
-        # Return as-is without adding flag_id filter
-        return processed_query
-
-    # Check if the challenge schema actually has flag_id columns
-    # This prevents errors when flag_id columns are missing
-    schema_sql = challenge.get_all_schema_sql()
-    if not schema_sql or 'flag_id' not in schema_sql.lower():
-        # Schema doesn't have flag_id columns, return query without flag_id filter
-        # This handles legacy challenges or improperly created challenges
-        return processed_query
-
-    # Check if this is a CTE query
-    is_cte_query = bool(re.search(r'\bWITH\b', processed_query, re.IGNORECASE))
-
-    if is_cte_query:
-        # For CTE queries, add flag_id filters to each SELECT statement within the CTE
-        # This is complex, so for now we'll add flag_id filters to individual SELECT statements
-        def add_flag_id_to_select(match):
-            select_statement = match.group(0)
-            # Check if this SELECT references our tables
-            table_referenced = False
-            for original_name, unique_name in tables_referenced:
-                if unique_name in select_statement:
-                    table_referenced = True
-                    break
-
-            if table_referenced:
-                # Add WHERE flag_id = {flag_id} to this SELECT
-                if 'WHERE' in select_statement.upper():
-                    # Add to existing WHERE
-                    select_statement = re.sub(
-                        r'\bWHERE\b',
-                        f'WHERE {unique_name}.flag_id = {flag_id} AND',
-                        select_statement,
-                        flags=re.IGNORECASE
-                    )
-                else:
-                    # Add new WHERE clause before FROM
-                    # Find the FROM clause and add WHERE before any GROUP BY, ORDER BY, etc.
-                    keywords = ['GROUP BY', 'ORDER BY', 'HAVING', 'LIMIT', 'UNION']
-                    where_added = False
-                    for keyword in keywords:
-                        pattern = r'\b' + keyword.replace(' ', r'\s+') + r'\b'
-                        if re.search(pattern, select_statement, re.IGNORECASE):
-                            select_statement = re.sub(
-                                pattern,
-                                f'WHERE {unique_name}.flag_id = {flag_id} {keyword}',
-                                select_statement,
-                                flags=re.IGNORECASE
-                            )
-                            where_added = True
-                            break
-
-                    if not where_added:
-                        # Add at the end of the SELECT statement
-                        select_statement += f' WHERE {unique_name}.flag_id = {flag_id}'
-
-            return select_statement
-
-        # Apply flag_id filters to SELECT statements within the CTE
-        # This regex matches SELECT statements that are not the main outer SELECT
-        processed_query = re.sub(
-            r'SELECT\s+[^)]+?FROM\s+\w+',
-            add_flag_id_to_select,
-            processed_query,
-            flags=re.IGNORECASE | re.DOTALL
-        )
-
-        return processed_query
-
-    # Add flag_id filter to WHERE clause
-    # Check if this is a JOIN query by looking for JOIN keywords
-    is_join_query = bool(re.search(r'\bJOIN\b', processed_query, re.IGNORECASE))
-
-    if is_join_query:
-        # For JOIN queries, we need to add flag_id conditions for each referenced table
-        flag_id_conditions = []
-        for original_name, unique_name in tables_referenced:
-            # Use alias if available, otherwise use unique table name
-            if unique_name in table_aliases:
-                alias = table_aliases[unique_name]
-                flag_id_conditions.append(f'{alias}.flag_id = {flag_id}')
-            else:
-                flag_id_conditions.append(f'{unique_name}.flag_id = {flag_id}')
+    from .engine_health import is_engine_available, record_engine_failure, record_engine_success
 
-        flag_id_clause = ' AND '.join(flag_id_conditions)
-    else:
-        # For simple queries with one table, use simple flag_id
-        flag_id_clause = f'flag_id = {flag_id}'
-
-    if 'WHERE' in processed_query.upper():
-        # Add to existing WHERE clause
-        processed_query = re.sub(
-            r'\bWHERE\b',
-            f'WHERE {flag_id_clause} AND',
-            processed_query,
-            flags=re.IGNORECASE
-        )
+    label = 'MySQL' if engine == 'mysql' else 'PostgreSQL'
+    if not is_engine_available(engine):
+        return {
+            'success': False,
+            'error': f'{label} server is not available',
+            'engine_unavailable': True
+        }
+
+    result = _execute_on_engine(challenge, flag_id, engine, db_name, schema_sql, dataset_sql, parsed_query, compiled)
+    if not result['success'] and _is_connection_error(engine, result):
+        print(f"{label} not available, falling back: {result.get('error')}")
+        record_engine_failure(engine, result.get('error'))
+        result['engine_unavailable'] = True
     else:
-        # Remove trailing semicolon if present
-        has_semicolon = processed_query.rstrip().endswith(';')
-        if has_semicolon:
-            processed_query = processed_query.rstrip().rstrip(';')
-
-        # Add WHERE clause before GROUP BY, HAVING, ORDER BY, LIMIT (in correct SQL order)
-        # But avoid matching these keywords inside parentheses (like in window functions)
-        keywords = ['GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT']
-        where_added = False
-        for keyword in keywords:
-            # Use regex to properly match the keyword as a whole phrase
-            # but not inside parentheses (to avoid window functions)
-            pattern = r'\b' + keyword.replace(' ', r'\s+') + r'\b'
-
-            # Find all matches and check if they're outside parentheses
-            matches = list(re.finditer(pattern, processed_query, re.IGNORECASE))
-            for match in matches:
-                # Check if this match is inside parentheses by counting open/close parens before it
-                text_before = processed_query[:match.start()]
-                open_parens = text_before.count('(')
-                close_parens = text_before.count(')')
-
-                # If we're not inside parentheses (equal number of open/close), this is a valid match
-                if open_parens == close_parens:
-                    processed_query = re.sub(
-                        pattern,
-                        f'WHERE {flag_id_clause} {keyword}',
-                        processed_query,
-                        count=1,  # Only replace the first valid occurrence
-                        flags=re.IGNORECASE
-                    )
-                    where_added = True
-                    break
+        record_engine_success(engine)
+    return result
+
+
+def _execute_sqlite_fallback(challenge, flag_id, parsed_query, compiled, failed_result):
+    """
+    Run a query on the in-memory SQLite engine when no database server is reachable.
+    Returns failed_result unchanged when the fallback is disabled or the query
+    is graded: SQLite differs on integer division, date functions, type
+    affinity and collation, so Submit and reference queries (flag_id 2) must
+    not be answered by it.
+    """
+    from .sqlite_engine import execute_on_sqlite, is_sqlite_fallback_enabled
+
+    if flag_id != 1 or not is_sqlite_fallback_enabled():
+        return failed_result
+
+    print(f"PostgreSQL not available, falling back to SQLite: {failed_result.get('error')}")
+    result = execute_on_sqlite(challenge, flag_id, parsed_query, compiled)
+    if result.get('success'):
+        result['fallback_engine'] = 'sqlite'
+    return result
 
-            if where_added:
-                break
 
-        if not where_added:
-            # No special keywords found, add WHERE at the end
-            processed_query += f' WHERE {flag_id_clause}'
+def _execute_on_engine(challenge, flag_id, engine, db_name, schema_sql, dataset_sql, parsed_query, compiled=None):
+    """
+    Execute a query on one engine. Read-only queries run as written on the
+    challenge's persistent template database, where views expose
+    the dataset under the original table names. Everything else gets a private
+    database (cloned from the template on PostgreSQL, loaded from SQL otherwise)
+    and is rewritten to the unique table names first.
+    """
+    from .clone_pool import execute_on_cloned_database
+    from .compiled_sql import get_load_plan
+    from .provisioning import execute_on_template_database
+    from sqlplayground.query_timing import span
+    from .sandbox_pool import is_sandbox_pool_enabled
 
-        # Add semicolon back if it was there
-        if has_semicolon:
-            processed_query += ';'
+    load_plan = get_load_plan(compiled, engine, flag_id)
 
-    return processed_query
+    with span('db.template_query', engine):
+        result = execute_on_template_database(challenge, flag_id, engine, schema_sql, dataset_sql, parsed_query, load_plan)
+    if result is not None:
+        return result
 
+    # Schema changes have to reach the real tables, not the dataset views
+    with span('query.rewrite', engine):
+        processed_query = _process_user_query(parsed_query, challenge, flag_id, compiled)
 
-def _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, query):
-    """Execute dual-dataset query on MySQL using enhanced execution"""
-    import mysql.connector
-    from django.conf import settings
+    if is_sandbox_pool_enabled():
+        with span('db.sandbox_query', engine):
+            result = _execute_on_sandbox(engine, flag_id, processed_query, compiled)
+        if result is not None:
+            return result
+
+    if engine == 'postgresql':
+        with span('db.clone_query', engine):
+            result = execute_on_cloned_database(challenge, flag_id, schema_sql, dataset_sql, processed_query, load_plan)
+        if result is not None:
+            return result
+
+    if engine == 'mysql':
+        return _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, processed_query, load_plan)
+    return _execute_postgresql_dual_dataset(db_name, schema_sql, dataset_sql, processed_query, load_plan)
+
+
+def _execute_on_sandbox(engine, flag_id, query, compiled):
+    """
+    Execute a processed user query on a sandbox leased from the pool.
+    Returns None when no sandbox is available.
+    """
+    from editor.query_governor import describe_error
+
+    manager = DatabaseEngineManager(engine)
+    lease = manager.lease_sandbox(compiled, flag_id)
+    if lease is None:
+        return None
 
     try:
-        # Connect to MySQL server using new configuration
-        conn = mysql.connector.connect(
-            host=getattr(settings, 'MYSQL_HOST', 'localhost'),
-            user=getattr(settings, 'MYSQL_USER', 'root'),
-            password=getattr(settings, 'MYSQL_PASSWORD', ''),
-            port=getattr(settings, 'MYSQL_PORT', 3306)
-        )
-        cursor = conn.cursor(dictionary=True, buffered=True)
+        if engine == 'mysql':
+            cursor = lease.connection.cursor(dictionary=True, buffered=True)
+        else:
+            import psycopg2.extras
+            cursor = lease.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        return _collect_statement_results(lease.connection, cursor, _split_sql_statements(query), engine)
 
-        # Create temporary database
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
-        cursor.execute(f"USE `{db_name}`")
+    except Exception as e:
+        label = 'MySQL' if engine == 'mysql' else 'PostgreSQL'
+        return {
+            'success': False,
+            'error': f'{label} Error: {describe_error(engine, e)}'
+        }
+    finally:
+        manager.release_sandbox(lease, query)
+
+
+def _process_user_query(query, challenge, flag_id, compiled=None):
+    """
+    Process user query to use unique table names and scope every scan of a
+    challenge table to the flag_id dataset (see query_rewriter.py).
+    query may be a string or a ParsedQuery; compiled is the challenge's
+    compiled SQL artifact.
+    """
+    from .query_rewriter import rewrite_challenge_query
 
-        # Execute schema SQL using enhanced statement splitting
-        schema_statements = _split_sql_statements(schema_sql)
-        for statement in schema_statements:
-            if statement.strip():
+    return rewrite_challenge_query(query, challenge, flag_id, compiled)
+
+
+def _load_challenge_sql(cursor, engine, schema_sql, dataset_sql, load_plan=None):
+    """
+    Load processed challenge schema and dataset SQL into the database the cursor
+    is connected to. MySQL SQL is converted first when loading into PostgreSQL.
+    INSERT statements in the dataset are bulk-loaded and the dataset conversion
+    is cached (see dataset_loader.py).
+
+    load_plan is the precompiled (schema statements, dataset operations) pair
+    from compiled_sql.get_load_plan; when given, no SQL is converted or parsed.
+    """
+    from .dataset_loader import load_dataset, load_operations
+    from sqlplayground.query_timing import span
+
+    if load_plan is not None:
+        schema_statements, operations = load_plan
+        with span('db.load_schema', engine):
+            for statement in schema_statements:
                 cursor.execute(statement)
-                # Consume any results to avoid "Unread result found" error
-                try:
-                    while cursor.nextset():
+                if engine == 'mysql':
+                    # Consume any results to avoid "Unread result found" error
+                    try:
+                        while cursor.nextset():
+                            pass
+                    except:
                         pass
-                except:
-                    pass
+        with span('db.load_dataset', engine):
+            load_operations(cursor, engine, operations)
+        return
 
-        # Execute dataset SQL using enhanced statement splitting
-        dataset_statements = _split_sql_statements(dataset_sql)
-        for statement in dataset_statements:
-            if statement.strip():
-                cursor.execute(statement)
+    with span('db.load_schema', engine):
+        if engine == 'postgresql':
+            schema_sql = convert_mysql_to_postgresql(schema_sql)
+
+        for statement in _split_sql_statements(schema_sql):
+            if not statement.strip():
+                continue
+            cursor.execute(statement)
+            if engine == 'mysql':
                 # Consume any results to avoid "Unread result found" error
                 try:
                     while cursor.nextset():
@@ -1241,56 +1089,73 @@ def _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, query):
                 except:
                     pass
 
-        # Execute user query using enhanced logic
-        statements = _split_sql_statements(query)
-        all_results = []
+    with span('db.load_dataset', engine):
+        load_dataset(cursor, engine, dataset_sql)
 
-        for i, statement in enumerate(statements):
-            statement = statement.strip()
-            if not statement:
-                continue
 
-            cursor.execute(statement)
+def _collect_statement_results(conn, cursor, statements, engine, commit_modifications=True):
+    """
+    Execute the user's statements on an open cursor and build the result dict
+    returned to the challenge views (last SELECT wins, modifications are summed).
+    Pass commit_modifications=False when the caller rolls the transaction back.
+    """
+    from editor.query_governor import apply_query_limits, execute_and_fetch
+    from sqlplayground.query_timing import span
 
-            # Determine if this statement returns results
-            is_select = _is_select_statement(statement)
-
-            if is_select:
-                results = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-
-                # Filter out flag_id column from display while preserving column order
-                filtered_columns = [col for col in columns if col != 'flag_id']
-                filtered_results = []
-                for row in results:
-                    if isinstance(row, dict):
-                        # Preserve column order by iterating through filtered_columns
-                        filtered_row = {}
-                        for col in filtered_columns:
-                            if col in row:
-                                filtered_row[col] = row[col]
-                    else:
-                        # Handle tuple/list results
-                        filtered_row = {}
-                        for j, col in enumerate(columns):
-                            if col != 'flag_id':
-                                filtered_row[col] = row[j]
-                    filtered_results.append(filtered_row)
-
-                all_results.append({
-                    'type': 'SELECT',
-                    'results': filtered_results,
-                    'columns': filtered_columns,
-                    'row_count': len(filtered_results)
-                })
-            else:
-                conn.commit()
-                changes = cursor.rowcount
-                all_results.append({
-                    'type': 'MODIFICATION',
-                    'changes': changes
-                })
+    all_results = []
+    truncated = False
+
+    # Time and row limits for the user's statements
+    apply_query_limits(conn, cursor, engine)
 
+    for statement in statements:
+        statement = statement.strip()
+        if not statement:
+            continue
+
+        # Determine if this statement returns results
+        is_select = _is_select_statement(statement)
+
+        if is_select:
+            columns, results, statement_truncated = execute_and_fetch(conn, cursor, engine, statement)
+            truncated = truncated or statement_truncated
+
+            # Filter out flag_id column from display while preserving column order
+            filtered_columns = [col for col in columns if col != 'flag_id']
+            filtered_results = []
+            for row in results:
+                if isinstance(row, dict):
+                    # Preserve column order by iterating through filtered_columns
+                    filtered_row = {}
+                    for col in filtered_columns:
+                        if col in row:
+                            filtered_row[col] = row[col]
+                else:
+                    # Handle tuple/list results
+                    filtered_row = {}
+                    for j, col in enumerate(columns):
+                        if col != 'flag_id':
+                            filtered_row[col] = row[j]
+                filtered_results.append(filtered_row)
+
+            all_results.append({
+                'type': 'SELECT',
+                'results': filtered_results,
+                'columns': filtered_columns,
+                'row_count': len(filtered_results)
+            })
+        else:
+            with span('db.execute', engine):
+                cursor.execute(statement)
+                if commit_modifications:
+                    conn.commit()
+            changes = cursor.rowcount
+            all_results.append({
+                'type': 'MODIFICATION',
+                'changes': changes
+            })
+
+        if engine == 'mysql':
             # Consume any remaining results to avoid "Unread result found" error
             try:
                 while cursor.nextset():
@@ -1298,215 +1163,138 @@ def _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, query):
             except:
                 pass
 
-        # Return results based on what was executed
-        if len(all_results) == 1 and all_results[0]['type'] == 'SELECT':
-            # Single SELECT statement
-            result = all_results[0]
-            return {
+    # Return results based on what was executed
+    if len(all_results) == 1 and all_results[0]['type'] == 'SELECT':
+        # Single SELECT statement
+        result = all_results[0]
+        response = {
+            'success': True,
+            'results': result['results'],
+            'columns': result['columns'],
+            'row_count': result['row_count']
+        }
+    elif len(all_results) == 1 and all_results[0]['type'] == 'MODIFICATION':
+        # Single modification statement
+        result = all_results[0]
+        response = {
+            'success': True,
+            'results': [],
+            'changes': result['changes']
+        }
+    else:
+        # Multiple statements - return the last SELECT result if any
+        select_results = [r for r in all_results if r['type'] == 'SELECT']
+        if select_results:
+            last_select = select_results[-1]
+            response = {
                 'success': True,
-                'results': result['results'],
-                'columns': result['columns'],
-                'row_count': result['row_count']
+                'results': last_select['results'],
+                'columns': last_select['columns'],
+                'row_count': last_select['row_count'],
+                'multiple_statements': True
             }
-        elif len(all_results) == 1 and all_results[0]['type'] == 'MODIFICATION':
-            # Single modification statement
-            result = all_results[0]
-            return {
+        else:
+            total_changes = sum(r['changes'] for r in all_results if r['type'] == 'MODIFICATION')
+            response = {
                 'success': True,
                 'results': [],
-                'changes': result['changes']
+                'changes': total_changes,
+                'multiple_statements': True
             }
-        else:
-            # Multiple statements - return the last SELECT result if any
-            select_results = [r for r in all_results if r['type'] == 'SELECT']
-            if select_results:
-                last_select = select_results[-1]
-                return {
-                    'success': True,
-                    'results': last_select['results'],
-                    'columns': last_select['columns'],
-                    'row_count': last_select['row_count'],
-                    'multiple_statements': True
-                }
-            else:
-                total_changes = sum(r['changes'] for r in all_results if r['type'] == 'MODIFICATION')
-                return {
-                    'success': True,
-                    'results': [],
-                    'changes': total_changes,
-                    'multiple_statements': True
-                }
+
+    if truncated:
+        # Rows past the governor's row or byte cap were dropped
+        response['truncated'] = True
+    return response
+
+
+def _execute_mysql_dual_dataset(db_name, schema_sql, dataset_sql, query, load_plan=None):
+    """Execute dual-dataset query on MySQL using enhanced execution"""
+    from .connection_pool import get_connection
+    from .job_resources import track_resource, untrack_resource
+    from sqlplayground.query_timing import span
+    from editor.query_governor import describe_error
+
+    try:
+        # Borrow a server connection from the pool
+        with span('db.connect', 'mysql'):
+            conn = get_connection('mysql', '')
+        cursor = conn.cursor(dictionary=True, buffered=True)
+
+        # Create temporary database (tracked so a killed query worker's database is dropped)
+        track_resource('database', 'mysql', db_name)
+        with span('db.create_database', 'mysql'):
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
+            cursor.execute(f"USE `{db_name}`")
+
+        # Load schema and dataset, then execute the user query
+        _load_challenge_sql(cursor, 'mysql', schema_sql, dataset_sql, load_plan)
+        return _collect_statement_results(conn, cursor, _split_sql_statements(query), 'mysql')
 
     except Exception as e:
         return {
             'success': False,
-            'error': f'MySQL Error: {str(e)}'
+            'error': f'MySQL Error: {describe_error("mysql", e)}'
         }
     finally:
         try:
             # Clean up temporary database
-            cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+            with span('db.drop_database', 'mysql'):
+                cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+            untrack_resource('database', 'mysql', db_name)
             cursor.close()
             conn.close()
         except:
             pass
 
 
-def _execute_postgresql_dual_dataset(db_name, schema_sql, dataset_sql, query):
+def _execute_postgresql_dual_dataset(db_name, schema_sql, dataset_sql, query, load_plan=None):
     """Execute dual-dataset query on PostgreSQL (converted from MySQL)"""
-    import psycopg2
     import psycopg2.extras
-    from django.conf import settings
+    from .connection_pool import get_connection, connect_direct
+    from .job_resources import track_resource, untrack_resource
+    from sqlplayground.query_timing import span
+    from editor.query_governor import describe_error
 
     try:
-        # Connect to PostgreSQL server
-        conn = psycopg2.connect(
-            host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-            user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-            password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-            port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-            database=getattr(settings, 'POSTGRESQL_DB', 'postgres')
-        )
+        # Borrow an admin connection from the pool
+        with span('db.connect', 'postgresql'):
+            conn = get_connection('postgresql')
         conn.autocommit = True
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # Create temporary database
-        cursor.execute(f"CREATE DATABASE {db_name}")
+        # Create temporary database (tracked so a killed query worker's database is dropped)
+        track_resource('database', 'postgresql', db_name)
+        with span('db.create_database', 'postgresql'):
+            cursor.execute(f"CREATE DATABASE {db_name}")
         cursor.close()
         conn.close()
 
-        # Connect to the new database
-        conn = psycopg2.connect(
-            host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-            user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-            password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-            port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-            database=db_name
-        )
+        # Connect to the new database (not pooled, it is dropped right after)
+        with span('db.connect', 'postgresql'):
+            conn = connect_direct('postgresql', db_name)
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # Convert MySQL schema to PostgreSQL compatible
-        pg_schema = convert_mysql_to_postgresql(schema_sql)
-        pg_dataset = convert_mysql_to_postgresql(dataset_sql)
-
-        # Execute schema SQL using enhanced statement splitting
-        schema_statements = _split_sql_statements(pg_schema)
-        for statement in schema_statements:
-            if statement.strip():
-                cursor.execute(statement)
-
-        # Execute dataset SQL using enhanced statement splitting
-        dataset_statements = _split_sql_statements(pg_dataset)
-        for statement in dataset_statements:
-            if statement.strip():
-                cursor.execute(statement)
-
-        # Execute user query using enhanced logic
-        statements = _split_sql_statements(query)
-        all_results = []
-
-        for i, statement in enumerate(statements):
-            statement = statement.strip()
-            if not statement:
-                continue
-
-            cursor.execute(statement)
-
-            # Determine if this statement returns results
-            is_select = _is_select_statement(statement)
-
-            if is_select:
-                results = cursor.fetchall()
-                # Convert to list of dicts
-                results = [dict(row) for row in results]
-
-                # Extract column names from the first result if available
-                columns = list(results[0].keys()) if results else []
-
-                # Filter out flag_id column from display while preserving column order
-                filtered_columns = [col for col in columns if col != 'flag_id']
-                filtered_results = []
-                for row in results:
-                    # Preserve column order by iterating through filtered_columns
-                    filtered_row = {}
-                    for col in filtered_columns:
-                        if col in row:
-                            filtered_row[col] = row[col]
-                    filtered_results.append(filtered_row)
-
-                all_results.append({
-                    'type': 'SELECT',
-                    'results': filtered_results,
-                    'columns': filtered_columns,
-                    'row_count': len(filtered_results)
-                })
-            else:
-                conn.commit()
-                changes = cursor.rowcount
-                all_results.append({
-                    'type': 'MODIFICATION',
-                    'changes': changes
-                })
-
-        # Return results based on what was executed
-        if len(all_results) == 1 and all_results[0]['type'] == 'SELECT':
-            # Single SELECT statement
-            result = all_results[0]
-            return {
-                'success': True,
-                'results': result['results'],
-                'columns': result['columns'],
-                'row_count': result['row_count']
-            }
-        elif len(all_results) == 1 and all_results[0]['type'] == 'MODIFICATION':
-            # Single modification statement
-            result = all_results[0]
-            return {
-                'success': True,
-                'results': [],
-                'changes': result['changes']
-            }
-        else:
-            # Multiple statements - return the last SELECT result if any
-            select_results = [r for r in all_results if r['type'] == 'SELECT']
-            if select_results:
-                last_select = select_results[-1]
-                return {
-                    'success': True,
-                    'results': last_select['results'],
-                    'columns': last_select['columns'],
-                    'row_count': last_select['row_count'],
-                    'multiple_statements': True
-                }
-            else:
-                total_changes = sum(r['changes'] for r in all_results if r['type'] == 'MODIFICATION')
-                return {
-                    'success': True,
-                    'results': [],
-                    'changes': total_changes,
-                    'multiple_statements': True
-                }
+        # Load converted schema and dataset, then execute the user query
+        _load_challenge_sql(cursor, 'postgresql', schema_sql, dataset_sql, load_plan)
+        return _collect_statement_results(conn, cursor, _split_sql_statements(query), 'postgresql')
 
     except Exception as e:
         return {
             'success': False,
-            'error': f'PostgreSQL Error: {str(e)}'
+            'error': f'PostgreSQL Error: {describe_error("postgresql", e)}'
         }
     finally:
         try:
             cursor.close()
             conn.close()
             # Clean up temporary database
-            admin_conn = psycopg2.connect(
-                host=getattr(settings, 'POSTGRESQL_HOST', 'localhost'),
-                user=getattr(settings, 'POSTGRESQL_USER', 'postgres'),
-                password=getattr(settings, 'POSTGRESQL_PASSWORD', ''),
-                port=getattr(settings, 'POSTGRESQL_PORT', 5432),
-                database=getattr(settings, 'POSTGRESQL_DB', 'postgres')
-            )
+            admin_conn = get_connection('postgresql')
             admin_conn.autocommit = True
             admin_cursor = admin_conn.cursor()
-            admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+            with span('db.drop_database', 'postgresql'):
+                admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+            untrack_resource('database', 'postgresql', db_name)
             admin_cursor.close()
             admin_conn.close()
         except:
@@ -14,12 +14,16 @@ from datetime import timedelta
 import json
 import sqlite3
 import os
-import time
 
-from .models import Challenge, UserChallengeProgress, ChallengeSubscriptionPlan, UserChallengeSubscription
+from .models import Challenge, ChallengeQueryJob, UserChallengeProgress, ChallengeSubscriptionPlan, UserChallengeSubscription
 from users.models import UserDatabase, UserProfile
-from editor.views import execute_sql_query
+from editor.result_format import apply_result_format, get_result_format
+from sqlplayground.query_timing import should_include_timings, span, summarize_trace, trace_request
+from .engine_health import get_available_engines
+from .execution import run_challenge_query, submit_challenge_query
+from .job_queue import enqueue_job, get_job_response, is_job_queue_enabled
 from .utils import execute_sql_query_multi_engine, DatabaseEngineManager
+from .warmup import schedule_warmup
 from .forms import ChallengeForm, ChallengeFilterForm, UserChallengeSubscriptionForm, SubscriptionFilterForm, ChallengeSubscriptionPlanForm
 
 
@@ -199,6 +203,13 @@ def challenge_detail(request, challenge_id):
     schema_config = challenge.get_database_schema_config()
     database_schema = schema_config.get('schema', {})
 
+    # Engines whose server is down are left out of the selector
+    available_engines = get_available_engines(challenge.get_supported_engines())
+
+    # Prepare the sandbox of the preselected engine while the user reads the problem
+    if has_access and available_engines:
+        schedule_warmup(challenge, 'mysql' if 'mysql' in available_engines else available_engines[0])
+
     context = {
         'page_title': f'Challenge: {challenge.title}',
         'challenge': challenge,
@@ -206,6 +217,7 @@ def challenge_detail(request, challenge_id):
         'has_access': has_access,
         'database_schema': database_schema,
         'schema_config': schema_config,
+        'available_engines': available_engines,
     }
     return render(request, 'challenges/challenge_solve.html', context)
 
@@ -243,79 +255,17 @@ def execute_challenge_query(request, challenge_id):
                 'error': f'This challenge does not support {engine.upper()} database engine.'
             })
 
-        # Database initialization is handled dynamically by the dual-dataset system
-        # No need to pre-initialize databases
+        result_format = get_result_format(request, data)
 
-        # Execute user query with selected engine
-        start_time = time.time()
+        # Slow queries run in the query workers instead of this web worker
+        if is_job_queue_enabled():
+            job = enqueue_job(request.user, challenge, 'run', user_query, engine)
+            return JsonResponse(get_job_response(job, result_format))
 
-        # Use new dual-dataset system if available
-        if challenge.has_multi_table_setup() or (challenge.schema_sql and challenge.run_dataset_sql):
-            # New dual-dataset system (test mode - flag_id=1)
-            from .utils import execute_dual_dataset_query
-
-            result = execute_dual_dataset_query(
-                challenge=challenge,
-                query=user_query,
-                flag_id=1,  # Test dataset
-                engine=engine
-            )
-
-            # Add fallback message if MySQL fallback was used
-            if result.get('fallback_used') and result.get('original_engine') == 'mysql':
-                original_message = result.get('message', f'Query executed successfully. {result.get("row_count", 0)} row(s) returned.')
-                result['message'] = original_message + ' (Note: Executed on PostgreSQL - MySQL server not available)'
-        else:
-            # Use multi-engine logic for PostgreSQL/MySQL (hosting service engines)
-            db_config = {
-                'database': f"challenge_{challenge.id}_user_{request.user.id}"
-            }
-            result = execute_sql_query_multi_engine(engine, db_config, user_query)
-
-        execution_time = int((time.time() - start_time) * 1000)
-
-        if not result['success']:
-            return JsonResponse({
-                'success': False,
-                'error': f'Query execution failed: {result["error"]}',
-                'execution_time': execution_time
-            })
-
-        user_results = result.get('results', [])
-        columns = result.get('columns', [])
-        row_count = result.get('row_count', 0)
-
-        # Convert results to JSON-serializable format
-        def serialize_value(value):
-            """Convert Python objects to JSON-serializable format"""
-            from decimal import Decimal
-            import datetime
-
-            if isinstance(value, Decimal):
-                return float(value)
-            elif isinstance(value, (datetime.date, datetime.datetime)):
-                return value.isoformat()
-            elif value is None:
-                return None
-            else:
-                return str(value)
-
-        # Serialize all results
-        serialized_results = []
-        for row in user_results:
-            serialized_row = {}
-            for key, value in row.items():
-                serialized_row[key] = serialize_value(value)
-            serialized_results.append(serialized_row)
-
-        return JsonResponse({
-            'success': True,
-            'results': serialized_results,
-            'columns': columns,
-            'row_count': row_count,
-            'execution_time': execution_time,
-            'message': f'Query executed successfully. {row_count} row(s) returned.'
-        })
+        with trace_request() as trace:
+            with span('view.run', engine):
+                response = run_challenge_query(challenge, request.user, user_query, engine, result_format)
+            return _timed_json_response(request, response, trace, engine)
 
     except json.JSONDecodeError:
         return JsonResponse({
@@ -353,126 +303,25 @@ def submit_challenge(request, challenge_id):
                 'error': f'This challenge does not support {engine.upper()} database engine.'
             })
 
-        # Get or create user progress
-        user_progress, created = UserChallengeProgress.objects.get_or_create(
-            user=request.user,
-            challenge=challenge
-        )
-
-        # Increment attempts
-        user_progress.attempts += 1
-
-        # Execute user query using dual-dataset system (submit dataset for validation)
-        if challenge.has_multi_table_setup() or (challenge.schema_sql and challenge.submit_dataset_sql):
-            # Use new dual-dataset system
-            from .utils import execute_dual_dataset_query
-            result = execute_dual_dataset_query(
-                challenge=challenge,
-                query=user_query,
-                flag_id=2,  # Submit dataset for validation
-                engine=engine
-            )
-        else:
-            # Fallback to legacy system for old challenges
-            try:
-                challenge.initialize_challenge_database(request.user, engine)
-            except Exception as e:
-                return JsonResponse({
-                    'success': False,
-                    'error': f'Failed to initialize {engine} database: {str(e)}'
-                })
-
-            if engine == 'sqlite':
-                # Use existing SQLite logic
-                db_path = challenge.get_challenge_database_path(request.user, engine)
-                result = execute_sql_query(db_path, user_query)
-            else:
-                # Use multi-engine logic for PostgreSQL/MySQL
-                db_config = {
-                    'database': f"challenge_{challenge.id}_user_{request.user.id}"
-                }
-                result = execute_sql_query_multi_engine(engine, db_config, user_query)
-
-        if not result['success']:
-            user_progress.save()
+        # Expected results come from MySQL/PostgreSQL; SQLite is for practice runs only
+        if engine == 'sqlite':
             return JsonResponse({
                 'success': False,
-                'error': f'Query execution failed: {result["error"]}',
-                'attempts': user_progress.attempts
+                'error': 'SQLite practice mode is only available for Run. Switch to MySQL or PostgreSQL to submit.'
             })
 
-        # Get user result and expected result for response
-        user_result = result.get('results', [])
-        expected_result = challenge.expected_result
-
-        # Use dual-dataset validation for both legacy and multi-table systems
-        if (challenge.schema_sql and challenge.submit_dataset_sql) or challenge.has_multi_table_setup():
-            # Dual-dataset validation (submit mode)
-            is_correct, validation_message = challenge.validate_user_query(user_query, engine, is_test_mode=False)
-            if not is_correct and "Query execution failed" not in validation_message:
-                # Query executed successfully but result doesn't match
-                user_progress.save()
-                return JsonResponse({
-                    'success': False,
-                    'error': validation_message,
-                    'attempts': user_progress.attempts,
-                    'validation_type': 'dual_dataset'
-                })
-        else:
-            # Fallback validation for challenges not yet migrated
-            # Normalize results for comparison
-            is_correct = compare_query_results(user_result, expected_result)
-
-        if is_correct:
-            # Check if this is the first completion to award XP
-            if not user_progress.is_completed:
-                user_progress.xp_earned = challenge.xp
-                xp_message = f" You earned {challenge.xp} XP!"
-
-                # Create XP transaction for audit trail
-                from .models import XPTransaction
-                XPTransaction.objects.create(
-                    user=request.user,
-                    challenge=challenge,
-                    transaction_type='challenge_completion',
-                    xp_amount=challenge.xp,
-                    description=f"Completed challenge: {challenge.title}"
-                )
-
-                # Update user profile total XP
-                try:
-                    profile = request.user.profile
-                except UserProfile.DoesNotExist:
-                    profile = UserProfile.objects.create(user=request.user)
-                profile.update_total_xp()
-            else:
-                xp_message = ""
+        result_format = get_result_format(request)
 
-            user_progress.is_completed = True
-            user_progress.completed_at = timezone.now()
-            user_progress.best_query = user_query
-            user_progress.save()
+        if is_job_queue_enabled():
+            job = enqueue_job(request.user, challenge, 'submit', user_query, engine)
+            return JsonResponse(get_job_response(job, result_format))
 
-            return JsonResponse({
-                'success': True,
-                'correct': True,
-                'message': f'Congratulations! Your solution is correct!{xp_message}',
-                'attempts': user_progress.attempts,
-                'user_result': user_result,
-                'expected_result': expected_result,
-                'xp_earned': user_progress.xp_earned
-            })
-        else:
-            user_progress.save()
-            return JsonResponse({
-                'success': True,
-                'correct': False,
-                'message': 'Your query executed successfully, but the result doesn\'t match the expected output.',
-                'attempts': user_progress.attempts,
-                'user_result': user_result,
-                'expected_result': expected_result,
-                'hint': challenge.hint if user_progress.attempts >= 3 else None
-            })
+        with trace_request() as trace:
+            with span('view.submit', engine):
+                response = apply_result_format(
+                    submit_challenge_query(challenge, request.user, user_query, engine), result_format
+                )
+            return _timed_json_response(request, response, trace, engine)
 
     except Exception as e:
         return JsonResponse({
@@ -481,6 +330,24 @@ def submit_challenge(request, challenge_id):
         })
 
 
+def _timed_json_response(request, response, trace, engine):
+    """JsonResponse with its encoding timed, adding the request's timings for staff users"""
+    if should_include_timings(request.user):
+        response['timings'] = summarize_trace(trace)
+    with span('response.encode', engine):
+        return JsonResponse(response)
+
+
+@login_required
+@require_http_methods(["GET"])
+def challenge_query_job(request, job_id):
+    """
+    Poll a queued Run or Submit. The result is included once the job has finished.
+    """
+    job = get_object_or_404(ChallengeQueryJob, id=job_id, user=request.user)
+    return JsonResponse(get_job_response(job, get_result_format(request)))
+
+
 def compare_query_results(user_result, expected_result):
     """
     Compare user query result with expected result.
@@ -0,0 +1,132 @@
+"""
+Sandbox warm-up when a challenge page is opened.
+
+The first Run of a challenge used to pay the whole cold start: building the
+template database of the run dataset (or rebuilding it after the challenge
+was edited) and, on PostgreSQL, cloning a private database. challenge_detail
+now schedules a warm-up that does this work in a background thread while the
+user reads the problem:
+
+- the compiled SQL artifact is recompiled if it is stale
+- the template database of the run dataset is built if it is missing or stale
+- on PostgreSQL the clone pool leases ready clones of the template; they are
+  dropped again if no query takes one for CHALLENGE_CLONE_LEASE_SECONDS
+- on SQLite the in-memory template is loaded
+
+Page views of the same challenge version and engine only schedule one
+warm-up per CHALLENGE_WARMUP_INTERVAL_SECONDS (shared through the default cache).
+"""
+
+import os
+import queue
+import threading
+
+from django.conf import settings
+
+
+# Run uses the first dataset
+RUN_FLAG_ID = 1
+
+_tasks = queue.Queue()
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def is_warmup_enabled():
+    """Check whether opening a challenge page warms its sandbox"""
+    return getattr(settings, 'CHALLENGE_WARMUP_ENABLED', True)
+
+
+def get_warmup_interval():
+    return getattr(settings, 'CHALLENGE_WARMUP_INTERVAL_SECONDS', 300)
+
+
+def _warmup_key(challenge, engine):
+    content_hash = (challenge.compiled_sql or {}).get('content_hash', '')
+    return f'challenge_warmup:{challenge.id}:{engine}:{content_hash[:12]}'
+
+
+def schedule_warmup(challenge, engine):
+    """
+    Queue a warm-up of the challenge's run dataset on an engine without
+    waiting for it. Returns True if a warm-up was queued.
+    """
+    from django.core.cache import cache
+    from .engine_health import get_engine_state, CLOSED
+
+    if not is_warmup_enabled():
+        return False
+
+    # Nothing to warm on a server that is down
+    if get_engine_state(engine)['state'] != CLOSED:
+        return False
+
+    if not cache.add(_warmup_key(challenge, engine), True, get_warmup_interval()):
+        return False
+
+    _ensure_worker()
+    _tasks.put((challenge.id, engine))
+    return True
+
+
+def warm_up_challenge(challenge_id, engine):
+    """
+    Prepare the run dataset of a challenge on an engine. Returns the name of the
+    warmed template database ('memory' for SQLite), or None if nothing was warmed.
+    """
+    from .clone_pool import get_clone_pool, get_clone_source_name, is_cloning_enabled
+    from .compiled_sql import get_load_plan
+    from .models import Challenge
+    from .provisioning import get_template_database, is_template_execution_enabled
+    from .sqlite_engine import get_sqlite_template
+
+    challenge = Challenge.objects.filter(pk=challenge_id, is_active=True).first()
+    if challenge is None:
+        return None
+
+    compiled = challenge.get_compiled_sql()
+    schema_sql = compiled['schema_sql']
+    dataset_sql = compiled['datasets'][str(RUN_FLAG_ID)]
+    if not schema_sql or not dataset_sql:
+        return None
+
+    if engine == 'sqlite':
+        get_sqlite_template(compiled, RUN_FLAG_ID)
+        return 'memory'
+
+    if not is_template_execution_enabled():
+        return None
+
+    load_plan = get_load_plan(compiled, engine, RUN_FLAG_ID)
+    database_name = get_template_database(challenge, RUN_FLAG_ID, engine, schema_sql, dataset_sql, load_plan)
+    if database_name and engine == 'postgresql' and is_cloning_enabled():
+        get_clone_pool().warm(get_clone_source_name(database_name))
+    return database_name
+
+
+def _ensure_worker():
+    """Start this process's warm-up thread if it is not running"""
+    global _worker, _worker_pid
+
+    with _worker_lock:
+        # Threads do not survive a fork, so a forked worker starts its own
+        if _worker is not None and _worker.is_alive() and _worker_pid == os.getpid():
+            return
+        _worker = threading.Thread(target=_run, name='challenge-warmup', daemon=True)
+        _worker_pid = os.getpid()
+        _worker.start()
+
+
+def _run():
+    from django.db import connection
+
+    while True:
+        challenge_id, engine = _tasks.get()
+        try:
+            warm_up_challenge(challenge_id, engine)
+        except Exception as e:
+            print(f"Warm-up of challenge {challenge_id} on {engine} failed: {e}")
+        finally:
+            # Do not keep this thread's Django database connection open between tasks
+            connection.close()
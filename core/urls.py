@@ -15,6 +15,7 @@ urlpatterns = [
     path('contribute/', views.contribute, name='contribute'),
     path('terms/', views.terms_of_service, name='terms_of_service'),
     path('privacy/', views.privacy_policy, name='privacy_policy'),
+    path('metrics', views.metrics, name='metrics'),
     # Debug URLs (only for development)
     path('csrf-debug/', views.csrf_debug, name='csrf_debug'),
     path('csrf-test/', views.csrf_test_form, name='csrf_test'),
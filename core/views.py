@@ -1,6 +1,6 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
@@ -242,3 +242,22 @@ def privacy_policy(request):
         'page_title': 'Privacy Policy - SQLMaster',
     }
     return render(request, 'core/privacy_policy.html', context)
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Query execution metrics in the Prometheus text format. Readable by staff
+    users, or by a scraper sending QUERY_METRICS_TOKEN as a bearer token.
+    """
+    from django.conf import settings
+    from django.utils.crypto import constant_time_compare
+    from challenges.metrics import render_prometheus
+
+    token = getattr(settings, 'QUERY_METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    has_token = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    if not has_token and not request.user.is_staff:
+        return HttpResponseForbidden('Metrics are only available to staff users.')
+
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
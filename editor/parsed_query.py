@@ -0,0 +1,342 @@
+"""
+Preprocessed user queries.
+
+A Run or Submit request used to strip comments, split statements and scan for
+dangerous keywords several times over the same text. parse_query does all of
+it once with the shared SQL lexer and returns an immutable ParsedQuery that
+the editor, challenge and export code paths pass along. Results are memoized
+by query text, so repeated submissions of the same query are not parsed again.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from .sql_lexer import iter_statements, strip_comments, tokenize
+
+
+# Commands that are not allowed in the playground
+DANGEROUS_KEYWORDS = frozenset([
+    'DROP', 'TRUNCATE', 'DELETE', 'ALTER', 'MODIFY', 'RENAME', 'REMOVE',
+    'GRANT', 'REVOKE', 'ATTACH', 'DETACH', 'PRAGMA',
+])
+
+# Statements that return a result set
+RESULT_KEYWORDS = frozenset([
+    'SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN', 'PRAGMA', 'CALL', 'VALUES', 'TABLE',
+])
+
+# Keywords followed by a table reference, and how the table is used there:
+# scanned by a query, written by INSERT/UPDATE/DELETE or named in DDL
+_TABLE_KEYWORDS = {'FROM': 'scan', 'JOIN': 'scan', 'INTO': 'into', 'UPDATE': 'update', 'TABLE': 'table'}
+
+# Words that can come between a table keyword and the table name
+_TABLE_PREFIXES = frozenset(['IF', 'NOT', 'EXISTS', 'ONLY', 'LATERAL', 'IGNORE'])
+
+# TABLE is only followed by a table name in these statements (and on its own: TABLE name)
+_TABLE_STATEMENTS = frozenset([None, 'CREATE', 'ALTER', 'DROP', 'TRUNCATE', 'TEMPORARY', 'TEMP', 'LOCK'])
+
+# Functions whose arguments may contain FROM
+_FROM_FUNCTIONS = frozenset(['EXTRACT', 'TRIM', 'SUBSTRING', 'POSITION', 'OVERLAY'])
+
+# Keywords that end a FROM list
+_CLAUSE_KEYWORDS = frozenset([
+    'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'FETCH', 'UNION', 'INTERSECT',
+    'EXCEPT', 'WINDOW', 'SET', 'VALUES', 'SELECT', 'RETURNING', 'FOR',
+])
+
+# Words after a table name that are not an alias
+_NON_ALIAS_WORDS = frozenset([
+    'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN',
+    'ON', 'USING', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'FETCH', 'UNION', 'INTERSECT',
+    'EXCEPT', 'MINUS', 'WINDOW', 'SET', 'VALUES', 'VALUE', 'SELECT', 'RETURNING', 'FOR', 'LATERAL',
+    'TABLESAMPLE', 'USE', 'FORCE', 'IGNORE', 'PARTITION', 'WITH', 'DEFAULT', 'ADD', 'DROP',
+    'ALTER', 'MODIFY', 'CHANGE', 'RENAME', 'LOCK', 'WHEN', 'THEN', 'ELSE', 'END', 'AND', 'OR',
+    'INTO', 'FROM',
+])
+
+_SKIPPED = frozenset(['space', 'comment'])
+
+# DELETE and its MySQL modifiers: the table after them is the one deleted from
+_DELETE_WORDS = frozenset(['DELETE', 'LOW_PRIORITY', 'QUICK', 'IGNORE'])
+
+# Words that start a MySQL index hint after a table name (USE INDEX, FORCE KEY, ...)
+_INDEX_HINT_WORDS = frozenset(['USE', 'FORCE', 'IGNORE'])
+
+# name: table name as written (quotes removed); start/end: offsets of the name in
+# the query; context: 'scan', 'into', 'update', 'delete', 'table', or for a
+# multi-table DELETE 'delete_join' (a table of its table list) and
+# 'delete_target' (a name in DELETE FROM ... USING that refers to that list);
+# has_alias: whether an alias follows; is_cte: whether the name refers to a CTE;
+# has_index_hint: whether a MySQL index hint follows
+TableReference = namedtuple(
+    'TableReference', ['name', 'start', 'end', 'context', 'has_alias', 'is_cte', 'has_index_hint']
+)
+
+MAX_CACHED_QUERIES = 256
+
+
+class ParsedQuery:
+    """
+    A user query parsed once per request.
+
+    Attributes:
+        query: the query as submitted
+        clean_query: the query without comments and surrounding whitespace
+        statements: lexer Statements (text without comments, start/end offsets into query)
+        statement_kinds: upper-cased leading keyword of each statement
+        table_references: every TableReference in the query
+        tables: names referenced as tables (CTE names excluded), in order of appearance
+        cte_names: names defined in WITH clauses
+        tokens: lexer tokens of the query, comments and whitespace excluded
+        is_dangerous: whether the query uses a command that is not allowed in the playground
+    """
+
+    __slots__ = (
+        'query', 'clean_query', 'statements', 'statement_kinds', 'table_references',
+        'tables', 'cte_names', 'tokens', 'is_dangerous',
+    )
+
+    def __init__(self, query, backslash_escapes=True):
+        self.query = query
+        self.clean_query = strip_comments(query, backslash_escapes).strip()
+        self.statements = tuple(iter_statements(query, backslash_escapes))
+        self.tokens = tuple(
+            token for token in tokenize(query, backslash_escapes) if token.kind not in _SKIPPED
+        )
+        self.statement_kinds = tuple(_leading_keyword(statement.text) for statement in self.statements)
+        self.table_references, self.cte_names = _find_table_references(self.tokens)
+        self.tables = _unique_names(reference.name for reference in self.table_references if not reference.is_cte)
+        self.is_dangerous = _is_dangerous(self.tokens)
+
+    def __repr__(self):
+        return f'<ParsedQuery {self.clean_query[:40]!r} statements={len(self.statements)}>'
+
+    @property
+    def is_empty(self):
+        return not self.statements
+
+    @property
+    def statement_texts(self):
+        return [statement.text for statement in self.statements]
+
+    def returns_rows(self, index):
+        """Whether the statement at index returns a result set"""
+        return self.statement_kinds[index] in RESULT_KEYWORDS
+
+
+@lru_cache(maxsize=MAX_CACHED_QUERIES)
+def parse_query(query, backslash_escapes=True):
+    """Return the (memoized) ParsedQuery for a query string"""
+    return ParsedQuery(query, backslash_escapes)
+
+
+def as_parsed_query(query, backslash_escapes=True):
+    """Accept a query string or an already parsed query"""
+    if isinstance(query, ParsedQuery):
+        return query
+    return parse_query(query, backslash_escapes)
+
+
+def _leading_keyword(statement_text):
+    for token in tokenize(statement_text):
+        if token.kind == 'word':
+            return token.text.upper()
+        if token.kind not in _SKIPPED and token.text != '(':
+            return ''
+    return ''
+
+
+def _is_dangerous(tokens):
+    previous = None
+    for token in tokens:
+        if token.kind != 'word':
+            previous = None
+            continue
+        word = token.text.upper()
+        if word in DANGEROUS_KEYWORDS or (word == 'USER' and previous == 'CREATE'):
+            return True
+        previous = word
+    return False
+
+
+def _find_table_references(tokens):
+    """
+    Find table references after FROM/JOIN/INTO/UPDATE/TABLE, including
+    comma-separated FROM lists, and the CTEs defined with WITH.
+    Returns (TableReferences, CTE names).
+    """
+    references = []  # [name, first token, last token, context, has alias, has index hint]
+    ctes = []  # [name, body start token, body end token, recursive]
+    depth = 0
+    expect_table = None  # context of the table reference expected next
+    from_depth = None  # paren depth of the FROM list being read, if any
+    from_calls = []  # paren depths opened by EXTRACT(... FROM ...) style calls
+    cte_state = None  # 'name', 'columns', 'as', 'body' or 'next' while reading a WITH list
+    cte_depth = 0
+    recursive = False
+    previous_word = None
+    statement_keyword = None  # first word of the current statement
+    statement_references = 0  # index in references of the current statement's first one
+    list_context = None  # context of the tables in the FROM list being read
+
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        kind = token.kind
+        text = token.text
+        upper = text.upper() if kind == 'word' else None
+        if statement_keyword is None and kind == 'word':
+            statement_keyword = upper
+
+        if text == '(':
+            if cte_state == 'as':
+                cte_state = 'body'
+                ctes[-1][1] = index
+            depth += 1
+            if previous_word in _FROM_FUNCTIONS and tokens[index - 1].kind == 'word':
+                from_calls.append(depth)
+            expect_table = None
+        elif text == ')':
+            if from_calls and from_calls[-1] == depth:
+                from_calls.pop()
+            depth -= 1
+            if from_depth is not None and depth < from_depth:
+                from_depth = None
+            if cte_state == 'body' and depth == cte_depth:
+                cte_state = 'next'
+                ctes[-1][2] = index
+        elif kind == 'semicolon':
+            depth = 0
+            expect_table = None
+            from_depth = None
+            from_calls = []
+            cte_state = None
+            previous_word = None
+            statement_keyword = None
+            statement_references = len(references)
+        elif cte_state == 'next':
+            if text == ',':
+                cte_state = 'name'
+            else:
+                # The WITH list is over: read this token again as part of the query
+                cte_state = None
+                continue
+        elif cte_state == 'name':
+            if upper == 'RECURSIVE':
+                recursive = True
+            elif kind in ('word', 'quoted'):
+                ctes.append([_unquote(text), None, None, recursive])
+                cte_state = 'columns'
+        elif cte_state == 'columns':
+            if upper == 'AS':
+                cte_state = 'as'
+        elif cte_state == 'as':
+            pass  # MATERIALIZED and the like before the CTE body
+        elif upper == 'WITH':
+            cte_state = 'name'
+            cte_depth = depth
+            recursive = False
+        elif expect_table and upper in _TABLE_PREFIXES:
+            pass
+        elif expect_table and kind in ('word', 'quoted'):
+            first = index
+            name = _unquote(text)
+            # Schema-qualified names: schema.table
+            while index + 2 < len(tokens) and tokens[index + 1].text == '.' and tokens[index + 2].kind in ('word', 'quoted'):
+                name = f'{name}.{_unquote(tokens[index + 2].text)}'
+                index += 2
+            context = expect_table
+            if context == 'scan' and statement_keyword == 'DELETE' and depth == 0:
+                # DELETE t1 FROM t1 JOIN t2 ...: the tables rows are deleted from
+                context = 'delete_join'
+            references.append([
+                name, first, index, context, _has_alias(tokens, index + 1), _has_index_hint(tokens, index + 1),
+            ])
+            expect_table = None
+        elif upper == 'FROM' and from_calls and from_calls[-1] == depth:
+            pass  # EXTRACT(YEAR FROM column), TRIM(x FROM column), ...
+        elif upper in _TABLE_KEYWORDS and (upper != 'TABLE' or previous_word in _TABLE_STATEMENTS):
+            if upper == 'FROM' and statement_keyword == 'DELETE' and previous_word in _DELETE_WORDS:
+                expect_table = 'delete'
+            else:
+                expect_table = _TABLE_KEYWORDS[upper]
+            if upper in ('FROM', 'JOIN'):
+                from_depth = depth
+                list_context = expect_table
+        elif upper == 'USING' and statement_keyword == 'DELETE' and depth == 0 and _next_text(tokens, index) != '(':
+            # DELETE FROM t1 USING t1 JOIN t2 ...: the names after FROM refer to this table list
+            for reference in references[statement_references:]:
+                if reference[3] == 'delete':
+                    reference[3] = 'delete_target'
+            expect_table = list_context = 'scan'
+            from_depth = depth
+        elif text == ',' and from_depth == depth:
+            expect_table = list_context
+        elif upper in _CLAUSE_KEYWORDS and from_depth == depth:
+            from_depth = None
+            expect_table = None
+        else:
+            expect_table = None
+
+        if kind == 'word':
+            previous_word = upper
+        index += 1
+
+    table_references = []
+    for name, first, last, context, has_alias, has_index_hint in references:
+        key = name.lower()
+        is_cte = False
+        for cte_name, body_start, body_end, cte_recursive in ctes:
+            if cte_name.lower() != key or body_start is None:
+                continue
+            # A CTE is visible after its body, and inside it when RECURSIVE
+            if first > (body_end if body_end is not None else len(tokens)) or (cte_recursive and first > body_start):
+                is_cte = True
+        table_references.append(TableReference(
+            name, tokens[first].start, tokens[last].start + len(tokens[last].text), context, has_alias, is_cte,
+            has_index_hint,
+        ))
+    return tuple(table_references), tuple(cte[0] for cte in ctes)
+
+
+def _has_alias(tokens, index):
+    if index >= len(tokens):
+        return False
+    token = tokens[index]
+    if token.kind == 'quoted':
+        return True
+    return token.kind == 'word' and token.text.upper() not in _NON_ALIAS_WORDS
+
+
+def _has_index_hint(tokens, index):
+    # Skip the alias, if any
+    if index < len(tokens) and tokens[index].kind == 'word' and tokens[index].text.upper() == 'AS':
+        index += 1
+    if _has_alias(tokens, index):
+        index += 1
+    return (
+        index + 1 < len(tokens)
+        and tokens[index].kind == 'word'
+        and tokens[index].text.upper() in _INDEX_HINT_WORDS
+        and tokens[index + 1].text.upper() in ('INDEX', 'KEY')
+    )
+
+
+def _next_text(tokens, index):
+    return tokens[index + 1].text if index + 1 < len(tokens) else None
+
+
+def _unique_names(names):
+    seen = set()
+    unique = []
+    for name in names:
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            unique.append(name)
+    return tuple(unique)
+
+
+def _unquote(text):
+    if len(text) >= 2 and text[0] in '"`' and text[-1] == text[0]:
+        return text[1:-1].replace(text[0] * 2, text[0])
+    return text
@@ -0,0 +1,178 @@
+"""
+Per-query resource limits for the SQL executors.
+
+Executors used to call cursor.fetchall() without limits, so an accidental
+cross join built millions of row dicts in the web worker before any of them
+was encoded. The governor bounds every user query:
+
+- time: the engine's own limit is set before the user's statements run
+  (statement_timeout on PostgreSQL, max_execution_time on MySQL and a progress
+  handler deadline on SQLite)
+- rows and bytes: results are fetched in batches with fetchmany until
+  QUERY_MAX_RESULT_ROWS rows or QUERY_MAX_RESULT_BYTES bytes are reached; the
+  rest is dropped and the result is flagged as truncated. MySQL also stops
+  sending rows after the cap (sql_select_limit), and PostgreSQL read-only
+  queries are read through a server-side cursor so only the fetched batches
+  reach the worker.
+"""
+
+import re
+import time
+import uuid
+
+from django.conf import settings
+
+
+# SQLite calls the progress handler every this many virtual machine instructions
+SQLITE_PROGRESS_STEPS = 10000
+
+# Statements that can be opened as a PostgreSQL server-side cursor
+STREAMABLE_KINDS = frozenset(['SELECT', 'WITH', 'VALUES', 'TABLE'])
+
+# Statements that DECLARE ... CURSOR does not accept
+_NOT_STREAMABLE_PATTERN = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|INTO)\b', re.IGNORECASE)
+
+_LEADING_WORD_PATTERN = re.compile(r'\s*(\w+)')
+
+# Rough size of a non-text value when counting result bytes
+_VALUE_SIZE = 8
+
+
+def get_statement_timeout_ms():
+    return getattr(settings, 'QUERY_STATEMENT_TIMEOUT_MS', 10000)
+
+
+def get_max_result_rows():
+    return getattr(settings, 'QUERY_MAX_RESULT_ROWS', 5000)
+
+
+def get_max_result_bytes():
+    return getattr(settings, 'QUERY_MAX_RESULT_BYTES', 8 * 1024 * 1024)
+
+
+def get_fetch_batch_size():
+    return getattr(settings, 'QUERY_FETCH_BATCH_SIZE', 500)
+
+
+def apply_query_limits(conn, cursor, engine):
+    """
+    Set the engine-native time limit (and MySQL's row limit) for the user
+    statements about to run on this connection. PostgreSQL settings made inside
+    a transaction that is rolled back are undone with it.
+    """
+    timeout_ms = get_statement_timeout_ms()
+
+    if engine == 'postgresql':
+        if timeout_ms:
+            cursor.execute(f"SET statement_timeout = {int(timeout_ms)}")
+
+    elif engine == 'mysql':
+        # One row more than the cap tells the fetch that the result was truncated
+        cursor.execute(f"SET SESSION sql_select_limit = {int(get_max_result_rows()) + 1}")
+        if timeout_ms:
+            try:
+                cursor.execute(f"SET SESSION max_execution_time = {int(timeout_ms)}")
+            except Exception as e:
+                # Servers without the variable (e.g. MariaDB) still get the row limits
+                print(f"Could not set MySQL max_execution_time: {e}")
+
+    elif engine == 'sqlite':
+        if timeout_ms:
+            deadline = time.monotonic() + timeout_ms / 1000
+            # A non-zero return value interrupts the running statement
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+
+
+def is_timeout_error(engine, error):
+    """Check whether an execution error was caused by the governor's time limit"""
+    message = str(error).lower()
+    if engine == 'sqlite':
+        return message == 'interrupted'
+    if engine == 'postgresql':
+        return 'statement timeout' in message
+    return 'maximum statement execution time exceeded' in message
+
+
+def describe_error(engine, error):
+    """Error text for the user, explaining errors caused by the time limit"""
+    if is_timeout_error(engine, error):
+        return f'Query took longer than {get_statement_timeout_ms() / 1000:g} seconds and was stopped'
+    return str(error)
+
+
+def can_stream(conn, engine, statement_kind, statement):
+    """Check whether a PostgreSQL statement can be read through a server-side cursor"""
+    if statement_kind is None:
+        match = _LEADING_WORD_PATTERN.match(statement)
+        statement_kind = match.group(1).upper() if match else ''
+    return (
+        engine == 'postgresql'
+        and not conn.autocommit
+        and statement_kind in STREAMABLE_KINDS
+        and not _NOT_STREAMABLE_PATTERN.search(statement)
+    )
+
+
+def execute_and_fetch(conn, cursor, engine, statement, statement_kind=None):
+    """
+    Execute a statement that returns rows and fetch it within the row and byte caps.
+    statement_kind is the statement's upper-cased leading keyword, if already known.
+    Returns (columns, rows, truncated); rows are in the cursor's row format.
+    """
+    from sqlplayground.query_timing import span
+
+    if can_stream(conn, engine, statement_kind, statement):
+        stream = conn.cursor(name=f"result_{uuid.uuid4().hex[:12]}", cursor_factory=type(cursor))
+        try:
+            # A server-side cursor only runs the query on the first fetch
+            with span('db.execute', engine):
+                stream.execute(statement)
+            with span('db.fetch', engine):
+                rows, truncated = fetch_limited(stream)
+            columns = [desc[0] for desc in stream.description] if stream.description else []
+        finally:
+            stream.close()
+        return columns, rows, truncated
+
+    with span('db.execute', engine):
+        cursor.execute(statement)
+    with span('db.fetch', engine):
+        rows, truncated = fetch_limited(cursor)
+    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    return columns, rows, truncated
+
+
+def fetch_limited(cursor):
+    """
+    Fetch rows in batches until the result ends or a cap is reached.
+    Returns (rows, truncated).
+    """
+    max_rows = get_max_result_rows()
+    max_bytes = get_max_result_bytes()
+    batch_size = get_fetch_batch_size()
+
+    rows = []
+    size = 0
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return rows, False
+
+        for row in batch:
+            if len(rows) >= max_rows:
+                return rows, True
+            size += _row_size(row)
+            if size > max_bytes:
+                return rows, True
+            rows.append(row)
+
+
+def _row_size(row):
+    values = row.values() if isinstance(row, dict) else row
+    size = 0
+    for value in values:
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        else:
+            size += _VALUE_SIZE
+    return size
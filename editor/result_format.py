@@ -0,0 +1,151 @@
+"""
+Response formats for query results.
+
+By default results are sent as a list of {column: value} objects, which
+repeats every column name on every row. Clients can opt into the columnar
+format by sending format=columnar (JSON body, POST field or query string):
+
+    {
+        "format": "columnar",
+        "columns": ["id", "name", "salary"],
+        "column_types": ["integer", "string", "decimal"],
+        "rows": [[1, "Ann", 1200.5], ...]
+    }
+
+Submit responses carry user_result and expected_result as
+{"columns": ..., "column_types": ..., "rows": ...} objects instead.
+"""
+
+import datetime
+import decimal
+from operator import itemgetter
+
+
+OBJECTS = 'objects'
+COLUMNAR = 'columnar'
+
+# Result lists converted for submit responses
+_NESTED_RESULT_KEYS = ('user_result', 'expected_result')
+
+
+def get_result_format(request, data=None):
+    """Return COLUMNAR if the client asked for it, otherwise OBJECTS"""
+    requested = None
+    if isinstance(data, dict):
+        requested = data.get('format')
+    if not requested:
+        requested = request.POST.get('format') or request.GET.get('format')
+    return COLUMNAR if requested == COLUMNAR else OBJECTS
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _hex(value):
+    return bytes(value).hex()
+
+
+# Type tag and converter for each Python type, checked in order (bool before int,
+# datetime before date); None means the value is sent as is
+_COLUMN_TYPES = (
+    (bool, 'boolean', None),
+    (int, 'integer', None),
+    (float, 'number', None),
+    (decimal.Decimal, 'decimal', float),
+    (str, 'string', None),
+    (datetime.datetime, 'datetime', _isoformat),
+    (datetime.date, 'date', _isoformat),
+    (datetime.time, 'time', _isoformat),
+    ((bytes, bytearray, memoryview), 'bytes', _hex),
+)
+
+
+def _column_type(value):
+    for python_type, tag, converter in _COLUMN_TYPES:
+        if isinstance(value, python_type):
+            return tag, converter
+    # timedelta (MySQL TIME), UUID and anything else is sent as text
+    return 'text', str
+
+
+def _encode_value(value):
+    if value is None:
+        return None
+    converter = _column_type(value)[1]
+    return converter(value) if converter else value
+
+
+def _encode_column(values):
+    """
+    Convert one column of values at a time. The type of the first non-null value
+    picks the converter for the whole column; columns that mix types (SQLite) fall
+    back to converting every value by its own type.
+    Returns (type tag, encoded values).
+    """
+    first = next((value for value in values if value is not None), None)
+    if first is None:
+        return 'null', values
+
+    tag, converter = _column_type(first)
+    value_type = type(first)
+    if not all(value is None or type(value) is value_type for value in values):
+        return 'mixed', [_encode_value(value) for value in values]
+    if converter is None:
+        return tag, values
+    return tag, [None if value is None else converter(value) for value in values]
+
+
+def encode_columnar(results, columns=None):
+    """
+    Encode a list of row dicts as {'columns', 'column_types', 'rows'} with one
+    array per row.
+    """
+    if columns is None:
+        columns = list(results[0].keys()) if results else []
+    columns = list(columns)
+
+    if not results or not columns:
+        return {'columns': columns, 'column_types': ['null'] * len(columns), 'rows': [[] for _ in results]}
+
+    # Transpose to columns, convert each column in one pass and transpose back
+    if len(columns) == 1:
+        column_values = [[row.get(columns[0]) for row in results]]
+    else:
+        try:
+            getter = itemgetter(*columns)
+            column_values = [list(values) for values in zip(*map(getter, results))]
+        except KeyError:
+            # Rows without some of the columns (e.g. duplicate column names)
+            column_values = [[row.get(column) for row in results] for column in columns]
+
+    column_types = []
+    encoded_columns = []
+    for values in column_values:
+        tag, encoded = _encode_column(values)
+        column_types.append(tag)
+        encoded_columns.append(encoded)
+
+    return {
+        'columns': columns,
+        'column_types': column_types,
+        'rows': [list(row) for row in zip(*encoded_columns)],
+    }
+
+
+def apply_result_format(response, result_format):
+    """
+    Convert the result lists of a response dict to the requested format.
+    The response is changed in place and returned.
+    """
+    if result_format != COLUMNAR or not isinstance(response, dict):
+        return response
+
+    if isinstance(response.get('results'), list):
+        response.update(encode_columnar(response.pop('results'), response.get('columns')))
+    for key in _NESTED_RESULT_KEYS:
+        value = response.get(key)
+        if isinstance(value, list) and all(isinstance(row, dict) for row in value):
+            response[key] = encode_columnar(value)
+    response['format'] = COLUMNAR
+    return response
@@ -0,0 +1,173 @@
+"""
+Streaming SQL lexer shared by the editor and challenge executors.
+
+A single regular expression classifies the input into tokens in one left to
+right pass, so splitting scripts into statements and removing comments is O(n)
+even for multi-megabyte dataset scripts. Input can be a string or a file-like
+object; file-like input is read in chunks and never loaded as a whole.
+
+Quoting rules cover what the supported engines accept:
+- '...' strings with doubled quotes, and backslash escapes unless disabled
+  (SQLite has none)
+- "..." and `...` quoted identifiers with doubled quotes
+- PostgreSQL dollar-quoted bodies ($$...$$ and $tag$...$tag$)
+- -- line comments and /* */ block comments, which never start inside quotes
+
+Unterminated quotes and comments run to the end of the input, as the
+database would read them.
+"""
+
+import re
+from collections import namedtuple
+
+
+# Characters read at a time from file-like input
+CHUNK_SIZE = 64 * 1024
+
+# A token ending this close to the end of a chunk may match differently once more
+# input is read (longest case: a dollar-quote delimiter with a 63 character tag)
+LOOKAHEAD = 66
+
+Token = namedtuple('Token', ['kind', 'text', 'start'])
+
+# start/end are offsets into the source; text has comments removed and is stripped
+Statement = namedtuple('Statement', ['text', 'start', 'end', 'terminated'])
+
+# Quoted tokens shared by both pattern sets; {string} and {quoted} depend on
+# whether backslash escapes are recognised
+_QUOTED_PATTERNS = r"""
+    (?P<comment>--[^\n]*|/\*(?:[^*]+|\*(?!/))*(?:\*/)?)
+    | (?P<string>{string})
+    | (?P<quoted>{quoted}|`(?:[^`]+|``)*`?)
+    | (?P<dollar>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$(?:[^$]+|\$(?!(?P=tag)\$))*(?:\$(?P=tag)\$)?)
+    | (?P<semicolon>;)
+"""
+
+# Fine-grained tokens
+_TOKEN_PATTERNS = r"""
+    (?P<space>\s+)
+    | """ + _QUOTED_PATTERNS + r"""
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    | (?P<punct>.)
+"""
+
+# Coarse segments for statement splitting: everything that is not quoted, a
+# comment or a semicolon is matched in runs, which is much faster than
+# producing a token per word. Words are kept whole so a $ inside an
+# identifier never starts a dollar quote.
+_SEGMENT_PATTERNS = _QUOTED_PATTERNS + r"""
+    | (?P<text>(?:[A-Za-z0-9_][A-Za-z0-9_$]*|[^'"`$;/\-A-Za-z0-9_]+|/(?!\*)|-(?!-))+)
+    | (?P<punct>.)
+"""
+
+_ESCAPES = {
+    True: {'string': r"'(?:[^'\\]+|''|\\.)*'?", 'quoted': r'"(?:[^"\\]+|""|\\.)*"?'},
+    False: {'string': r"'(?:[^']+|'')*'?", 'quoted': r'"(?:[^"]+|"")*"?'},
+}
+
+_TOKEN_PATTERN = {
+    escapes: re.compile(_TOKEN_PATTERNS.format(**quotes), re.VERBOSE | re.DOTALL)
+    for escapes, quotes in _ESCAPES.items()
+}
+
+_SEGMENT_PATTERN = {
+    escapes: re.compile(_SEGMENT_PATTERNS.format(**quotes), re.VERBOSE | re.DOTALL)
+    for escapes, quotes in _ESCAPES.items()
+}
+
+
+def tokenize(source, backslash_escapes=True):
+    """
+    Yield Token(kind, text, start) for a SQL string or file-like object.
+    kind is one of space, comment, string, quoted, dollar, word, number,
+    semicolon and punct.
+    """
+    for kind, text, start in _scan(source, _TOKEN_PATTERN[bool(backslash_escapes)]):
+        yield Token(kind, text, start)
+
+
+def _scan(source, pattern):
+    """Yield (kind, text, start) for each match of pattern over a string or file-like object"""
+    if isinstance(source, str):
+        for match in pattern.finditer(source):
+            yield match.lastgroup, match.group(), match.start()
+        return
+
+    buffer = source.read(CHUNK_SIZE)
+    eof = not buffer
+    offset = 0  # source offset of buffer[0]
+    position = 0
+    read_size = CHUNK_SIZE
+
+    while position < len(buffer):
+        match = pattern.match(buffer, position)
+
+        if match.end() > len(buffer) - LOOKAHEAD and not eof:
+            # The token may continue in the next chunk: read more and match it again.
+            # Doubling the read size keeps rescanning a huge token linear overall.
+            chunk = source.read(read_size)
+            if chunk:
+                read_size *= 2
+            else:
+                eof = True
+            buffer = buffer[position:] + chunk
+            offset += position
+            position = 0
+            continue
+
+        read_size = CHUNK_SIZE
+        yield match.lastgroup, match.group(), offset + match.start()
+        position = match.end()
+
+
+def iter_statements(source, backslash_escapes=True):
+    """
+    Yield a Statement for each non-empty statement in a SQL script, split on
+    semicolons outside quotes, dollar quotes and comments.
+    """
+    parts = []
+    start = None
+    end = None
+
+    for kind, text, position in _scan(source, _SEGMENT_PATTERN[bool(backslash_escapes)]):
+        if kind == 'semicolon':
+            if start is not None:
+                yield Statement(''.join(parts).strip(), start, end, True)
+            parts = []
+            start = None
+            continue
+
+        if kind == 'comment':
+            # A block comment separates tokens like whitespace does
+            if start is not None and text.startswith('/*'):
+                parts.append(' ')
+            continue
+
+        stripped = text.strip()
+        if stripped:
+            if start is None:
+                start = position + text.index(stripped[0])
+            end = position + len(text.rstrip())
+            parts.append(text)
+        elif start is not None:
+            parts.append(text)
+
+    if start is not None:
+        yield Statement(''.join(parts).strip(), start, end, False)
+
+
+def split_statements(source, backslash_escapes=True):
+    """Return the comment-free text of each non-empty statement in a SQL script"""
+    return [statement.text for statement in iter_statements(source, backslash_escapes)]
+
+
+def strip_comments(source, backslash_escapes=True):
+    """Remove -- and /* */ comments that are not inside quotes"""
+    parts = []
+    for kind, text, _ in _scan(source, _SEGMENT_PATTERN[bool(backslash_escapes)]):
+        if kind != 'comment':
+            parts.append(text)
+        elif text.startswith('/*'):
+            parts.append(' ')
+    return ''.join(parts)
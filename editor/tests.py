@@ -1,3 +1,154 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import sql_lexer
+from .parsed_query import as_parsed_query, parse_query
+from .result_format import COLUMNAR, apply_result_format, encode_columnar
+from .sql_lexer import iter_statements, split_statements, strip_comments, tokenize
+from .views import execute_sql_query
+
+
+class SqlLexerTestCase(SimpleTestCase):
+    """Test statement splitting and comment removal with the shared SQL lexer."""
+
+    script = (
+        "-- header; comment\n"
+        "SELECT 'a;b', \"x\"\"y;\", `c;d`, 'it''s; \\' ;' FROM t /* ; */ WHERE a = 1;\n"
+        "CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql;\n"
+        "SELECT $$a;b$$, price$usd FROM t -- trailing"
+    )
+
+    def test_semicolons_inside_quotes_and_comments_do_not_split(self):
+        statements = list(iter_statements(self.script))
+
+        self.assertEqual(len(statements), 3)
+        self.assertTrue(statements[0].text.startswith("SELECT 'a;b'"))
+        self.assertNotIn('/*', statements[0].text)
+        self.assertTrue(statements[1].text.endswith('$body$ LANGUAGE sql'))
+        self.assertEqual(statements[2].text, 'SELECT $$a;b$$, price$usd FROM t')
+        self.assertEqual([s.terminated for s in statements], [True, True, False])
+        self.assertEqual(self.script[statements[1].start:statements[1].end], statements[1].text)
+
+    def test_comment_markers_inside_strings_are_kept(self):
+        self.assertEqual(strip_comments("SELECT '--not a comment' -- comment"), "SELECT '--not a comment' ")
+        self.assertEqual(split_statements("SELECT 'a/*b*/c'"), ["SELECT 'a/*b*/c'"])
+
+    def test_backslash_escapes_can_be_disabled(self):
+        self.assertEqual(split_statements(r"SELECT 'a\'; SELECT 2"), [r"SELECT 'a\'; SELECT 2"])
+        self.assertEqual(
+            split_statements(r"SELECT 'a\'; SELECT 2", backslash_escapes=False),
+            [r"SELECT 'a\'", 'SELECT 2'],
+        )
+
+    def test_file_like_input_matches_string_input(self):
+        script = self.script * 20
+        for chunk_size in (1, 7, 100):
+            with mock.patch.object(sql_lexer, 'CHUNK_SIZE', chunk_size):
+                self.assertEqual(list(tokenize(io.StringIO(script))), list(tokenize(script)))
+                self.assertEqual(list(iter_statements(io.StringIO(script))), list(iter_statements(script)))
+
+
+class ParsedQueryTestCase(SimpleTestCase):
+    """Test the per-request ParsedQuery."""
+
+    def test_statements_kinds_and_tables(self):
+        parsed = parse_query(
+            "WITH totals(dept, total) AS (SELECT dept, SUM(salary) FROM employees GROUP BY dept) "
+            "SELECT t.dept, d.name FROM totals t JOIN departments d ON d.id = t.dept, regions r "
+            "WHERE EXTRACT(YEAR FROM r.opened) > 2000; -- done\n"
+            "INSERT INTO audit (note) VALUES ('drop table employees')"
+        )
+
+        self.assertEqual(parsed.statement_kinds, ('WITH', 'INSERT'))
+        self.assertEqual(parsed.cte_names, ('totals',))
+        self.assertEqual(parsed.tables, ('employees', 'departments', 'regions', 'audit'))
+        self.assertTrue(parsed.returns_rows(0))
+        self.assertFalse(parsed.returns_rows(1))
+        self.assertNotIn('-- done', parsed.clean_query)
+        # Keywords inside string literals are not commands
+        self.assertFalse(parsed.is_dangerous)
+
+    def test_dangerous_commands(self):
+        self.assertTrue(parse_query('DROP TABLE employees').is_dangerous)
+        self.assertTrue(parse_query('create user bob').is_dangerous)
+        self.assertFalse(parse_query('SELECT created_user FROM users').is_dangerous)
+
+    def test_parsing_is_memoized(self):
+        self.assertIs(parse_query('SELECT 1'), parse_query('SELECT 1'))
+        self.assertIs(as_parsed_query(parse_query('SELECT 1')), parse_query('SELECT 1'))
+
+
+@override_settings(QUERY_MAX_RESULT_ROWS=10, QUERY_FETCH_BATCH_SIZE=4, QUERY_STATEMENT_TIMEOUT_MS=200)
+class QueryGovernorTestCase(SimpleTestCase):
+    """Test the row cap and time limit applied to user queries."""
+
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, self.db_path)
+
+    def test_large_results_are_truncated(self):
+        result = execute_sql_query(
+            self.db_path,
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 100) SELECT x FROM n"
+        )
+
+        self.assertTrue(result['success'])
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['row_count'], 10)
+        self.assertEqual([row['x'] for row in result['results']], list(range(1, 11)))
+
+    def test_small_results_are_not_truncated(self):
+        result = execute_sql_query(self.db_path, "SELECT 1 AS x UNION ALL SELECT 2")
+
+        self.assertEqual(result['row_count'], 2)
+        self.assertNotIn('truncated', result)
+
+    def test_long_running_query_is_stopped(self):
+        result = execute_sql_query(
+            self.db_path,
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+        )
+
+        self.assertFalse(result['success'])
+        self.assertIn('took longer than 0.2 seconds', result['error'])
+
+
+class ResultFormatTestCase(SimpleTestCase):
+    """Test the columnar result encoding."""
+
+    def test_columns_are_encoded_with_type_tags(self):
+        results = [
+            {'id': 1, 'salary': Decimal('10.50'), 'hired': datetime.date(2020, 1, 2), 'photo': b'\x01\xff', 'note': None},
+            {'id': 2, 'salary': None, 'hired': datetime.date(2021, 3, 4), 'photo': None, 'note': None},
+        ]
+        encoded = encode_columnar(results, ['id', 'salary', 'hired', 'photo', 'note'])
+
+        self.assertEqual(encoded['column_types'], ['integer', 'decimal', 'date', 'bytes', 'null'])
+        self.assertEqual(encoded['rows'], [
+            [1, 10.5, '2020-01-02', '01ff', None],
+            [2, None, '2021-03-04', None, None],
+        ])
+
+        # SQLite columns can mix types
+        mixed = encode_columnar([{'v': 1}, {'v': 'one'}, {'v': Decimal('1.5')}])
+        self.assertEqual(mixed['column_types'], ['mixed'])
+        self.assertEqual(mixed['rows'], [[1], ['one'], [1.5]])
+
+    def test_apply_result_format(self):
+        response = {'success': True, 'results': [{'a': 1, 'b': 'x'}], 'columns': ['a', 'b']}
+        self.assertIs(apply_result_format(dict(response), 'objects')['results'], response['results'])
+
+        columnar = apply_result_format(dict(response), COLUMNAR)
+        self.assertNotIn('results', columnar)
+        self.assertEqual(columnar['rows'], [[1, 'x']])
+        self.assertEqual(columnar['format'], COLUMNAR)
+
+        submit = apply_result_format({'user_result': [{'a': 1}], 'expected_result': [{'a': 2}]}, COLUMNAR)
+        self.assertEqual(submit['expected_result'], {'columns': ['a'], 'column_types': ['integer'], 'rows': [[2]]})
@@ -8,11 +8,14 @@ import json
 import sqlite3
 import os
 import time
-import re
 import csv
 import io
 
 from .models import QueryHistory, SavedQuery
+from .parsed_query import as_parsed_query, parse_query
+from .query_governor import apply_query_limits, describe_error, execute_and_fetch
+from .result_format import apply_result_format, get_result_format
+from .sql_lexer import strip_comments
 from users.models import UserDatabase
 
 
@@ -42,8 +45,11 @@ def execute_query(request):
                 'error': 'Query is required'
             })
 
+        # Parse once; the parsed query is passed along instead of the raw text
+        parsed_query = parse_query(query, backslash_escapes=False)
+
         # Security check - prevent dangerous operations
-        if is_dangerous_query(query):
+        if parsed_query.is_dangerous:
             return JsonResponse({
                 'success': False,
                 'error': 'This query contains commands that are not allowed in the playground'
@@ -62,7 +68,7 @@ def execute_query(request):
 
         # Execute query
         start_time = time.time()
-        result = execute_sql_query(db_path, query)
+        result = execute_sql_query(db_path, parsed_query)
         execution_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
 
         # Save to query history
@@ -77,7 +83,7 @@ def execute_query(request):
         # Update database last accessed time
         user_db.save()  # This will update last_accessed due to auto_now=True
 
-        return JsonResponse(result)
+        return JsonResponse(apply_result_format(result, get_result_format(request, data)))
 
     except Exception as e:
         # Save failed query to history
@@ -240,65 +246,51 @@ def delete_saved_query(request, query_id):
 def remove_sql_comments(query):
     """
     Remove SQL comments from query.
-    Handles both single-line (--) and multi-line (/* */) comments.
+    Handles both single-line (--) and multi-line (/* */) comments, leaving
+    comment markers inside string literals and quoted identifiers alone.
     """
-    # Remove single-line comments (-- comment)
-    query = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-
-    # Remove multi-line comments (/* comment */)
-    query = re.sub(r'/\*.*?\*/', '', query, flags=re.DOTALL)
-
-    return query
+    return strip_comments(query)
 
 
 def is_dangerous_query(query):
     """
-    Check if query contains dangerous SQL commands.
+    Check if query contains dangerous SQL commands (see parsed_query.DANGEROUS_KEYWORDS).
+    Accepts a query string or a ParsedQuery.
     """
-    dangerous_commands = [
-        'DROP', 'TRUNCATE', 'DELETE', 'ALTER', 'MODIFY',
-        'RENAME', 'REMOVE', 'GRANT', 'REVOKE', 'CREATE USER',
-        'DROP USER', 'ATTACH', 'DETACH', 'PRAGMA'
-    ]
-
-    # Convert to uppercase and remove comments
-    clean_query = remove_sql_comments(query).upper()
-
-    # Check for dangerous commands
-    for cmd in dangerous_commands:
-        if re.search(r'\b' + cmd + r'\b', clean_query):
-            return True
-
-    return False
+    return as_parsed_query(query, backslash_escapes=False).is_dangerous
 
 
 def execute_sql_query_enhanced(db_path, query):
     """
     Enhanced SQL query execution for SQLite that handles complex queries, CTEs,
     multiple statements, and multiple result sets.
+    query may be a string or a ParsedQuery.
     """
     try:
         conn = sqlite3.connect(db_path)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         cursor = conn.cursor()
 
-        # Clean the query - remove comments and whitespace
-        clean_query = remove_sql_comments(query).strip()
+        # Comments are removed and statements split when the query is parsed
+        parsed_query = as_parsed_query(query, backslash_escapes=False)
 
         # Check if query is empty after cleaning
-        if not clean_query:
+        if parsed_query.is_empty:
             conn.close()
             return {
                 'success': False,
                 'error': 'Query is empty or contains only comments'
             }
 
-        # Split query into individual statements
-        statements = _split_sql_statements_sqlite(clean_query)
+        statements = parsed_query.statement_texts
 
         all_results = []
         total_changes = 0
         last_insert_id = None
+        truncated = False
+
+        # Time and row limits for the user's statements
+        apply_query_limits(conn, cursor, 'sqlite')
 
         for i, statement in enumerate(statements):
             statement = statement.strip()
@@ -306,16 +298,14 @@ def execute_sql_query_enhanced(db_path, query):
                 continue
 
             try:
-                # Execute the statement
-                cursor.execute(statement)
-
                 # Determine if this is a SELECT statement or returns results
-                is_select = _is_select_statement_sqlite(statement)
+                is_select = parsed_query.statement_kinds[i] in SQLITE_RESULT_KEYWORDS
 
                 if is_select:
-                    # Handle SELECT statements and other statements that return results
-                    rows = cursor.fetchall()
-                    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                    # Handle SELECT statements and other statements that return results,
+                    # fetching at most the governor's row and byte caps
+                    columns, rows, statement_truncated = execute_and_fetch(conn, cursor, 'sqlite', statement)
+                    truncated = truncated or statement_truncated
 
                     # Convert rows to list of dictionaries
                     results = []
@@ -332,6 +322,7 @@ def execute_sql_query_enhanced(db_path, query):
                     })
                 else:
                     # Handle INSERT, UPDATE, DELETE, etc.
+                    cursor.execute(statement)
                     conn.commit()
                     changes = cursor.rowcount
                     total_changes += changes
@@ -353,7 +344,7 @@ def execute_sql_query_enhanced(db_path, query):
                 conn.close()
                 return {
                     'success': False,
-                    'error': f'Error in statement {i + 1}: {str(stmt_error)}',
+                    'error': f'Error in statement {i + 1}: {describe_error("sqlite", stmt_error)}',
                     'statement': statement
                 }
 
@@ -364,7 +355,7 @@ def execute_sql_query_enhanced(db_path, query):
             # Single statement - return simplified format
             result = all_results[0]
             if result['type'] == 'SELECT':
-                return {
+                response = {
                     'success': True,
                     'results': result['results'],
                     'columns': result['columns'],
@@ -408,7 +399,10 @@ def execute_sql_query_enhanced(db_path, query):
             if not select_results and modification_results:
                 response['message'] = f'All statements executed successfully. {total_changes} total row(s) affected.'
 
-            return response
+        if truncated:
+            # Rows past the governor's row or byte cap were dropped
+            response['truncated'] = True
+        return response
 
     except Exception as e:
         try:
@@ -429,69 +423,8 @@ def execute_sql_query(db_path, query):
     return execute_sql_query_enhanced(db_path, query)
 
 
-def _split_sql_statements_sqlite(query):
-    """
-    Split SQL query into individual statements for SQLite, handling complex cases.
-    """
-    # Remove comments first
-    clean_query = remove_sql_comments(query)
-
-    # Simple approach: split by semicolon, but be smart about it
-    statements = []
-    current_statement = ""
-    in_string = False
-    string_char = None
-
-    i = 0
-    while i < len(clean_query):
-        char = clean_query[i]
-
-        # Handle string literals
-        if char in ("'", '"') and not in_string:
-            in_string = True
-            string_char = char
-            current_statement += char
-        elif char == string_char and in_string:
-            # Check if it's escaped
-            if i > 0 and clean_query[i-1] == '\\':
-                current_statement += char
-            else:
-                in_string = False
-                string_char = None
-                current_statement += char
-        elif char == ';' and not in_string:
-            # End of statement
-            if current_statement.strip():
-                statements.append(current_statement.strip())
-            current_statement = ""
-        else:
-            current_statement += char
-
-        i += 1
-
-    # Add the last statement if it doesn't end with semicolon
-    if current_statement.strip():
-        statements.append(current_statement.strip())
-
-    return statements
-
-
-def _is_select_statement_sqlite(statement):
-    """
-    Determine if a SQL statement returns results for SQLite.
-    """
-    statement_upper = statement.upper().strip()
-
-    # Statements that return results in SQLite
-    result_returning_keywords = [
-        'SELECT', 'WITH', 'PRAGMA', 'EXPLAIN'
-    ]
-
-    for keyword in result_returning_keywords:
-        if statement_upper.startswith(keyword):
-            return True
-
-    return False
+# Leading keywords of SQLite statements that return results
+SQLITE_RESULT_KEYWORDS = frozenset(['SELECT', 'WITH', 'PRAGMA', 'EXPLAIN'])
 
 
 def initialize_user_database(db_path):
@@ -591,8 +524,10 @@ def export_results(request, format):
                 'error': 'Query is required'
             })
 
+        parsed_query = parse_query(query, backslash_escapes=False)
+
         # Security check
-        if is_dangerous_query(query):
+        if parsed_query.is_dangerous:
             return JsonResponse({
                 'success': False,
                 'error': 'This query contains commands that are not allowed'
@@ -609,7 +544,7 @@ def export_results(request, format):
             })
 
         # Execute query
-        result = execute_sql_query(db_path, query)
+        result = execute_sql_query(db_path, parsed_query)
 
         if not result['success']:
             return JsonResponse({
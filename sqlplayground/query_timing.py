@@ -0,0 +1,296 @@
+"""
+Per-phase timing of the query execution pipeline.
+
+The executors wrap each phase of a query in span(name, engine): connecting,
+creating the temporary database, loading the schema and dataset, rewriting
+the query, executing, fetching, grading and encoding the response. Every
+finished span goes to the sinks named in QUERY_TIMING_SINKS:
+
+- 'log': print one line per span
+- 'histogram': add it to the latency histogram, which the /metrics endpoint
+  (challenges/metrics.py) renders in the Prometheus text format
+- a dotted path to any callable(name, seconds, engine)
+
+The histogram is counted per process. So that /metrics also covers the other
+web workers and the forked query workers, every process writes its histogram
+to its own file in QUERY_METRICS_DIR (at most every QUERY_METRICS_FLUSH_SECONDS,
+and after every queued job) and collect_histogram() adds the files up. Files
+of processes that have exited are folded into one archive file, so their
+counts are kept. The directory must be local to the host, and each host is
+scraped on its own; with QUERY_METRICS_DIR empty, /metrics only reports the
+process that serves it.
+
+Views run the request inside trace_request(); the spans it collects are sent
+back to staff users as a 'timings' block ({phase: milliseconds}, repeated
+phases summed). Spans nest, so 'query.total' includes the phases below it.
+"""
+
+import atexit
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace = contextvars.ContextVar('query_timing_trace', default=None)
+
+_sink_cache = {}
+
+ARCHIVE_FILE = 'archive.json'
+
+
+class Histogram:
+    """Thread-safe cumulative latency histogram per (phase, engine)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}  # (phase, engine) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.observations = 0
+        self.flushed_observations = 0
+        self.last_flush = time.monotonic()
+        self.process_id = f'{self._pid}-{uuid.uuid4().hex[:12]}'
+
+    def _check_fork_locked(self):
+        # A forked child starts from zero: the parent reports what it observed itself
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._series.clear()
+            self.observations = self.flushed_observations = 0
+            self.last_flush = time.monotonic()
+            self.process_id = f'{self._pid}-{uuid.uuid4().hex[:12]}'
+
+    def observe(self, name, seconds, engine=None):
+        key = (name, engine or '')
+        with self._lock:
+            self._check_fork_locked()
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._series[key] = series
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            self.observations += 1
+
+    def snapshot(self):
+        return self.checkpoint()[1]
+
+    def checkpoint(self):
+        """(number of observations, snapshot) at one point in time"""
+        with self._lock:
+            self._check_fork_locked()
+            return self.observations, {key: list(series) for key, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.observations = self.flushed_observations = 0
+
+
+histogram = Histogram()
+
+
+def log_sink(name, seconds, engine=None):
+    print(f"[timing] {name}{f' ({engine})' if engine else ''}: {seconds * 1000:.2f} ms")
+
+
+def histogram_sink(name, seconds, engine=None):
+    histogram.observe(name, seconds, engine)
+    interval = getattr(settings, 'QUERY_METRICS_FLUSH_SECONDS', 10)
+    if time.monotonic() - histogram.last_flush >= interval:
+        flush_histogram()
+
+
+SINKS = {
+    'log': log_sink,
+    'histogram': histogram_sink,
+}
+
+
+def get_sinks():
+    """Resolve QUERY_TIMING_SINKS to callables"""
+    names = getattr(settings, 'QUERY_TIMING_SINKS', ('histogram',))
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    names = tuple(names)
+
+    sinks = _sink_cache.get(names)
+    if sinks is None:
+        from django.utils.module_loading import import_string
+
+        sinks = tuple(SINKS[name] if name in SINKS else import_string(name) for name in names)
+        _sink_cache.clear()
+        _sink_cache[names] = sinks
+    return sinks
+
+
+def record_span(name, seconds, engine=None):
+    """Hand a finished span to the current trace and the sinks"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+    for sink in get_sinks():
+        try:
+            sink(name, seconds, engine)
+        except Exception as e:
+            print(f"Timing sink failed for {name}: {e}")
+
+
+@contextmanager
+def span(name, engine=None):
+    """Time the enclosed block as one phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, engine)
+
+
+@contextmanager
+def trace_request():
+    """Collect the spans recorded inside the block; yields the list they are added to"""
+    trace = []
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def summarize_trace(trace):
+    """{phase: milliseconds} in the order phases first finished, repeated phases summed"""
+    timings = {}
+    for name, seconds in trace:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+    return {name: round(ms, 2) for name, ms in timings.items()}
+
+
+def should_include_timings(user):
+    """Staff users get the timings block in query responses"""
+    return (
+        getattr(settings, 'QUERY_TIMING_IN_RESPONSE', True)
+        and user is not None
+        and getattr(user, 'is_staff', False)
+    )
+
+
+def get_metrics_dir():
+    return str(getattr(settings, 'QUERY_METRICS_DIR', '') or '')
+
+
+def flush_histogram():
+    """Write this process's histogram to its file in QUERY_METRICS_DIR"""
+    directory = get_metrics_dir()
+    histogram.last_flush = time.monotonic()
+    if not directory:
+        return
+
+    observations, series = histogram.checkpoint()
+    if observations == histogram.flushed_observations:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _write_series(os.path.join(directory, f'{histogram.process_id}.json'), series)
+        histogram.flushed_observations = observations
+    except OSError as e:
+        print(f"Could not write query timing metrics to {directory}: {e}")
+
+
+def collect_histogram():
+    """
+    The histogram of every process on this host, as {(phase, engine): [bucket
+    counts..., sum, count]}; only this process's when QUERY_METRICS_DIR is empty.
+    """
+    directory = get_metrics_dir()
+    if not directory:
+        return histogram.snapshot()
+
+    flush_histogram()
+    totals = {}
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock:
+        # Archiving while another scrape adds up the files would count a process twice
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _archive_exited_processes(directory)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            _add_series(totals, _read_series(path))
+    return totals
+
+
+def _archive_exited_processes(directory):
+    exited = []
+    for path in glob.glob(os.path.join(directory, '*-*.json')):
+        try:
+            os.kill(int(os.path.basename(path).split('-')[0]), 0)
+        except ProcessLookupError:
+            exited.append(path)
+        except (PermissionError, ValueError):
+            pass
+    if not exited:
+        return
+
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _read_series(archive_path)
+    for path in exited:
+        _add_series(archive, _read_series(path))
+    _write_series(archive_path, archive)
+    for path in exited:
+        os.remove(path)
+
+
+def _read_series(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if data.get('buckets') != list(BUCKETS):
+        # Written with other bucket bounds; cannot be added up
+        return {}
+    return {(phase, engine): series for phase, engine, series in data['series']}
+
+
+def _write_series(path, series):
+    data = {
+        'buckets': list(BUCKETS),
+        'series': [[phase, engine, values] for (phase, engine), values in sorted(series.items())],
+    }
+    # Written to the side and renamed, so a reader never sees half a file
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle)
+    os.replace(temporary_path, path)
+
+
+def _add_series(totals, series):
+    for key, values in series.items():
+        current = totals.get(key)
+        if current is None:
+            totals[key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                current[index] += value
+
+
+# Spans recorded since the last flush; forked query workers exit without this
+# and flush after every job instead
+atexit.register(flush_histogram)
@@ -92,35 +92,51 @@ class QueryExecutionRouter:
             raise ValueError(f"Unsupported database engine: {engine}")
 
     @staticmethod
-    def get_connection_params(engine):
+    def get_connection_params(engine, database=None):
         """
         Get connection parameters for direct database connections.
         Used by challenge execution utilities that need raw database connections.
         
         Args:
             engine (str): Database engine ('mysql' or 'postgresql')
+            database (str): Target database; defaults to the configured query
+                database. For MySQL an empty string selects no database.
             
         Returns:
-            dict: Connection parameters for the database driver
+            dict: Connection parameters for the database driver, plus a 'pool'
+                entry with the connection pool options (removed by the pool
+                before connecting)
         """
         from django.conf import settings
         
+        pool = {
+            'max_size': getattr(settings, 'QUERY_POOL_MAX_SIZE', 10),
+            'idle_timeout': getattr(settings, 'QUERY_POOL_IDLE_TIMEOUT', 300),
+            'checkout_timeout': getattr(settings, 'QUERY_POOL_CHECKOUT_TIMEOUT', 10),
+            'enabled': getattr(settings, 'QUERY_POOL_ENABLED', True),
+        }
+        
         if engine.lower() == 'mysql':
-            return {
+            params = {
                 'host': settings.MYSQL_HOST,
                 'port': settings.MYSQL_PORT,
                 'user': settings.MYSQL_USER,
                 'password': settings.MYSQL_PASSWORD,
-                'database': settings.MYSQL_DB,
+                'database': settings.MYSQL_DB if database is None else database,
                 'charset': 'utf8mb4',
+                'pool': pool,
             }
+            if not params['database']:
+                del params['database']
+            return params
         elif engine.lower() == 'postgresql':
             return {
                 'host': settings.POSTGRESQL_HOST,
                 'port': settings.POSTGRESQL_PORT,
                 'user': settings.POSTGRESQL_USER,
                 'password': settings.POSTGRESQL_PASSWORD,
-                'database': settings.POSTGRESQL_DB,
+                'database': settings.POSTGRESQL_DB if database is None else database,
+                'pool': pool,
             }
         else:
             raise ValueError(f"Unsupported database engine: {engine}")
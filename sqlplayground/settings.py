@@ -357,6 +357,128 @@ MYSQL_USER = os.environ.get('QUERY_MYSQL_USER', 'root')
 MYSQL_PASSWORD = os.environ.get('QUERY_MYSQL_PASSWORD', 'forgex99')
 MYSQL_DB = os.environ.get('QUERY_MYSQL_DB_NAME', 'sqlplayground_queries_mysql')
 
+# Run read-only challenge queries on persistent, pre-loaded databases (one per
+# challenge version, dataset and engine) instead of a temporary database per query
+CHALLENGE_TEMPLATE_DATABASES_ENABLED = os.environ.get('CHALLENGE_TEMPLATE_DATABASES_ENABLED', 'True').lower() == 'true'
+
+# Give other PostgreSQL queries a private copy of the template database made with
+# CREATE DATABASE ... TEMPLATE, keeping this many clones ready per dataset
+CHALLENGE_DATABASE_CLONING_ENABLED = os.environ.get('CHALLENGE_DATABASE_CLONING_ENABLED', 'True').lower() == 'true'
+CHALLENGE_CLONE_POOL_SIZE = int(os.environ.get('CHALLENGE_CLONE_POOL_SIZE', '2'))
+# Ready clones of a dataset nobody has used for this long are dropped
+CHALLENGE_CLONE_LEASE_SECONDS = int(os.environ.get('CHALLENGE_CLONE_LEASE_SECONDS', '600'))
+
+# Lease private databases from a per-process pool of reusable sandboxes
+# (challenges/sandbox_pool.py) instead of creating and dropping one per query
+CHALLENGE_SANDBOX_POOL_ENABLED = os.environ.get('CHALLENGE_SANDBOX_POOL_ENABLED', 'False').lower() == 'true'
+CHALLENGE_SANDBOX_POOL_SIZE = int(os.environ.get('CHALLENGE_SANDBOX_POOL_SIZE', '4'))
+CHALLENGE_SANDBOX_LEASE_SECONDS = int(os.environ.get('CHALLENGE_SANDBOX_LEASE_SECONDS', '60'))
+CHALLENGE_SANDBOX_CHECKOUT_TIMEOUT = int(os.environ.get('CHALLENGE_SANDBOX_CHECKOUT_TIMEOUT', '2'))
+
+# Warm the sandbox of a challenge (challenges/warmup.py) when its page is opened,
+# at most once per challenge version and engine in this many seconds
+CHALLENGE_WARMUP_ENABLED = os.environ.get('CHALLENGE_WARMUP_ENABLED', 'True').lower() == 'true'
+CHALLENGE_WARMUP_INTERVAL_SECONDS = int(os.environ.get('CHALLENGE_WARMUP_INTERVAL_SECONDS', '300'))
+
+# In-memory SQLite engine (challenges/sqlite_engine.py): offer it as a practice
+# engine for Run, use it for Run when neither MySQL nor PostgreSQL can be reached
+# (Submit is never graded on SQLite), and keep this many loaded challenge
+# datasets per process
+CHALLENGE_SQLITE_ENGINE_ENABLED = os.environ.get('CHALLENGE_SQLITE_ENGINE_ENABLED', 'False').lower() == 'true'
+CHALLENGE_SQLITE_FALLBACK_ENABLED = os.environ.get('CHALLENGE_SQLITE_FALLBACK_ENABLED', 'True').lower() == 'true'
+CHALLENGE_SQLITE_TEMPLATE_CACHE_SIZE = int(os.environ.get('CHALLENGE_SQLITE_TEMPLATE_CACHE_SIZE', '64'))
+
+# Cache results of deterministic read-only challenge Run queries (seconds)
+CHALLENGE_RESULT_CACHE_ENABLED = os.environ.get('CHALLENGE_RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+CHALLENGE_RESULT_CACHE_TIMEOUT = int(os.environ.get('CHALLENGE_RESULT_CACHE_TIMEOUT', '300'))
+
+# Caches: challenge query results go to Redis when REDIS_URL is set so all
+# workers share them, otherwise to a per-process LRU local-memory cache. The
+# engine circuit breakers must be shared by every worker process, so without
+# Redis they are kept in a database cache table (created by a challenges
+# migration) rather than in local memory
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'query_results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'challenge-query-results',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CHALLENGE_RESULT_CACHE_MAX_ENTRIES', '5000')),
+        },
+    },
+    'engine_health': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'challenge_engine_health_cache',
+    },
+}
+if REDIS_URL:
+    CACHES['query_results'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'kodesql',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'IGNORE_EXCEPTIONS': True,
+        },
+    }
+    CACHES['engine_health'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'kodesql',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'IGNORE_EXCEPTIONS': True,
+        },
+    }
+
+# Circuit breakers for the query database servers (challenges/engine_health.py):
+# open after this many connection failures in a row, let a trial query through
+# after the cooldown, and probe an unavailable server in the background
+ENGINE_HEALTH_FAILURE_THRESHOLD = int(os.environ.get('ENGINE_HEALTH_FAILURE_THRESHOLD', '3'))
+ENGINE_HEALTH_COOLDOWN_SECONDS = int(os.environ.get('ENGINE_HEALTH_COOLDOWN_SECONDS', '30'))
+ENGINE_HEALTH_PROBE_INTERVAL_SECONDS = int(os.environ.get('ENGINE_HEALTH_PROBE_INTERVAL_SECONDS', '10'))
+
+# Connection pools for the query databases (per worker process, per database)
+QUERY_POOL_ENABLED = os.environ.get('QUERY_POOL_ENABLED', 'True').lower() == 'true'
+QUERY_POOL_MAX_SIZE = int(os.environ.get('QUERY_POOL_MAX_SIZE', '10'))
+QUERY_POOL_IDLE_TIMEOUT = int(os.environ.get('QUERY_POOL_IDLE_TIMEOUT', '300'))
+QUERY_POOL_CHECKOUT_TIMEOUT = int(os.environ.get('QUERY_POOL_CHECKOUT_TIMEOUT', '10'))
+
+# Limits for every user query: engine-side time limit (0 disables it), and the
+# rows / bytes of a result that are fetched before it is truncated
+QUERY_STATEMENT_TIMEOUT_MS = int(os.environ.get('QUERY_STATEMENT_TIMEOUT_MS', '10000'))
+QUERY_MAX_RESULT_ROWS = int(os.environ.get('QUERY_MAX_RESULT_ROWS', '5000'))
+QUERY_MAX_RESULT_BYTES = int(os.environ.get('QUERY_MAX_RESULT_BYTES', str(8 * 1024 * 1024)))
+QUERY_FETCH_BATCH_SIZE = int(os.environ.get('QUERY_FETCH_BATCH_SIZE', '500'))
+
+# Per-phase timing of query execution (sqlplayground/query_timing.py): where spans
+# go ('log', 'histogram' or dotted paths to callables, comma separated; empty
+# disables them), whether staff users get a timings block in Run/Submit
+# responses, and the bearer token that lets a scraper read /metrics
+QUERY_TIMING_SINKS = os.environ.get('QUERY_TIMING_SINKS', 'histogram')
+QUERY_TIMING_IN_RESPONSE = os.environ.get('QUERY_TIMING_IN_RESPONSE', 'True').lower() == 'true'
+QUERY_METRICS_TOKEN = os.environ.get('QUERY_METRICS_TOKEN', '')
+# Local directory where every web and query worker process writes its timing
+# histogram for /metrics to add up (empty: /metrics only reports the process
+# that serves it), and how often a process rewrites its file
+QUERY_METRICS_DIR = os.environ.get('QUERY_METRICS_DIR', str(BASE_DIR / 'query_metrics'))
+QUERY_METRICS_FLUSH_SECONDS = int(os.environ.get('QUERY_METRICS_FLUSH_SECONDS', '10'))
+
+# Run challenge Run/Submit requests as queued jobs executed by
+# `python manage.py run_query_workers` instead of inside the web worker.
+# Only enable this when the query workers are running.
+CHALLENGE_JOB_QUEUE_ENABLED = os.environ.get('CHALLENGE_JOB_QUEUE_ENABLED', 'False').lower() == 'true'
+CHALLENGE_JOB_WORKERS = int(os.environ.get('CHALLENGE_JOB_WORKERS', '4'))
+CHALLENGE_JOB_ENGINE_CONCURRENCY = {
+    'mysql': int(os.environ.get('CHALLENGE_JOB_MYSQL_CONCURRENCY', '2')),
+    'postgresql': int(os.environ.get('CHALLENGE_JOB_POSTGRESQL_CONCURRENCY', '2')),
+}
+CHALLENGE_JOB_TIMEOUT_SECONDS = int(os.environ.get('CHALLENGE_JOB_TIMEOUT_SECONDS', '30'))
+CHALLENGE_JOB_RETENTION_SECONDS = int(os.environ.get('CHALLENGE_JOB_RETENTION_SECONDS', '3600'))
+
 
 
 # =============================================================================
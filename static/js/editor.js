@@ -64,7 +64,7 @@ async function executeQuery() {
     try {
         const response = await apiRequest('/editor/api/execute/', {
             method: 'POST',
-            body: JSON.stringify({ query })
+            body: JSON.stringify({ query, format: 'columnar' })
         });
         
         if (response.success) {
@@ -87,8 +87,10 @@ async function executeQuery() {
 function displayResults(response) {
     const container = document.getElementById('results-container');
     
-    if (response.results && response.results.length > 0) {
-        const table = createResultsTable(response.results, response.columns);
+    const rows = getResultRows(response);
+
+    if (rows.length > 0) {
+        const table = createResultsTable(rows, response.columns, response.column_types);
         container.innerHTML = '';
         container.appendChild(table);
         
@@ -126,8 +128,27 @@ function displayError(error) {
     `;
 }
 
+// Rows as arrays in column order, from either the columnar or the object format
+function getResultRows(response) {
+    if (response.format === 'columnar') {
+        return response.rows || [];
+    }
+    return (response.results || []).map(row => response.columns.map(column => row[column]));
+}
+
+// Format a cell using the column type tag sent with columnar results
+function formatCellValue(value, columnType) {
+    if (value === null || value === undefined) {
+        return 'NULL';
+    }
+    if (columnType === 'bytes') {
+        return '0x' + value;
+    }
+    return value;
+}
+
 // Create Results Table
-function createResultsTable(results, columns) {
+function createResultsTable(rows, columns, columnTypes = []) {
     const tableContainer = document.createElement('div');
     tableContainer.className = 'results-table';
     
@@ -149,13 +170,12 @@ function createResultsTable(results, columns) {
     // Create body
     const tbody = document.createElement('tbody');
     
-    results.forEach(row => {
+    rows.forEach(row => {
         const tr = document.createElement('tr');
         
-        columns.forEach(column => {
+        row.forEach((value, index) => {
             const td = document.createElement('td');
-            const value = row[column];
-            td.textContent = value !== null && value !== undefined ? value : 'NULL';
+            td.textContent = formatCellValue(value, columnTypes[index]);
             tr.appendChild(td);
         });
         